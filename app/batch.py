@@ -0,0 +1,154 @@
+"""
+アップロード済み画像を一括でモデレーション（顔モザイク・猫の枠線描画）するCLI
+
+    uv run python -m app.batch <入力ディレクトリ | globパターン | マニフェスト.jsonl> --output-dir out/
+"""
+import argparse
+import dataclasses
+import json
+import os
+from typing import Optional
+
+from lib.batch_processor import BatchImageProcessor, BatchItemResult, list_input_images
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.cache import LRUCache
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.local_detector import OpenCVRekognitionClientWrapper
+from lib.rekognition.near_duplicate import NearDuplicateRekognitionClientWrapper
+from lib.rekognition.preprocess import PreprocessingRekognitionClientWrapper
+from lib.rekognition.resilience import (
+    CircuitBreaker,
+    ResilientRekognitionClientWrapper,
+    TokenBucket,
+    create_rekognition_client,
+)
+from lib.rekognition.results_store import DetectionResultsStore, PersistentRekognitionClientWrapper
+from lib.rekognition.router import LOCAL_CATS_FIRST, RoutingRekognitionClientWrapper
+from lib.rekognition.wrapper import IRekognitionClientWrapper, RekognitionClientWrapper
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="入力ディレクトリ、globパターン、または各行に{\"path\": ...}を持つJSONLマニフェスト")
+    parser.add_argument("--output-dir", required=True, help="処理済み画像の出力先ディレクトリ")
+    parser.add_argument("--results", default=None, help="結果ファイル（JSONL）のパス。省略時は<output-dir>/results.jsonl")
+    parser.add_argument("--report", default=None, help="スループットレポート（JSON）の出力先")
+    parser.add_argument("--workers", type=int, default=4, help="並列に処理する画像数")
+    parser.add_argument("--mosaic-size", type=int, default=5)
+    parser.add_argument("--region", default="ap-northeast-1")
+    parser.add_argument("--endpoint-url", default=None, help="Rekognitionの代わりに接続するエンドポイント（ローカルのスタンドインサーバーなど）")
+    parser.add_argument("--max-upload-dimension", type=int, default=1920, help="Rekognitionへ送信する画像の長辺の上限（px）")
+    parser.add_argument("--max-requests-per-second", type=float, default=10, help="Rekognitionへのリクエストレートの上限")
+    parser.add_argument("--max-attempts", type=int, default=5, help="スロットリング時などの最大試行回数")
+    parser.add_argument("--results-db", default=None, help="検出結果を保存・再利用するSQLiteファイルのパス")
+    parser.add_argument("--detector", choices=("rekognition", "local"), default="rekognition",
+                        help="local: Rekognitionの代わりにOpenCVのカスケード分類器で検出する（opencv-python-headlessが必要）")
+    parser.add_argument("--local-cat-prefilter", action="store_true",
+                        help="OpenCVで猫が見つからない画像はRekognitionを呼ばずにrejectedとする（--results-dbとは併用できない）")
+    parser.add_argument("--reuse-near-duplicates", action="store_true",
+                        help="縮小・再圧縮されただけの画像は、知覚ハッシュで見つけて先に検出した画像の結果を再利用する")
+    parser.add_argument("--resume", action="store_true", help="結果ファイルで処理済みの画像をスキップして再開する")
+    args = parser.parse_args()
+    if args.detector == "local" and args.results_db is not None:
+        # 保存済みの結果はRekognitionの結果として扱われる（benchmarks.local_detectorの正解にも使う）ため混ぜない
+        parser.error("--results-db cannot be used with --detector local")
+    if args.local_cat_prefilter and args.results_db is not None:
+        # 保存されるのはローカルの検出器が猫を見つけた画像だけになり、ベンチマークで見逃し率を評価できなくなる
+        parser.error("--results-db cannot be used with --local-cat-prefilter")
+    return args
+
+
+def print_progress(result: BatchItemResult):
+    if result.status == "ok":
+        print(f"[ok] {result.path} (faces={result.face_count}, cats={result.cat_count})")
+    elif result.status == "rejected":
+        print(f"[rejected] {result.path} (no cat)")
+    else:
+        print(f"[error] {result.path}: {result.error}")
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    results_path = args.results or os.path.join(args.output_dir, "results.jsonl")
+
+    resilient_client: Optional[ResilientRekognitionClientWrapper] = None
+    router: Optional[RoutingRekognitionClientWrapper] = None
+    if args.detector == "local":
+        # Rekognitionを呼ばず、OpenCVのカスケード分類器だけで検出する（オフライン）
+        rekognition_client: IRekognitionClientWrapper = OpenCVRekognitionClientWrapper()
+    else:
+        resilient_client = ResilientRekognitionClientWrapper(
+            RekognitionClientWrapper(
+                # 顔検出と猫検出を並行して送るため、ワーカー数の2倍の接続を用意する
+                create_rekognition_client(
+                    args.region,
+                    max_pool_connections=max(10, args.workers * 2),
+                    endpoint_url=args.endpoint_url,
+                )
+            ),
+            rate_limiter=TokenBucket(args.max_requests_per_second),
+            circuit_breaker=CircuitBreaker(),
+            max_attempts=args.max_attempts,
+        )
+        rekognition_client = PreprocessingRekognitionClientWrapper(
+            resilient_client, max_dimension=args.max_upload_dimension
+        )
+        if args.local_cat_prefilter:
+            # ローカルの判定だけの結果はcats_skippedとなり、キャッシュ・近似重複のインデックスには残らない
+            rekognition_client = router = RoutingRekognitionClientWrapper(
+                rekognition_client, LOCAL_CATS_FIRST, local_detector=OpenCVRekognitionClientWrapper()
+            )
+    if args.results_db is not None:
+        rekognition_client = PersistentRekognitionClientWrapper(
+            rekognition_client, DetectionResultsStore(args.results_db)
+        )
+    if args.reuse_near_duplicates:
+        rekognition_client = NearDuplicateRekognitionClientWrapper(rekognition_client)
+    processor = BatchImageProcessor(
+        CachedRekognitionClientWrapper(rekognition_client, LRUCache(max_entries=1024)),
+        NumpyEllipseFaceMosaicDrawer(),
+        PILBoundingBoxDrawer(),
+        args.output_dir,
+        mosaic_size=args.mosaic_size,
+        workers=args.workers,
+    )
+    report = processor.run(
+        list_input_images(args.source),
+        results_path,
+        resume=args.resume,
+        on_result=print_progress,
+    ).to_dict()
+
+    print(
+        f"processed={report['processed']} succeeded={report['succeeded']} rejected={report['rejected']} "
+        f"failed={report['failed']} skipped={report['skipped']} "
+        f"throughput={report['images_per_second']:.2f} images/s"
+    )
+    for stage, summary in report["stages"].items():
+        print(f"  {stage:<6} p50={summary['p50'] * 1000:.1f}ms p95={summary['p95'] * 1000:.1f}ms")
+
+    # Rekognitionの時間のうち、レート制限・バックオフで待った時間と実際の呼び出し時間の内訳
+    if resilient_client is not None:
+        stats = resilient_client.stats
+        report["rekognition"] = dataclasses.asdict(stats)
+        print(
+            f"rekognition calls={stats.calls} retries={stats.retries} failures={stats.failures} "
+            f"wait={stats.wait_seconds:.1f}s call={stats.call_seconds:.1f}s"
+        )
+
+    if router is not None:
+        report["routing"] = dataclasses.asdict(router.stats)
+        print(
+            f"routing local_calls={router.stats.local_calls} rejected={router.stats.rejected} "
+            f"calls_per_image={router.stats.calls_per_image:.2f}"
+        )
+
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
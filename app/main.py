@@ -1,5 +1,7 @@
 from app.nekognition_app import NekognitionApp
+from lib.instrumentation import configure_from_env
 
 if __name__ == "__main__":
+    configure_from_env()
     app = NekognitionApp()
     app.run()
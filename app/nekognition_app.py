@@ -1,19 +1,98 @@
-from PIL import Image
-import io
+from __future__ import annotations
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+import functools
+import os
+import tempfile
+from typing import Callable, Optional, Union
 
 from streamlit.runtime.uploaded_file_manager import UploadedFile
-import boto3
-from mypy_boto3_rekognition.type_defs import (
-    DetectLabelsResponseTypeDef,
-    FaceDetailTypeDef,
-)
 import streamlit as st
 
-from lib.boundary_draw.drawer import BoundingBoxDrawer, IBoundaryDrawer
-from lib.rekognition.wrapper import IRekognitionClientWrapper, RekognitionClientWrapper
-from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer, IFaceMosaicDrawer
+from lib.boundary_draw.drawer import IBoundaryDrawer
+from lib.boundary_draw.layered_drawer import LayeredBoundingBoxDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.cache import LRUCache
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.lazy import LazyRekognitionClientWrapper
+from lib.rekognition.near_duplicate import NearDuplicateRekognitionClientWrapper
+from lib.rekognition.preprocess import PreprocessingRekognitionClientWrapper
+from lib.rekognition.resilience import (
+    CircuitBreaker,
+    RekognitionUnavailableError,
+    ResilientRekognitionClientWrapper,
+    TokenBucket,
+    create_rekognition_client,
+)
+from lib.rekognition.router import CATS_FIRST, RoutingRekognitionClientWrapper
+from lib.rekognition.results_store import (
+    DEFAULT_RESULTS_DB_PATH,
+    DetectionResultsStore,
+    PersistentRekognitionClientWrapper,
+)
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper, RekognitionClientWrapper
+from lib.face_mosaic_drawer import IFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer
 from lib.image_processor import ImageProcessor
-from lib.rekognition.utils import extract_cat_label, get_cat_instance_name_and_confidence
+from lib.instrumentation import span
+from lib.multi_image import (
+    MULTI_IMAGE_STORE_MAX_BYTES,
+    ImageItem,
+    ImageResult,
+    MultiImageProcessor,
+)
+from lib.large_image import (
+    LARGE_IMAGE_PIXELS,
+    PREVIEW_MAX_DIMENSION,
+    get_image_size,
+    write_full_resolution,
+)
+from lib.output_encoder import EncodedImage, OutputEncoder, output_encoder_from_env
+from lib.process_pool import ProcessPoolImageProcessor, RenderedImage, process_pool_from_env
+from lib.render_cache import RenderCache
+from lib.video import (
+    ANIMATION_MAX_FRAMES,
+    ANIMATION_MAX_OUTPUT_BYTES,
+    AnimatedImageFrameSource,
+    GIFFrameSink,
+    VideoProcessor,
+    is_animated_image,
+)
+from lib.rekognition.detections import Detections
+from lib.rekognition.utils import compute_image_hash, validate_image_bytes
+
+
+@functools.lru_cache(maxsize=8)
+def _shared_image_processor(
+    mosaic_drawer: IFaceMosaicDrawer,
+    bounding_box_drawer: IBoundaryDrawer,
+    render_cache: RenderCache,
+) -> ImageProcessor:
+    """同じ描画器の組み合わせに対しては、再実行をまたいで同じImageProcessorを使う"""
+    return ImageProcessor(mosaic_drawer, bounding_box_drawer, render_cache)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_multi_image_executor() -> Executor:
+    """複数画像モードのワーカープール。最初に使う時に生成し、全セッションで共有してプロセス全体の同時処理数を制限する"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="nekognition-multi")
+
+
+@functools.lru_cache(maxsize=8)
+def _shared_multi_image_processor(
+    rekognition_client: IRekognitionClientWrapper,
+    mosaic_drawer: IFaceMosaicDrawer,
+    executor: Executor,
+) -> MultiImageProcessor:
+    """同じ検出クライアント・描画器・ワーカープールに対しては、再実行をまたいで同じMultiImageProcessorを使う"""
+    # ワーカースレッドで並列に描画するため、matplotlibではなくPILの描画器を使う
+    return MultiImageProcessor(rekognition_client, mosaic_drawer, PILBoundingBoxDrawer(), executor)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 class NekognitionApp:
@@ -21,28 +100,262 @@ class NekognitionApp:
         self,
         app_title: str = "Nekognition",
         app_sub_title: str = "猫検出アプリケーション",
-        rekognition_client: IRekognitionClientWrapper = RekognitionClientWrapper(
-            boto3.client("rekognition", "ap-northeast-1")
+        # 同じ画像が別名・別ユーザーで再アップロードされた場合もRekognitionを呼ばないようキャッシュし、
+        # 送信する画像は縮小・再エンコードして5MBの上限と送信時間を抑える
+        # スロットリング時は再試行し、レート制限とサーキットブレーカーは全セッションで共有する
+        # 検出結果はSQLiteにも保存し、セッションやプロセスをまたいだ再描画でRekognitionを呼ばない
+        # 縮小・再圧縮されただけの画像も、知覚ハッシュで見つけて検出結果を再利用する
+        rekognition_client: IRekognitionClientWrapper = CachedRekognitionClientWrapper(
+            NearDuplicateRekognitionClientWrapper(
+                PersistentRekognitionClientWrapper(
+                    PreprocessingRekognitionClientWrapper(
+                        # 猫が写っていない画像は投稿させないため、先に猫を検出し、猫がいなければ顔検出を省略する
+                        RoutingRekognitionClientWrapper(
+                            ResilientRekognitionClientWrapper(
+                                # boto3のクライアントは起動時ではなく最初の検出時に生成する
+                                LazyRekognitionClientWrapper(
+                                    lambda: RekognitionClientWrapper(create_rekognition_client("ap-northeast-1"))
+                                ),
+                                rate_limiter=TokenBucket(rate_per_second=10),  # アカウントのTPSクォータに合わせて調整する
+                                circuit_breaker=CircuitBreaker(),
+                            ),
+                            policy=os.environ.get("NEKOGNITION_ROUTING_POLICY", CATS_FIRST),
+                        )
+                    ),
+                    DetectionResultsStore(os.environ.get("NEKOGNITION_RESULTS_DB", DEFAULT_RESULTS_DB_PATH)),
+                ),
+            ),
+            LRUCache(max_entries=256, ttl_seconds=60 * 60),
         ),
-        mosaic_drawer: IFaceMosaicDrawer = EllipseFaceMosaicDrawer(),
-        bounding_box_drawer: IBoundaryDrawer = BoundingBoxDrawer()
+        mosaic_drawer: IFaceMosaicDrawer = NumpyEllipseFaceMosaicDrawer(),
+        bounding_box_drawer: IBoundaryDrawer = LayeredBoundingBoxDrawer(),
+        # 再実行のたびにインスタンスが作り直されても共有されるよう、デフォルト引数で1つだけ生成する
+        render_cache: RenderCache = RenderCache(),
+        large_image_pixels: int = LARGE_IMAGE_PIXELS,
+        # 複数画像モードのワーカープール。指定しない場合は全セッションで共有するプールを最初に使う時に生成する
+        multi_image_executor: Optional[Executor] = None,
+        multi_image_store_max_bytes: int = MULTI_IMAGE_STORE_MAX_BYTES,
+        # 設定した場合（NEKOGNITION_RENDER_PROCESSES）、1画像モードの描画を全セッションで共有するプロセスプールで実行する
+        # （エンコードはoutput_encoderと同じNEKOGNITION_OUTPUT_*の設定に従う）
+        render_pool: Optional[ProcessPoolImageProcessor] = process_pool_from_env(),
+        # 1画像モードの描画結果は、st.pyplot（PNG）ではなくJPEG / WebPへエンコードして表示する
+        # （NEKOGNITION_OUTPUT_FORMAT / NEKOGNITION_OUTPUT_QUALITY / NEKOGNITION_OUTPUT_MAX_DIMENSION / NEKOGNITION_OUTPUT_MAX_BYTES）
+        output_encoder: OutputEncoder = output_encoder_from_env(),
+        # アニメーション画像のフレーム数と、セッションに保持する処理結果（GIF）のサイズの上限
+        animation_max_frames: int = ANIMATION_MAX_FRAMES,
+        animation_max_output_bytes: int = ANIMATION_MAX_OUTPUT_BYTES,
     ):
         self._app_title = app_title
         self._app_sub_title = app_sub_title
         self._rekognition_client = rekognition_client
-        self._image_processor = ImageProcessor(
-            mosaic_drawer, bounding_box_drawer
+        self._large_image_pixels = large_image_pixels
+        self._render_pool = render_pool
+        self._output_encoder = output_encoder
+        self._image_processor = _shared_image_processor(
+            mosaic_drawer, bounding_box_drawer, render_cache
         )
+        self._mosaic_drawer = mosaic_drawer
+        self._multi_image_executor = multi_image_executor
+        self._multi_image_store_max_bytes = multi_image_store_max_bytes
+        self._animation_max_frames = animation_max_frames
+        self._animation_max_output_bytes = animation_max_output_bytes
+        self._video_processor = VideoProcessor(rekognition_client, mosaic_drawer, PILBoundingBoxDrawer())
 
     def _update_session_state_with_detection(self, uploaded_file: UploadedFile):
         """画像バイトとRekognitionの検出結果をセッションに保存"""
         st.session_state["image_bytes"] = uploaded_file.read()
         st.session_state["uploaded_filename"] = uploaded_file.name
-        st.session_state["detect_face_res"] = self._rekognition_client.detect_faces(
-            st.session_state["image_bytes"]
-        )
-        st.session_state["detect_cats_res"] = self._rekognition_client.detect_cats(
-            st.session_state["image_bytes"]
+        st.session_state["image_hash"] = compute_image_hash(st.session_state["image_bytes"])
+        # 顔検出と猫検出は並行してリクエストする
+        with span("app.detect"):
+            detection_result = self._rekognition_client.detect_all(
+                st.session_state["image_bytes"]
+            )
+        # 正規化した検出結果（detection_result.faces / cats）は、結果オブジェクトと一緒に再実行をまたいで使い回す
+        st.session_state["detection_result"] = detection_result
+
+    def _show_processed_image(
+        self,
+        thumbnail: Callable[[], Union[EncodedImage, RenderedImage]],
+        full: Callable[[], Union[EncodedImage, RenderedImage]],
+    ):
+        """
+        エンコード済みの描画結果を表示する
+        先に小さなサムネイルを表示し、全体のエンコードが終わったら同じ場所を置き換える
+        """
+        slot = st.empty()
+        with span("app.show_image", renderer="thumbnail"):
+            slot.image(thumbnail().data)
+        encoded = full()
+        with span("app.show_image", renderer="st.image"):
+            slot.image(encoded.data)
+        st.caption(encoded.describe())
+
+    def _show_full_resolution_export(
+        self,
+        image_bytes: bytes,
+        face_detections: Detections,
+        cat_detections: Detections,
+        highlight_states: dict[str, bool],
+        mosaic_size: int,
+    ):
+        """
+        大画像モードで、元の解像度の処理済み画像を書き出してダウンロードボタンを表示する
+        書き出した画像は一時ファイルに保存してセッションに記録し、ダウンロードボタンのクリックによる再実行でも
+        同じ画像（画像・ハイライト状態・モザイクの粗さが同じ間）のボタンを表示し続ける
+        メモリ使用量：書き出し中はデコード済みの画像1枚分（エンコード結果はファイルへ直接書き出す）。
+        ダウンロードボタンの表示中は、Streamlitがエンコード済みのJPEG（ファイルサイズ分）をメモリに保持する
+        """
+        st.caption("大きな画像のため、縮小したプレビューを表示しています")
+        export_key = (st.session_state["image_hash"], tuple(sorted(highlight_states.items())), mosaic_size)
+        export = st.session_state.get("full_resolution_export")
+        if export is not None and export["key"] != export_key:
+            # 画像やハイライト状態が変わった場合は、前の書き出し結果を破棄する
+            _remove_file(export["path"])
+            del st.session_state["full_resolution_export"]
+            export = None
+
+        if export is None:
+            if not st.button("フル解像度の画像を書き出す"):
+                return
+            with tempfile.NamedTemporaryFile(prefix="nekognition-export-", suffix=".jpg", delete=False) as output_file:
+                write_full_resolution(
+                    image_bytes,
+                    face_detections,
+                    cat_detections,
+                    highlight_states,
+                    output_file,
+                    mosaic_size=mosaic_size,
+                )
+            export = {"key": export_key, "path": output_file.name}
+            st.session_state["full_resolution_export"] = export
+
+        with open(export["path"], "rb") as export_file:
+            st.download_button(
+                "ダウンロード",
+                data=export_file,
+                file_name="nekognition.jpg",
+                mime="image/jpeg",
+                # ダウンロードのクリックでは再実行しない
+                on_click="ignore",
+            )
+
+    def _multi_image_store(self) -> LRUCache[str, ImageResult]:
+        """複数画像モードの処理結果を保持するセッション毎のストア（プレビューの合計サイズで上限を設ける）"""
+        if "multi_image_results" not in st.session_state:
+            st.session_state["multi_image_results"] = LRUCache(
+                max_entries=256,
+                max_bytes=self._multi_image_store_max_bytes,
+                size_of=lambda result: result.size_bytes,
+            )
+        return st.session_state["multi_image_results"]
+
+    def _show_image_result(self, result: ImageResult):
+        """複数画像モードの1画像分の結果を表示する"""
+        st.markdown(f"#### {result.name}")
+        if result.error is not None:
+            st.error(f"処理に失敗しました: {result.error}")
+            return
+        if result.rejected:
+            st.warning("猫が検出されなかったため、この画像は投稿できません")
+            return
+        if len(result.cat_labels) == 0:
+            st.write("猫は検出されませんでした")
+        else:
+            st.write("、".join(result.cat_labels))
+        st.image(result.preview_jpeg)
+
+    def _run_multi_image(self, uploaded_files: list[UploadedFile]):
+        """
+        複数画像モード
+        - 処理済みの画像はセッションのストアから表示し、未処理の画像だけをワーカープールで処理する
+        - アップロード順に表示枠を確保し、処理が終わった画像から順に表示する
+        """
+        store = self._multi_image_store()
+        items = []
+        for uploaded_file in uploaded_files:
+            image_bytes = uploaded_file.getvalue()
+            items.append(ImageItem(compute_image_hash(image_bytes), uploaded_file.name, image_bytes))
+
+        # アップロードから外された画像の結果は破棄する
+        current_keys = {item.key for item in items}
+        for key in store.keys():
+            if key not in current_keys:
+                store.pop(key)
+
+        progress = st.progress(0.0)
+        placeholders = {}
+        pending = []
+        done_count = 0
+        for item in items:
+            if item.key in placeholders:
+                continue
+            placeholders[item.key] = st.empty()
+            result = store.get(item.key)
+            if result is None:
+                pending.append(item)
+                placeholders[item.key].info(f"{item.name}: 処理中...")
+            else:
+                done_count += 1
+                with placeholders[item.key].container():
+                    self._show_image_result(result)
+
+        total = len(placeholders)
+        progress.progress(done_count / total, text=f"{done_count}/{total} 枚処理済み")
+        executor = self._multi_image_executor or _shared_multi_image_executor()
+        multi_image_processor = _shared_multi_image_processor(self._rekognition_client, self._mosaic_drawer, executor)
+        for result in multi_image_processor.process_many(pending):
+            # 失敗した画像は保持せず、次の再実行で処理し直す
+            if result.error is None:
+                store.put(result.key, result)
+            done_count += 1
+            progress.progress(done_count / total, text=f"{done_count}/{total} 枚処理済み")
+            with placeholders[result.key].container():
+                self._show_image_result(result)
+
+    def _run_animation(self, image_bytes: bytes):
+        """
+        アニメーションGIFなど複数フレームの画像を処理して表示する
+        キーフレームだけを検出し、処理結果はチェックボックス操作などの再実行で作り直さないようセッションに保持する
+        処理時間とメモリを抑えるため、画像のサイズ・フレーム数・処理結果のサイズに上限を設ける
+        """
+        image_hash = compute_image_hash(image_bytes)
+        cached = st.session_state.get("animation_result")
+        if cached is None or cached[0] != image_hash:
+            # 前の画像の処理結果は、上限を超えて処理できなかった場合も残さない
+            st.session_state.pop("animation_result", None)
+            try:
+                validate_image_bytes(image_bytes)
+            except ValueError:
+                st.error("画像のサイズが大きすぎるため処理できません。5MB以下の画像をアップロードしてください。")
+                return
+            source = AnimatedImageFrameSource(image_bytes)
+            if source.frame_count > self._animation_max_frames:
+                st.error(
+                    f"フレーム数（{source.frame_count}）が多すぎるため処理できません。"
+                    f"{self._animation_max_frames}フレーム以下の画像をアップロードしてください。"
+                )
+                return
+            with st.spinner("フレームを処理しています..."):
+                # 上限を超えた分はディスクへ退避し、処理中のGIFをメモリに溜め込まない
+                with tempfile.SpooledTemporaryFile(max_size=self._animation_max_output_bytes) as output_file:
+                    try:
+                        report = self._video_processor.process(source, GIFFrameSink(output_file))
+                    except RekognitionUnavailableError:
+                        st.error("検出サービスが混み合っています。しばらくしてから再度お試しください。")
+                        return
+                    if output_file.tell() > self._animation_max_output_bytes:
+                        st.error("処理結果のサイズが大きすぎるため表示できません。小さな画像をアップロードしてください。")
+                        return
+                    output_file.seek(0)
+                    cached = (image_hash, output_file.read(), report)
+            st.session_state["animation_result"] = cached
+
+        _, gif_bytes, report = cached
+        st.image(gif_bytes)
+        st.caption(
+            f"{report.frames}フレーム（うち{report.keyframes}フレームで検出） "
+            f"{report.frames_per_second:.1f} frames/s"
         )
 
     def run(self):
@@ -55,7 +368,8 @@ class NekognitionApp:
         - 顔領域にモザイク処理を適用
         - 猫ごとにラベルとハイライト用チェックボックスを表示
         - チェックボックスの状態に応じて枠線の色を切り替えて画像を描画
-        - 猫が検出されなかった場合はその旨を表示
+        - 猫が検出されなかった場合はその旨を表示（顔検出を省略した場合は、投稿できない旨だけを表示して画像は表示しない）
+        - アニメーションGIFなどは、キーフレームで検出した結果を補間して全フレームに適用する
         """
         #### ヘッダー類 ####
         st.set_page_config(page_title=self._app_title)
@@ -63,14 +377,31 @@ class NekognitionApp:
         st.subheader(self._app_sub_title)
         ###################
 
+        #### 複数画像モード ####
+        if st.toggle("複数の画像をまとめて処理する", key="multi_image_mode"):
+            uploaded_files = st.file_uploader(
+                "画像をアップロードしてください（複数選択可）",
+                type=["jpeg", "png"],
+                accept_multiple_files=True,
+            )
+            if uploaded_files:
+                self._run_multi_image(uploaded_files)
+            return
+        ########################
+
         #### ファイルアップロードフォーム #####
         uploaded_file = st.file_uploader(
             "画像をアップロードしてください",
-            type=["jpeg", "png"],
+            type=["jpeg", "png", "gif", "webp"],
             accept_multiple_files=False,
         )
         ####################################
 
+        # アニメーションGIFなどはフレーム毎に処理する
+        if uploaded_file is not None and is_animated_image(uploaded_file.getvalue()):
+            self._run_animation(uploaded_file.getvalue())
+            return
+
         if uploaded_file is not None:
             #### 検出結果見出し ####
             st.markdown("### 検出されたラベル:")
@@ -78,27 +409,37 @@ class NekognitionApp:
 
             # 枠線ハイライトのチェックボックスが更新された時、Rekognitionへの不要なリクエストを防ぐ
             if "image_bytes" not in st.session_state or st.session_state.get("uploaded_filename") != uploaded_file.name:
-                self._update_session_state_with_detection(uploaded_file)
+                try:
+                    self._update_session_state_with_detection(uploaded_file)
+                except RekognitionUnavailableError:
+                    # 次の再実行で検出をやり直すよう、アップロード済みの状態を取り消す
+                    st.session_state.pop("uploaded_filename", None)
+                    st.error("検出サービスが混み合っています。しばらくしてから再度お試しください。")
+                    return
 
-            # sessionから画像バイトとRekognitionからのレスポンスを取り出す
-            detect_face_res: list[FaceDetailTypeDef] = st.session_state["detect_face_res"]
-            detect_cats_res: DetectLabelsResponseTypeDef = st.session_state["detect_cats_res"]
+            # sessionから画像バイトとRekognitionの検出結果を取り出す
+            detection_result: DetectionResult = st.session_state["detection_result"]
+            if detection_result.faces_skipped:
+                # 顔検出を省略しているため、モザイクをかけられない画像は表示しない
+                st.warning("アップロードされた画像において猫は検出されなかったため、この画像は投稿できません")
+                return
+            face_detections = detection_result.faces
+            cat_detections = detection_result.cats
             image_bytes: bytes = st.session_state["image_bytes"]
 
             # 検出されたラベル毎に対応する枠線のハイライト有無を管理する Ex.：{"Cat-1": True, "Cat-2": False}
             highlight_states: dict[str, bool] = {}
 
-            cat_label = extract_cat_label(detect_cats_res)
-            if cat_label is None or "Instances" not in cat_label:
+            if len(cat_detections) == 0:
                 #### 検出結果（猫なし） ####
                 st.write("アップロードされた画像において猫は検出されませんでした")
                 ##########################
 
             else:
                 #### 検出結果（猫あり） 表示形式: Cat-<連番> | 枠線ハイライト用チェックボックス ####
-                for index, instance in enumerate(cat_label["Instances"]):
-                    instance_name, instance_confidence = get_cat_instance_name_and_confidence(
-                        index, instance)
+                for instance_name, instance_confidence in zip(
+                    cat_detections.names, cat_detections.confidence_texts
+                ):
                     col1, col2 = st.columns([1, 1])
                     with col1:
                         st.write(f"- {instance_name} ({instance_confidence})")
@@ -111,12 +452,53 @@ class NekognitionApp:
                 ############################################################################
 
             #### 処理済みの画像を表示 ####
-            image_file = Image.open(io.BytesIO(image_bytes))
-            fig, ax = self._image_processor.process_image(
-                image_file,
-                detect_face_res,
-                detect_cats_res,
-                highlight_states,
-            )
-            st.pyplot(fig)
+            # チェックボックスの切り替え時は、キャッシュ済みのモザイク画像・描画結果を再利用する
+            # 大きな画像は縮小デコードしたプレビューに対して処理し、元の解像度の画像は書き出し時だけ処理する
+            image_width, image_height = get_image_size(image_bytes)
+            is_large_image = image_width * image_height > self._large_image_pixels
+            mosaic_size = 5
+            max_dimension = PREVIEW_MAX_DIMENSION if is_large_image else None
+            if self._render_pool is not None:
+                # 描画はワーカープロセスで行い、待っている間は他のセッションのスクリプトスレッドを妨げない
+                # サムネイルは縮小デコードした画像から別のワーカーで作り、全体より先に表示する
+                thumbnail_future, full_future = (
+                    self._render_pool.submit(
+                        image_bytes,
+                        face_detections,
+                        cat_detections,
+                        highlight_states,
+                        mosaic_size=mosaic_size,
+                        max_dimension=max_dimension,
+                        thumbnail=thumbnail,
+                    )
+                    for thumbnail in (True, False)
+                )
+                self._show_processed_image(thumbnail_future.result, full_future.result)
+            else:
+                # 描画結果とエンコード結果はRenderCacheに保持し、チェックボックスの切り替えで戻した時は再利用する
+                def encode(thumbnail: bool) -> EncodedImage:
+                    return self._image_processor.encode_image_bytes(
+                        image_bytes,
+                        face_detections,
+                        cat_detections,
+                        highlight_states,
+                        self._output_encoder,
+                        thumbnail=thumbnail,
+                        mosaic_size=mosaic_size,
+                        image_hash=st.session_state["image_hash"],
+                        max_dimension=max_dimension,
+                    )
+
+                self._show_processed_image(lambda: encode(True), lambda: encode(False))
+
+            if is_large_image:
+                # プレビューと同じ見た目になるよう、モザイクの粗さを元の解像度に合わせて拡大する
+                preview_scale = PREVIEW_MAX_DIMENSION / max(image_width, image_height)
+                self._show_full_resolution_export(
+                    image_bytes,
+                    face_detections,
+                    cat_detections,
+                    highlight_states,
+                    max(1, round(mosaic_size / preview_scale)),
+                )
             ############################
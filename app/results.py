@@ -0,0 +1,59 @@
+"""
+保存済みの検出結果（SQLite）を検索するCLI。Rekognitionは呼び出さない
+
+    uv run python -m app.results --min-cats 3 --min-confidence 90
+    uv run python -m app.results --since-days 7 --format jsonl
+"""
+import argparse
+import dataclasses
+import datetime
+import json
+import os
+import time
+
+from lib.rekognition.results_store import DEFAULT_RESULTS_DB_PATH, DetectionResultsStore
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.environ.get("NEKOGNITION_RESULTS_DB", DEFAULT_RESULTS_DB_PATH))
+    parser.add_argument("--min-cats", type=int, default=0, help="猫の数の下限")
+    parser.add_argument("--min-confidence", type=float, default=None, help="猫の数に数える信頼度（%%）の下限")
+    parser.add_argument("--min-faces", type=int, default=0, help="顔の数の下限")
+    parser.add_argument("--since-days", type=float, default=None, help="直近N日以内に検出した画像に限定する")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--format", choices=["table", "jsonl"], default="table")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = DetectionResultsStore(args.db)
+    try:
+        summaries = store.find_images(
+            min_cats=args.min_cats,
+            min_cat_confidence=args.min_confidence,
+            min_faces=args.min_faces,
+            since=time.time() - args.since_days * 24 * 60 * 60 if args.since_days is not None else None,
+            limit=args.limit,
+        )
+    finally:
+        store.close()
+
+    if args.format == "jsonl":
+        for summary in summaries:
+            print(json.dumps(dataclasses.asdict(summary)))
+        return
+
+    print(f"{'detected_at':<20} {'cats':>4} {'matched':>7} {'faces':>5}  image_hash")
+    for summary in summaries:
+        detected_at = datetime.datetime.fromtimestamp(summary.detected_at).strftime("%Y-%m-%d %H:%M:%S")
+        print(
+            f"{detected_at:<20} {summary.cat_count:>4} {summary.matched_cat_count:>7} "
+            f"{summary.face_count:>5}  {summary.image_hash}"
+        )
+    print(f"{len(summaries)} images")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+動画・アニメーション画像に顔モザイクと猫の枠線を適用するCLI
+キーフレームだけをRekognitionで検出し、間のフレームは枠を補間する
+
+    uv run python -m app.video input.gif --output out.gif --keyframe-interval 10
+    uv run python -m app.video input.mp4 --output out.mp4   # ffmpegが必要
+"""
+import argparse
+import dataclasses
+import json
+import os
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.rekognition.preprocess import PreprocessingRekognitionClientWrapper
+from lib.rekognition.resilience import (
+    CircuitBreaker,
+    ResilientRekognitionClientWrapper,
+    TokenBucket,
+    create_rekognition_client,
+)
+from lib.rekognition.wrapper import RekognitionClientWrapper
+from lib.video import (
+    AnimatedImageFrameSource,
+    FFmpegFrameSink,
+    FFmpegFrameSource,
+    GIFFrameSink,
+    IFrameSource,
+    VideoProcessor,
+)
+
+# Pillowで読み書きするアニメーション画像の拡張子（それ以外はffmpegで扱う）
+ANIMATED_IMAGE_EXTENSIONS = (".gif", ".webp", ".png", ".apng")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="入力ファイル（GIF / アニメーションWebP / APNG、ffmpegがあればmp4なども可）")
+    parser.add_argument("--output", required=True, help="出力ファイル（.gif、ffmpegがあれば.mp4なども可）")
+    parser.add_argument("--keyframe-interval", type=int, default=10, help="Rekognitionで検出するフレームの間隔")
+    parser.add_argument("--mosaic-size", type=int, default=5)
+    parser.add_argument("--no-boxes", action="store_true", help="猫の枠線を描画しない")
+    parser.add_argument("--region", default="ap-northeast-1")
+    parser.add_argument("--endpoint-url", default=None, help="Rekognitionの代わりに接続するエンドポイント")
+    parser.add_argument("--max-requests-per-second", type=float, default=10, help="Rekognitionへのリクエストレートの上限")
+    parser.add_argument("--report", default=None, help="処理結果（JSON）の出力先")
+    return parser.parse_args()
+
+
+def open_source(path: str) -> IFrameSource:
+    if path.lower().endswith(ANIMATED_IMAGE_EXTENSIONS):
+        with open(path, "rb") as f:
+            return AnimatedImageFrameSource(f.read())
+    return FFmpegFrameSource(path)
+
+
+def main():
+    args = parse_args()
+    rekognition_client = PreprocessingRekognitionClientWrapper(
+        ResilientRekognitionClientWrapper(
+            RekognitionClientWrapper(create_rekognition_client(args.region, endpoint_url=args.endpoint_url)),
+            rate_limiter=TokenBucket(args.max_requests_per_second),
+            circuit_breaker=CircuitBreaker(),
+        )
+    )
+    processor = VideoProcessor(
+        rekognition_client,
+        NumpyEllipseFaceMosaicDrawer(),
+        None if args.no_boxes else PILBoundingBoxDrawer(),
+        keyframe_interval=args.keyframe_interval,
+        mosaic_size=args.mosaic_size,
+    )
+
+    source = open_source(args.input)
+    if os.path.splitext(args.output)[1].lower() == ".gif":
+        with open(args.output, "wb") as output_file:
+            report = processor.process(source, GIFFrameSink(output_file))
+    else:
+        fps = source.fps if isinstance(source, FFmpegFrameSource) else 10.0
+        report = processor.process(source, FFmpegFrameSink(args.output, source.size, fps))
+
+    print(
+        f"frames={report.frames} keyframes={report.keyframes} "
+        f"elapsed={report.elapsed_seconds:.2f}s detect={report.detect_seconds:.2f}s "
+        f"throughput={report.frames_per_second:.1f} frames/s"
+    )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(
+                {**dataclasses.asdict(report), "frames_per_second": report.frames_per_second},
+                report_file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
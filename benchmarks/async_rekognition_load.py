@@ -0,0 +1,72 @@
+"""
+AsyncRekognitionClientWrapperの負荷試験
+Rekognitionの代わりに遅延を注入したスタブを使うため、オフラインで実行できる
+
+    uv run python -m benchmarks.async_rekognition_load --requests 500 --max-concurrency 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from lib.rekognition.async_wrapper import AsyncRekognitionClientWrapper, RekognitionBackpressureError
+from lib.rekognition.stub import StubRekognitionClientWrapper
+
+
+async def run_load(
+    requests: int,
+    max_concurrency: int,
+    max_waiting: int | None,
+    latency_seconds: float,
+) -> dict:
+    stub = StubRekognitionClientWrapper(
+        detect_faces_latency_seconds=latency_seconds,
+        detect_cats_latency_seconds=latency_seconds,
+    )
+    latencies: list[float] = []
+    rejected = 0
+
+    async with AsyncRekognitionClientWrapper(stub, max_concurrency, max_waiting) as client:
+        async def one_request():
+            nonlocal rejected
+            start = time.perf_counter()
+            try:
+                await client.detect_all(b"image")
+            except RekognitionBackpressureError:
+                rejected += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else [0.0] * 99
+    return {
+        "requests": requests,
+        "completed": len(latencies),
+        "rejected": rejected,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 1),
+        "p95_ms": round(quantiles[94] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-waiting", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.05, help="スタブに注入する1リクエストあたりの遅延（秒）")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load(args.requests, args.max_concurrency, args.max_waiting, args.latency)
+    )
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
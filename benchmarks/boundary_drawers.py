@@ -0,0 +1,104 @@
+"""
+枠線描画のベンチマーク（matplotlibのBoundingBoxDrawer と PILBoundingBoxDrawer の比較）
+1, 12, 24MPの合成画像に枠線を描画し、表示可能な画像になるまでの時間を計測する
+matplotlibはst.pyplotと同様にFigureをPNGへラスタライズするまでを計測に含める
+--toggleを指定した場合は、1インスタンスのハイライトだけを切り替えた時の再描画時間を
+PILBoundingBoxDrawer（全体を再描画）とLayeredBoundingBoxDrawer（変化した領域のみ再合成）で比較する
+
+    uv run python -m benchmarks.boundary_drawers --repeat 3
+"""
+import argparse
+import io
+import statistics
+import time
+
+from PIL import Image
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from lib.boundary_draw.drawer import BoundingBoxDrawer  # noqa: E402
+from lib.boundary_draw.layered_drawer import LayeredBoundingBoxDrawer  # noqa: E402
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer  # noqa: E402
+from benchmarks.synthetic import synthetic_labels_response  # noqa: E402
+
+# (名前, 幅, 高さ)
+IMAGE_SIZES = [
+    ("1MP", 1224, 816),
+    ("12MP", 4240, 2832),
+    ("24MP", 6000, 4000),
+]
+
+
+def render_with_matplotlib(image: Image.Image, labels_response: dict, highlight_states: dict):
+    fig, _ = BoundingBoxDrawer().draw(image, labels_response, highlight_states)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+
+
+def render_with_pil(image: Image.Image, labels_response: dict, highlight_states: dict):
+    PILBoundingBoxDrawer().draw(image, labels_response, highlight_states)
+
+
+def measure(func, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def compare_toggle(labels_response: dict, cats: int, repeat: int):
+    names = [f"Cat-{index+1}" for index in range(cats)]
+    states_off = {name: False for name in names}
+    states_on = {**states_off, names[0]: True}
+
+    print(f"{'size':<6} {'full redraw[ms]':>16} {'layered[ms]':>12} {'speedup':>8}")
+    for name, width, height in IMAGE_SIZES:
+        image = Image.new("RGB", (width, height), (90, 120, 150))
+        full_drawer = PILBoundingBoxDrawer()
+        full_seconds = measure(lambda: full_drawer.draw(image, labels_response, states_on), repeat)
+
+        layered_drawer = LayeredBoundingBoxDrawer()
+        layered_drawer.draw(image, labels_response, states_off)
+        toggles = iter([states_on, states_off] * repeat)
+        layered_seconds = measure(lambda: layered_drawer.draw(image, labels_response, next(toggles)), repeat)
+        print(
+            f"{name:<6} {full_seconds * 1000:>16.1f} {layered_seconds * 1000:>12.1f} "
+            f"{full_seconds / layered_seconds:>7.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cats", type=int, default=5)
+    parser.add_argument("--toggle", action="store_true", help="ハイライト切り替え時の再描画時間を比較する")
+    args = parser.parse_args()
+
+    labels_response = synthetic_labels_response(args.cats)
+    if args.toggle:
+        compare_toggle(labels_response, args.cats, args.repeat)
+        return
+
+    highlight_states = {f"Cat-{index+1}": index == 0 for index in range(args.cats)}
+
+    print(f"{'size':<6} {'matplotlib[ms]':>15} {'pil[ms]':>10} {'speedup':>8}")
+    for name, width, height in IMAGE_SIZES:
+        image = Image.new("RGB", (width, height), (90, 120, 150))
+        matplotlib_seconds = measure(
+            lambda: render_with_matplotlib(image, labels_response, highlight_states), args.repeat
+        )
+        pil_seconds = measure(
+            lambda: render_with_pil(image, labels_response, highlight_states), args.repeat
+        )
+        print(
+            f"{name:<6} {matplotlib_seconds * 1000:>15.1f} {pil_seconds * 1000:>10.1f} "
+            f"{matplotlib_seconds / pil_seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
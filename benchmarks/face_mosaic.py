@@ -0,0 +1,85 @@
+"""
+顔モザイク処理のベンチマーク（EllipseFaceMosaicDrawer と NumpyEllipseFaceMosaicDrawer の比較）
+大人数の集合写真を想定した合成画像に対して、処理時間とピークメモリ（最大RSSの増分）を計測する
+ピークメモリを他の計測と混ぜないため、エンジン毎に別プロセスで実行する
+
+    uv run python -m benchmarks.face_mosaic --width 6000 --height 4000 --faces 100
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from PIL import Image
+
+from benchmarks.synthetic import synthetic_face_details
+from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer
+
+ENGINES = {
+    "pil": EllipseFaceMosaicDrawer,
+    "numpy": NumpyEllipseFaceMosaicDrawer,
+}
+
+
+def max_rss_bytes() -> int:
+    # Linuxではru_maxrssの単位はKB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_engine(engine: str, width: int, height: int, faces: int, mosaic_size: int) -> dict:
+    """子プロセス側で1つのエンジンを計測する"""
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    face_details = synthetic_face_details(faces)
+    drawer = ENGINES[engine]()
+
+    baseline_rss = max_rss_bytes()
+    start = time.perf_counter()
+    drawer.apply_mosaic(image, face_details, mosaic_size)
+    elapsed = time.perf_counter() - start
+    return {
+        "engine": engine,
+        "seconds": elapsed,
+        "peak_rss_increase_bytes": max_rss_bytes() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--faces", type=int, default=100)
+    parser.add_argument("--mosaic-size", type=int, default=5)
+    parser.add_argument("--engine", choices=ENGINES.keys(), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine is not None:
+        print(json.dumps(run_engine(args.engine, args.width, args.height, args.faces, args.mosaic_size)))
+        return
+
+    print(f"{args.width}x{args.height} ({args.width * args.height / 1e6:.0f}MP), faces={args.faces}")
+    print(f"{'engine':<6} {'time[ms]':>10} {'peak RSS +[MB]':>15}")
+    for engine in ENGINES:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.face_mosaic",
+                "--engine", engine,
+                "--width", str(args.width),
+                "--height", str(args.height),
+                "--faces", str(args.faces),
+                "--mosaic-size", str(args.mosaic_size),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+        print(
+            f"{engine:<6} {result['seconds'] * 1000:>10.1f} "
+            f"{result['peak_rss_increase_bytes'] / 1e6:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
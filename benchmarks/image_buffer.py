@@ -0,0 +1,86 @@
+"""
+1枚のバッファにデコードして その場でモザイク・枠線を適用する経路（render_image_bytes）と、
+ImageProcessor（段階毎に画像をコピーする経路）の、処理時間とピークメモリ（RSSの増分）の比較
+tracemallocはPILのメモリ確保を追跡しないため、RSSをサンプリングして計測する
+
+    uv run python -m benchmarks.image_buffer --megapixels 4 12 --format JPEG PNG WEBP
+"""
+import argparse
+import io
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.pipeline import PeakRSSSampler
+from benchmarks.synthetic import synthetic_face_details, synthetic_jpeg_bytes, synthetic_labels_response
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.large_image import get_image_size, render_image_bytes
+
+
+PIPELINES = ("copy_per_stage", "single_buffer")
+
+
+def run_case(pipeline: str, megapixels: float, format: str, faces: int, cats: int) -> dict:
+    """1回だけ処理して計測する（確保済みのメモリが再利用されないよう、ケース毎に別プロセスで実行する）"""
+    image_bytes = synthetic_jpeg_bytes(megapixels)
+    face_details = synthetic_face_details(faces)
+    detect_labels_res = synthetic_labels_response(cats)
+    width, height = get_image_size(image_bytes)
+
+    if pipeline == "copy_per_stage":
+        processor = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer())
+
+        def render():
+            rendered = processor.process_image_bytes(image_bytes, face_details, detect_labels_res, {})
+            rendered.convert("RGB").save(io.BytesIO(), format=format)
+    else:
+        def render():
+            render_image_bytes(image_bytes, face_details, detect_labels_res, {}, io.BytesIO(), format=format)
+
+    with PeakRSSSampler() as sampler:
+        start = time.perf_counter()
+        render()
+        seconds = time.perf_counter() - start
+    return {
+        "pipeline": pipeline,
+        "megapixels": megapixels,
+        "format": format,
+        "decoded_rgb_bytes": width * height * 3,
+        "seconds": round(seconds, 3),
+        "peak_rss_increase_bytes": sampler.peak_delta_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[4, 12])
+    parser.add_argument("--format", nargs="+", default=["JPEG"], choices=["JPEG", "PNG", "WEBP"])
+    parser.add_argument("--faces", type=int, default=20)
+    parser.add_argument("--cats", type=int, default=5)
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        pipeline, megapixels, format = json.loads(args.case)
+        print(json.dumps(run_case(pipeline, megapixels, format, args.faces, args.cats)))
+        return
+
+    for megapixels in args.megapixels:
+        for format in args.format:
+            for pipeline in PIPELINES:
+                subprocess.run(
+                    [
+                        sys.executable, "-m", "benchmarks.image_buffer",
+                        "--case", json.dumps([pipeline, megapixels, format]),
+                        "--faces", str(args.faces),
+                        "--cats", str(args.cats),
+                    ],
+                    check=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
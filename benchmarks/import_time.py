@@ -0,0 +1,75 @@
+"""
+モジュールの読み込み時間のベンチマーク（python -X importtime）
+別プロセスで対象モジュールを読み込み、読み込み時間（累積）と、時間のかかったモジュールを表示する
+--preloadに指定したモジュールは先に読み込み、計測対象から除く
+（streamlit run で起動した場合、streamlitは既に読み込まれているため）
+
+    uv run python -m benchmarks.import_time --module app.nekognition_app --preload streamlit
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class ImportTiming:
+    name: str
+    self_us: int
+    cumulative_us: int
+
+
+def measure_import(module: str, preload: Optional[list[str]] = None) -> list[ImportTiming]:
+    """
+    新しいプロセスでmoduleを読み込み、そのとき新たに読み込まれたモジュールの一覧を返す
+    最後の要素がmodule自身（cumulative_usが読み込み全体の時間）になる
+    """
+    preload_statements = "".join(f"import {name}; " for name in preload or [])
+    # preloadの読み込みとの境界を判別するため、計測対象の直前に目印のモジュール名を読み込ませる
+    code = f"{preload_statements}import sys; print('--', file=sys.stderr); import {module}"
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    ).stderr
+
+    timings = []
+    for line in stderr.split("--\n", 1)[-1].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.nekognition_app")
+    parser.add_argument("--preload", nargs="*", default=["streamlit"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=None, help="計測結果（JSON）の出力先")
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module, args.preload) for _ in range(args.repeat)]
+    totals_ms = [run[-1].cumulative_us / 1000 for run in runs]
+    print(f"{args.module} (preload={args.preload}): median {statistics.median(totals_ms):.1f}ms "
+          f"over {args.repeat} runs, {len(runs[-1])} modules")
+    print(f"{'self[ms]':>9} {'cumulative[ms]':>15}  module")
+    for timing in sorted(runs[-1], key=lambda timing: timing.self_us, reverse=True)[:args.top]:
+        print(f"{timing.self_us / 1000:9.1f} {timing.cumulative_us / 1000:15.1f}  {timing.name}")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({
+                "module": args.module,
+                "preload": args.preload,
+                "totals_ms": totals_ms,
+                "modules": [asdict(timing) for timing in runs[-1]],
+            }, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+ローカルの検出器（OpenCVRekognitionClientWrapper）とRekognitionの、レイテンシと精度の比較
+Rekognitionの結果を正解とし、顔・猫それぞれの適合率・再現率と、猫検出のプレフィルタとして使った場合の
+省略率（Rekognitionの猫検出を呼ばずに済む画像の割合）・見逃し率を集計する
+
+    # 保存済みの検出結果（app.batch --results-db）を正解として使う（Rekognitionを呼ばない）
+    uv run python -m benchmarks.local_detector images/ --results-db nekognition_results.sqlite3
+
+    # Rekognition（またはスタンドインサーバー）を呼んで、レイテンシも比較する
+    uv run python -m benchmarks.local_detector images/ --region ap-northeast-1
+
+OpenCV（opencv-python-headless）が必要
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from lib.batch_processor import list_input_images
+from lib.rekognition.detections import Detections
+from lib.rekognition.local_detector import OpenCVRekognitionClientWrapper
+from lib.rekognition.preprocess import PreprocessingRekognitionClientWrapper
+from lib.rekognition.resilience import create_rekognition_client
+from lib.rekognition.results_store import DetectionResultsStore
+from lib.rekognition.utils import compute_image_hash
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper, RekognitionClientWrapper
+from lib.stats import summarize_durations
+from lib.tracking import iou_matrix, match_scores
+
+
+def coverage_matrix(local_boxes: np.ndarray, reference_boxes: np.ndarray) -> np.ndarray:
+    """
+    ローカルの枠の面積のうち、Rekognitionの枠に含まれる割合を(N, M)の配列で返す
+    猫のカスケードは猫の顔を、Rekognitionは猫全体を囲むため、猫はIoUではなくこの割合で対応付ける
+    """
+    local = np.nan_to_num(local_boxes, nan=0.0)[:, None, :]
+    reference = np.nan_to_num(reference_boxes, nan=0.0)[None, :, :]
+    inter_width = np.clip(
+        np.minimum(local[..., 0] + local[..., 2], reference[..., 0] + reference[..., 2])
+        - np.maximum(local[..., 0], reference[..., 0]), 0, None
+    )
+    inter_height = np.clip(
+        np.minimum(local[..., 1] + local[..., 3], reference[..., 1] + reference[..., 3])
+        - np.maximum(local[..., 1], reference[..., 1]), 0, None
+    )
+    area = local[..., 2] * local[..., 3]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(area > 0, inter_width * inter_height / area, 0.0)
+
+
+def count_matches(local: Detections, reference: Detections, scores: np.ndarray, min_score: float) -> int:
+    """scores（(ローカル, Rekognition)の類似度）がmin_score以上の組を、1対1で貪欲に対応付けた数"""
+    if len(local) == 0 or len(reference) == 0:
+        return 0
+    return len(match_scores(scores, min_score))
+
+
+@dataclass
+class Accuracy:
+    true_positives: int = 0
+    local_total: int = 0
+    reference_total: int = 0
+
+    def add(self, matched: int, local_count: int, reference_count: int):
+        self.true_positives += matched
+        self.local_total += local_count
+        self.reference_total += reference_count
+
+    def to_dict(self) -> dict:
+        return {
+            "local": self.local_total,
+            "reference": self.reference_total,
+            "matched": self.true_positives,
+            "precision": round(self.true_positives / self.local_total, 3) if self.local_total else None,
+            "recall": round(self.true_positives / self.reference_total, 3) if self.reference_total else None,
+        }
+
+
+@dataclass
+class Comparison:
+    faces: Accuracy = field(default_factory=Accuracy)
+    cats: Accuracy = field(default_factory=Accuracy)
+    images: int = 0
+    # 猫検出のプレフィルタとして使った場合の集計（画像単位）
+    images_without_local_cat: int = 0
+    images_with_reference_cat: int = 0
+    missed_cat_images: int = 0
+
+    def add(self, local: DetectionResult, reference: DetectionResult, face_min_iou: float, cat_min_coverage: float):
+        self.images += 1
+        self.faces.add(
+            count_matches(local.faces, reference.faces, iou_matrix(local.faces.boxes, reference.faces.boxes), face_min_iou),
+            len(local.faces),
+            len(reference.faces),
+        )
+        self.cats.add(
+            count_matches(
+                local.cats, reference.cats, coverage_matrix(local.cats.boxes, reference.cats.boxes), cat_min_coverage
+            ),
+            len(local.cats),
+            len(reference.cats),
+        )
+        if len(local.cats) == 0:
+            self.images_without_local_cat += 1
+        if len(reference.cats) > 0:
+            self.images_with_reference_cat += 1
+            if len(local.cats) == 0:
+                self.missed_cat_images += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "images": self.images,
+            "faces": self.faces.to_dict(),
+            "cats": self.cats.to_dict(),
+            "prefilter": {
+                "skip_rate": round(self.images_without_local_cat / self.images, 3) if self.images else None,
+                "missed_cat_rate": (
+                    round(self.missed_cat_images / self.images_with_reference_cat, 3)
+                    if self.images_with_reference_cat else None
+                ),
+            },
+        }
+
+
+def compare(
+    paths: list[str],
+    local_detector: IRekognitionClientWrapper,
+    reference_client: Optional[IRekognitionClientWrapper] = None,
+    reference_store: Optional[DetectionResultsStore] = None,
+    face_min_iou: float = 0.4,
+    cat_min_coverage: float = 0.6,
+) -> dict:
+    """
+    各画像をローカルの検出器とRekognitionの両方で検出して比較する
+    reference_storeを指定した場合は保存済みの結果を正解とし、保存されていない画像と
+    顔検出を省略した結果（顔の正解が無い）の画像は集計から除く
+    """
+    comparison = Comparison()
+    local_durations: list[float] = []
+    reference_durations: list[float] = []
+    skipped = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+
+        if reference_store is not None:
+            reference = reference_store.get(compute_image_hash(image_bytes))
+            if reference is None or reference.faces_skipped:
+                skipped += 1
+                continue
+        else:
+            start = time.perf_counter()
+            reference = reference_client.detect_all(image_bytes)
+            reference_durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        local = local_detector.detect_all(image_bytes)
+        local_durations.append(time.perf_counter() - start)
+        comparison.add(local, reference, face_min_iou, cat_min_coverage)
+
+    report = comparison.to_dict()
+    report["skipped"] = skipped
+    for name, durations in (("local", local_durations), ("reference", reference_durations)):
+        if durations:
+            summary = summarize_durations(durations)
+            report[f"{name}_latency_ms"] = {key: round(summary[key] * 1000, 1) for key in ("p50", "p95", "max")}
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="入力ディレクトリ、globパターン、またはJSONLマニフェスト")
+    parser.add_argument("--results-db", default=None, help="正解として使う保存済みの検出結果（SQLite）")
+    parser.add_argument("--region", default="ap-northeast-1")
+    parser.add_argument("--endpoint-url", default=None)
+    parser.add_argument("--max-dimension", type=int, default=1024, help="ローカルの検出器で検出する画像の長辺の上限（px）")
+    parser.add_argument("--face-min-iou", type=float, default=0.4)
+    parser.add_argument("--cat-min-coverage", type=float, default=0.6)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    local_detector = OpenCVRekognitionClientWrapper(max_dimension=args.max_dimension)
+    reference_client = None
+    reference_store = None
+    if args.results_db is not None:
+        reference_store = DetectionResultsStore(args.results_db)
+    else:
+        reference_client = PreprocessingRekognitionClientWrapper(
+            RekognitionClientWrapper(create_rekognition_client(args.region, endpoint_url=args.endpoint_url))
+        )
+
+    report = compare(
+        list_input_images(args.source),
+        local_detector,
+        reference_client,
+        reference_store,
+        args.face_min_iou,
+        args.cat_min_coverage,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
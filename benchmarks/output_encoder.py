@@ -0,0 +1,93 @@
+"""
+描画結果を画面へ送る形式毎の、エンコード時間と送信サイズの比較
+- st.pyplot：matplotlibの描画結果をst.pyplotと同じ設定（dpi=200、bbox_inches="tight"）でPNGにする
+- png：PILの描画結果をPNGにする（st.imageにPILの画像を渡した場合）
+- jpeg / jpeg_progressive / webp / thumbnail：OutputEncoder
+
+    uv run python -m benchmarks.output_encoder --megapixels 2 12 --repeat 5
+"""
+import argparse
+import io
+import time
+
+from benchmarks.synthetic import synthetic_face_details, synthetic_jpeg_bytes, synthetic_labels_response
+from lib.boundary_draw.drawer import BoundingBoxDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.output_encoder import OutputEncoder
+from lib.rekognition.detections import as_cat_detections
+from lib.stats import summarize_durations
+
+
+def _measure(encode, repeat: int) -> tuple[int, dict[str, float]]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = encode()
+        durations.append(time.perf_counter() - start)
+    return len(data), summarize_durations(durations)
+
+
+def _print_row(name: str, megapixels: float, nbytes: int, summary: dict[str, float]):
+    print(
+        f"{megapixels:>5.1f}MP {name:<18} {nbytes / 1024:>9.1f} KB"
+        f"  p50 {summary['p50'] * 1000:>8.1f} ms  p95 {summary['p95'] * 1000:>8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[2, 12])
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--faces", type=int, default=20)
+    parser.add_argument("--cats", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import matplotlib.pyplot as plt
+
+    for megapixels in args.megapixels:
+        image_bytes = synthetic_jpeg_bytes(megapixels)
+        face_details = synthetic_face_details(args.faces)
+        detect_labels_res = synthetic_labels_response(args.cats)
+        # matplotlibの描画器は全ての猫のハイライト状態を必要とする
+        highlight_states = {name: False for name in as_cat_detections(detect_labels_res).names}
+
+        figure, axes = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), BoundingBoxDrawer()).process_image_bytes(
+            image_bytes, face_details, detect_labels_res, highlight_states
+        )
+        image = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer()).process_image_bytes(
+            image_bytes, face_details, detect_labels_res, highlight_states
+        )
+
+        def pyplot_png() -> bytes:
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+            return buffer.getvalue()
+
+        def pil_png() -> bytes:
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            return buffer.getvalue()
+
+        jpeg = OutputEncoder(quality=args.quality, progressive=False)
+        progressive = OutputEncoder(quality=args.quality, progressive=True)
+        webp = OutputEncoder(format="WEBP", quality=args.quality)
+        cases = {
+            "st.pyplot": pyplot_png,
+            "png": pil_png,
+            "jpeg": lambda: jpeg.encode(image).data,
+            "jpeg_progressive": lambda: progressive.encode(image).data,
+            "webp": lambda: webp.encode(image).data,
+            "thumbnail": lambda: progressive.encode_thumbnail(image).data,
+            # matplotlibの描画器の結果も、PNGを経由せずにエンコードできる
+            "figure_jpeg": lambda: progressive.encode((figure, axes)).data,
+        }
+        for name, encode in cases.items():
+            _print_row(name, megapixels, *_measure(encode, args.repeat))
+        plt.close(figure)
+
+
+if __name__ == "__main__":
+    main()
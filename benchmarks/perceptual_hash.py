@@ -0,0 +1,107 @@
+"""
+知覚ハッシュのインデックス（MultiIndexHashTable）のベンチマーク
+ランダムなハッシュ値を登録し、登録時間・メモリ使用量（最大RSSの増分）と、
+近いハッシュ値の検索のレイテンシを全件の線形走査（numpy）と比較する。あわせて画像のdHashの計算時間も計測する
+
+    uv run python -m benchmarks.perceptual_hash --entries 1000000 --queries 1000
+"""
+import argparse
+import json
+import random
+import resource
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_jpeg_bytes
+from lib.perceptual_hash import MultiIndexHashTable, fingerprint_image_bytes
+from lib.stats import summarize_durations
+
+
+def max_rss_bytes() -> int:
+    # Linuxではru_maxrssの単位はKB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def near_hash(rng: random.Random, value: int, max_flips: int) -> int:
+    for bit in rng.sample(range(64), rng.randint(0, max_flips)):
+        value ^= 1 << bit
+    return value
+
+
+def run_index(entries: int, queries: int, max_distance: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(entries)]
+
+    baseline_rss = max_rss_bytes()
+    index = MultiIndexHashTable(max_distance)
+    start = time.perf_counter()
+    for value in hashes:
+        index.add(value)
+    build_seconds = time.perf_counter() - start
+    rss_increase = max_rss_bytes() - baseline_rss
+
+    # 半分は登録済みのハッシュ値の近傍（再圧縮された画像）、半分は無関係な画像
+    query_values = [
+        near_hash(rng, rng.choice(hashes), max_distance) if query_index % 2 == 0 else rng.getrandbits(64)
+        for query_index in range(queries)
+    ]
+    all_hashes = np.array(hashes, dtype=np.uint64)
+
+    index_durations = []
+    scan_durations = []
+    for value in query_values:
+        start = time.perf_counter()
+        found = index.search(value)
+        index_durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scanned = np.flatnonzero(np.bitwise_count(all_hashes ^ np.uint64(value)) <= max_distance)
+        scan_durations.append(time.perf_counter() - start)
+        assert sorted(entry_id for entry_id, _ in found) == scanned.tolist()
+
+    index_summary = summarize_durations(index_durations)
+    scan_summary = summarize_durations(scan_durations)
+    return {
+        "entries": entries,
+        "max_distance": max_distance,
+        "build_seconds": round(build_seconds, 2),
+        "index_nbytes": index.nbytes,
+        "peak_rss_increase_bytes": rss_increase,
+        "search_p50_us": round(index_summary["p50"] * 1e6, 1),
+        "search_p95_us": round(index_summary["p95"] * 1e6, 1),
+        "linear_scan_p50_us": round(scan_summary["p50"] * 1e6, 1),
+        "linear_scan_p95_us": round(scan_summary["p95"] * 1e6, 1),
+    }
+
+
+def run_fingerprint(megapixels: float, repeat: int) -> dict:
+    image_bytes = synthetic_jpeg_bytes(megapixels)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fingerprint_image_bytes(image_bytes)
+        durations.append(time.perf_counter() - start)
+    summary = summarize_durations(durations)
+    return {
+        "megapixels": megapixels,
+        "image_bytes": len(image_bytes),
+        "fingerprint_p50_ms": round(summary["p50"] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument("--megapixels", default="1,12", help="dHashの計算時間を計測する画像の画素数（MP）")
+    args = parser.parse_args()
+
+    print(json.dumps(run_index(args.entries, args.queries, args.max_distance)))
+    for megapixels in (float(value) for value in args.megapixels.split(",")):
+        print(json.dumps(run_fingerprint(megapixels, repeat=5)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+検出 → 顔モザイク → 枠線描画 のパイプライン全体のベンチマーク
+合成画像（1〜50MP、顔0〜100件、猫0〜50件）に対し、遅延を設定できるスタブのRekognitionを使って
+ステージ毎（detect, decode, mosaic, draw, process_image）の処理時間とピークメモリを計測する
+ピークメモリは計測中にRSSをサンプリングし、ステージ開始時からの増分の最大値を記録する
+ケース毎に別プロセスで実行し、結果をJSONに保存する。--baselineで以前の結果と比較できる
+
+    uv run python -m benchmarks.pipeline --megapixels 1 12 50 --faces 0 10 100 --cats 0 10 50 \\
+        --output bench.json
+    uv run python -m benchmarks.pipeline --baseline bench-main.json --output bench.json
+"""
+import argparse
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+from PIL import Image
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+from lib.boundary_draw.drawer import BoundingBoxDrawer  # noqa: E402
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer  # noqa: E402
+from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer  # noqa: E402
+from lib.image_processor import ImageProcessor  # noqa: E402
+from lib.rekognition.preprocess import PreprocessingRekognitionClientWrapper  # noqa: E402
+from lib.rekognition.stub import StubRekognitionClientWrapper  # noqa: E402
+from lib.stats import summarize_durations  # noqa: E402
+from benchmarks.synthetic import (  # noqa: E402
+    synthetic_face_details,
+    synthetic_jpeg_bytes,
+    synthetic_labels_response,
+)
+
+STAGES = ("detect", "decode", "mosaic", "draw", "process_image")
+
+MOSAIC_ENGINES = {
+    "pil": EllipseFaceMosaicDrawer,
+    "numpy": NumpyEllipseFaceMosaicDrawer,
+}
+
+BOX_DRAWERS = {
+    "matplotlib": BoundingBoxDrawer,
+    "pil": PILBoundingBoxDrawer,
+}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> int:
+    """現在のRSS（Linux以外では最大RSSで代用する）"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSSSampler:
+    """withブロックの実行中にRSSを一定間隔でサンプリングし、開始時からの増分の最大値を記録する"""
+
+    def __init__(self, interval_seconds: float = 0.001):
+        self._interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._baseline = 0
+        self._peak = 0
+
+    @property
+    def peak_delta_bytes(self) -> int:
+        return max(0, self._peak - self._baseline)
+
+    def _sample(self):
+        while not self._stop.wait(self._interval_seconds):
+            self._peak = max(self._peak, current_rss_bytes())
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self._baseline = self._peak = current_rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, current_rss_bytes())
+
+
+def rasterize(result) -> Image.Image:
+    """
+    描画結果を表示可能な画像にする
+    matplotlibの場合はst.pyplotと同様にFigureをPNGへラスタライズするまでを含める
+    """
+    if isinstance(result, tuple) and isinstance(result[0], Figure):
+        figure = result[0]
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png")
+        plt.close(figure)
+        buffer.seek(0)
+        return Image.open(buffer)
+    return result
+
+
+def _measure(run: Callable[[], object]) -> tuple[object, float, int]:
+    with PeakRSSSampler() as sampler:
+        start = time.perf_counter()
+        value = run()
+        elapsed = time.perf_counter() - start
+    return value, elapsed, sampler.peak_delta_bytes
+
+
+def run_case(
+    megapixels: float,
+    faces: int,
+    cats: int,
+    mosaic_engine: str = "numpy",
+    box_drawer: str = "pil",
+    mosaic_size: int = 5,
+    latency_seconds: float = 0.0,
+    repeat: int = 3,
+) -> dict:
+    """1つのケース（画像サイズ・顔の数・猫の数の組み合わせ）を計測する"""
+    image_bytes = synthetic_jpeg_bytes(megapixels)
+    # アプリと同様に縮小・再エンコードしてから送信する（detectには前処理の時間も含まれる）
+    client = PreprocessingRekognitionClientWrapper(
+        StubRekognitionClientWrapper(
+            synthetic_face_details(faces),
+            synthetic_labels_response(cats),
+            detect_faces_latency_seconds=latency_seconds,
+            detect_cats_latency_seconds=latency_seconds,
+        )
+    )
+    mosaic_drawer = MOSAIC_ENGINES[mosaic_engine]()
+    bounding_box_drawer = BOX_DRAWERS[box_drawer]()
+    processor = ImageProcessor(mosaic_drawer, bounding_box_drawer)
+
+    def decode() -> Image.Image:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        return image
+
+    durations: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    peaks: dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def record(stage: str, run: Callable[[], object]) -> object:
+        value, elapsed, peak = _measure(run)
+        durations[stage].append(elapsed)
+        peaks[stage] = max(peaks[stage], peak)
+        return value
+
+    for _ in range(repeat):
+        detection = record("detect", lambda: client.detect_all(image_bytes))
+        image = record("decode", decode)
+        mosaiced = record(
+            "mosaic", lambda: mosaic_drawer.apply_mosaic(image, detection.faces, mosaic_size)
+        )
+        record("draw", lambda: rasterize(bounding_box_drawer.draw(mosaiced, detection.cats)))
+        del mosaiced
+        record(
+            "process_image",
+            lambda: rasterize(
+                processor.process_image(
+                    image, detection.faces, detection.cats, {}, mosaic_size
+                )
+            ),
+        )
+        del image
+
+    width, height = Image.open(io.BytesIO(image_bytes)).size
+    return {
+        "megapixels": megapixels,
+        "width": width,
+        "height": height,
+        "faces": faces,
+        "cats": cats,
+        "stages": {
+            stage: {**summarize_durations(durations[stage]), "peak_rss_delta_bytes": peaks[stage]}
+            for stage in STAGES
+        },
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def case_key(case: dict) -> tuple:
+    return case["megapixels"], case["faces"], case["cats"]
+
+
+def compare_results(
+    baseline: dict,
+    current: dict,
+    threshold: float = 0.1,
+    min_delta_seconds: float = 0.001,
+) -> list[dict]:
+    """
+    2つの計測結果を比較し、ステージ毎のp50の変化率を返す
+    変化率がthresholdを超え、かつmin_delta_seconds以上遅くなったものはregression=Trueとする
+    （1ms未満のステージの揺らぎを回帰として扱わないため）
+    """
+    baseline_cases = {case_key(case): case for case in baseline["cases"]}
+    comparisons = []
+    for case in current["cases"]:
+        baseline_case = baseline_cases.get(case_key(case))
+        if baseline_case is None:
+            continue
+        for stage, summary in case["stages"].items():
+            baseline_summary = baseline_case["stages"].get(stage)
+            if baseline_summary is None or baseline_summary["p50"] == 0:
+                continue
+            change = summary["p50"] / baseline_summary["p50"] - 1
+            comparisons.append({
+                "megapixels": case["megapixels"],
+                "faces": case["faces"],
+                "cats": case["cats"],
+                "stage": stage,
+                "baseline_p50": baseline_summary["p50"],
+                "current_p50": summary["p50"],
+                "change": change,
+                "regression": (
+                    change > threshold
+                    and summary["p50"] - baseline_summary["p50"] >= min_delta_seconds
+                ),
+            })
+    return comparisons
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 12, 24])
+    parser.add_argument("--faces", type=int, nargs="+", default=[0, 10, 100])
+    parser.add_argument("--cats", type=int, nargs="+", default=[0, 10, 50])
+    parser.add_argument("--mosaic-engine", choices=MOSAIC_ENGINES, default="numpy")
+    parser.add_argument("--box-drawer", choices=BOX_DRAWERS, default="pil")
+    parser.add_argument("--mosaic-size", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブのRekognitionの1呼び出しあたりの遅延（秒）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="計測結果（JSON）の出力先")
+    parser.add_argument("--baseline", default=None, help="比較対象の計測結果（JSON）")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p50がこの割合を超えて遅くなった場合に回帰とみなす")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.case is not None:
+        # 子プロセス側：1ケースだけ計測して標準出力にJSONを書く
+        megapixels, faces, cats = json.loads(args.case)
+        print(json.dumps(run_case(
+            megapixels, faces, cats, args.mosaic_engine, args.box_drawer,
+            args.mosaic_size, args.latency, args.repeat,
+        )))
+        return
+
+    cases = []
+    for megapixels, faces, cats in itertools.product(args.megapixels, args.faces, args.cats):
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.pipeline",
+                "--case", json.dumps([megapixels, faces, cats]),
+                "--mosaic-engine", args.mosaic_engine,
+                "--box-drawer", args.box_drawer,
+                "--mosaic-size", str(args.mosaic_size),
+                "--latency", str(args.latency),
+                "--repeat", str(args.repeat),
+            ],
+            stdout=subprocess.PIPE, text=True, check=True,
+        ).stdout
+        case = json.loads(output)
+        cases.append(case)
+        stages = "  ".join(
+            f"{stage}={case['stages'][stage]['p50'] * 1000:.1f}ms"
+            f"/{case['stages'][stage]['peak_rss_delta_bytes'] / 2**20:.0f}MB"
+            for stage in STAGES
+        )
+        print(f"{megapixels:g}MP faces={faces} cats={cats}: {stages}")
+
+    results = {
+        "metadata": {
+            "commit": git_commit(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mosaic_engine": args.mosaic_engine,
+            "box_drawer": args.box_drawer,
+            "mosaic_size": args.mosaic_size,
+            "latency_seconds": args.latency,
+            "repeat": args.repeat,
+        },
+        "cases": cases,
+    }
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            comparisons = compare_results(json.load(baseline_file), results, args.threshold)
+        regressions = [comparison for comparison in comparisons if comparison["regression"]]
+        for comparison in comparisons:
+            mark = "  REGRESSION" if comparison["regression"] else ""
+            print(
+                f"{comparison['megapixels']:g}MP faces={comparison['faces']} cats={comparison['cats']} "
+                f"{comparison['stage']:<13} {comparison['baseline_p50'] * 1000:8.1f}ms -> "
+                f"{comparison['current_p50'] * 1000:8.1f}ms ({comparison['change']:+.1%}){mark}"
+            )
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
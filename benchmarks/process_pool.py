@@ -0,0 +1,96 @@
+"""
+描画をスレッドで行う場合（ImageProcessor）と、プロセスプールで行う場合（ProcessPoolImageProcessor）の比較
+同時に使っているセッション数（--sessions）のスレッドから、それぞれ--images枚の合成画像を
+デコード → 顔モザイク → 枠線描画 → JPEGエンコード（OutputEncoderの既定の設定） し、スループット（枚/秒）とプールの稼働率を集計する
+スレッドの場合はGILで直列化されるため、ワーカー数（--workers）を増やしてもCPUコア数まではプロセスプールだけが伸びる
+
+    uv run python -m benchmarks.process_pool --megapixels 2 --sessions 8 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic import synthetic_face_details, synthetic_jpeg_bytes, synthetic_labels_response
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.output_encoder import OutputEncoder
+from lib.process_pool import ProcessPoolImageProcessor
+from lib.stats import summarize_durations
+
+
+def _run_sessions(sessions: int, images: int, render) -> tuple[float, list[float]]:
+    """sessions個のスレッドからimages枚ずつrenderを呼び、全体の経過時間と1枚毎の処理時間を返す"""
+    durations: list[float] = []
+
+    def session():
+        for _ in range(images):
+            start = time.perf_counter()
+            render()
+            durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        for future in [executor.submit(session) for _ in range(sessions)]:
+            future.result()
+    return time.perf_counter() - start, durations
+
+
+def run(backend: str, workers: int, sessions: int, images: int, megapixels: float, faces: int, cats: int) -> dict:
+    image_bytes = synthetic_jpeg_bytes(megapixels)
+    face_details = synthetic_face_details(faces)
+    detect_labels_res = synthetic_labels_response(cats)
+    report = {"backend": backend, "workers": workers, "sessions": sessions, "megapixels": megapixels}
+
+    if backend == "threads":
+        processor = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer())
+        encoder = OutputEncoder()
+
+        def render():
+            encoder.encode(processor.process_image_bytes(image_bytes, face_details, detect_labels_res, {}))
+
+        elapsed, durations = _run_sessions(sessions, images, render)
+    else:
+        pool = ProcessPoolImageProcessor(max_workers=workers)
+        # ワーカーの起動時間を計測に含めない
+        for future in [pool.submit(image_bytes, face_details, detect_labels_res, {}) for _ in range(workers)]:
+            future.result()
+
+        worker_seconds: list[float] = []
+
+        def render():
+            rendered = pool.process_image_bytes(image_bytes, face_details, detect_labels_res, {})
+            worker_seconds.append(rendered.worker_seconds)
+
+        elapsed, durations = _run_sessions(sessions, images, render)
+        # 計測区間内の稼働率（pool.statsはプール作成時からの値のため、ここでは計測区間だけで求める）
+        report["utilization"] = round(sum(worker_seconds) / (workers * elapsed), 3)
+        report["worker_p50_ms"] = round(summarize_durations(worker_seconds)["p50"] * 1000, 1)
+        pool.shutdown()
+
+    summary = summarize_durations(durations)
+    report["images_per_second"] = round(len(durations) / elapsed, 2)
+    report["latency_p50_ms"] = round(summary["p50"] * 1000, 1)
+    report["latency_p95_ms"] = round(summary["p95"] * 1000, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, default=2)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--images", type=int, default=4, help="1セッションあたりの画像数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--faces", type=int, default=10)
+    parser.add_argument("--cats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run("threads", args.sessions, args.sessions, args.images, args.megapixels, args.faces, args.cats)))
+    for workers in args.workers:
+        print(json.dumps(run("processes", workers, args.sessions, args.images, args.megapixels, args.faces, args.cats)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+ローカルのRekognitionスタンドインサーバー（LocalRekognitionServer）の起動と、boto3の経路の負荷試験
+
+    # サーバーだけを起動し、アプリやバッチ処理から接続する（AWS_ENDPOINT_URL_REKOGNITION / --endpoint-url）
+    uv run python -m benchmarks.rekognition_server serve --port 4599 --latency lognormal:0.15,0.5 --throttle-rate 0.05
+
+    # サーバーを起動し、boto3 → RekognitionClientWrapper → 再試行 → キャッシュの経路に並列にリクエストを送る
+    uv run python -m benchmarks.rekognition_server load --requests 500 --concurrency 32 --images 50
+"""
+import argparse
+import dataclasses
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from benchmarks.synthetic import synthetic_face_details, synthetic_jpeg_bytes, synthetic_labels_response
+from lib.cache import LRUCache
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.local_server import LatencyDistribution, LocalRekognitionServer, RekognitionFixtures
+from lib.rekognition.resilience import (
+    CircuitBreaker,
+    RekognitionUnavailableError,
+    ResilientRekognitionClientWrapper,
+    TokenBucket,
+    create_rekognition_client,
+)
+from lib.rekognition.wrapper import IRekognitionClientWrapper, RekognitionClientWrapper
+from lib.stats import summarize_durations
+
+
+def synthetic_fixtures(images: int, seed: int = 0) -> tuple[list[bytes], RekognitionFixtures]:
+    """負荷試験用の小さな合成画像と、それぞれの固定の検出結果を作る"""
+    image_bytes_list = []
+    fixtures = RekognitionFixtures()
+    for index in range(images):
+        image_bytes = synthetic_jpeg_bytes(0.05, seed=seed + index)
+        image_bytes_list.append(image_bytes)
+        fixtures.add(
+            image_bytes,
+            synthetic_face_details(index % 4, seed=seed + index),
+            synthetic_labels_response(index % 3, seed=seed + index)["Labels"],
+        )
+    return image_bytes_list, fixtures
+
+
+def run_load(
+    server: LocalRekognitionServer,
+    image_bytes_list: list[bytes],
+    requests: int,
+    concurrency: int,
+    max_requests_per_second: Optional[float] = None,
+    max_attempts: int = 5,
+    use_cache: bool = True,
+) -> dict:
+    resilient_client = ResilientRekognitionClientWrapper(
+        RekognitionClientWrapper(
+            create_rekognition_client(
+                "ap-northeast-1",
+                max_pool_connections=concurrency * 2,
+                endpoint_url=server.endpoint_url,
+            )
+        ),
+        rate_limiter=TokenBucket(max_requests_per_second) if max_requests_per_second else None,
+        circuit_breaker=CircuitBreaker(),
+        max_attempts=max_attempts,
+    )
+    client: IRekognitionClientWrapper = resilient_client
+    if use_cache:
+        client = CachedRekognitionClientWrapper(client, LRUCache(max_entries=len(image_bytes_list)))
+
+    def one_request(index: int) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            client.detect_all(image_bytes_list[index % len(image_bytes_list)])
+        except RekognitionUnavailableError:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    completed = [latency for latency in latencies if latency is not None]
+    summary = summarize_durations(completed)
+    return {
+        "requests": requests,
+        "completed": len(completed),
+        "failed": requests - len(completed),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(completed) / elapsed, 1),
+        "p50_ms": round(summary["p50"] * 1000, 1),
+        "p95_ms": round(summary["p95"] * 1000, 1),
+        "max_ms": round(summary["max"] * 1000, 1),
+        "client": dataclasses.asdict(resilient_client.stats),
+        "server": dataclasses.asdict(server.stats),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "load"):
+        subparser = subparsers.add_parser(name)
+        subparser.add_argument("--latency", type=LatencyDistribution.parse, default=LatencyDistribution.parse("fixed:0.05"),
+                               help="応答の遅延の分布（fixed:<秒> / uniform:<最小>,<最大> / lognormal:<中央値>,<sigma>）")
+        subparser.add_argument("--throttle-rate", type=float, default=0.0, help="ThrottlingExceptionを返す割合")
+        subparser.add_argument("--error-rate", type=float, default=0.0, help="InternalServerErrorを返す割合")
+        subparser.add_argument("--seed", type=int, default=None)
+
+    serve = subparsers.choices["serve"]
+    serve.add_argument("--port", type=int, default=4599)
+    serve.add_argument("--address", default="127.0.0.1")
+    serve.add_argument("--fixtures", default=None, help="画像のハッシュ値毎の検出結果（JSON）")
+
+    load = subparsers.choices["load"]
+    load.add_argument("--requests", type=int, default=200)
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--images", type=int, default=20, help="リクエストに使う合成画像の枚数（キャッシュのヒット率に影響する）")
+    load.add_argument("--max-requests-per-second", type=float, default=None)
+    load.add_argument("--max-attempts", type=int, default=5)
+    load.add_argument("--no-cache", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "serve":
+        fixtures = RekognitionFixtures.from_file(args.fixtures) if args.fixtures else None
+        server = LocalRekognitionServer(
+            fixtures, args.latency, args.throttle_rate, args.error_rate, args.seed, args.address, args.port
+        )
+        print(f"Serving Rekognition stand-in on http://{args.address}:{args.port}")
+        server.serve_forever()
+        return
+
+    # スタンドインサーバーは署名を検証しないが、boto3は署名のために認証情報を必要とする
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+    image_bytes_list, fixtures = synthetic_fixtures(args.images)
+    with LocalRekognitionServer(fixtures, args.latency, args.throttle_rate, args.error_rate, args.seed) as server:
+        report = run_load(
+            server,
+            image_bytes_list,
+            args.requests,
+            args.concurrency,
+            args.max_requests_per_second,
+            args.max_attempts,
+            use_cache=not args.no_cache,
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+検出のルーティング（RoutingRekognitionClientWrapper）のポリシー毎の比較
+猫が写っている画像の割合（--cat-fraction）を変えながら、遅延を設定したスタブのRekognitionを使って
+1画像あたりのRekognitionの呼び出し回数・顔検出を省略した画像の割合・detect_allのレイテンシを集計する
+local-cats-firstは、再現率（--local-recall）と遅延（--local-latency-ms）を設定した模擬のローカル検出器で比較する
+（実際のローカル検出器の精度と速度はbenchmarks.local_detectorで計測する）
+
+    uv run python -m benchmarks.routing --images 200 --cat-fraction 0.2 0.5 0.9
+"""
+import argparse
+import json
+import random
+import time
+
+from lib.rekognition.router import CATS_FIRST, LOCAL_CATS_FIRST, ROUTING_POLICIES, RoutingRekognitionClientWrapper
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.stats import summarize_durations
+from benchmarks.synthetic import synthetic_face_details, synthetic_labels_response
+
+CATS = synthetic_labels_response(1)
+NO_CATS = synthetic_labels_response(0)
+
+
+class SimulatedRekognitionClientWrapper(StubRekognitionClientWrapper):
+    """cat_imagesに含まれる画像だけ猫を返すスタブ"""
+
+    def __init__(self, cat_images: set[bytes], detect_faces_latency_seconds: float, detect_cats_latency_seconds: float):
+        super().__init__(
+            synthetic_face_details(1),
+            detect_faces_latency_seconds=detect_faces_latency_seconds,
+            detect_cats_latency_seconds=detect_cats_latency_seconds,
+        )
+        self._cat_images = cat_images
+
+    def detect_cats(self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75) -> dict:
+        super().detect_cats(image_bytes, max_labels, min_confidence)
+        return CATS if image_bytes in self._cat_images else NO_CATS
+
+
+class SimulatedLocalDetector(StubRekognitionClientWrapper):
+    """猫が写っている画像をrecallの確率で検出する模擬のローカル検出器（誤検出はしない）"""
+
+    def __init__(self, cat_images: set[bytes], recall: float, latency_seconds: float, seed: int = 0):
+        super().__init__(detect_cats_latency_seconds=latency_seconds)
+        self._found = {image for image in cat_images if random.Random(f"{seed}:{image!r}").random() < recall}
+
+    def detect_cats(self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75) -> dict:
+        super().detect_cats(image_bytes, max_labels, min_confidence)
+        return CATS if image_bytes in self._found else NO_CATS
+
+
+def run(
+    policy: str,
+    images: int,
+    cat_fraction: float,
+    latency_seconds: float,
+    local_recall: float,
+    local_latency_seconds: float,
+    seed: int = 0,
+) -> dict:
+    rng = random.Random(seed)
+    image_list = [f"image-{index:08d}".encode() for index in range(images)]
+    cat_images = {image for image in image_list if rng.random() < cat_fraction}
+    client = SimulatedRekognitionClientWrapper(cat_images, latency_seconds, latency_seconds)
+    local_detector = None
+    if policy == LOCAL_CATS_FIRST:
+        local_detector = SimulatedLocalDetector(cat_images, local_recall, local_latency_seconds, seed)
+    router = RoutingRekognitionClientWrapper(client, policy, local_detector=local_detector)
+
+    durations = []
+    missed_cats = 0
+    for image in image_list:
+        start = time.perf_counter()
+        result = router.detect_all(image)
+        durations.append(time.perf_counter() - start)
+        if image in cat_images and len(result.cats) == 0:
+            missed_cats += 1
+
+    summary = summarize_durations(durations)
+    return {
+        "policy": policy,
+        "cat_fraction": cat_fraction,
+        "calls_per_image": round(router.stats.calls_per_image, 3),
+        "rejected_rate": round(router.stats.rejected / images, 3),
+        "missed_cat_rate": round(missed_cats / len(cat_images), 3) if cat_images else None,
+        "latency_p50_ms": round(summary["p50"] * 1000, 1),
+        "latency_p95_ms": round(summary["p95"] * 1000, 1),
+        "latency_mean_ms": round(summary["mean"] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--cat-fraction", type=float, nargs="+", default=[0.2, 0.5, 0.9])
+    parser.add_argument("--policy", choices=ROUTING_POLICIES, nargs="+", default=list(ROUTING_POLICIES))
+    parser.add_argument("--latency-ms", type=float, default=20, help="スタブのRekognitionの1回の呼び出しの遅延")
+    parser.add_argument("--local-recall", type=float, default=0.8)
+    parser.add_argument("--local-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    for cat_fraction in args.cat_fraction:
+        for policy in args.policy:
+            print(json.dumps(run(
+                policy,
+                args.images,
+                cat_fraction,
+                args.latency_ms / 1000,
+                args.local_recall,
+                args.local_latency_ms / 1000,
+            )))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""ベンチマーク用の合成データ（画像・検出結果）"""
+import io
+import math
+import random
+
+from PIL import Image
+
+
+def synthetic_image(megapixels: float, aspect_ratio: float = 3 / 2, seed: int = 0) -> Image.Image:
+    """指定した画素数（MP）の、写真に近い圧縮率になるノイズ入りグラデーション画像を返す"""
+    width = max(1, round(math.sqrt(megapixels * 1e6 * aspect_ratio)))
+    height = max(1, round(width / aspect_ratio))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 32 + seed % 8)
+    return Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+
+def synthetic_jpeg_bytes(megapixels: float, quality: int = 90, seed: int = 0) -> bytes:
+    buffer = io.BytesIO()
+    synthetic_image(megapixels, seed=seed).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def synthetic_face_details(faces: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    face_details = []
+    for _ in range(faces):
+        width, height = rng.uniform(0.02, 0.08), rng.uniform(0.03, 0.12)
+        face_details.append({
+            "BoundingBox": {
+                "Left": rng.uniform(0, 1 - width),
+                "Top": rng.uniform(0, 1 - height),
+                "Width": width,
+                "Height": height,
+            }
+        })
+    return face_details
+
+
+def synthetic_labels_response(cats: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    instances = []
+    for _ in range(cats):
+        width, height = rng.uniform(0.05, 0.3), rng.uniform(0.05, 0.3)
+        instances.append({
+            "BoundingBox": {
+                "Left": rng.uniform(0, 1 - width),
+                "Top": rng.uniform(0, 1 - height),
+                "Width": width,
+                "Height": height,
+            },
+            "Confidence": rng.uniform(75, 100),
+        })
+    if len(instances) == 0:
+        return {"Labels": []}
+    return {"Labels": [{"Name": "Cat", "Instances": instances}]}
+
+
+def synthetic_gif_bytes(frames: int, megapixels: float, duration_ms: int = 100) -> bytes:
+    """フレーム毎にノイズの異なるアニメーションGIFを返す"""
+    images = [synthetic_image(megapixels, seed=seed) for seed in range(min(frames, 8))]
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer,
+        format="GIF",
+        save_all=True,
+        append_images=[images[index % len(images)] for index in range(1, frames)],
+        duration=duration_ms,
+        loop=0,
+    )
+    return buffer.getvalue()
@@ -0,0 +1,76 @@
+"""
+動画・アニメーション画像の処理（VideoProcessor）のベンチマーク
+キーフレームの間隔毎に、スループット（frames/s）・Rekognitionの呼び出し回数・ピークメモリ（最大RSSの増分）を計測する
+Rekognitionの代わりに遅延を注入したスタブを使うため、オフラインで実行できる
+
+    uv run python -m benchmarks.video --frames 120 --megapixels 0.5 --keyframe-intervals 1,5,10,30
+"""
+import argparse
+import io
+import json
+import resource
+
+from benchmarks.synthetic import synthetic_face_details, synthetic_gif_bytes, synthetic_labels_response
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.video import AnimatedImageFrameSource, GIFFrameSink, VideoProcessor
+
+
+class CountingStub(StubRekognitionClientWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def detect_faces(self, image_bytes: bytes):
+        self.calls += 1
+        return super().detect_faces(image_bytes)
+
+
+def max_rss_bytes() -> int:
+    # Linuxではru_maxrssの単位はKB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_case(gif_bytes: bytes, keyframe_interval: int, faces: int, cats: int, latency_seconds: float) -> dict:
+    client = CountingStub(
+        synthetic_face_details(faces),
+        synthetic_labels_response(cats),
+        detect_faces_latency_seconds=latency_seconds,
+        detect_cats_latency_seconds=latency_seconds,
+    )
+    processor = VideoProcessor(
+        client, NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer(), keyframe_interval=keyframe_interval
+    )
+    output = io.BytesIO()
+    baseline_rss = max_rss_bytes()
+    report = processor.process(AnimatedImageFrameSource(gif_bytes), GIFFrameSink(output))
+    return {
+        "keyframe_interval": keyframe_interval,
+        "frames": report.frames,
+        "keyframes": report.keyframes,
+        "rekognition_calls": client.calls,
+        "elapsed_seconds": round(report.elapsed_seconds, 3),
+        "frames_per_second": round(report.frames_per_second, 1),
+        "output_bytes": len(output.getvalue()),
+        "peak_rss_increase_bytes": max_rss_bytes() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--megapixels", type=float, default=0.5)
+    parser.add_argument("--faces", type=int, default=5)
+    parser.add_argument("--cats", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.15, help="スタブに注入する1リクエストあたりの遅延（秒）")
+    parser.add_argument("--keyframe-intervals", default="1,5,10,30")
+    args = parser.parse_args()
+
+    gif_bytes = synthetic_gif_bytes(args.frames, args.megapixels)
+    for interval in (int(value) for value in args.keyframe_intervals.split(",")):
+        print(json.dumps(run_case(gif_bytes, interval, args.faces, args.cats, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
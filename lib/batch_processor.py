@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import glob
+import io
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Iterator, Optional
+
+from PIL import Image
+
+from lib.boundary_draw.drawer import BoundingBoxDrawer, IBoundaryDrawer
+from lib.face_mosaic_drawer import IFaceMosaicDrawer
+from lib.orientation import apply_orientation, exif_orientation
+from lib.parallel import map_completed
+from lib.rekognition.detections import Detections
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+from lib.stats import summarize_durations
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# 処理段階の名前（スループットレポートの集計単位）
+STAGES = ("read", "detect", "decode", "mosaic", "draw", "save")
+
+
+@dataclass
+class BatchItemResult:
+    """
+    1画像分の処理結果。結果ファイル（JSONL）の1行に対応する
+    statusは ok / rejected（猫が検出されず、顔検出を省略したため出力しない） / error
+    """
+    path: str
+    status: str
+    output_path: Optional[str] = None
+    face_count: int = 0
+    cat_count: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def list_input_images(source: str) -> list[str]:
+    """
+    入力元から処理対象の画像パスのリストを返す
+    - ディレクトリ: 直下の画像ファイル
+    - .jsonlファイル: 各行の"path"（相対パスはマニフェストのあるディレクトリ基準）
+    - それ以外: globパターン
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name)
+            for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+    if source.endswith(".jsonl"):
+        base_dir = os.path.dirname(source)
+        paths = []
+        with open(source, encoding="utf-8") as manifest:
+            for line in manifest:
+                if line.strip() == "":
+                    continue
+                path = json.loads(line)["path"]
+                paths.append(path if os.path.isabs(path) else os.path.join(base_dir, path))
+        return paths
+
+    return sorted(glob.glob(source, recursive=True))
+
+
+def load_completed_paths(results_path: str) -> set[str]:
+    """既存の結果ファイルから処理済み（ok / rejected）の画像パスを読み込む（再開用のチェックポイント）"""
+    if not os.path.exists(results_path):
+        return set()
+    completed = set()
+    with open(results_path, encoding="utf-8") as results:
+        for line in results:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            if record.get("status") in ("ok", "rejected"):
+                completed.add(record["path"])
+    return completed
+
+
+class BatchImageProcessor:
+    """
+    複数の画像に対して 検出 → 顔モザイク → 枠線描画 → 保存 をワーカープールで並列に実行する
+    処理結果は1画像ごとに結果ファイル（JSONL）へ追記するため、中断しても続きから再開できる
+    RoutingRekognitionClientWrapperで顔検出を省略した画像（猫なし）は、顔にモザイクをかけられないため出力しない
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        mosaic_drawer: IFaceMosaicDrawer,
+        bounding_box_drawer: IBoundaryDrawer,
+        output_dir: str,
+        mosaic_size: int = 5,
+        workers: int = 4,
+    ):
+        self._rekognition_client = rekognition_client
+        self._mosaic_drawer = mosaic_drawer
+        self._bounding_box_drawer = bounding_box_drawer
+        self._output_dir = output_dir
+        self._mosaic_size = mosaic_size
+        self._workers = workers
+        # pyplotはスレッドセーフではないため、matplotlibで描画する場合はFigureを扱う段階を排他制御する
+        self._figure_lock = threading.Lock()
+
+    def _output_path(self, path: str, root_dir: str) -> str:
+        """
+        入力画像の共通ディレクトリからの相対パスを保ったまま、出力先のパスを決める
+        同じディレクトリのa.jpgとa.pngが同じ出力先にならないよう、元の拡張子を残す（a.jpg -> a.jpg.png）
+        """
+        relative_path = os.path.relpath(os.path.abspath(path), root_dir)
+        return os.path.join(self._output_dir, relative_path + ".png")
+
+    def process_one(self, path: str, root_dir: str) -> BatchItemResult:
+        """1画像を処理し、段階ごとの処理時間を含む結果を返す"""
+        timings: dict[str, float] = {}
+
+        def timed(stage: str, func: Callable[[], object]):
+            start = time.perf_counter()
+            value = func()
+            timings[stage] = time.perf_counter() - start
+            return value
+
+        try:
+            image_bytes = timed("read", lambda: _read_bytes(path))
+            detection = timed("detect", lambda: self._rekognition_client.detect_all(image_bytes))
+            if detection.faces_skipped:
+                return BatchItemResult(path=path, status="rejected", timings=timings)
+            image = timed("decode", lambda: _decode_upright(image_bytes))
+            mosaiced_image = timed(
+                "mosaic",
+                lambda: self._mosaic_drawer.apply_mosaic(
+                    image, detection.faces, self._mosaic_size
+                ),
+            )
+
+            output_path = self._output_path(path, root_dir)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # pyplotはスレッドセーフではないため、matplotlibの描画器の場合だけ描画と保存を排他制御する
+            uses_pyplot = isinstance(self._bounding_box_drawer, BoundingBoxDrawer)
+            figure_lock = self._figure_lock if uses_pyplot else nullcontext()
+            with figure_lock:
+                drawn = timed(
+                    "draw",
+                    lambda: self._bounding_box_drawer.draw(
+                        mosaiced_image,
+                        detection.cats,
+                        _all_highlights_off(detection.cats),
+                    ),
+                )
+                # 描画器の種類ではなく描画結果の型で保存方法を決める（アプリの表示と同じ）
+                if isinstance(drawn, Image.Image):
+                    timed("save", lambda: drawn.save(output_path))
+                else:
+                    import matplotlib.pyplot as plt
+
+                    fig, _ = drawn
+                    timed("save", lambda: fig.savefig(output_path, bbox_inches="tight", pad_inches=0))
+                    plt.close(fig)
+
+            return BatchItemResult(
+                path=path,
+                status="ok",
+                output_path=output_path,
+                face_count=len(detection.faces),
+                cat_count=len(detection.cats),
+                timings=timings,
+            )
+        except Exception as e:
+            return BatchItemResult(path=path, status="error", timings=timings, error=repr(e))
+
+    def run(
+        self,
+        paths: Iterable[str],
+        results_path: str,
+        resume: bool = False,
+        on_result: Optional[Callable[[BatchItemResult], None]] = None,
+    ) -> "BatchReport":
+        """
+        画像を並列に処理し、結果を結果ファイルに追記してスループットレポートを返す
+        resume=Trueの場合、結果ファイルで処理済み（status="ok" / "rejected"）の画像はスキップする
+        """
+        paths = list(paths)
+        completed = load_completed_paths(results_path) if resume else set()
+        pending_paths = [path for path in paths if path not in completed]
+        root_dir = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else "."
+
+        results: list[BatchItemResult] = []
+        start = time.perf_counter()
+        with open(results_path, "a" if resume else "w", encoding="utf-8") as results_file:
+            for result in self._iter_results(pending_paths, root_dir):
+                results_file.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+                results_file.flush()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        elapsed = time.perf_counter() - start
+
+        return BatchReport(results, elapsed, skipped=len(paths) - len(pending_paths))
+
+    def _iter_results(self, paths: list[str], root_dir: str) -> Iterator[BatchItemResult]:
+        # 未処理の画像を一度に投入せず、実行中の件数をワーカー数の2倍までに抑える
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            yield from map_completed(
+                executor, lambda path: self.process_one(path, root_dir), paths, self._workers * 2
+            )
+
+
+def _decode_upright(image_bytes: bytes) -> Image.Image:
+    """EXIFの回転情報を適用したRGBの画像にデコードする（Rekognitionへ送信する画像と同じ向き）"""
+    image = Image.open(io.BytesIO(image_bytes))
+    return apply_orientation(image.convert("RGB"), exif_orientation(image))
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _all_highlights_off(cats: Detections) -> dict[str, bool]:
+    """全ての猫インスタンスを非ハイライトにしたhighlight_statesを返す"""
+    return dict.fromkeys(cats.names, False)
+
+
+class BatchReport:
+    """バッチ処理のスループット（images/s）と段階ごとの処理時間（p50/p95）の集計"""
+
+    def __init__(self, results: list[BatchItemResult], elapsed_seconds: float, skipped: int = 0):
+        self.results = results
+        self.elapsed_seconds = elapsed_seconds
+        self.skipped = skipped
+
+    def to_dict(self) -> dict:
+        succeeded = [result for result in self.results if result.status == "ok"]
+        rejected = sum(result.status == "rejected" for result in self.results)
+        return {
+            "processed": len(self.results),
+            "succeeded": len(succeeded),
+            "rejected": rejected,
+            "failed": len(self.results) - len(succeeded) - rejected,
+            "skipped": self.skipped,
+            "elapsed_seconds": self.elapsed_seconds,
+            "images_per_second": len(self.results) / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0,
+            "stages": {
+                stage: summarize_durations(
+                    [result.timings[stage] for result in succeeded if stage in result.timings]
+                )
+                for stage in STAGES
+            },
+        }
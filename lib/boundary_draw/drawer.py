@@ -1,20 +1,22 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Union
 from PIL.Image import Image
 
-from matplotlib.axes import Axes
-from matplotlib.figure import Figure
-from mypy_boto3_rekognition.type_defs import DetectLabelsResponseTypeDef
-import matplotlib.pyplot as plt
-
 from lib.boundary_draw.utils import (
     calculate_left_top,
     generate_box,
 )
-from lib.rekognition.utils import (
-    extract_bounding_boxes_from_instance,
-    extract_cat_label,
-    get_cat_instance_name_and_confidence,
-)
+from lib.rekognition.detections import CatDetectionsLike, as_cat_detections
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
+# 描画結果。matplotlibで描画する場合はFigure, Axes、画像に直接描画する場合はImage
+# matplotlibの読み込みは重いため、BoundingBoxDrawerで描画する時まで遅らせる
+DrawResult = Union["tuple[Figure, Axes]", Image]
 
 
 class IBoundaryDrawer(ABC):
@@ -22,11 +24,11 @@ class IBoundaryDrawer(ABC):
     def draw(
         self,
         target_image: Image,
-        detect_labels_res: DetectLabelsResponseTypeDef,
+        detect_labels_res: CatDetectionsLike,
         highlight_states: dict[str, bool],
         default_color: str,
         highlight_color: str,
-    ) -> tuple[Figure, Axes]:
+    ) -> DrawResult:
         pass
 
 
@@ -34,7 +36,7 @@ class BoundingBoxDrawer(IBoundaryDrawer):
     def draw(
         self,
         target_image: Image,
-        detect_labels_res: DetectLabelsResponseTypeDef,
+        detect_labels_res: CatDetectionsLike,
         highlight_states: dict[str, bool] = {},
         default_color: str = "gray",
         highlight_color: str = "red",
@@ -43,6 +45,8 @@ class BoundingBoxDrawer(IBoundaryDrawer):
         rekognitionで検出された物体の枠線（矩形）を描画し、処理済みのFigureを返す処理
         highlight_states={"Cat-1": True, "Cat-2": False} -> Cat-1に対応する枠線をハイライトして描画
         """
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.imshow(target_image)
         ax.axis('off')
@@ -51,33 +55,33 @@ class BoundingBoxDrawer(IBoundaryDrawer):
         image_width, image_height = target_image.size
 
         # 猫が検出されていなければ何も描画しない
-        cat_label = extract_cat_label(detect_labels_res)
-        if cat_label is None or "Instances" not in cat_label:
+        cats = as_cat_detections(detect_labels_res)
+        if len(cats) == 0:
             return fig, ax
 
-        for index, instance in enumerate(cat_label["Instances"]):
-            instance_name, instance_confidence = get_cat_instance_name_and_confidence(
-                index, instance)
-            bounding_boxes = extract_bounding_boxes_from_instance(instance)
-
+        has_box = cats.has_box.tolist()
+        for index, (instance_name, label) in enumerate(zip(cats.names, cats.labels)):
             color = highlight_color if highlight_states[instance_name] else default_color
+            if not has_box[index]:
+                continue
 
-            for bounding_box in bounding_boxes:
-                left, top = calculate_left_top(
-                    bounding_box, image_width, image_height
-                )
-                rect = generate_box(
-                    bounding_box, left, top, image_width, image_height, color
-                )
+            box_left, box_top, box_width, box_height = cats.boxes[index].tolist()
+            bounding_box = {"Left": box_left, "Top": box_top, "Width": box_width, "Height": box_height}
+            left, top = calculate_left_top(
+                bounding_box, image_width, image_height
+            )
+            rect = generate_box(
+                bounding_box, left, top, image_width, image_height, color
+            )
 
-                ax.add_patch(rect)
-                ax.text(
-                    left,
-                    top - 10,
-                    f"{instance_name}({instance_confidence})",
-                    color=color,
-                    fontsize=10,
-                    weight='bold'
-                )
+            ax.add_patch(rect)
+            ax.text(
+                left,
+                top - 10,
+                label,
+                color=color,
+                fontsize=10,
+                weight='bold'
+            )
 
         return fig, ax
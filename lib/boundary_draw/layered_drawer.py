@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import InstanceOverlay, PILBoundingBoxDrawer, compute_instance_overlays
+from lib.cache import LRUCache
+from lib.rekognition.detections import CatDetectionsLike, as_cat_detections
+from lib.render_cache import detect_labels_key, image_nbytes
+
+
+class _Layer:
+    """ベース画像1枚分の合成状態"""
+    __slots__ = ("base", "composed", "labels_key", "colors", "overlays", "regions", "highlight_states")
+
+    def __init__(
+        self,
+        base: Image.Image,
+        composed: Image.Image,
+        labels_key: tuple,
+        colors: tuple[str, str],
+        overlays: list[InstanceOverlay],
+        regions: list[list[tuple[int, int, int, int]]],
+        highlight_states: dict[str, bool],
+    ):
+        self.base = base
+        self.composed = composed
+        self.labels_key = labels_key
+        self.colors = colors
+        self.overlays = overlays
+        self.regions = regions
+        self.highlight_states = highlight_states
+
+
+def _layer_nbytes(layer: _Layer) -> int:
+    """合成状態のメモリのサイズの見積もり（参照しているベース画像と、合成した画像の合計）"""
+    return image_nbytes(layer.base) + image_nbytes(layer.composed)
+
+
+def _intersects(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class LayeredBoundingBoxDrawer(PILBoundingBoxDrawer):
+    """
+    ベース画像（デコード・モザイク適用済み）と枠線を合成した画像を保持し、
+    ハイライト状態が変わったインスタンスの領域だけを再合成するPILBoundingBoxDrawer
+
+    同じベース画像（同一オブジェクト）に対する2回目以降の描画では、変化したインスタンスの枠線の帯とラベルの領域を
+    ベース画像から復元し、その領域に重なる枠線とラベルだけを描き直す
+    猫が多い画像や高解像度の画像で、ハイライト切り替え時の再描画を小さく抑える
+    合成状態は件数（max_layers）とメモリのサイズ（max_layer_bytes）の上限付きのLRUで破棄する
+    """
+
+    def __init__(
+        self,
+        line_width: Optional[int] = None,
+        font_size: Optional[int] = None,
+        max_layers: int = 8,
+        max_layer_bytes: int = 256 * 1024 * 1024,
+    ):
+        super().__init__(line_width, font_size)
+        # ベース画像への参照を保持するため、エントリが残っている間はid()が再利用されない
+        self._layers: LRUCache[int, _Layer] = LRUCache(
+            max_layers, max_bytes=max_layer_bytes, size_of=_layer_nbytes
+        )
+        self._lock = threading.Lock()
+
+    def _compose(
+        self,
+        target_image: Image.Image,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        default_color: str,
+        highlight_color: str,
+    ) -> _Layer:
+        """全ての枠線を描画した合成状態を作る"""
+        composed = target_image.convert("RGB")
+        overlays = compute_instance_overlays(detect_labels_res, composed.size)
+        self.draw_overlays(composed, overlays, highlight_states, default_color, highlight_color)
+        return _Layer(
+            base=target_image,
+            composed=composed,
+            labels_key=detect_labels_key(detect_labels_res),
+            colors=(default_color, highlight_color),
+            overlays=overlays,
+            regions=[self.overlay_regions(overlay, composed.size) for overlay in overlays],
+            highlight_states=dict(highlight_states),
+        )
+
+    def _recomposite(self, layer: _Layer, index: int, highlight_states: dict[str, bool]):
+        """index番目のインスタンスの描画領域を再合成する"""
+        for region in layer.regions[index]:
+            self._recomposite_region(layer, region, highlight_states)
+
+    def _recomposite_region(
+        self, layer: _Layer, region: tuple[int, int, int, int], highlight_states: dict[str, bool]
+    ):
+        """領域をベース画像から復元し、重なる枠線とラベルを描画順どおりに描き直す"""
+        left, top, _, _ = region
+        tile = layer.base.crop(region).convert("RGB")
+        overlapping = [
+            overlay
+            for overlay, overlay_regions in zip(layer.overlays, layer.regions)
+            if any(_intersects(overlay_region, region) for overlay_region in overlay_regions)
+        ]
+        default_color, highlight_color = layer.colors
+        self.draw_overlays(
+            tile,
+            overlapping,
+            highlight_states,
+            default_color,
+            highlight_color,
+            offset=(-left, -top),
+            reference_size=layer.composed.size,
+        )
+        layer.composed.paste(tile, (left, top))
+
+    def draw(
+        self,
+        target_image: Image.Image,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool] = {},
+        default_color: str = "gray",
+        highlight_color: str = "red",
+    ) -> Image.Image:
+        """
+        枠線を描画した画像を返す
+        合成状態は次回以降の描画で更新するため、呼び出し元にはそのコピーを返す
+        """
+        detect_labels_res = as_cat_detections(detect_labels_res)
+        with self._lock:
+            layer = self._layers.get(id(target_image))
+            if (
+                layer is None
+                or layer.base is not target_image
+                or layer.labels_key != detect_labels_key(detect_labels_res)
+                or layer.colors != (default_color, highlight_color)
+            ):
+                layer = self._compose(
+                    target_image, detect_labels_res, highlight_states, default_color, highlight_color
+                )
+                self._layers.put(id(target_image), layer)
+                return layer.composed.copy()
+
+            for index, overlay in enumerate(layer.overlays):
+                name = overlay.instance_name
+                if highlight_states.get(name, False) != layer.highlight_states.get(name, False):
+                    self._recomposite(layer, index, highlight_states)
+            layer.highlight_states = dict(highlight_states)
+            return layer.composed.copy()
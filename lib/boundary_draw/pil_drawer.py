@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from lib.boundary_draw.drawer import IBoundaryDrawer
+from lib.rekognition.detections import CatDetectionsLike, as_cat_detections
+
+
+class InstanceOverlay:
+    """1つの猫インスタンスについて、描画する枠線（ピクセル座標）とラベル文字列をまとめたもの"""
+    __slots__ = ("instance_name", "label", "boxes")
+
+    def __init__(self, instance_name: str, label: str, boxes: list[tuple[int, int, int, int]]):
+        self.instance_name = instance_name
+        self.label = label
+        self.boxes = boxes
+
+
+def compute_instance_overlays(
+    detect_labels_res: CatDetectionsLike, image_size: tuple[int, int]
+) -> list[InstanceOverlay]:
+    """検出結果から、猫インスタンス毎の枠線のピクセル座標(left, top, right, bottom)とラベルを計算する"""
+    cats = as_cat_detections(detect_labels_res)
+    if len(cats) == 0:
+        return []
+
+    # 全インスタンスの座標を配列でまとめて計算する（roundと同じく偶数丸め）
+    image_width, image_height = image_size
+    lefts, tops, widths, heights = cats.boxes.T
+    has_box = cats.has_box
+    pixel_boxes = np.rint(np.column_stack([
+        lefts * image_width,
+        tops * image_height,
+        (lefts + widths) * image_width,
+        (tops + heights) * image_height,
+    ]))
+    # BoundingBoxが無い行はNaNのため、整数に変換する前に0で埋める
+    pixel_boxes[~has_box] = 0
+    return [
+        InstanceOverlay(instance_name, label, [tuple(box)] if box_exists else [])
+        for instance_name, label, box, box_exists in zip(
+            cats.names, cats.labels, pixel_boxes.astype(np.int64).tolist(), has_box.tolist()
+        )
+    ]
+
+
+class PILBoundingBoxDrawer(IBoundaryDrawer):
+    """
+    matplotlibを使わず、PILのImageDrawで画像に直接枠線とラベルを描画する
+    Figureを生成しないため高速・省メモリで、pyplotのグローバル状態にも影響しない
+
+    line_width, font_sizeを省略した場合は画像サイズに合わせて決める
+    """
+
+    def __init__(self, line_width: Optional[int] = None, font_size: Optional[int] = None):
+        self._line_width = line_width
+        self._font_size = font_size
+
+    def _resolve_line_width(self, image_size: tuple[int, int]) -> int:
+        if self._line_width is not None:
+            return self._line_width
+        return max(2, round(max(image_size) / 400))
+
+    def _resolve_font_size(self, image_size: tuple[int, int]) -> int:
+        if self._font_size is not None:
+            return self._font_size
+        return max(10, round(max(image_size) / 60))
+
+    def _label_position(
+        self, box: tuple[int, int, int, int], line_width: int, font_size: int
+    ) -> tuple[tuple[int, int], str]:
+        """ラベルの描画位置とアンカーを返す。枠の上に表示し、画像の上端にはみ出す場合は枠の内側に表示する"""
+        left, top, _, _ = box
+        if top - line_width - font_size >= 0:
+            return (left, top - line_width), "ld"
+        return (left + line_width, top + line_width), "la"
+
+    def overlay_regions(
+        self, overlay: InstanceOverlay, image_size: tuple[int, int]
+    ) -> list[tuple[int, int, int, int]]:
+        """
+        インスタンスの描画で変化しうる領域(left, top, right, bottom)のリストを返す
+        枠の内側は描画で変化しないため、枠線の上下左右の帯とラベルの領域に分けて返す
+        """
+        line_width = self._resolve_line_width(image_size)
+        font_size = self._resolve_font_size(image_size)
+        font = ImageFont.load_default(size=font_size)
+        image_width, image_height = image_size
+
+        regions = []
+        for box in overlay.boxes:
+            left, top, right, bottom = box
+            (x, y), anchor = self._label_position(box, line_width, font_size)
+            text_left, text_top, text_right, text_bottom = font.getbbox(overlay.label, anchor=anchor)
+            # 境界のにじみを考慮して1pxの余白を持たせる
+            candidates = [
+                (left - 1, top - 1, right + 2, top + line_width + 1),
+                (left - 1, bottom - line_width, right + 2, bottom + 2),
+                (left - 1, top - 1, left + line_width + 1, bottom + 2),
+                (right - line_width, top - 1, right + 2, bottom + 2),
+                (x + text_left - 1, y + text_top - 1, x + text_right + 2, y + text_bottom + 2),
+            ]
+            for region_left, region_top, region_right, region_bottom in candidates:
+                region = (
+                    max(0, int(region_left)),
+                    max(0, int(region_top)),
+                    min(image_width, int(region_right)),
+                    min(image_height, int(region_bottom)),
+                )
+                if region[0] < region[2] and region[1] < region[3]:
+                    regions.append(region)
+        return regions
+
+    def draw_overlays(
+        self,
+        image: Image.Image,
+        overlays: list[InstanceOverlay],
+        highlight_states: dict[str, bool],
+        default_color: str,
+        highlight_color: str,
+        offset: tuple[int, int] = (0, 0),
+        reference_size: Optional[tuple[int, int]] = None,
+    ):
+        """
+        枠線とラベルを画像に直接（インプレースで）描画する
+        画像の一部を切り出したタイルに描画する場合は、タイルの位置をoffset（負の値）に、
+        元画像のサイズをreference_sizeに指定する
+        """
+        draw = ImageDraw.Draw(image)
+        reference_size = reference_size if reference_size is not None else image.size
+        line_width = self._resolve_line_width(reference_size)
+        font_size = self._resolve_font_size(reference_size)
+        font = ImageFont.load_default(size=font_size)
+        offset_x, offset_y = offset
+
+        for overlay in overlays:
+            color = highlight_color if highlight_states.get(overlay.instance_name, False) else default_color
+            for box in overlay.boxes:
+                left, top, right, bottom = box
+                draw.rectangle(
+                    (left + offset_x, top + offset_y, right + offset_x, bottom + offset_y),
+                    outline=color,
+                    width=line_width,
+                )
+                (x, y), anchor = self._label_position(box, line_width, font_size)
+                draw.text((x + offset_x, y + offset_y), overlay.label, fill=color, font=font, anchor=anchor)
+
+    def draw(
+        self,
+        target_image: Image.Image,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool] = {},
+        default_color: str = "gray",
+        highlight_color: str = "red",
+    ) -> Image.Image:
+        """
+        rekognitionで検出された物体の枠線（矩形）を描画した画像を返す
+        入力画像は変更せず、RGBに変換したコピーに描画する
+        """
+        # convertは元画像がRGBの場合もコピーを返す
+        output_image = target_image.convert("RGB")
+
+        overlays = compute_instance_overlays(detect_labels_res, output_image.size)
+        self.draw_overlays(output_image, overlays, highlight_states, default_color, highlight_color)
+        return output_image
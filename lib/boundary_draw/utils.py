@@ -1,5 +1,10 @@
-from matplotlib.patches import Rectangle
-from mypy_boto3_rekognition.type_defs import BoundingBoxTypeDef
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matplotlib.patches import Rectangle
+    from mypy_boto3_rekognition.type_defs import BoundingBoxTypeDef
 
 
 def calculate_left_top(box: BoundingBoxTypeDef, image_width: int, image_height: int) -> tuple[int, int]:
@@ -18,6 +23,8 @@ def generate_box(
     color: str
 ) -> Rectangle:
     """枠のサイズを計算し、Rectangleインスタンスを返す"""
+    from matplotlib.patches import Rectangle
+
     box_width = box["Width"] * image_width
     box_height = box["Height"] * image_height
 
@@ -0,0 +1,118 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    件数上限とTTL（有効期限）でエントリを破棄する、スレッドセーフなインメモリLRUキャッシュ
+    ttl_seconds=Noneの場合は期限切れによる破棄を行わない
+    max_bytesを指定した場合は、size_ofで見積もったサイズの合計がmax_bytes以下になるよう破棄する
+    （最後に格納したエントリは、単体でmax_bytesを超えていても破棄しない）
+    on_evictを指定した場合は、上限・期限切れ・clearで破棄した値を渡して呼び出す（ロックの外で呼ぶ）
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        max_bytes: Optional[int] = None,
+        size_of: Callable[[V], int] = sys.getsizeof,
+        on_evict: Optional[Callable[[V], None]] = None,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be greater than or equal to 1.")
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._max_bytes = max_bytes
+        self._size_of = size_of
+        self._on_evict = on_evict
+        self._entries: OrderedDict[K, tuple[float, int, V]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def total_bytes(self) -> int:
+        """格納しているエントリのサイズの合計（max_bytesを指定しない場合は0）"""
+        return self._total_bytes
+
+    def get(self, key: K) -> Optional[V]:
+        """キーに対応する値を返す。存在しない、または期限切れの場合はNone"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, size, value = entry
+            expired = self._ttl_seconds is not None and self._clock() - stored_at > self._ttl_seconds
+            if expired:
+                del self._entries[key]
+                self._total_bytes -= size
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        self._evicted([value])
+        return None
+
+    def put(self, key: K, value: V):
+        """値を格納し、件数・サイズの上限を超えた場合は最も長く参照されていないエントリから破棄する"""
+        size = self._size_of(value) if self._max_bytes is not None else 0
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+                if previous[2] is not value:
+                    evicted.append(previous[2])
+            self._entries[key] = (self._clock(), size, value)
+            self._total_bytes += size
+            while len(self._entries) > self._max_entries or (
+                self._max_bytes is not None
+                and self._total_bytes > self._max_bytes
+                and len(self._entries) > 1
+            ):
+                _, (_, evicted_size, evicted_value) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                evicted.append(evicted_value)
+        self._evicted(evicted)
+
+    def pop(self, key: K) -> Optional[V]:
+        """キーに対応するエントリを取り除いて値を返す。存在しない場合はNone"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry[1]
+            return entry[2]
+
+    def keys(self) -> list[K]:
+        """格納しているキーを、参照の古い順に返す（期限切れのエントリも含む）"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            evicted = [value for _, _, value in self._entries.values()]
+            self._entries.clear()
+            self._total_bytes = 0
+        self._evicted(evicted)
+
+    def _evicted(self, values: list[V]):
+        if self._on_evict is not None:
+            for value in values:
+                self._on_evict(value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
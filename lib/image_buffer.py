@@ -0,0 +1,182 @@
+"""
+デコード済みの画像1枚分の画素を、NumPyの配列とPILの画像で共有するバッファ
+
+    buffer = open_image_buffer(image_bytes, max_dimension=2048)
+    pixelate_ellipse_in_place(buffer.rgb[top:bottom, left:right], 5)  # 配列のビューを直接書き換える
+    ImageDraw.Draw(buffer.image).rectangle(...)                        # 同じメモリに描画される
+    encode_image_buffer(buffer, fp, format="WEBP")                     # エンコードは最後に1回だけ
+
+PILのRGB画像は1画素4バイト（4バイト目は未使用）でメモリに保持するため、(高さ, 幅, 4)のuint8配列を
+そのままPILの画像メモリとして使える。デコーダーはこの配列へ直接書き込むため、デコード後の画像全体のコピーを作らない
+（縮小デコードでサイズを合わせきれない場合や、RGB以外の画像は、変換後の画像を1回だけ配列へコピーする）
+RGBモードのメモリ共有とデコード先の差し替えはPillowの内部API（Image.core.map_buffer、Image._new、Image.im）に
+依存する。Pillowのバージョンは固定せず、内部APIが使えない版では、RGBXモードの画像でメモリを共有し
+（Image.frombuffer）、デコードした画像を配列へ1回コピーする（結果は同じで、コピーが1回増えるだけ）
+"""
+from __future__ import annotations
+
+import io
+from typing import BinaryIO, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from lib.orientation import apply_orientation, exif_orientation
+
+# エンコード時にqualityを指定する形式
+_QUALITY_FORMATS = ("JPEG", "WEBP")
+
+# RGBモードの画像として配列のメモリを共有するための、Pillowの内部API（無い版ではNone）
+_map_buffer = getattr(Image.core, "map_buffer", None)
+
+
+class ImageBuffer:
+    """
+    (高さ, 幅, 4)のuint8配列（pixels）と、同じメモリを参照するRGBモードのPILの画像（image）
+    どちらを書き換えても、もう一方に反映される
+    Pillowの内部APIが使えない場合、imageはRGBXモードになる（zero_copyがFalse）
+    """
+    __slots__ = ("pixels", "image")
+
+    def __init__(self, pixels: np.ndarray):
+        if pixels.dtype != np.uint8 or pixels.ndim != 3 or pixels.shape[2] != 4 or not pixels.flags.c_contiguous:
+            raise ValueError("pixels must be a C-contiguous (height, width, 4) uint8 array.")
+        self.pixels = pixels
+        self.image = _map_rgb_image(pixels)
+
+    @classmethod
+    def allocate(cls, size: tuple[int, int]) -> ImageBuffer:
+        width, height = size
+        return cls(np.empty((height, width, 4), dtype=np.uint8))
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """(高さ, 幅, 3)のビュー（コピーしない）"""
+        return self.pixels[..., :3]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.pixels.nbytes
+
+    @property
+    def zero_copy(self) -> bool:
+        """imageがRGBモードで、デコーダーが配列へ直接書き込める（Pillowの内部APIが使える）か"""
+        return self.image.mode == "RGB"
+
+
+def _map_rgb_image(pixels: np.ndarray) -> Image.Image:
+    """
+    配列のメモリをそのまま画像メモリとして使うRGBモードの画像を返す
+    Image.frombufferはRGBモードのメモリ共有に対応していない（RGBXになり、PNGで保存できない）ため、
+    frombufferと同じImage.core.map_bufferを使う。配列が書き込み可能なため、読み取り専用にはしない
+    内部APIが使えない場合は、frombufferでメモリを共有するRGBXモードの画像を返す
+    """
+    height, width = pixels.shape[:2]
+    if _map_buffer is not None:
+        try:
+            return Image.new("RGB", (0, 0))._new(_map_buffer(pixels, (width, height), "raw", 0, ("RGB", 0, 1)))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    image = Image.frombuffer("RGBX", (width, height), pixels, "raw", "RGBX", 0, 1)
+    # frombufferの画像は読み取り専用で、書き込む時に別のメモリへコピーされるため、書き込み可能にする
+    image.readonly = 0
+    return image
+
+
+class _MemoryViewReader(io.RawIOBase):
+    """memoryview（共有メモリなど）を、全体をbytesへコピーせずに読むファイルオブジェクト"""
+
+    def __init__(self, view: memoryview):
+        self._view: Optional[memoryview] = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = max(0, min(len(buffer), len(self._view) - self._position))
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        # 呼び出し元がmemoryviewを解放できるよう、参照を外す
+        self._view = None
+        super().close()
+
+
+def _target_size(size: tuple[int, int], max_dimension: Optional[int]) -> tuple[int, int]:
+    if max_dimension is None or max(size) <= max_dimension:
+        return size
+    scale = max_dimension / max(size)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _set_decode_target(image: Image.Image, buffer: ImageBuffer) -> bool:
+    """
+    デコーダーの書き込み先を配列のメモリにする（読み込み前の画像メモリは使われない）
+    Pillowの内部API（Image.im）に依存するため、差し替えられない版ではFalseを返す
+    """
+    try:
+        image.im = buffer.image.im
+    except (AttributeError, TypeError):
+        return False
+    return True
+
+
+def open_image_buffer(image_data: Union[bytes, memoryview], max_dimension: Optional[int] = None) -> ImageBuffer:
+    """
+    画像をデコードしてImageBufferを返す
+    max_dimensionを指定した場合は、open_previewと同じく長辺がその長さ以下になるよう縮小デコードする
+    EXIFの回転情報は適用する（回転が必要な画像は、回転した画像を配列へコピーする）
+    """
+    fp = _MemoryViewReader(image_data) if isinstance(image_data, memoryview) else io.BytesIO(image_data)
+    try:
+        image = Image.open(fp)
+        orientation = exif_orientation(image)
+        target_size = _target_size(image.size, max_dimension)
+        if target_size != image.size:
+            image.draft("RGB", target_size)
+
+        buffer = None
+        if image.mode == "RGB" and image.size == target_size and orientation == 1:
+            buffer = ImageBuffer.allocate(target_size)
+            if buffer.zero_copy and _set_decode_target(image, buffer):
+                image.load()
+                if image.im is buffer.image.im:
+                    return buffer
+
+        # RGB以外の画像、縮小デコードで目的のサイズにならなかった画像、回転が必要な画像は、変換した画像を配列へコピーする
+        image = image.convert("RGB")
+        if image.size != target_size:
+            image = image.resize(target_size, Image.Resampling.LANCZOS)
+        image = apply_orientation(image, orientation)
+        if buffer is None or buffer.size != image.size:
+            buffer = ImageBuffer.allocate(image.size)
+        buffer.image.paste(image)
+        return buffer
+    finally:
+        fp.close()
+
+
+def encode_image_buffer(buffer: ImageBuffer, fp: BinaryIO, format: str = "JPEG", quality: int = 90, **params):
+    """バッファをそのまま（変換のコピーを作らず）エンコードしてfpへ書き出す（RGBXモードの場合はRGBへ変換する）"""
+    if format in _QUALITY_FORMATS:
+        params.setdefault("quality", quality)
+    image = buffer.image if buffer.zero_copy else buffer.image.convert("RGB")
+    image.save(fp, format=format, **params)
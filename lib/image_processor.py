@@ -1,43 +1,226 @@
-from PIL import Image
+from __future__ import annotations
+
+import io
+from typing import Optional
 
-from matplotlib.axes import Axes
-from matplotlib.figure import Figure
-from mypy_boto3_rekognition.type_defs import DetectLabelsResponseTypeDef, FaceDetailTypeDef
+from PIL import Image
 
 from lib.face_mosaic_drawer import IFaceMosaicDrawer
-from lib.boundary_draw.drawer import IBoundaryDrawer
+from lib.boundary_draw.drawer import DrawResult, IBoundaryDrawer
+from lib.instrumentation import span
+from lib.large_image import open_preview
+from lib.orientation import apply_orientation, exif_orientation
+from lib.output_encoder import EncodedImage, OutputEncoder
+from lib.render_cache import RenderCache, detect_labels_key, face_details_key
+from lib.rekognition.detections import (
+    CatDetectionsLike,
+    FaceDetectionsLike,
+    as_cat_detections,
+    as_face_detections,
+)
+from lib.rekognition.utils import compute_image_hash
 
 
 class ImageProcessor:
     def __init__(
         self,
         mosaic_drawer: IFaceMosaicDrawer,
-        bounding_box_drawer: IBoundaryDrawer
+        bounding_box_drawer: IBoundaryDrawer,
+        render_cache: Optional[RenderCache] = None,
     ):
         self._mosaic_drawer = mosaic_drawer
         self._bounding_box_drawer = bounding_box_drawer
+        self._render_cache = render_cache
 
     def process_image(
         self,
         image: Image.Image,
-        face_details: list[FaceDetailTypeDef],
-        detect_labels_res: DetectLabelsResponseTypeDef,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
         highlight_states: dict[str, bool],
         mosaic_size: int = 5,
         default_color: str = "gray",
         highlight_color: str = "red"
-    ) -> tuple[Figure, Axes]:
+    ) -> DrawResult:
         """
-        顔にモザイクをかけ、検知した物体の枠線を描画したFigure, Axesを返す
+        顔にモザイクをかけ、検知した物体の枠線を描画した結果を返す
+        描画結果の型はbounding_box_drawerに依存する（Figure, Axes または Image）
+        検出結果はboto3のレスポンスのままでもよいが、Detectionsを渡せば変換をやり直さない
+        """
+        face_details = as_face_detections(face_details)
+        detect_labels_res = as_cat_detections(detect_labels_res)
+        with span("image_processor.process_image"):
+            face_mosaiced_image = self._apply_mosaic(image, face_details, mosaic_size)
+            return self._draw(
+                face_mosaiced_image,
+                detect_labels_res,
+                highlight_states,
+                default_color,
+                highlight_color
+            )
+
+    def _apply_mosaic(
+        self, image: Image.Image, face_details: FaceDetectionsLike, mosaic_size: int
+    ) -> Image.Image:
+        with span("image_processor.mosaic", drawer=type(self._mosaic_drawer).__name__):
+            return self._mosaic_drawer.apply_mosaic(image, face_details, mosaic_size)
+
+    def _draw(
+        self,
+        image: Image.Image,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        default_color: str,
+        highlight_color: str,
+    ) -> DrawResult:
+        with span("image_processor.draw", drawer=type(self._bounding_box_drawer).__name__):
+            return self._bounding_box_drawer.draw(
+                image, detect_labels_res, highlight_states, default_color, highlight_color
+            )
+
+    @staticmethod
+    def _decode(image_bytes: bytes, max_dimension: Optional[int]) -> Image.Image:
         """
-        face_mosaiced_image = self._mosaic_drawer.apply_mosaic(
-            image, face_details, mosaic_size
+        デコードの時間を後続の処理と分けて計測できるよう、ここで画素を読み込む
+        EXIFの回転情報は適用する（Rekognitionへ送信する画像と同じ向きにする）
+        """
+        with span("image_processor.decode"):
+            if max_dimension is None:
+                image = Image.open(io.BytesIO(image_bytes))
+                image.load()
+                return apply_orientation(image, exif_orientation(image))
+            return open_preview(image_bytes, max_dimension)
+
+    def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        mosaic_size: int = 5,
+        default_color: str = "gray",
+        highlight_color: str = "red",
+        image_hash: Optional[str] = None,
+        max_dimension: Optional[int] = None,
+    ) -> DrawResult:
+        """
+        画像バイトをデコードしてprocess_imageと同じ処理を行う
+        render_cacheが設定されている場合、モザイク適用済みの画像とハイライト状態毎の描画結果を再利用するため、
+        ハイライトの切り替え時にデコードとモザイク処理をやり直さない
+        image_hashを省略した場合は画像バイトから計算する
+        max_dimensionを指定した場合は、長辺がその長さ以下になるよう縮小デコードした画像を処理する
+        """
+        face_details = as_face_detections(face_details)
+        detect_labels_res = as_cat_detections(detect_labels_res)
+        if self._render_cache is None:
+            return self.process_image(
+                self._decode(image_bytes, max_dimension),
+                face_details,
+                detect_labels_res,
+                highlight_states,
+                mosaic_size,
+                default_color,
+                highlight_color,
+            )
+
+        if image_hash is None:
+            image_hash = compute_image_hash(image_bytes)
+        base_key, rendered_key = self._cache_keys(
+            image_hash, face_details, detect_labels_res, highlight_states,
+            mosaic_size, default_color, highlight_color, max_dimension,
         )
-        fig, ax = self._bounding_box_drawer.draw(
+
+        rendered = self._render_cache.rendered.get(rendered_key)
+        if rendered is not None:
+            return rendered
+
+        face_mosaiced_image = self._render_cache.base_images.get(base_key)
+        if face_mosaiced_image is None:
+            face_mosaiced_image = self._apply_mosaic(
+                self._decode(image_bytes, max_dimension), face_details, mosaic_size
+            )
+            # 遅延読み込みのままだと元の画像バイトを参照し続けるため、ここでデコードを確定させる
+            face_mosaiced_image.load()
+            self._render_cache.base_images.put(base_key, face_mosaiced_image)
+
+        rendered = self._draw(
             face_mosaiced_image,
             detect_labels_res,
             highlight_states,
             default_color,
             highlight_color
         )
-        return fig, ax
+        self._render_cache.rendered.put(rendered_key, rendered)
+        return rendered
+
+    def encode_image_bytes(
+        self,
+        image_bytes: bytes,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        output_encoder: OutputEncoder,
+        thumbnail: bool = False,
+        mosaic_size: int = 5,
+        default_color: str = "gray",
+        highlight_color: str = "red",
+        image_hash: Optional[str] = None,
+        max_dimension: Optional[int] = None,
+    ) -> EncodedImage:
+        """
+        process_image_bytesの描画結果をoutput_encoderでエンコードする（thumbnail=Trueの場合はサムネイル）
+        render_cacheが設定されている場合はエンコード結果も再利用し、チェックボックスの操作などによる再実行で
+        同じ描画結果をエンコードし直さない
+        """
+        face_details = as_face_detections(face_details)
+        detect_labels_res = as_cat_detections(detect_labels_res)
+        encoded_key = None
+        if self._render_cache is not None:
+            if image_hash is None:
+                image_hash = compute_image_hash(image_bytes)
+            _, rendered_key = self._cache_keys(
+                image_hash, face_details, detect_labels_res, highlight_states,
+                mosaic_size, default_color, highlight_color, max_dimension,
+            )
+            encoded_key = (rendered_key, output_encoder.settings, thumbnail)
+            encoded = self._render_cache.encoded.get(encoded_key)
+            if encoded is not None:
+                return encoded
+
+        rendered = self.process_image_bytes(
+            image_bytes,
+            face_details,
+            detect_labels_res,
+            highlight_states,
+            mosaic_size,
+            default_color,
+            highlight_color,
+            image_hash,
+            max_dimension,
+        )
+        encoded = output_encoder.encode_thumbnail(rendered) if thumbnail else output_encoder.encode(rendered)
+        if encoded_key is not None:
+            self._render_cache.encoded.put(encoded_key, encoded)
+        return encoded
+
+    @staticmethod
+    def _cache_keys(
+        image_hash: str,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        mosaic_size: int,
+        default_color: str,
+        highlight_color: str,
+        max_dimension: Optional[int],
+    ) -> tuple[tuple, tuple]:
+        """(モザイク適用済みの画像のキー, 描画結果のキー)"""
+        base_key = (image_hash, face_details_key(face_details), mosaic_size, max_dimension)
+        rendered_key = (
+            base_key,
+            detect_labels_key(detect_labels_res),
+            tuple(sorted(highlight_states.items())),
+            default_color,
+            highlight_color,
+        )
+        return base_key, rendered_key
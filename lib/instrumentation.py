@@ -0,0 +1,318 @@
+"""
+処理時間の計測（スパン）と、計測結果の出力先（シンク）
+
+    with span("image_processor.mosaic", drawer="NumpyEllipseFaceMosaicDrawer"):
+        ...
+
+シンクが1つも登録されていない間は、span()は共有の何もしないコンテキストマネージャを返すだけなので、
+計測を無効にしている本番環境ではほぼオーバーヘッドが無い
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, ContextManager, Mapping, Optional
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+_DISABLED_SPAN = contextlib.nullcontext()
+
+
+@dataclass(frozen=True)
+class SpanRecord:
+    name: str
+    duration_seconds: float
+    attributes: dict[str, str] = field(default_factory=dict)
+
+
+class IMetricsSink(ABC):
+    """計測したスパンの出力先のインターフェース"""
+
+    @abstractmethod
+    def record(self, record: SpanRecord):
+        pass
+
+
+class LoggingMetricsSink(IMetricsSink):
+    """スパン毎に1行のログを出力するシンク"""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self._logger = logger if logger is not None else logging.getLogger("nekognition.metrics")
+        self._level = level
+
+    def record(self, record: SpanRecord):
+        attributes = " ".join(f"{key}={value}" for key, value in sorted(record.attributes.items()))
+        self._logger.log(
+            self._level,
+            "span=%s duration_ms=%.3f %s",
+            record.name,
+            record.duration_seconds * 1000,
+            attributes,
+        )
+
+
+class InMemoryMetricsSink(IMetricsSink):
+    """スパンをメモリ上に保持するシンク（テスト用）"""
+
+    def __init__(self):
+        self._records: list[SpanRecord] = []
+        self._lock = threading.Lock()
+
+    @property
+    def records(self) -> list[SpanRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def durations(self, name: str) -> list[float]:
+        return [record.duration_seconds for record in self.records if record.name == name]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def record(self, record: SpanRecord):
+        with self._lock:
+            self._records.append(record)
+
+
+# Prometheusのヒストグラムのバケット境界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "count", "sum")
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    return ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels.items())
+
+
+class PrometheusMetricsSink(IMetricsSink):
+    """
+    スパンの処理時間をヒストグラムに集計し、Prometheusのテキスト形式で公開するシンク
+    - render()：テキスト形式の文字列を返す
+    - textfile_pathを指定した場合：node_exporterのtextfile collector向けに、
+      バックグラウンドのスレッドでflush_interval_seconds毎にファイルへ書き出す（書き出しはアトミックに置き換える）
+      記録したスレッド（リクエストの処理）ではファイルを書かない。close()で停止し、最後に1回書き出す
+    - start_http_server()：/metricsを返すHTTPサーバーをデーモンスレッドで起動する
+    """
+
+    def __init__(
+        self,
+        metric_name: str = "nekognition_span_duration_seconds",
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        textfile_path: Optional[str] = None,
+        flush_interval_seconds: float = 10.0,
+    ):
+        self._metric_name = metric_name
+        self._buckets = tuple(sorted(buckets))
+        self._textfile_path = textfile_path
+        self._flush_interval_seconds = flush_interval_seconds
+        # 前回の書き出し以降に記録があったか（_lockで保護する）
+        self._dirty = False
+        self._histograms: dict[tuple[tuple[str, str], ...], _Histogram] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop_flusher = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if textfile_path is not None:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name="nekognition-metrics-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def record(self, record: SpanRecord):
+        labels = (("span", record.name), *sorted(record.attributes.items()))
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = _Histogram(len(self._buckets))
+            for index, upper_bound in enumerate(self._buckets):
+                if record.duration_seconds <= upper_bound:
+                    histogram.bucket_counts[index] += 1
+            histogram.count += 1
+            histogram.sum += record.duration_seconds
+            self._dirty = True
+
+    def flush(self):
+        """前回の書き出し以降に記録があれば、textfile_pathへ書き出す"""
+        if self._textfile_path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self.write_textfile(self._textfile_path)
+
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self._flush_interval_seconds):
+            self.flush()
+
+    def render(self) -> str:
+        name = self._metric_name
+        lines = [
+            f"# HELP {name} Duration of instrumented spans in seconds.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for labels, histogram in sorted(self._histograms.items()):
+                label_text = _format_labels(dict(labels))
+                for upper_bound, bucket_count in zip(self._buckets, histogram.bucket_counts):
+                    lines.append(f'{name}_bucket{{{label_text},le="{upper_bound:g}"}} {bucket_count}')
+                lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{label_text}}} {histogram.sum!r}")
+                lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """一時ファイルに書き出してから置き換え、読み取り側が書きかけのファイルを読まないようにする"""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8"
+        ) as temp_file:
+            temp_file.write(self.render())
+        os.replace(temp_file.name, path)
+
+    def start_http_server(self, port: int, address: str = "127.0.0.1") -> ThreadingHTTPServer:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((address, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def close(self):
+        if self._flusher is not None:
+            self._stop_flusher.set()
+            self._flusher.join()
+            self._flusher = None
+            self.flush()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Span:
+    __slots__ = ("_instrumentation", "_name", "_attributes", "_start")
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, attributes: dict[str, str]):
+        self._instrumentation = instrumentation
+        self._name = name
+        self._attributes = attributes
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration_seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self._attributes["error"] = exc_type.__name__
+        self._instrumentation.emit(SpanRecord(self._name, duration_seconds, self._attributes))
+
+
+class Instrumentation:
+    """登録されたシンクへスパンを送る。シンクが無い間は計測自体を行わない"""
+
+    def __init__(self):
+        # 計測のたびにロックを取らないよう、シンクの一覧はタプルごと差し替える
+        self._sinks: tuple[IMetricsSink, ...] = ()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self._sinks) > 0
+
+    def add_sink(self, sink: IMetricsSink):
+        with self._lock:
+            self._sinks = (*self._sinks, sink)
+
+    def remove_sink(self, sink: IMetricsSink):
+        with self._lock:
+            self._sinks = tuple(registered for registered in self._sinks if registered is not sink)
+
+    def clear_sinks(self):
+        with self._lock:
+            self._sinks = ()
+
+    def span(self, name: str, **attributes: str) -> ContextManager:
+        if not self._sinks:
+            return _DISABLED_SPAN
+        return _Span(self, name, attributes)
+
+    def emit(self, record: SpanRecord):
+        for sink in self._sinks:
+            sink.record(record)
+
+
+# アプリ全体で共有するインスタンス
+instrumentation = Instrumentation()
+span = instrumentation.span
+
+_configured_from_env = False
+_configure_lock = threading.Lock()
+
+
+def configure_from_env(environ: Mapping[str, str] = os.environ) -> bool:
+    """
+    環境変数に応じてシンクを登録する。Streamlitの再実行のたびに呼ばれても、登録は最初の1回だけ行う
+    - NEKOGNITION_METRICS_LOG=1：ログに出力する
+    - NEKOGNITION_METRICS_PROMETHEUS_FILE=<path>：Prometheusのテキスト形式でファイルに書き出す
+    - NEKOGNITION_METRICS_PROMETHEUS_PORT=<port>：http://127.0.0.1:<port>/metrics で公開する
+    シンクを登録した場合はTrueを返す
+    """
+    global _configured_from_env
+    with _configure_lock:
+        if _configured_from_env:
+            return instrumentation.enabled
+        _configured_from_env = True
+
+        if environ.get("NEKOGNITION_METRICS_LOG", "") not in ("", "0"):
+            logger = logging.getLogger("nekognition.metrics")
+            if not logger.handlers:
+                logger.addHandler(logging.StreamHandler())
+                logger.setLevel(logging.INFO)
+            instrumentation.add_sink(LoggingMetricsSink(logger))
+
+        textfile_path = environ.get("NEKOGNITION_METRICS_PROMETHEUS_FILE")
+        port = environ.get("NEKOGNITION_METRICS_PROMETHEUS_PORT")
+        if textfile_path or port:
+            prometheus_sink = PrometheusMetricsSink(textfile_path=textfile_path or None)
+            if port:
+                prometheus_sink.start_http_server(int(port))
+            instrumentation.add_sink(prometheus_sink)
+        return instrumentation.enabled
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import io
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer, compute_instance_overlays
+from lib.face_mosaic_drawer import IFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer
+from lib.image_buffer import ImageBuffer, encode_image_buffer, open_image_buffer
+from lib.orientation import apply_orientation, exif_orientation, oriented_size
+from lib.rekognition.detections import CatDetectionsLike, FaceDetectionsLike
+
+# この画素数を超える画像は、プレビューを縮小デコードする大画像モードで扱う
+LARGE_IMAGE_PIXELS = 16_000_000
+
+# 大画像モードのプレビューの長辺（px）
+PREVIEW_MAX_DIMENSION = 2048
+
+
+def get_image_size(image_bytes: bytes) -> tuple[int, int]:
+    """画像をデコードせず、ヘッダーからサイズ（EXIFの回転情報を適用した向き）を読み取って返す"""
+    image = Image.open(io.BytesIO(image_bytes))
+    return oriented_size(image, exif_orientation(image))
+
+
+def open_preview(image_bytes: bytes, max_dimension: int = PREVIEW_MAX_DIMENSION) -> Image.Image:
+    """
+    長辺がmax_dimension以下になるよう縮小した画像を返す
+    JPEGはdraftモードで1/2〜1/8の解像度で直接デコードするため、元の解像度の画像をメモリに展開しない
+    EXIFの回転情報は適用した向きで返す
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    orientation = exif_orientation(image)
+    if max(image.size) <= max_dimension:
+        return apply_orientation(image, orientation)
+
+    scale = max_dimension / max(image.size)
+    target_size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    image.draft("RGB", target_size)
+    image = image.convert("RGB")
+    if image.size != target_size:
+        image = image.resize(target_size, Image.Resampling.LANCZOS)
+    return apply_orientation(image, orientation)
+
+
+def render_image_bytes(
+    image_data: Union[bytes, memoryview],
+    face_details: FaceDetectionsLike,
+    detect_labels_res: CatDetectionsLike,
+    highlight_states: dict[str, bool],
+    fp: BinaryIO,
+    mosaic_size: int = 5,
+    mosaic_drawer: IFaceMosaicDrawer = NumpyEllipseFaceMosaicDrawer(),
+    bounding_box_drawer: PILBoundingBoxDrawer = PILBoundingBoxDrawer(),
+    default_color: str = "gray",
+    highlight_color: str = "red",
+    format: str = "JPEG",
+    quality: int = 90,
+    max_dimension: Optional[int] = None,
+) -> tuple[int, int]:
+    """
+    画像をデコードし、顔モザイクと枠線を適用してformatでエンコードしながらfpへ書き出す。書き出した画像のサイズを返す
+    デコード先のバッファ（ImageBuffer）1枚に対して、モザイクは顔の領域のビューを、枠線は同じメモリを直接書き換え、
+    エンコードは最後に1回だけ行うため、画像全体のコピーを作らない（ピークメモリはおおよそデコード済み画像1枚分）
+    max_dimensionを指定した場合は、長辺がその長さ以下になるよう縮小デコードした画像を処理する
+    """
+    buffer = render_image_buffer(
+        image_data,
+        face_details,
+        detect_labels_res,
+        highlight_states,
+        mosaic_size,
+        mosaic_drawer,
+        bounding_box_drawer,
+        default_color,
+        highlight_color,
+        max_dimension,
+    )
+    encode_image_buffer(buffer, fp, format, quality)
+    return buffer.size
+
+
+def render_image_buffer(
+    image_data: Union[bytes, memoryview],
+    face_details: FaceDetectionsLike,
+    detect_labels_res: CatDetectionsLike,
+    highlight_states: dict[str, bool],
+    mosaic_size: int = 5,
+    mosaic_drawer: IFaceMosaicDrawer = NumpyEllipseFaceMosaicDrawer(),
+    bounding_box_drawer: PILBoundingBoxDrawer = PILBoundingBoxDrawer(),
+    default_color: str = "gray",
+    highlight_color: str = "red",
+    max_dimension: Optional[int] = None,
+) -> ImageBuffer:
+    """render_image_bytesのエンコードの前までを行い、顔モザイクと枠線を適用したバッファを返す"""
+    buffer = open_image_buffer(image_data, max_dimension)
+    mosaic_drawer.apply_mosaic_to_buffer(buffer, face_details, mosaic_size)
+    bounding_box_drawer.draw_overlays(
+        buffer.image,
+        compute_instance_overlays(detect_labels_res, buffer.size),
+        highlight_states,
+        default_color,
+        highlight_color,
+    )
+    return buffer
+
+
+def write_full_resolution(
+    image_bytes: bytes,
+    face_details: FaceDetectionsLike,
+    detect_labels_res: CatDetectionsLike,
+    highlight_states: dict[str, bool],
+    fp: BinaryIO,
+    mosaic_size: int = 5,
+    bounding_box_drawer: PILBoundingBoxDrawer = PILBoundingBoxDrawer(),
+    default_color: str = "gray",
+    highlight_color: str = "red",
+    format: str = "JPEG",
+    quality: int = 90,
+):
+    """元の解像度の画像に顔モザイクと枠線を適用し、エンコードしながらfpへ書き出す"""
+    render_image_bytes(
+        image_bytes,
+        face_details,
+        detect_labels_res,
+        highlight_states,
+        fp,
+        mosaic_size=mosaic_size,
+        bounding_box_drawer=bounding_box_drawer,
+        default_color=default_color,
+        highlight_color=highlight_color,
+        format=format,
+        quality=quality,
+    )
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import io
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import IFaceMosaicDrawer
+from lib.instrumentation import span
+from lib.large_image import PREVIEW_MAX_DIMENSION, render_image_bytes
+from lib.parallel import map_completed
+from lib.rekognition.detections import Detections
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+# 複数画像モードで、1セッションが保持する処理結果（プレビュー画像）の合計サイズの上限
+MULTI_IMAGE_STORE_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ImageItem:
+    """処理対象の画像（keyはセッション内で結果を引くためのキー。画像のハッシュ値など）"""
+    key: str
+    name: str
+    image_bytes: bytes
+
+
+@dataclass(frozen=True)
+class ImageResult:
+    """1画像分の処理結果。プレビューは顔モザイクと枠線を適用済みのJPEG"""
+    key: str
+    name: str
+    preview_jpeg: Optional[bytes] = None
+    face_count: int = 0
+    cat_labels: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+    # 猫が検出されず、顔検出を省略した（投稿できない）画像。プレビューは作らない
+    rejected: bool = False
+
+    @property
+    def size_bytes(self) -> int:
+        """セッションに保持する際のおおよそのメモリ使用量"""
+        return len(self.preview_jpeg or b"") + 1024
+
+
+def _cat_labels(cats: Detections) -> list[str]:
+    return [f"{name} ({confidence})" for name, confidence in zip(cats.names, cats.confidence_texts)]
+
+
+class MultiImageProcessor:
+    """
+    複数の画像の 検出 → 顔モザイク → 枠線描画 を共有のワーカープールで実行し、終わった画像から順に結果を返す
+    各画像は長辺がpreview_max_dimension以下のプレビューに対して処理し、JPEGにエンコードした結果だけを保持する
+    executorは全セッションで共有し、プロセス全体の同時処理数を制限する
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        mosaic_drawer: IFaceMosaicDrawer,
+        bounding_box_drawer: PILBoundingBoxDrawer,
+        executor: Executor,
+        max_in_flight: int = 8,
+        mosaic_size: int = 5,
+        preview_max_dimension: int = PREVIEW_MAX_DIMENSION,
+        quality: int = 85,
+    ):
+        self._rekognition_client = rekognition_client
+        self._mosaic_drawer = mosaic_drawer
+        self._bounding_box_drawer = bounding_box_drawer
+        self._executor = executor
+        self._max_in_flight = max_in_flight
+        self._mosaic_size = mosaic_size
+        self._preview_max_dimension = preview_max_dimension
+        self._quality = quality
+
+    def process_one(self, item: ImageItem) -> ImageResult:
+        """1画像を処理する。失敗した場合はerrorを設定した結果を返す"""
+        try:
+            with span("multi_image.process_one"):
+                detection = self._rekognition_client.detect_all(item.image_bytes)
+                if detection.faces_skipped:
+                    return ImageResult(key=item.key, name=item.name, rejected=True)
+                # プレビューを1枚のバッファにデコードし、モザイクと枠線をその場で適用してから1回だけエンコードする
+                buffer = io.BytesIO()
+                render_image_bytes(
+                    item.image_bytes,
+                    detection.faces,
+                    detection.cats,
+                    {},
+                    buffer,
+                    mosaic_size=self._mosaic_size,
+                    mosaic_drawer=self._mosaic_drawer,
+                    bounding_box_drawer=self._bounding_box_drawer,
+                    quality=self._quality,
+                    max_dimension=self._preview_max_dimension,
+                )
+            return ImageResult(
+                key=item.key,
+                name=item.name,
+                preview_jpeg=buffer.getvalue(),
+                face_count=len(detection.faces),
+                cat_labels=_cat_labels(detection.cats),
+            )
+        except Exception as e:
+            return ImageResult(key=item.key, name=item.name, error=str(e) or type(e).__name__)
+
+    def process_many(self, items: Iterable[ImageItem]) -> Iterator[ImageResult]:
+        """
+        画像を並列に処理し、処理が終わった順に結果を返す
+        未処理の画像を一度に投入せず、このセッションの実行中の件数をmax_in_flightまでに抑える
+        """
+        return map_completed(self._executor, self.process_one, items, self._max_in_flight)
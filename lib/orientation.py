@@ -0,0 +1,54 @@
+"""
+EXIFの回転情報（Orientation）の扱い
+
+スマートフォンの写真は画素を回転せず、EXIFのOrientationで表示の向きを指定していることが多い。
+RekognitionはJPEGのOrientationを適用した向きでBoundingBoxを返すため、Rekognitionへ送る画像・表示する画像・
+ハッシュ値を求める画像は、いずれもOrientationを適用した向き（以下、正立）で扱う
+縮小デコード（draft）とリサイズは元の向きのまま行い、最後に回転する（縮小率は向きによらない）
+"""
+from __future__ import annotations
+
+from PIL import Image
+
+ORIENTATION_TAG = 0x0112
+
+# Orientationの値毎の、正立させるための変換（PIL.ImageOps.exif_transposeと同じ対応）
+_TRANSPOSE_METHODS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# 縦横が入れ替わるOrientation
+_SWAPS_AXES = (5, 6, 7, 8)
+
+
+def exif_orientation(image: Image.Image) -> int:
+    """
+    画像のOrientation（1〜8）を返す。無い場合や不正な値の場合は1（回転なし）
+    画素を読み込まないよう、ヘッダーから読んだEXIF（info["exif"]）だけを見る
+    （PNGのgetexif()はEXIFが無いと画像全体を読み込むため使わない）
+    """
+    exif = image.info.get("exif")
+    if not exif:
+        return 1
+    tags = Image.Exif()
+    tags.load(exif)
+    value = tags.get(ORIENTATION_TAG, 1)
+    return value if value in _TRANSPOSE_METHODS else 1
+
+
+def oriented_size(image: Image.Image, orientation: int) -> tuple[int, int]:
+    """正立させた後の画像サイズ"""
+    width, height = image.size
+    return (height, width) if orientation in _SWAPS_AXES else (width, height)
+
+
+def apply_orientation(image: Image.Image, orientation: int) -> Image.Image:
+    """Orientationに従って画像を正立させる。回転が不要な場合は同じ画像を返す（コピーしない）"""
+    method = _TRANSPOSE_METHODS.get(orientation)
+    return image if method is None else image.transpose(method)
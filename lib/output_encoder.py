@@ -0,0 +1,177 @@
+"""
+描画結果（ImageProcessorの出力）を、ブラウザへ送るJPEG / WebPへ直接エンコードする出力ステージ
+
+st.pyplot(fig)はFigureをmatplotlibのDPIでラスタライズし直してPNGで送るため、写真では送信サイズが大きく
+エンコードも遅い。OutputEncoderは描画結果の画像をそのまま（matplotlibのFigureはAggのバッファから）
+JPEG / WebPへエンコードし、送信サイズとエンコード時間をあわせて返す
+
+- max_dimension：長辺の上限（超える場合は縮小してからエンコードする）
+- max_bytes：送信サイズの上限（超える場合はmin_qualityまでqualityを下げてエンコードし直す）
+- progressive：JPEGをプログレッシブで出力する（サイズは1割ほど小さくなるがエンコードは数倍遅いため既定では使わない。WebPでは無視する）
+- encode_thumbnail()：最初の表示用の小さな画像。全体のエンコード前に送って先に表示する
+PillowのAPIだけを使うため、Pillow-SIMDやlibjpeg-turboでビルドしたPillowでもそのまま高速化される
+"""
+from __future__ import annotations
+
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+from PIL import Image
+
+from lib.boundary_draw.drawer import DrawResult
+from lib.instrumentation import span
+
+OUTPUT_FORMATS = ("JPEG", "WEBP")
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    format: str
+    size: tuple[int, int]
+    quality: int
+    encode_seconds: float
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    def describe(self) -> str:
+        """表示用の要約（"JPEG 1024x768 182.4 KB 12.3 ms"）"""
+        width, height = self.size
+        return f"{self.format} {width}x{height} {self.nbytes / 1024:.1f} KB {self.encode_seconds * 1000:.1f} ms"
+
+
+def to_image(processed: DrawResult) -> Image.Image:
+    """描画結果をRGBの画像にする。matplotlibのFigureはPNGを経由せず、Aggのバッファから変換する"""
+    if isinstance(processed, Image.Image):
+        return processed if processed.mode == "RGB" else processed.convert("RGB")
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    canvas = FigureCanvasAgg(processed[0])
+    canvas.draw()
+    return Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba(), "raw", "RGBA", 0, 1).convert("RGB")
+
+
+def _fit(image: Image.Image, max_dimension: Optional[int]) -> Image.Image:
+    """長辺がmax_dimensionを超える場合は縮小する（reducing_gapで整数分の1への縮小を先に行い、高速化する）"""
+    if max_dimension is None or max(image.size) <= max_dimension:
+        return image
+    scale = max_dimension / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+
+class OutputEncoder:
+    def __init__(
+        self,
+        format: str = "JPEG",
+        quality: int = 85,
+        max_dimension: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_quality: int = 50,
+        progressive: bool = False,
+        thumbnail_dimension: int = 320,
+        thumbnail_quality: int = 60,
+        webp_method: int = 4,
+    ):
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(OUTPUT_FORMATS)}.")
+        self.format = format
+        self._quality = quality
+        self._max_dimension = max_dimension
+        self._max_bytes = max_bytes
+        self._min_quality = min(min_quality, quality)
+        self._progressive = progressive
+        self._thumbnail_dimension = thumbnail_dimension
+        self._thumbnail_quality = thumbnail_quality
+        self._webp_method = webp_method
+
+    @property
+    def settings(self) -> tuple:
+        """エンコード結果に影響する設定値（エンコード結果のキャッシュキーに使う）"""
+        return (
+            self.format,
+            self._quality,
+            self._max_dimension,
+            self._max_bytes,
+            self._min_quality,
+            self._progressive,
+            self._thumbnail_dimension,
+            self._thumbnail_quality,
+            self._webp_method,
+        )
+
+    @property
+    def thumbnail_max_dimension(self) -> int:
+        """サムネイルの長辺の上限"""
+        if self._max_dimension is None:
+            return self._thumbnail_dimension
+        return min(self._thumbnail_dimension, self._max_dimension)
+
+    def _save(self, image: Image.Image, quality: int, progressive: bool) -> bytes:
+        buffer = io.BytesIO()
+        if self.format == "JPEG":
+            # optimizeはハフマンテーブルの最適化のため2パスになり遅いため使わない
+            image.save(buffer, format="JPEG", quality=quality, progressive=progressive)
+        else:
+            image.save(buffer, format="WEBP", quality=quality, method=self._webp_method)
+        return buffer.getvalue()
+
+    def _encode(
+        self,
+        processed: DrawResult,
+        max_dimension: Optional[int],
+        quality: int,
+        progressive: bool,
+        max_bytes: Optional[int],
+        variant: str,
+    ) -> EncodedImage:
+        with span("output_encoder.encode", format=self.format, variant=variant):
+            start = time.perf_counter()
+            image = _fit(to_image(processed), max_dimension)
+            data = self._save(image, quality, progressive)
+            # 上限を超える場合はqualityを下げてエンコードし直す（縮小はしない）
+            while max_bytes is not None and len(data) > max_bytes and quality > self._min_quality:
+                quality = max(self._min_quality, quality - 10)
+                data = self._save(image, quality, progressive)
+            return EncodedImage(data, self.format, image.size, quality, time.perf_counter() - start)
+
+    def encode(self, processed: DrawResult) -> EncodedImage:
+        """描画結果を設定どおりにエンコードする"""
+        return self._encode(
+            processed, self._max_dimension, self._quality, self._progressive, self._max_bytes, "full"
+        )
+
+    def encode_thumbnail(self, processed: DrawResult) -> EncodedImage:
+        """最初の表示用に、長辺thumbnail_dimensionの小さな画像をエンコードする"""
+        return self._encode(
+            processed, self.thumbnail_max_dimension, self._thumbnail_quality, False, None, "thumbnail"
+        )
+
+
+def output_encoder_from_env(environ: Mapping[str, str] = os.environ) -> OutputEncoder:
+    """
+    環境変数からOutputEncoderを作る
+    NEKOGNITION_OUTPUT_FORMAT（JPEG / WEBP）、NEKOGNITION_OUTPUT_QUALITY、NEKOGNITION_OUTPUT_MAX_DIMENSION、
+    NEKOGNITION_OUTPUT_MAX_BYTES、NEKOGNITION_OUTPUT_PROGRESSIVE（空・0以外でプログレッシブJPEG）
+    """
+    def optional_int(name: str) -> Optional[int]:
+        value = environ.get(name)
+        return int(value) if value else None
+
+    return OutputEncoder(
+        format=environ.get("NEKOGNITION_OUTPUT_FORMAT", "JPEG").upper(),
+        quality=optional_int("NEKOGNITION_OUTPUT_QUALITY") or 85,
+        max_dimension=optional_int("NEKOGNITION_OUTPUT_MAX_DIMENSION"),
+        max_bytes=optional_int("NEKOGNITION_OUTPUT_MAX_BYTES"),
+        progressive=environ.get("NEKOGNITION_OUTPUT_PROGRESSIVE", "") not in ("", "0"),
+    )
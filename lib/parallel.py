@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_completed(
+    executor: Executor, fn: Callable[[T], R], items: Iterable[T], max_in_flight: int
+) -> Iterator[R]:
+    """
+    itemsをexecutorで並列に処理し、処理が終わった順に結果を返す
+    未処理の要素を一度に投入せず、実行中の件数をmax_in_flightまでに抑える（itemsは必要な分だけ読み進める）
+    """
+    in_flight: set[Future[R]] = set()
+    for item in items:
+        in_flight.add(executor.submit(fn, item))
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while in_flight:
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
@@ -0,0 +1,170 @@
+"""
+画像の知覚ハッシュ（dHash）と、ハミング距離で近いハッシュを検索するインデックス
+
+同じ写真をスマートフォンで縮小・再圧縮し直した画像は、バイト列のハッシュ値（SHA-256）は一致しないが、
+dHashのハミング距離は数ビット以内に収まる
+"""
+from __future__ import annotations
+
+import io
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from lib.orientation import apply_orientation, exif_orientation, oriented_size
+
+# dHashのビット数（hash_size=8の場合）
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    グレースケールに変換して(hash_size+1)×hash_sizeに縮小し、横に隣り合う画素の明暗をビットにしたハッシュ値を返す
+    縮小・再圧縮・明るさの変化には強く、切り抜き・回転には弱い
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, :-1] > pixels[:, 1:]).reshape(-1)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+@dataclass(frozen=True)
+class ImageFingerprint:
+    """
+    画像の知覚ハッシュと、近い画像か確かめるための縮小画像
+    dHashは64ビットしかなく、連写した写真のように少しずれた画像も距離が数ビットに収まるため、
+    インデックスで候補を絞った後、縮小画像の差分で縮小・再圧縮しただけの画像かを確かめる
+    """
+    hash_value: int
+    size: tuple[int, int]
+    thumbnail: np.ndarray  # thumbnail_size×thumbnail_sizeのグレースケール（uint8）
+
+    @property
+    def aspect_ratio(self) -> float:
+        return self.size[0] / self.size[1]
+
+    def thumbnail_difference(self, other: ImageFingerprint) -> float:
+        """縮小画像の画素値の差の絶対値の平均（0〜255）"""
+        return float(np.abs(self.thumbnail.astype(np.int16) - other.thumbnail.astype(np.int16)).mean())
+
+
+def fingerprint_image_bytes(image_bytes: bytes, hash_size: int = 8, thumbnail_size: int = 16) -> ImageFingerprint:
+    """
+    画像バイトのdHash・画像サイズ・縮小画像を返す
+    JPEGは縮小した解像度（最小1/8）でデコードし、大きな画像でもデコードのコストを抑える
+    EXIFの回転情報は適用する（preprocessと同じく、Rekognitionへ送信する正立した向きでハッシュ値を求める）
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    orientation = exif_orientation(image)
+    size = oriented_size(image, orientation)
+    draft_size = max(hash_size + 1, thumbnail_size) * 8
+    image.draft("L", (draft_size, draft_size))
+    gray = apply_orientation(image.convert("L"), orientation)
+    thumbnail = np.asarray(gray.resize((thumbnail_size, thumbnail_size), Image.Resampling.BOX))
+    return ImageFingerprint(dhash(gray, hash_size), size, thumbnail)
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    return (hash_a ^ hash_b).bit_count()
+
+
+class MultiIndexHashTable:
+    """
+    ハミング距離がmax_distance以下のハッシュ値を検索するインデックス（multi-index hashing）
+    ハッシュ値をmax_distance+1個のチャンクに分割し、チャンク毎にそのビット列をキーとするテーブルに登録する。
+    距離がmax_distance以下なら鳩の巣原理で少なくとも1つのチャンクが完全に一致するため、
+    各テーブルの一致するバケットだけを候補として距離を計算すればよい
+    - ハッシュ値はnumpyの配列、バケットはarray("I")で持ち、1件あたり約30バイト（100万件で約30MB、最大RSSの増分は約50MB）
+    - add()の戻り値のIDは0からの連番。remove()で削除したIDは次のadd()で再利用するため、
+      削除しながら使う場合の配列の大きさは同時に登録されている件数の最大値で決まる
+    """
+
+    def __init__(self, max_distance: int = 4, bits: int = HASH_BITS):
+        if not 0 <= max_distance < bits:
+            raise ValueError("max_distance must be between 0 and bits - 1.")
+        self.max_distance = max_distance
+        self._bits = bits
+
+        # 先頭のチャンクから順にビット数を1ずつ多く割り振る（64ビット・5チャンクなら13, 13, 13, 13, 12）
+        chunks = max_distance + 1
+        self._chunks: list[tuple[int, int]] = []  # (シフト量, マスク)
+        shift = bits
+        for index in range(chunks):
+            width = bits // chunks + (1 if index < bits % chunks else 0)
+            shift -= width
+            self._chunks.append((shift, (1 << width) - 1))
+        self._tables: list[dict[int, array]] = [{} for _ in range(chunks)]
+
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._size = 0
+        self._free_ids: list[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size - len(self._free_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """ハッシュ値とバケットの配列が使っているバイト数（dictのオーバーヘッドは含まない）"""
+        with self._lock:
+            bucket_bytes = sum(
+                bucket.itemsize * len(bucket) for table in self._tables for bucket in table.values()
+            )
+            return self._hashes.nbytes + bucket_bytes
+
+    def add(self, hash_value: int) -> int:
+        """ハッシュ値を登録し、そのIDを返す（同じハッシュ値を登録した場合も別のIDになる）"""
+        with self._lock:
+            if self._free_ids:
+                entry_id = self._free_ids.pop()
+            else:
+                entry_id = self._size
+                if entry_id == len(self._hashes):
+                    self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+                self._size += 1
+            self._hashes[entry_id] = hash_value
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table.setdefault((hash_value >> shift) & mask, array("I")).append(entry_id)
+            return entry_id
+
+    def remove(self, entry_id: int):
+        """登録を削除する。削除したIDは以後のsearch()で返さず、次のadd()で再利用する"""
+        with self._lock:
+            hash_value = int(self._hashes[entry_id])
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                key = (hash_value >> shift) & mask
+                bucket = table[key]
+                bucket.remove(entry_id)
+                if not bucket:
+                    del table[key]
+            self._free_ids.append(entry_id)
+
+    def search(self, hash_value: int, max_distance: Optional[int] = None) -> list[tuple[int, int]]:
+        """ハミング距離がmax_distance以下のエントリを、(ID, 距離)の距離の近い順のリストで返す"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError("max_distance must not exceed the max_distance of the index.")
+
+        with self._lock:
+            buckets = [
+                table[key]
+                for table, (shift, mask) in zip(self._tables, self._chunks)
+                if (key := (hash_value >> shift) & mask) in table
+            ]
+            if not buckets:
+                return []
+            # arrayのバッファを参照したままではadd()で拡張できないため、ロックを持っている間に連結してコピーする
+            candidates = np.unique(np.concatenate([np.frombuffer(bucket, dtype=np.uint32) for bucket in buckets]))
+            del buckets
+            distances = np.bitwise_count(self._hashes[candidates] ^ np.uint64(hash_value))
+
+        within = distances <= max_distance
+        candidates = candidates[within]
+        distances = distances[within]
+        order = np.lexsort((candidates, distances))
+        return list(zip(candidates[order].tolist(), distances[order].tolist()))
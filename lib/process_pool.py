@@ -0,0 +1,305 @@
+"""
+顔モザイクと枠線描画を別プロセスで実行するImageProcessor
+
+Streamlitのスクリプトスレッドで描画するとGILで直列化されるため、同時に使っているセッションが増えても
+CPUを1コアしか使えない。ProcessPoolImageProcessorは デコード → モザイク → 描画 → エンコード を
+プロセスプールで実行し、エンコード済みの画像（OutputEncoderのJPEG / WebP）を返す
+
+- 入力の画像バイトはpickleせず、共有メモリ（multiprocessing.shared_memory）に書き込んで名前だけをワーカーへ渡す
+  PILの描画器の場合、ワーカーは共有メモリから直接デコードする（lib.image_buffer）
+- 描画器はpickleできないもの（ロックを持つLayeredBoundingBoxDrawerなど）もあるため、
+  インスタンスではなくファクトリ（クラスなど）を渡し、ワーカー毎に1回だけ生成する
+- ワーカーはforkserverで起動する（Streamlitのようにスレッドを持つプロセスからforkしないため）
+- エンコードは1画像モードの表示と同じOutputEncoderで行い、サムネイル（submit(thumbnail=True)）は
+  縮小デコードした画像から作る
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+from typing import Callable, Mapping, Optional
+
+from lib.boundary_draw.drawer import DrawResult, IBoundaryDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import IFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.instrumentation import span
+from lib.large_image import render_image_buffer
+from lib.output_encoder import EncodedImage, OutputEncoder, output_encoder_from_env
+from lib.rekognition.detections import (
+    CatDetectionsLike,
+    Detections,
+    FaceDetectionsLike,
+    as_cat_detections,
+    as_face_detections,
+)
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    """エンコード済みの処理結果"""
+    data: bytes
+    format: str
+    size: tuple[int, int]
+    # ワーカーでの処理時間（デコード〜エンコード。キューで待った時間は含まない）
+    worker_seconds: float
+
+    def describe(self) -> str:
+        """表示用の要約（"JPEG 1024x768 182.4 KB"）"""
+        width, height = self.size
+        return f"{self.format} {width}x{height} {len(self.data) / 1024:.1f} KB"
+
+
+@dataclass(frozen=True)
+class _RenderJob:
+    shared_memory_name: str
+    image_size_bytes: int
+    face_detections: Detections
+    cat_detections: Detections
+    highlight_states: dict[str, bool]
+    mosaic_size: int
+    default_color: str
+    highlight_color: str
+    max_dimension: Optional[int]
+    output_encoder: OutputEncoder
+    thumbnail: bool = False
+
+
+@dataclass
+class RenderPoolStats:
+    workers: int
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    # ワーカーが処理していた時間の合計
+    busy_seconds: float = 0.0
+    started_at: float = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    def utilization(self, now: Optional[float] = None) -> float:
+        """プール作成時からの、ワーカーが処理していた時間の割合（0〜1）"""
+        elapsed = (time.monotonic() if now is None else now) - self.started_at
+        if elapsed <= 0 or self.workers == 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (self.workers * elapsed))
+
+
+# ワーカープロセス毎に1つだけ生成する描画器とImageProcessor（_init_workerで設定する）
+_worker_mosaic_drawer: Optional[IFaceMosaicDrawer] = None
+_worker_bounding_box_drawer: Optional[IBoundaryDrawer] = None
+_worker_image_processor: Optional[ImageProcessor] = None
+
+
+def _init_worker(
+    mosaic_drawer_factory: Callable[[], IFaceMosaicDrawer],
+    bounding_box_drawer_factory: Callable[[], IBoundaryDrawer],
+):
+    global _worker_mosaic_drawer, _worker_bounding_box_drawer, _worker_image_processor
+    _worker_mosaic_drawer = mosaic_drawer_factory()
+    _worker_bounding_box_drawer = bounding_box_drawer_factory()
+    _worker_image_processor = ImageProcessor(_worker_mosaic_drawer, _worker_bounding_box_drawer)
+
+
+def _render_view(image_view: memoryview, job: _RenderJob) -> EncodedImage:
+    """
+    描画結果をjob.output_encoderでエンコードする。サムネイルはサムネイルの大きさまで縮小デコードした画像から作る
+    PILの描画器の場合は共有メモリから直接デコードし、1枚のバッファにモザイクと枠線を適用する
+    """
+    encoder = job.output_encoder
+    max_dimension = job.max_dimension
+    if job.thumbnail:
+        max_dimension = min(max_dimension or encoder.thumbnail_max_dimension, encoder.thumbnail_max_dimension)
+    if isinstance(_worker_bounding_box_drawer, PILBoundingBoxDrawer):
+        rendered: DrawResult = render_image_buffer(
+            image_view,
+            job.face_detections,
+            job.cat_detections,
+            job.highlight_states,
+            job.mosaic_size,
+            _worker_mosaic_drawer,
+            _worker_bounding_box_drawer,
+            job.default_color,
+            job.highlight_color,
+            max_dimension,
+        ).image
+    else:
+        rendered = _worker_image_processor.process_image(
+            _worker_image_processor._decode(image_view, max_dimension),
+            job.face_detections,
+            job.cat_detections,
+            job.highlight_states,
+            job.mosaic_size,
+            job.default_color,
+            job.highlight_color,
+        )
+    try:
+        return encoder.encode_thumbnail(rendered) if job.thumbnail else encoder.encode(rendered)
+    finally:
+        if isinstance(rendered, tuple):
+            import matplotlib.pyplot as plt
+
+            plt.close(rendered[0])
+
+
+def _render(job: _RenderJob) -> RenderedImage:
+    """ワーカープロセスで実行する。共有メモリは読むだけで、解放（unlink）は呼び出し元が行う"""
+    start = time.perf_counter()
+    shm = shared_memory.SharedMemory(name=job.shared_memory_name)
+    try:
+        with shm.buf[:job.image_size_bytes] as image_view:
+            encoded = _render_view(image_view, job)
+    finally:
+        shm.close()
+    return RenderedImage(encoded.data, encoded.format, encoded.size, time.perf_counter() - start)
+
+
+class ProcessPoolImageProcessor:
+    """
+    ImageProcessor.process_image_bytesと同じ処理をプロセスプールで実行し、エンコード済みの画像を返す
+    - max_workers：ワーカープロセス数（既定はCPUコア数）
+    - output_encoder：エンコードの設定（JPEG / WebP、長辺・サイズの上限、submit(thumbnail=True)でのサムネイル）
+    - statsで投入・完了件数と、ワーカーの稼働率（utilization()）を確認できる
+    描画結果のキャッシュ（RenderCache）は持たないため、ハイライトの切り替えのたびに画像全体を処理し直す
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        mosaic_drawer_factory: Callable[[], IFaceMosaicDrawer] = NumpyEllipseFaceMosaicDrawer,
+        bounding_box_drawer_factory: Callable[[], IBoundaryDrawer] = PILBoundingBoxDrawer,
+        mp_context: Optional[BaseContext] = None,
+        output_encoder: OutputEncoder = OutputEncoder(),
+    ):
+        workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context if mp_context is not None else multiprocessing.get_context("forkserver"),
+            initializer=_init_worker,
+            initargs=(mosaic_drawer_factory, bounding_box_drawer_factory),
+        )
+        self._output_encoder = output_encoder
+        self._lock = threading.Lock()
+        self.stats = RenderPoolStats(workers=workers, started_at=time.monotonic())
+
+    def submit(
+        self,
+        image_bytes: bytes,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        mosaic_size: int = 5,
+        default_color: str = "gray",
+        highlight_color: str = "red",
+        max_dimension: Optional[int] = None,
+        thumbnail: bool = False,
+    ) -> Future[RenderedImage]:
+        """
+        画像バイトを共有メモリへコピーして処理を投入する。共有メモリは処理が終わった時点で解放する
+        thumbnail=Trueの場合は、output_encoderのサムネイルを作る
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(image_bytes)))
+        try:
+            shm.buf[:len(image_bytes)] = image_bytes
+            job = _RenderJob(
+                shm.name,
+                len(image_bytes),
+                as_face_detections(face_details),
+                as_cat_detections(detect_labels_res),
+                dict(highlight_states),
+                mosaic_size,
+                default_color,
+                highlight_color,
+                max_dimension,
+                self._output_encoder,
+                thumbnail,
+            )
+            worker_future = self._executor.submit(_render, job)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+        with self._lock:
+            self.stats.submitted += 1
+        # 共有メモリの解放と集計を終えてから、呼び出し元へ結果を渡す
+        future: Future[RenderedImage] = Future()
+        worker_future.add_done_callback(lambda done: self._on_done(done, shm, future))
+        return future
+
+    def _on_done(
+        self,
+        worker_future: Future[RenderedImage],
+        shm: shared_memory.SharedMemory,
+        future: Future[RenderedImage],
+    ):
+        shm.close()
+        shm.unlink()
+        exception = None if worker_future.cancelled() else worker_future.exception()
+        with self._lock:
+            if worker_future.cancelled() or exception is not None:
+                self.stats.failed += 1
+            else:
+                self.stats.completed += 1
+                self.stats.busy_seconds += worker_future.result().worker_seconds
+
+        if worker_future.cancelled():
+            future.cancel()
+        # 呼び出し元がキャンセルした場合は結果を設定しない
+        if not future.set_running_or_notify_cancel():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(worker_future.result())
+
+    def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        face_details: FaceDetectionsLike,
+        detect_labels_res: CatDetectionsLike,
+        highlight_states: dict[str, bool],
+        mosaic_size: int = 5,
+        default_color: str = "gray",
+        highlight_color: str = "red",
+        max_dimension: Optional[int] = None,
+        thumbnail: bool = False,
+    ) -> RenderedImage:
+        """submitして結果を待つ。待っている間はGILを解放するため、他のセッションの処理を妨げない"""
+        with span("process_pool.process_image_bytes"):
+            return self.submit(
+                image_bytes,
+                face_details,
+                detect_labels_res,
+                highlight_states,
+                mosaic_size,
+                default_color,
+                highlight_color,
+                max_dimension,
+                thumbnail,
+            ).result()
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def process_pool_from_env(environ: Mapping[str, str] = os.environ) -> Optional[ProcessPoolImageProcessor]:
+    """
+    NEKOGNITION_RENDER_PROCESSESが設定されていれば、そのワーカー数のプールを返す（0はCPUコア数）
+    エンコードは1画像モードの表示と同じく、NEKOGNITION_OUTPUT_*の設定（output_encoder_from_env）に従う
+    """
+    value = environ.get("NEKOGNITION_RENDER_PROCESSES")
+    if not value:
+        return None
+    workers = int(value)
+    return ProcessPoolImageProcessor(
+        max_workers=workers if workers > 0 else None, output_encoder=output_encoder_from_env(environ)
+    )
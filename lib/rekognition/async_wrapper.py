@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+class RekognitionBackpressureError(RuntimeError):
+    """同時実行数と待機数の上限を超えたため、リクエストを受け付けなかった場合のエラー"""
+
+
+class IAsyncRekognitionClientWrapper(ABC):
+    @abstractmethod
+    async def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        pass
+
+    @abstractmethod
+    async def detect_cats(
+        self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75
+    ) -> DetectLabelsResponseTypeDef:
+        pass
+
+    async def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        """顔検出と猫検出を並行して実行し、両方の結果をまとめて返す"""
+        face_details, detect_labels_res = await asyncio.gather(
+            self.detect_faces(image_bytes),
+            self.detect_cats(image_bytes, max_labels, min_confidence),
+        )
+        return DetectionResult(face_details, detect_labels_res)
+
+
+class AsyncRekognitionClientWrapper(IAsyncRekognitionClientWrapper):
+    """
+    同期版のIRekognitionClientWrapperを、イベントループを止めずに呼び出すための非同期ラッパー
+    boto3の呼び出しは上限付きのスレッドプールで実行する
+
+    - max_concurrency: 同時にRekognitionへ送信するリクエスト数の上限
+    - max_waiting: 実行枠の空きを待つリクエスト数の上限。超えた場合はRekognitionBackpressureErrorを送出する
+      Noneの場合は上限なしで待機させる
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        max_concurrency: int = 16,
+        max_waiting: Optional[int] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be greater than or equal to 1.")
+        self._client = rekognition_client
+        self._max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="rekognition"
+        )
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """実行中のリクエスト数"""
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """実行枠の空きを待っているリクエスト数"""
+        return self._waiting
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._semaphore.locked() and self._max_waiting is not None and self._waiting >= self._max_waiting:
+            raise RekognitionBackpressureError(
+                "too many pending rekognition requests."
+            )
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        return await self._run(self._client.detect_faces, image_bytes)
+
+    async def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        return await self._run(
+            self._client.detect_cats, image_bytes, max_labels, min_confidence
+        )
+
+    def close(self):
+        """スレッドプールを停止する"""
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncRekognitionClientWrapper":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        self.close()
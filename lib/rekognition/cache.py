@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from lib.cache import LRUCache
+from lib.rekognition.router import has_cat
+from lib.rekognition.utils import compute_image_hash
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+class IDetectionCacheStore(ABC):
+    """検出結果を永続化するキャッシュ層（ディスクなど）のインターフェース"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: Any):
+        pass
+
+
+class SQLiteDetectionCacheStore(IDetectionCacheStore):
+    """
+    検出結果をJSONとしてSQLiteに保存するキャッシュ層
+    プロセスの再起動後も同じ画像に対するRekognitionへのリクエストを省略できる
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS detection_cache ("
+                " key TEXT PRIMARY KEY,"
+                " stored_at REAL NOT NULL,"
+                " value TEXT NOT NULL"
+                ")"
+            )
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, value FROM detection_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        stored_at, value = row
+        if self._ttl_seconds is not None and self._clock() - stored_at > self._ttl_seconds:
+            return None
+        return json.loads(value)
+
+    def put(self, key: str, value: Any):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO detection_cache (key, stored_at, value) VALUES (?, ?, ?)",
+                (key, self._clock(), json.dumps(value, default=str)),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    画像バイトのハッシュ値と呼び出しパラメータをキーに、検出結果をキャッシュするデコレータ
+    インメモリのLRUキャッシュ → ディスクキャッシュ → Rekognition の順に参照する
+    キャッシュから返した結果は呼び出し元間で共有されるため、変更しないこと
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        memory_cache: Optional[LRUCache[str, Any]] = None,
+        disk_store: Optional[IDetectionCacheStore] = None,
+    ):
+        self._client = rekognition_client
+        self._memory_cache = memory_cache if memory_cache is not None else LRUCache()
+        self._disk_store = disk_store
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        value = self._memory_cache.get(key)
+        if value is not None:
+            return value
+
+        if self._disk_store is not None:
+            value = self._disk_store.get(key)
+            if value is not None:
+                self._memory_cache.put(key, value)
+                return value
+        return None
+
+    def _store(self, key: str, value: Any):
+        self._memory_cache.put(key, value)
+        if self._disk_store is not None:
+            self._disk_store.put(key, value)
+
+    def _get_or_detect(self, key: str, detect: Callable[[], Any]) -> Any:
+        value = self._lookup(key)
+        if value is None:
+            value = detect()
+            self._store(key, value)
+        return value
+
+    @staticmethod
+    def _faces_key(image_hash: str) -> str:
+        return f"detect_faces:{image_hash}"
+
+    @staticmethod
+    def _cats_key(image_hash: str, max_labels: int, min_confidence: int) -> str:
+        return f"detect_cats:{image_hash}:{max_labels}:{min_confidence}"
+
+    def _detect_all_and_store(
+        self, image_bytes: bytes, max_labels: int, min_confidence: int, faces_key: str, cats_key: str
+    ) -> DetectionResult:
+        result = self._client.detect_all(image_bytes, max_labels, min_confidence)
+        # 省略した顔検出の結果（空のリスト）や、ローカルの検出器の判定だけの猫検出の結果はキャッシュしない
+        if not result.faces_skipped:
+            self._store(faces_key, result.face_details)
+        if not result.cats_skipped:
+            self._store(cats_key, result.detect_labels_res)
+        return result
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        key = self._faces_key(compute_image_hash(image_bytes))
+        return self._get_or_detect(
+            key, lambda: self._client.detect_faces(image_bytes)
+        )
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        key = self._cats_key(compute_image_hash(image_bytes), max_labels, min_confidence)
+        return self._get_or_detect(
+            key,
+            lambda: self._client.detect_cats(image_bytes, max_labels, min_confidence),
+        )
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        """
+        両方の結果がキャッシュに無い場合はラップ対象のdetect_allにまとめて委譲し、
+        片方だけ無い場合はその検出だけを行う
+        顔検出を省略した結果（RoutingRekognitionClientWrapper）は、猫検出の結果だけをキャッシュする。
+        キャッシュした猫検出の結果に猫がおらず、顔の結果が無い場合は、Rekognitionを呼ばずに顔検出を省略した結果を返す
+        """
+        image_hash = compute_image_hash(image_bytes)
+        faces_key = self._faces_key(image_hash)
+        cats_key = self._cats_key(image_hash, max_labels, min_confidence)
+        face_details = self._lookup(faces_key)
+        detect_labels_res = self._lookup(cats_key)
+
+        if face_details is None and detect_labels_res is None:
+            return self._detect_all_and_store(image_bytes, max_labels, min_confidence, faces_key, cats_key)
+
+        if face_details is None and not has_cat(detect_labels_res):
+            return DetectionResult([], detect_labels_res, faces_skipped=True)
+        if face_details is None:
+            face_details = self._get_or_detect(
+                faces_key, lambda: self._client.detect_faces(image_bytes)
+            )
+        if detect_labels_res is None:
+            detect_labels_res = self._get_or_detect(
+                cats_key,
+                lambda: self._client.detect_cats(image_bytes, max_labels, min_confidence),
+            )
+        return DetectionResult(face_details, detect_labels_res)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Iterable, Optional, Union
+
+import numpy as np
+
+from lib.rekognition.utils import extract_cat_label
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import DetectLabelsResponseTypeDef, FaceDetailTypeDef
+
+_NO_BOX = (math.nan, math.nan, math.nan, math.nan)
+
+
+class Detections:
+    """
+    正規化した検出結果（顔または猫のインスタンスN件分）
+    Rekognitionのレスポンス1件につき1回だけ作り、描画・モザイク・キャッシュキーの計算で使い回す
+    - boxes：(N, 4)の配列。BoundingBoxの(Left, Top, Width, Height)（画像サイズに対する比率）。BoundingBoxが無い場合はNaN
+    - confidences：(N,)の配列。信頼度が無い場合はNaN
+    - names / confidence_texts / labels：表示用の文字列（"Cat-1"、"97.00%"、"Cat-1(97.00%)"）
+    配列はfloat64で保持する（float32では比率から求めたピクセル座標が1pxずれることがあるため）
+    """
+    __slots__ = ("boxes", "confidences", "names", "confidence_texts", "labels", "_key")
+
+    def __init__(self, boxes: Iterable, confidences: Iterable, name_prefix: str = "Cat"):
+        self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        self.confidences = np.array(confidences, dtype=np.float64).reshape(-1)
+        if len(self.boxes) != len(self.confidences):
+            raise ValueError("boxes and confidences must have the same length.")
+        # 複数のセッション・スレッドで共有するため、書き換えられないようにする
+        self.boxes.flags.writeable = False
+        self.confidences.flags.writeable = False
+
+        self.names = tuple(f"{name_prefix}-{index + 1}" for index in range(len(self.boxes)))
+        self.confidence_texts = tuple(
+            "no confidence" if math.isnan(confidence) else f"{confidence:.2f}%"
+            for confidence in self.confidences.tolist()
+        )
+        self.labels = tuple(f"{name}({text})" for name, text in zip(self.names, self.confidence_texts))
+        self._key: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    @property
+    def has_box(self) -> np.ndarray:
+        """BoundingBoxを持つインスタンスのマスク"""
+        return ~np.isnan(self.boxes).any(axis=1)
+
+    @property
+    def key(self) -> bytes:
+        """描画に影響する値（BoundingBoxと信頼度）をまとめたキャッシュキー"""
+        if self._key is None:
+            self._key = self.boxes.tobytes() + self.confidences.tobytes()
+        return self._key
+
+    @classmethod
+    def from_instances(cls, instances: Iterable, name_prefix: str) -> Detections:
+        boxes = []
+        confidences = []
+        for instance in instances:
+            if "BoundingBox" in instance:
+                box = instance["BoundingBox"]
+                boxes.append((box["Left"], box["Top"], box["Width"], box["Height"]))
+            else:
+                boxes.append(_NO_BOX)
+            confidences.append(instance["Confidence"] if "Confidence" in instance else math.nan)
+        return cls(boxes, confidences, name_prefix)
+
+    @classmethod
+    def from_face_details(cls, face_details: list[FaceDetailTypeDef]) -> Detections:
+        return cls.from_instances(face_details, "Face")
+
+    @classmethod
+    def from_detect_labels_res(cls, detect_labels_res: DetectLabelsResponseTypeDef) -> Detections:
+        """猫のラベル（Name="Cat"）のインスタンスを取り出す。猫が検出されていなければ0件"""
+        cat_label = extract_cat_label(detect_labels_res)
+        instances = cat_label.get("Instances", []) if cat_label is not None else []
+        return cls.from_instances(instances, "Cat")
+
+
+# Detectionsか、変換前のboto3のレスポンス
+FaceDetectionsLike = Union[Detections, "list[FaceDetailTypeDef]"]
+CatDetectionsLike = Union[Detections, "DetectLabelsResponseTypeDef"]
+
+
+def as_face_detections(face_details: FaceDetectionsLike) -> Detections:
+    if isinstance(face_details, Detections):
+        return face_details
+    return Detections.from_face_details(face_details)
+
+
+def as_cat_detections(detect_labels_res: CatDetectionsLike) -> Detections:
+    if isinstance(detect_labels_res, Detections):
+        return detect_labels_res
+    return Detections.from_detect_labels_res(detect_labels_res)
+
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Callable, Optional
+
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+class LazyRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    最初の呼び出し時にfactoryでラップ対象を生成するデコレータ
+    boto3の読み込みとクライアントの生成を起動時ではなく最初の検出時まで遅らせる
+    生成は1回だけ行い、以降は全スレッドで同じインスタンスを使う
+    """
+
+    def __init__(self, factory: Callable[[], IRekognitionClientWrapper]):
+        self._factory = factory
+        self._client: Optional[IRekognitionClientWrapper] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> IRekognitionClientWrapper:
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        return self.client.detect_faces(image_bytes)
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        return self.client.detect_cats(image_bytes, max_labels, min_confidence)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import io
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from PIL import Image
+
+from lib.instrumentation import span
+from lib.orientation import apply_orientation, exif_orientation
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+# OpenCVに同梱されているカスケード分類器（cv2.data.haarcascades以下のファイル名）
+DEFAULT_FACE_CASCADE = "haarcascade_frontalface_default.xml"
+DEFAULT_CAT_CASCADE = "haarcascade_frontalcatface_extended.xml"
+
+
+def _import_cv2() -> Any:
+    """OpenCVは任意の依存関係のため、使う時に読み込む"""
+    try:
+        import cv2
+    except ImportError as e:
+        raise ImportError(
+            "The local detector requires OpenCV 4 (OpenCV 5 moved the cascade classifiers to opencv-contrib)."
+            " Install it with `uv add 'opencv-python-headless<5'`."
+        ) from e
+    return cv2
+
+
+def _cascade_path(cv2: Any, cascade: str) -> str:
+    """ファイル名だけが指定された場合は、OpenCVに同梱されているカスケードを使う"""
+    if os.path.dirname(cascade):
+        return cascade
+    return os.path.join(cv2.data.haarcascades, cascade)
+
+
+class OpenCVRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    Rekognitionの代わりに、OpenCVのカスケード分類器（Haar / LBP）で顔と猫をCPU上で検出するバックエンド
+    Rekognitionと同じ形（BoundingBoxは画像サイズに対する比率）のレスポンスを返すため、他のデコレータや描画処理はそのまま使える
+    - カスケード分類器は信頼度を返さないため、Confidenceは含めない（"no confidence"と表示される）。
+      そのためmin_confidenceは使わない
+    - 猫のカスケードは正面を向いた猫の顔だけを検出するため、BoundingBoxは猫全体ではなく顔の範囲になり、
+      横向きや後ろ向きの猫は検出できない
+    - 画像は長辺がmax_dimension以下になるよう縮小したグレースケールで検出する
+      EXIFの回転情報は適用する（Rekognitionへ送信する画像・表示する画像と同じ正立した向きで検出する）
+    - CascadeClassifierはスレッド間で共有できないため、スレッド毎に読み込む
+    """
+
+    def __init__(
+        self,
+        face_cascade: str = DEFAULT_FACE_CASCADE,
+        cat_cascade: str = DEFAULT_CAT_CASCADE,
+        max_dimension: int = 1024,
+        scale_factor: float = 1.1,
+        min_neighbors: int = 5,
+        min_size_ratio: float = 0.04,
+    ):
+        self._cv2 = _import_cv2()
+        self._face_cascade = _cascade_path(self._cv2, face_cascade)
+        self._cat_cascade = _cascade_path(self._cv2, cat_cascade)
+        self._max_dimension = max_dimension
+        self._scale_factor = scale_factor
+        self._min_neighbors = min_neighbors
+        self._min_size_ratio = min_size_ratio
+        self._local = threading.local()
+
+    def _classifier(self, path: str) -> Any:
+        classifiers = getattr(self._local, "classifiers", None)
+        if classifiers is None:
+            classifiers = self._local.classifiers = {}
+        if path not in classifiers:
+            classifier = self._cv2.CascadeClassifier(path)
+            if classifier.empty():
+                raise ValueError(f"Failed to load cascade classifier: {path}")
+            classifiers[path] = classifier
+        return classifiers[path]
+
+    def _decode(self, image_bytes: bytes) -> np.ndarray:
+        """長辺がmax_dimension以下のグレースケール画像（ヒストグラム平坦化済み）にデコードする"""
+        image = Image.open(io.BytesIO(image_bytes))
+        orientation = exif_orientation(image)
+        image.draft("L", (self._max_dimension, self._max_dimension))
+        image = image.convert("L")
+        if max(image.size) > self._max_dimension:
+            image.thumbnail((self._max_dimension, self._max_dimension), Image.Resampling.BILINEAR)
+        return self._cv2.equalizeHist(np.asarray(apply_orientation(image, orientation)))
+
+    def _detect(self, gray: np.ndarray, cascade: str) -> list[dict]:
+        """検出した矩形を、画像サイズに対する比率のBoundingBoxのリストで返す"""
+        height, width = gray.shape
+        min_side = max(1, round(min(width, height) * self._min_size_ratio))
+        rects = self._classifier(cascade).detectMultiScale(
+            gray,
+            scaleFactor=self._scale_factor,
+            minNeighbors=self._min_neighbors,
+            minSize=(min_side, min_side),
+        )
+        return [
+            {"BoundingBox": {"Left": x / width, "Top": y / height, "Width": w / width, "Height": h / height}}
+            for x, y, w, h in np.asarray(rects, dtype=np.int64).reshape(-1, 4).tolist()
+        ]
+
+    def _detect_faces(self, gray: np.ndarray) -> list[FaceDetailTypeDef]:
+        with span("local_detector.detect_faces"):
+            return self._detect(gray, self._face_cascade)
+
+    def _detect_cats(self, gray: np.ndarray, max_labels: int) -> DetectLabelsResponseTypeDef:
+        with span("local_detector.detect_cats"):
+            instances = self._detect(gray, self._cat_cascade)
+        if not instances or max_labels < 1:
+            return {"Labels": []}
+        return {"Labels": [{"Name": "Cat", "Instances": instances}]}
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        return self._detect_faces(self._decode(image_bytes))
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        return self._detect_cats(self._decode(image_bytes), max_labels)
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        """デコードは1回だけ行い、顔と猫を続けて検出する"""
+        gray = self._decode(image_bytes)
+        return DetectionResult(self._detect_faces(gray), self._detect_cats(gray, max_labels))
@@ -0,0 +1,296 @@
+"""
+Rekognitionの代わりにローカルで起動するHTTPサーバー（負荷試験・オフライン開発用）
+
+boto3が使うJSON 1.1プロトコル（X-Amz-Target: RekognitionService.DetectFaces / DetectLabels）を話すため、
+endpoint_urlをこのサーバーに向けるだけで、RekognitionClientWrapperや再試行・キャッシュを含めた実際の経路を
+ネットワークに出ずに試験できる
+
+    with LocalRekognitionServer(fixtures, latency=LatencyDistribution.parse("lognormal:0.15,0.5")) as server:
+        client = create_rekognition_client("ap-northeast-1", endpoint_url=server.endpoint_url)
+
+- 応答は画像のハッシュ値毎に固定（RekognitionFixtures）。登録されていない画像には既定の応答を返す
+- 遅延は分布（固定・一様・対数正規）から毎回サンプリングする
+- throttle_rate / error_rateの割合で、ThrottlingException / InternalServerErrorを返す
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Optional
+
+from lib.rekognition.utils import MAX_IMAGE_BYTES, compute_image_hash
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+    from mypy_boto3_rekognition.type_defs import FaceDetailTypeDef, LabelTypeDef
+
+TARGET_PREFIX = "RekognitionService."
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """
+    応答の遅延（秒）の分布
+    - fixed：常にparams[0]秒
+    - uniform：params[0]〜params[1]秒の一様分布
+    - lognormal：中央値params[0]秒、対数の標準偏差params[1]の対数正規分布（裾の重い遅延を模擬する）
+    """
+    kind: str = "fixed"
+    params: tuple[float, ...] = (0.0,)
+
+    def __post_init__(self):
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(self.kind)
+        if expected is None:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        if len(self.params) != expected:
+            raise ValueError(f"{self.kind} latency distribution takes {expected} parameters.")
+        if any(param < 0 for param in self.params):
+            raise ValueError("Latency parameters must not be negative.")
+
+    @classmethod
+    def parse(cls, spec: str) -> LatencyDistribution:
+        """'fixed:0.05'、'uniform:0.02,0.1'、'lognormal:0.15,0.5'の形式の文字列から作る"""
+        kind, _, params = spec.partition(":")
+        return cls(kind, tuple(float(param) for param in params.split(",")) if params else ())
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        if median == 0:
+            return 0.0
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+@dataclass
+class FixtureResponse:
+    """1画像分の固定の検出結果"""
+    face_details: list[FaceDetailTypeDef] = field(default_factory=list)
+    labels: list[LabelTypeDef] = field(default_factory=list)
+
+
+class RekognitionFixtures:
+    """
+    画像のハッシュ値（compute_image_hash）毎の固定の検出結果
+    JSONファイルから読み込む場合の形式：
+        {"<sha256>": {"FaceDetails": [...], "Labels": [...]}, "default": {"FaceDetails": [], "Labels": []}}
+    """
+
+    DEFAULT_KEY = "default"
+
+    def __init__(self, default: Optional[FixtureResponse] = None):
+        self._responses: dict[str, FixtureResponse] = {}
+        self._default = default if default is not None else FixtureResponse()
+
+    def add(
+        self,
+        image_bytes: bytes,
+        face_details: Optional[list[FaceDetailTypeDef]] = None,
+        labels: Optional[list[LabelTypeDef]] = None,
+    ):
+        self.add_hash(compute_image_hash(image_bytes), FixtureResponse(face_details or [], labels or []))
+
+    def add_hash(self, image_hash: str, response: FixtureResponse):
+        self._responses[image_hash] = response
+
+    def get(self, image_hash: str) -> FixtureResponse:
+        return self._responses.get(image_hash, self._default)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> RekognitionFixtures:
+        def to_response(item: dict) -> FixtureResponse:
+            return FixtureResponse(item.get("FaceDetails", []), item.get("Labels", []))
+
+        fixtures = cls(to_response(data[cls.DEFAULT_KEY]) if cls.DEFAULT_KEY in data else None)
+        for image_hash, item in data.items():
+            if image_hash != cls.DEFAULT_KEY:
+                fixtures.add_hash(image_hash, to_response(item))
+        return fixtures
+
+    @classmethod
+    def from_file(cls, path: str) -> RekognitionFixtures:
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+class _ServiceError(Exception):
+    def __init__(self, status: int, error_type: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+        self.message = message
+
+
+@dataclass(frozen=True)
+class ServerStats:
+    """サーバーが受け付けたリクエストの集計"""
+    requests: int
+    throttled: int
+    errors: int
+    requests_by_operation: dict[str, int]
+
+
+class LocalRekognitionServer:
+    """
+    DetectFaces / DetectLabelsだけに応答する、Rekognitionの代わりのHTTPサーバー
+    リクエスト毎にスレッドで処理するため、実際の並列度での試験ができる
+    port=0の場合は空いているポートを使う（endpoint_urlで確認できる）
+    """
+
+    def __init__(
+        self,
+        fixtures: Optional[RekognitionFixtures] = None,
+        latency: LatencyDistribution = LatencyDistribution(),
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        address: str = "127.0.0.1",
+        port: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if not (0 <= throttle_rate <= 1 and 0 <= error_rate <= 1 and throttle_rate + error_rate <= 1):
+            raise ValueError("throttle_rate and error_rate must be between 0 and 1 in total.")
+        self._fixtures = fixtures if fixtures is not None else RekognitionFixtures()
+        self._latency = latency
+        self._throttle_rate = throttle_rate
+        self._error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._address = address
+        self._port = port
+        self._sleep = sleep
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._throttled = 0
+        self._errors = 0
+        self._requests_by_operation: dict[str, int] = {}
+
+    @property
+    def endpoint_url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("Server is not started.")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> ServerStats:
+        with self._stats_lock:
+            return ServerStats(
+                requests=self._requests,
+                throttled=self._throttled,
+                errors=self._errors,
+                requests_by_operation=dict(self._requests_by_operation),
+            )
+
+    def _draw(self) -> tuple[float, float]:
+        """遅延と、エラーを注入するかを決める乱数を引く（シードを指定すれば再現できる）"""
+        with self._rng_lock:
+            return self._latency.sample(self._rng), self._rng.random()
+
+    def handle(self, target: str, body: bytes) -> dict:
+        """1リクエストを処理して応答のJSONを返す。エラーの場合は_ServiceErrorを送出する"""
+        operation = target[len(TARGET_PREFIX):] if target.startswith(TARGET_PREFIX) else target
+        latency_seconds, error_draw = self._draw()
+        with self._stats_lock:
+            self._requests += 1
+            self._requests_by_operation[operation] = self._requests_by_operation.get(operation, 0) + 1
+        if latency_seconds > 0:
+            self._sleep(latency_seconds)
+
+        if error_draw < self._throttle_rate:
+            with self._stats_lock:
+                self._throttled += 1
+            raise _ServiceError(400, "ThrottlingException", "Rate exceeded")
+        if error_draw < self._throttle_rate + self._error_rate:
+            with self._stats_lock:
+                self._errors += 1
+            raise _ServiceError(500, "InternalServerError", "Injected internal server error")
+
+        if operation not in ("DetectFaces", "DetectLabels"):
+            raise _ServiceError(400, "UnknownOperationException", f"Unsupported operation: {target}")
+        try:
+            request = json.loads(body)
+            image_bytes = base64.b64decode(request["Image"]["Bytes"], validate=True)
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise _ServiceError(400, "InvalidParameterException", "Request has invalid parameters")
+        if len(image_bytes) == 0:
+            raise _ServiceError(400, "InvalidImageFormatException", "Request has invalid image format")
+        if len(image_bytes) > MAX_IMAGE_BYTES:
+            raise _ServiceError(400, "ImageTooLargeException", "Image size is too large")
+
+        fixture = self._fixtures.get(compute_image_hash(image_bytes))
+        if operation == "DetectFaces":
+            return {"FaceDetails": fixture.face_details}
+
+        # 実際のDetectLabelsと同様に、MinConfidence未満のラベルを除き、MaxLabels件までに絞る
+        min_confidence = request.get("MinConfidence", 55)
+        max_labels = request.get("MaxLabels", 1000)
+        labels = [label for label in fixture.labels if label.get("Confidence", 100) >= min_confidence]
+        return {"Labels": labels[:max_labels], "LabelModelVersion": "3.0"}
+
+    def start(self) -> str:
+        """デーモンスレッドでサーバーを起動し、endpoint_urlを返す"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class RekognitionHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    status, response = 200, server.handle(self.headers.get("X-Amz-Target", ""), body)
+                    error_type = None
+                except _ServiceError as error:
+                    status, error_type = error.status, error.error_type
+                    response = {"__type": error.error_type, "message": error.message}
+                payload = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(payload)))
+                if error_type is not None:
+                    self.send_header("x-amzn-ErrorType", error_type)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self._address, self._port), RekognitionHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.endpoint_url
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> LocalRekognitionServer:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
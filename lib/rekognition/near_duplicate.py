@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from PIL import UnidentifiedImageError
+
+from lib.cache import LRUCache
+from lib.perceptual_hash import HASH_BITS, ImageFingerprint, MultiIndexHashTable, fingerprint_image_bytes
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+@dataclass(frozen=True)
+class _IndexedResult:
+    entry_id: int
+    fingerprint: ImageFingerprint
+    max_labels: int
+    min_confidence: int
+    result: DetectionResult
+
+
+class NearDuplicateRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    知覚ハッシュ（dHash）が近い画像の検出結果を再利用するデコレータ
+    縮小・再圧縮されただけの画像はバイト列のハッシュ値が一致せずCachedRekognitionClientWrapperでは拾えないため、
+    dHashのハミング距離がmax_distance以下で、縦横比が一致し、縮小画像の差がmax_thumbnail_difference以下の
+    画像の結果を返してRekognitionを呼ばない
+    - BoundingBoxは画像サイズに対する比率のため、縦横比が同じなら縮小後の画像にもそのまま対応する
+      （縦横比が変わる切り抜きや、連写のように少しずれた画像は別の画像として扱う。ずれた枠では顔のモザイクが漏れる）
+    - 単色に近い画像はdHashが0や全ビット1に偏って別の画像と一致しやすいため、対象外にする
+    - 検出結果はmax_results件まで保持し、LRUで破棄した結果のハッシュ値はインデックスからも削除する
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        index: Optional[MultiIndexHashTable] = None,
+        max_results: int = 10000,
+        max_distance: int = 4,
+        aspect_ratio_tolerance: float = 0.01,
+        max_thumbnail_difference: float = 1.5,
+        min_bits: int = 8,
+    ):
+        self._client = rekognition_client
+        self._index = index if index is not None else MultiIndexHashTable(max_distance)
+        self._results: LRUCache[int, _IndexedResult] = LRUCache(
+            max_entries=max_results, on_evict=lambda entry: self._index.remove(entry.entry_id)
+        )
+        self._max_distance = max_distance
+        self._aspect_ratio_tolerance = aspect_ratio_tolerance
+        self._max_thumbnail_difference = max_thumbnail_difference
+        self._min_bits = min_bits
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fingerprint(self, image_bytes: bytes) -> Optional[ImageFingerprint]:
+        """画像として読めない、または情報量の少ない画像の場合はNone"""
+        try:
+            fingerprint = fingerprint_image_bytes(image_bytes)
+        except (UnidentifiedImageError, OSError):
+            return None
+        if not self._min_bits <= fingerprint.hash_value.bit_count() <= HASH_BITS - self._min_bits:
+            return None
+        return fingerprint
+
+    def _is_near_duplicate(self, fingerprint: ImageFingerprint, indexed: ImageFingerprint) -> bool:
+        return (
+            abs(math.log(indexed.aspect_ratio / fingerprint.aspect_ratio)) <= self._aspect_ratio_tolerance
+            and fingerprint.thumbnail_difference(indexed) <= self._max_thumbnail_difference
+        )
+
+    def _find(
+        self,
+        fingerprint: Optional[ImageFingerprint],
+        max_labels: Optional[int] = None,
+        min_confidence: Optional[int] = None,
+    ) -> Optional[DetectionResult]:
+        """
+        近い画像の検出結果を返す。max_labels / min_confidenceがNoneの場合は猫検出のパラメータを問わない
+        （顔の検出結果はパラメータに依存しないため）
+        """
+        if fingerprint is not None:
+            for entry_id, _ in self._index.search(fingerprint.hash_value, self._max_distance):
+                entry = self._results.get(entry_id)
+                if (
+                    entry is not None
+                    and max_labels in (None, entry.max_labels)
+                    and min_confidence in (None, entry.min_confidence)
+                    and self._is_near_duplicate(fingerprint, entry.fingerprint)
+                ):
+                    with self._lock:
+                        self.hits += 1
+                    return entry.result
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        """近い画像の検出結果があればその顔を返す。片方の検出結果だけでは登録しない"""
+        result = self._find(self._fingerprint(image_bytes))
+        if result is not None:
+            return result.face_details
+        return self._client.detect_faces(image_bytes)
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        """近い画像の検出結果があればその猫を返す。片方の検出結果だけでは登録しない"""
+        result = self._find(self._fingerprint(image_bytes), max_labels, min_confidence)
+        if result is not None:
+            return result.detect_labels_res
+        return self._client.detect_cats(image_bytes, max_labels, min_confidence)
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        fingerprint = self._fingerprint(image_bytes)
+        result = self._find(fingerprint, max_labels, min_confidence)
+        if result is None:
+            result = self._client.detect_all(image_bytes, max_labels, min_confidence)
+            if fingerprint is not None and not result.faces_skipped:
+                entry_id = self._index.add(fingerprint.hash_value)
+                self._results.put(
+                    entry_id, _IndexedResult(entry_id, fingerprint, max_labels, min_confidence, result)
+                )
+        return result
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import io
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+from lib.orientation import apply_orientation, exif_orientation
+from lib.rekognition.utils import MAX_IMAGE_BYTES
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+# 再エンコードせずにそのままRekognitionへ送信できる形式
+_PASSTHROUGH_FORMATS = ("JPEG", "PNG")
+
+
+def preprocess_image_bytes(
+    image_bytes: bytes,
+    max_dimension: int = 1920,
+    quality: int = 85,
+    min_quality: int = 40,
+    max_bytes: int = MAX_IMAGE_BYTES,
+) -> bytes:
+    """
+    Rekognitionへ送信する前に画像を縮小・再エンコードする
+    - 長辺がmax_dimension以下、かつmax_bytes以下で、EXIFの回転情報の無いJPEG/PNGは変更せずに返す
+    - それ以外は長辺がmax_dimensionになるよう縮小し、EXIFの回転情報を適用して（lib.orientation）
+      JPEG（quality）で再エンコードする。max_bytesを超える場合はmin_qualityまで品質を下げて再エンコードする
+    送信する画像は常に正立した向きになるため、BoundingBoxは表示側で正立させた画像の座標と一致する
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    orientation = exif_orientation(image)
+    if (
+        image.format in _PASSTHROUGH_FORMATS
+        and orientation == 1
+        and max(image.size) <= max_dimension
+        and len(image_bytes) <= max_bytes
+    ):
+        return image_bytes
+
+    # JPEGの場合は縮小後のサイズに近い解像度でデコードし、デコード自体のコストを下げる
+    scale = min(1.0, max_dimension / max(image.size))
+    target_size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    image.draft("RGB", target_size)
+    image = image.convert("RGB")
+    if image.size != target_size:
+        image = image.resize(target_size, Image.Resampling.LANCZOS)
+    image = apply_orientation(image, orientation)
+
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= max_bytes or quality <= min_quality:
+            break
+        quality = max(min_quality, quality - 10)
+
+    return buffer.getvalue()
+
+
+class PreprocessingRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    画像を縮小・再エンコードしてからRekognitionへ送信するデコレータ
+    大きな写真でも5MBの上限で失敗せず、送信量とAPIの待ち時間を削減できる
+    検出結果のBoundingBoxは画像サイズに対する比率のため、元画像にそのまま適用できる
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        max_dimension: int = 1920,
+        quality: int = 85,
+    ):
+        self._client = rekognition_client
+        self._max_dimension = max_dimension
+        self._quality = quality
+
+    def preprocess(self, image_bytes: bytes) -> bytes:
+        if len(image_bytes) == 0:
+            raise ValueError("image_bytes must not be empty.")
+        return preprocess_image_bytes(image_bytes, self._max_dimension, self._quality)
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        return self._client.detect_faces(self.preprocess(image_bytes))
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        return self._client.detect_cats(
+            self.preprocess(image_bytes), max_labels, min_confidence
+        )
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        """縮小・再エンコードは1回だけ行い、両方の検出に使う"""
+        return self._client.detect_all(
+            self.preprocess(image_bytes), max_labels, min_confidence
+        )
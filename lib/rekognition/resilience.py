@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
+
+from lib.instrumentation import span
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition import RekognitionClient
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+T = TypeVar("T")
+
+# 時間をおいて再試行すれば成功する見込みのあるエラーコード
+RETRYABLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "LimitExceededException",
+    "InternalServerError",
+    "ServiceUnavailableException",
+})
+
+
+class RekognitionUnavailableError(RuntimeError):
+    """スロットリングや障害により、再試行してもRekognitionの呼び出しに成功しなかった場合のエラー"""
+
+
+class RekognitionCircuitOpenError(RekognitionUnavailableError):
+    """サーキットブレーカーが開いているため、Rekognitionを呼び出さずに失敗させた場合のエラー"""
+
+
+def create_rekognition_client(
+    region_name: str,
+    max_pool_connections: int = 32,
+    connect_timeout_seconds: float = 5,
+    read_timeout_seconds: float = 30,
+    endpoint_url: Optional[str] = None,
+) -> RekognitionClient:
+    """
+    コネクションプールの上限とタイムアウトを設定したRekognitionのクライアントを作る
+    再試行はResilientRekognitionClientWrapperで行うため、botocore側の再試行は無効にする
+    boto3の読み込みとクライアントの生成には時間がかかるため、最初に必要になった時に呼び出す
+    endpoint_urlを指定すると、LocalRekognitionServerなどRekognition以外のエンドポイントへ接続する
+    """
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "rekognition",
+        region_name,
+        endpoint_url=endpoint_url,
+        config=Config(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout_seconds,
+            read_timeout=read_timeout_seconds,
+            retries={"mode": "standard", "total_max_attempts": 1},
+        ),
+    )
+
+
+def is_retryable_error(error: Exception) -> bool:
+    from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError
+
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return isinstance(error, BotocoreConnectionError)
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ
+    1秒あたりrate_per_second個のトークンを最大capacity個まで貯め、呼び出し毎に1個消費する
+    複数のセッション・スレッドで1つのインスタンスを共有して、プロセス全体のリクエストレートを制限する
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be greater than 0.")
+        self._rate_per_second = rate_per_second
+        self._capacity = capacity if capacity is not None else rate_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self._capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """トークンを1個予約し、利用可能になるまでの待ち時間を返す"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate_per_second)
+            self._updated_at = now
+            # 残高を負にして予約することで、待っているスレッド同士が同じトークンを奪い合わない
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate_per_second
+
+    def acquire(self) -> float:
+        """トークンを1個取得する。待った秒数を返す"""
+        wait_seconds = self._reserve()
+        if wait_seconds > 0:
+            self._sleep(wait_seconds)
+        return wait_seconds
+
+
+class CircuitBreaker:
+    """
+    失敗がfailure_threshold回続くと開き、reset_timeout_seconds秒の間は呼び出しを即座に失敗させる
+    経過後は1回だけ試行を許可し（半開）、成功すれば閉じ、失敗すれば再び開く
+    試行の結果がRekognitionの状態を示さない場合（入力画像の不備など）はrelease_trial()で試行の権利だけを返す
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1.")
+        self._failure_threshold = failure_threshold
+        self._reset_timeout_seconds = reset_timeout_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self._reset_timeout_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self._reset_timeout_seconds:
+                # 半開状態では、試行中の1回の結果が出るまで他の呼び出しを通さない
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+
+    def release_trial(self):
+        """
+        Rekognitionの成否と関係なく終わった呼び出しを記録する。連続失敗の回数と開閉の状態は変えない
+        半開で試行中だった場合は、次の呼び出しが改めて試行できる状態（開いていて待ち時間が経過済み）に戻す
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+                self._opened_at = self._clock() - self._reset_timeout_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self._failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+@dataclass(frozen=True)
+class CallStats:
+    """Rekognitionの呼び出しにかかった時間の内訳"""
+    calls: int
+    attempts: int
+    retries: int
+    failures: int
+    rate_limit_wait_seconds: float
+    backoff_wait_seconds: float
+    call_seconds: float
+
+    @property
+    def wait_seconds(self) -> float:
+        return self.rate_limit_wait_seconds + self.backoff_wait_seconds
+
+
+class ResilientRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    スロットリングや一時的な障害に備えたデコレータ
+    - rate_limiterを指定した場合は、呼び出し前にトークンを取得する（インスタンスを共有すればプロセス全体で制限できる）
+    - 再試行可能なエラーは、最大max_attempts回までフルジッター付きの指数バックオフで再試行する
+    - 再試行可能なエラーが続いた場合はcircuit_breakerが開き、以降の呼び出しを待たずに失敗させる
+    - 待ち時間（レート制限・バックオフ）と呼び出し時間をstatsに集計する
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        rate_limiter: Optional[TokenBucket] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        max_attempts: int = 5,
+        base_delay_seconds: float = 0.1,
+        max_delay_seconds: float = 5.0,
+        sleep: Callable[[float], None] = time.sleep,
+        random_fraction: Callable[[], float] = random.random,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self._client = rekognition_client
+        self._rate_limiter = rate_limiter
+        self._circuit_breaker = circuit_breaker
+        self._max_attempts = max_attempts
+        self._base_delay_seconds = base_delay_seconds
+        self._max_delay_seconds = max_delay_seconds
+        self._sleep = sleep
+        self._random_fraction = random_fraction
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._attempts = 0
+        self._retries = 0
+        self._failures = 0
+        self._rate_limit_wait_seconds = 0.0
+        self._backoff_wait_seconds = 0.0
+        self._call_seconds = 0.0
+
+    @property
+    def stats(self) -> CallStats:
+        with self._lock:
+            return CallStats(
+                calls=self._calls,
+                attempts=self._attempts,
+                retries=self._retries,
+                failures=self._failures,
+                rate_limit_wait_seconds=self._rate_limit_wait_seconds,
+                backoff_wait_seconds=self._backoff_wait_seconds,
+                call_seconds=self._call_seconds,
+            )
+
+    def backoff_seconds(self, retry: int) -> float:
+        """retry回目（0始まり）の再試行前の待ち時間（フルジッター）"""
+        return self._random_fraction() * min(self._max_delay_seconds, self._base_delay_seconds * 2 ** retry)
+
+    def _call(self, operation: str, call: Callable[[], T]) -> T:
+        with self._lock:
+            self._calls += 1
+
+        for attempt in range(self._max_attempts):
+            if self._circuit_breaker is not None and not self._circuit_breaker.allow_request():
+                with self._lock:
+                    self._failures += 1
+                raise RekognitionCircuitOpenError(f"Rekognition circuit breaker is open ({operation}).")
+
+            if self._rate_limiter is not None:
+                with span("rekognition.wait", reason="rate_limit"):
+                    waited = self._rate_limiter.acquire()
+                with self._lock:
+                    self._rate_limit_wait_seconds += waited
+
+            start = time.perf_counter()
+            try:
+                result = call()
+            except Exception as error:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._attempts += 1
+                    self._call_seconds += elapsed
+                if not is_retryable_error(error):
+                    # 入力画像の不備などはRekognitionの障害でも回復でもないため、ブレーカーの状態は変えない
+                    if self._circuit_breaker is not None:
+                        self._circuit_breaker.release_trial()
+                    raise
+                if self._circuit_breaker is not None:
+                    self._circuit_breaker.record_failure()
+                if attempt == self._max_attempts - 1:
+                    with self._lock:
+                        self._failures += 1
+                    raise RekognitionUnavailableError(
+                        f"Rekognition {operation} failed after {self._max_attempts} attempts."
+                    ) from error
+
+                delay = self.backoff_seconds(attempt)
+                with span("rekognition.wait", reason="backoff"):
+                    self._sleep(delay)
+                with self._lock:
+                    self._retries += 1
+                    self._backoff_wait_seconds += delay
+                continue
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._attempts += 1
+                self._call_seconds += elapsed
+            if self._circuit_breaker is not None:
+                self._circuit_breaker.record_success()
+            return result
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        return self._call("detect_faces", lambda: self._client.detect_faces(image_bytes))
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        return self._call(
+            "detect_cats",
+            lambda: self._client.detect_cats(image_bytes, max_labels, min_confidence),
+        )
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional
+
+from lib.rekognition.utils import compute_image_hash, extract_cat_label
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+# 検出結果を保存するSQLiteファイルの既定のパス
+DEFAULT_RESULTS_DB_PATH = "nekognition_results.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    image_hash TEXT NOT NULL,
+    max_labels INTEGER NOT NULL,
+    min_confidence INTEGER NOT NULL,
+    detected_at REAL NOT NULL,
+    face_count INTEGER NOT NULL,
+    cat_count INTEGER NOT NULL,
+    face_details TEXT NOT NULL,
+    detect_labels_res TEXT NOT NULL,
+    faces_skipped INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (image_hash, max_labels, min_confidence)
+);
+CREATE INDEX IF NOT EXISTS images_detected_at ON images (detected_at);
+CREATE INDEX IF NOT EXISTS images_cat_count ON images (cat_count);
+
+CREATE TABLE IF NOT EXISTS cat_instances (
+    image_hash TEXT NOT NULL,
+    max_labels INTEGER NOT NULL,
+    min_confidence INTEGER NOT NULL,
+    instance_index INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    box_left REAL,
+    box_top REAL,
+    box_width REAL,
+    box_height REAL,
+    PRIMARY KEY (image_hash, max_labels, min_confidence, instance_index),
+    FOREIGN KEY (image_hash, max_labels, min_confidence)
+        REFERENCES images (image_hash, max_labels, min_confidence) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS cat_instances_confidence ON cat_instances (confidence, image_hash);
+
+CREATE TABLE IF NOT EXISTS faces (
+    image_hash TEXT NOT NULL,
+    max_labels INTEGER NOT NULL,
+    min_confidence INTEGER NOT NULL,
+    face_index INTEGER NOT NULL,
+    confidence REAL,
+    box_left REAL,
+    box_top REAL,
+    box_width REAL,
+    box_height REAL,
+    PRIMARY KEY (image_hash, max_labels, min_confidence, face_index),
+    FOREIGN KEY (image_hash, max_labels, min_confidence)
+        REFERENCES images (image_hash, max_labels, min_confidence) ON DELETE CASCADE
+);
+"""
+
+
+@dataclass(frozen=True)
+class StoredImageSummary:
+    """保存済みの検出結果の概要（検索結果の1件）"""
+    image_hash: str
+    detected_at: float
+    face_count: int
+    cat_count: int
+    # 検索条件の信頼度以上で検出された猫の数（条件を指定しない検索ではcat_countと同じ）
+    matched_cat_count: int
+    # 猫が検出されず顔検出を省略した結果（face_countは0だが、顔が写っていないことを意味しない）
+    faces_skipped: bool = False
+
+
+def _box_values(item: dict) -> tuple[Optional[float], ...]:
+    box = item.get("BoundingBox", {})
+    return box.get("Left"), box.get("Top"), box.get("Width"), box.get("Height")
+
+
+class DetectionResultsStore:
+    """
+    Rekognitionの検出結果をSQLiteに保存し、画像のハッシュ値や猫の数・信頼度で検索できるようにする
+    - images：画像毎の検出結果（レスポンス全体のJSONと、顔・猫の数）
+    - cat_instances / faces：インスタンス毎の信頼度とBoundingBox
+    顔検出を省略した結果はfaces_skippedを立てて保存し、顔は保存しない（ローカルの検出器の判定だけの結果は保存しない）
+    接続は最初に使う時に開く
+    """
+
+    def __init__(self, db_path: str, clock: Callable[[], float] = time.time):
+        self._db_path = db_path
+        self._clock = clock
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")
+            with conn:
+                conn.executescript(_SCHEMA)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+                if "faces_skipped" not in columns:
+                    # faces_skippedを追加する前に作成したファイル
+                    conn.execute("ALTER TABLE images ADD COLUMN faces_skipped INTEGER NOT NULL DEFAULT 0")
+            self._conn = conn
+        return self._conn
+
+    def save(
+        self,
+        image_hash: str,
+        result: DetectionResult,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+        detected_at: Optional[float] = None,
+    ):
+        """検出結果を保存する。同じ画像・パラメータの結果が既にある場合は置き換える"""
+        if result.cats_skipped:
+            raise ValueError("A result whose cat detection was skipped cannot be saved.")
+        key = (image_hash, max_labels, min_confidence)
+        cat_label = extract_cat_label(result.detect_labels_res)
+        cat_instances = cat_label.get("Instances", []) if cat_label is not None else []
+        detected_at = detected_at if detected_at is not None else self._clock()
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # 子テーブルの行はON DELETE CASCADEで削除される
+                conn.execute(
+                    "DELETE FROM images WHERE image_hash = ? AND max_labels = ? AND min_confidence = ?", key
+                )
+                conn.execute(
+                    "INSERT INTO images (image_hash, max_labels, min_confidence, detected_at,"
+                    " face_count, cat_count, face_details, detect_labels_res, faces_skipped)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        *key,
+                        detected_at,
+                        len(result.face_details),
+                        len(cat_instances),
+                        json.dumps(result.face_details, default=str),
+                        json.dumps(result.detect_labels_res, default=str),
+                        int(result.faces_skipped),
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO cat_instances (image_hash, max_labels, min_confidence, instance_index,"
+                    " confidence, box_left, box_top, box_width, box_height)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, index, instance.get("Confidence", 0.0), *_box_values(instance))
+                        for index, instance in enumerate(cat_instances)
+                    ],
+                )
+                conn.executemany(
+                    "INSERT INTO faces (image_hash, max_labels, min_confidence, face_index,"
+                    " confidence, box_left, box_top, box_width, box_height)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, index, face.get("Confidence"), *_box_values(face))
+                        for index, face in enumerate(result.face_details)
+                    ],
+                )
+
+    def get(
+        self, image_hash: str, max_labels: int = 10, min_confidence: int = 75
+    ) -> Optional[DetectionResult]:
+        """保存済みの検出結果を返す。無い場合はNone"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT face_details, detect_labels_res, faces_skipped FROM images"
+                " WHERE image_hash = ? AND max_labels = ? AND min_confidence = ?",
+                (image_hash, max_labels, min_confidence),
+            ).fetchone()
+        if row is None:
+            return None
+        return DetectionResult(json.loads(row[0]), json.loads(row[1]), faces_skipped=bool(row[2]))
+
+    def find_images(
+        self,
+        min_cats: int = 0,
+        min_cat_confidence: Optional[float] = None,
+        min_faces: int = 0,
+        since: Optional[float] = None,
+        limit: int = 100,
+    ) -> list[StoredImageSummary]:
+        """
+        条件に合う画像を新しい順に返す
+        min_cat_confidenceを指定した場合は、その信頼度以上の猫がmin_cats匹（最低1匹）以上写っている画像を返す
+        例：信頼度90%以上の猫が3匹以上写っている画像 -> find_images(min_cats=3, min_cat_confidence=90)
+        """
+        # 猫の総数がmin_cats未満の画像は、信頼度を見るまでもなく除外できる（cat_countのインデックスで絞り込む）
+        conditions = ["images.cat_count >= ?", "images.face_count >= ?"]
+        params: list = [min_cats, min_faces]
+        if since is not None:
+            conditions.append("images.detected_at >= ?")
+            params.append(since)
+
+        if min_cat_confidence is None:
+            query = (
+                "SELECT image_hash, detected_at, face_count, cat_count, cat_count, faces_skipped FROM images"
+                f" WHERE {' AND '.join(conditions)}"
+                " ORDER BY detected_at DESC LIMIT ?"
+            )
+        else:
+            query = (
+                "SELECT images.image_hash, images.detected_at, images.face_count, images.cat_count,"
+                " COUNT(cat_instances.instance_index) AS matched, images.faces_skipped"
+                " FROM images JOIN cat_instances"
+                " ON cat_instances.image_hash = images.image_hash"
+                " AND cat_instances.max_labels = images.max_labels"
+                " AND cat_instances.min_confidence = images.min_confidence"
+                " AND cat_instances.confidence >= ?"
+                f" WHERE {' AND '.join(conditions)}"
+                " GROUP BY images.image_hash, images.max_labels, images.min_confidence"
+                " HAVING matched >= ?"
+                " ORDER BY images.detected_at DESC LIMIT ?"
+            )
+            params = [min_cat_confidence, *params, max(min_cats, 1)]
+        params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+        return [StoredImageSummary(*row[:5], faces_skipped=bool(row[5])) for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class PersistentRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    検出結果をDetectionResultsStoreに保存し、保存済みの画像はRekognitionを呼ばずにストアから返すデコレータ
+    セッションやプロセスをまたいで、モザイクの粗さや枠線の色を変えた再描画にRekognitionの料金がかからない
+    """
+
+    def __init__(self, rekognition_client: IRekognitionClientWrapper, store: DetectionResultsStore):
+        self._client = rekognition_client
+        self._store = store
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        """保存済みならストアから返す（顔検出を省略した結果は除く）。片方の検出結果だけでは保存しない"""
+        result = self._store.get(compute_image_hash(image_bytes))
+        if result is not None and not result.faces_skipped:
+            return result.face_details
+        return self._client.detect_faces(image_bytes)
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        """保存済みならストアから返す。片方の検出結果だけでは保存しない"""
+        result = self._store.get(compute_image_hash(image_bytes), max_labels, min_confidence)
+        if result is not None:
+            return result.detect_labels_res
+        return self._client.detect_cats(image_bytes, max_labels, min_confidence)
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        image_hash = compute_image_hash(image_bytes)
+        result = self._store.get(image_hash, max_labels, min_confidence)
+        if result is None:
+            result = self._client.detect_all(image_bytes, max_labels, min_confidence)
+            if not result.cats_skipped:
+                self._store.save(image_hash, result, max_labels, min_confidence)
+        return result
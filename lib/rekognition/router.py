@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from lib.rekognition.utils import extract_cat_label
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+# 顔検出と猫検出を常に並行して呼ぶ（顔検出を省略しない）
+PARALLEL = "parallel"
+# 猫検出を先に呼び、猫が検出された画像だけ顔検出を呼ぶ
+CATS_FIRST = "cats-first"
+# ローカルの検出器で猫を確認し、猫が見つかった画像だけRekognitionの顔検出と猫検出を並行して呼ぶ
+LOCAL_CATS_FIRST = "local-cats-first"
+ROUTING_POLICIES = (PARALLEL, CATS_FIRST, LOCAL_CATS_FIRST)
+
+
+def has_cat(detect_labels_res: DetectLabelsResponseTypeDef) -> bool:
+    """猫のインスタンスが1件以上あるか（BoundingBoxの有無は問わない。アプリの「猫が検出されなかった」と同じ基準）"""
+    cat_label = extract_cat_label(detect_labels_res)
+    return cat_label is not None and len(cat_label.get("Instances", [])) > 0
+
+
+@dataclass
+class RoutingStats:
+    images: int = 0
+    # 猫が検出されず、顔検出を省略した画像の数
+    rejected: int = 0
+    face_calls: int = 0
+    cat_calls: int = 0
+    local_calls: int = 0
+
+    @property
+    def calls_per_image(self) -> float:
+        """1画像あたりのRekognitionの呼び出し回数（ローカルの検出器は含まない）"""
+        return (self.face_calls + self.cat_calls) / self.images if self.images else 0.0
+
+
+class RoutingRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    detect_allで、猫が写っていない画像の顔検出を省略するデコレータ
+    猫が写っていない画像は投稿させないため、顔検出（モザイクの範囲）は不要になる
+    - policy：PARALLEL / CATS_FIRST / LOCAL_CATS_FIRST（ROUTING_POLICIES）
+      CATS_FIRSTは猫のいない画像の呼び出しが1回になる代わりに、猫のいる画像は2回の呼び出しの合計時間がかかる
+    - 顔検出を省略した結果はfaces_skipped=Trueとなり、.facesを参照するとFaceDetectionSkippedErrorになる
+      （顔にモザイクをかけずに描画しないため）。キャッシュ・保存は猫検出の結果だけを保持し、顔の結果は保持しない
+    - LOCAL_CATS_FIRSTでローカルの検出器が猫を見つけなかった場合は猫検出も省略し、cats_skipped=Trueとなる
+      （detect_labels_resはRekognitionの結果ではないため、キャッシュ・保存しない）
+    - detect_faces / detect_catsは常にラップ対象に委譲する
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        policy: str = CATS_FIRST,
+        local_detector: Optional[IRekognitionClientWrapper] = None,
+    ):
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(ROUTING_POLICIES)}.")
+        if policy == LOCAL_CATS_FIRST and local_detector is None:
+            from lib.rekognition.local_detector import OpenCVRekognitionClientWrapper
+
+            local_detector = OpenCVRekognitionClientWrapper()
+        self._client = rekognition_client
+        self._policy = policy
+        self._local_detector = local_detector
+        self._lock = threading.Lock()
+        self.stats = RoutingStats()
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    def _count(self, **counts: int):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + count)
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        self._count(face_calls=1)
+        return self._client.detect_faces(image_bytes)
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        self._count(cat_calls=1)
+        return self._client.detect_cats(image_bytes, max_labels, min_confidence)
+
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        self._count(images=1)
+        if self._policy == CATS_FIRST:
+            detect_labels_res = self.detect_cats(image_bytes, max_labels, min_confidence)
+            if not has_cat(detect_labels_res):
+                self._count(rejected=1)
+                return DetectionResult([], detect_labels_res, faces_skipped=True)
+            return DetectionResult(self.detect_faces(image_bytes), detect_labels_res)
+
+        if self._policy == LOCAL_CATS_FIRST:
+            self._count(local_calls=1)
+            local_labels_res = self._local_detector.detect_cats(image_bytes, max_labels, min_confidence)
+            if not has_cat(local_labels_res):
+                self._count(rejected=1)
+                return DetectionResult([], {"Labels": []}, faces_skipped=True, cats_skipped=True)
+
+        self._count(face_calls=1, cat_calls=1)
+        return self._client.detect_all(image_bytes, max_labels, min_confidence)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Optional
+
+from lib.rekognition.utils import validate_image_bytes
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+class StubRekognitionClientWrapper(IRekognitionClientWrapper):
+    """
+    Rekognitionへ接続せず、固定の検出結果を返すスタブ
+    ネットワークの遅延を模擬するため、呼び出し毎に指定秒数だけ待機できる
+    """
+
+    def __init__(
+        self,
+        face_details: Optional[list[FaceDetailTypeDef]] = None,
+        detect_labels_res: Optional[DetectLabelsResponseTypeDef] = None,
+        detect_faces_latency_seconds: float = 0.0,
+        detect_cats_latency_seconds: float = 0.0,
+    ):
+        self._face_details = face_details if face_details is not None else []
+        self._detect_labels_res = detect_labels_res if detect_labels_res is not None else {"Labels": []}
+        self._detect_faces_latency_seconds = detect_faces_latency_seconds
+        self._detect_cats_latency_seconds = detect_cats_latency_seconds
+
+    def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
+        validate_image_bytes(image_bytes)
+        time.sleep(self._detect_faces_latency_seconds)
+        return self._face_details
+
+    def detect_cats(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectLabelsResponseTypeDef:
+        validate_image_bytes(image_bytes)
+        time.sleep(self._detect_cats_latency_seconds)
+        return self._detect_labels_res
@@ -1,21 +1,14 @@
-from typing import Optional
+from __future__ import annotations
 
-from mypy_boto3_rekognition.type_defs import (
-    BoundingBoxTypeDef,
-    DetectLabelsResponseTypeDef,
-    InstanceTypeDef,
-    LabelTypeDef
-)
+import hashlib
+from typing import TYPE_CHECKING, Optional
 
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition.type_defs import DetectLabelsResponseTypeDef, LabelTypeDef
 
-def extract_bounding_boxes_from_instance(instance: InstanceTypeDef) -> list[BoundingBoxTypeDef]:
-    """
-    LabelTypeDefからBoundingBoxを抽出してリストで返す
-    """
-    bounding_boxes: list[BoundingBoxTypeDef] = []
-    if "BoundingBox" in instance:
-        bounding_boxes.append(instance["BoundingBox"])
-    return bounding_boxes
+
+# Rekognitionに画像バイトとして送信できるサイズの上限
+MAX_IMAGE_BYTES = 5242880
 
 
 def validate_image_bytes(image_bytes: bytes):
@@ -24,13 +17,21 @@ def validate_image_bytes(image_bytes: bytes):
     https://docs.aws.amazon.com/rekognition/latest/APIReference/API_Image.html#API_Image_Contents
     """
     min_bytes = 1
-    max_bytes = 5242880
+    max_bytes = MAX_IMAGE_BYTES
     if not (min_bytes <= len(image_bytes) <= max_bytes):
         raise ValueError(
             "image_bytes must be between 1 and 5242880 bytes."
         )
 
 
+def compute_image_hash(image_bytes: bytes) -> str:
+    """
+    画像バイトの内容からSHA-256のハッシュ値（16進文字列）を計算して返す
+    ファイル名に依存せず、同一画像を識別するためのキーとして使う
+    """
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
 def extract_cat_label(detect_labels_res: DetectLabelsResponseTypeDef) -> Optional[LabelTypeDef]:
     """
     DetectLabelsResponseTypeDefから"Name"が"Cat"のラベルを抽出して返し、該当するラベルが無ければNone
@@ -40,13 +41,3 @@ def extract_cat_label(detect_labels_res: DetectLabelsResponseTypeDef) -> Optiona
             return label
     return None
 
-
-def get_cat_instance_name_and_confidence(index: int, instance: InstanceTypeDef) -> tuple[str, str]:
-    """
-    Catインスタンスの連番名（Cat-1, Cat-2, ...）と信頼度文字列をタプルで返す
-    インスタンスに信頼度情報がなかった場合は、"no confidence"を返す
-    """
-    instance_name = f"Cat-{index+1}"
-    instance_confidence = f"{instance['Confidence']:.2f}%" if "Confidence" in instance else "no confidence"
-
-    return instance_name, instance_confidence
@@ -1,12 +1,49 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from mypy_boto3_rekognition import RekognitionClient
-from mypy_boto3_rekognition.type_defs import (
-    DetectLabelsResponseTypeDef,
-    FaceDetailTypeDef,
-)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from typing import TYPE_CHECKING
 
+from lib.instrumentation import span
+from lib.rekognition.detections import Detections
 from lib.rekognition.utils import validate_image_bytes
 
+if TYPE_CHECKING:
+    from mypy_boto3_rekognition import RekognitionClient
+    from mypy_boto3_rekognition.type_defs import (
+        DetectLabelsResponseTypeDef,
+        FaceDetailTypeDef,
+    )
+
+
+class FaceDetectionSkippedError(Exception):
+    """顔検出を省略した検出結果から、顔の検出結果を取り出そうとした場合のエラー"""
+
+
+@dataclass(frozen=True)
+class DetectionResult:
+    """顔検出と猫検出の結果をまとめたもの"""
+    face_details: list[FaceDetailTypeDef]
+    detect_labels_res: DetectLabelsResponseTypeDef
+    # 猫が検出されず顔検出を省略した場合はTrue。face_detailsは空だが、顔が写っていないことを意味しない
+    faces_skipped: bool = False
+    # ローカルの検出器の判定で猫検出も省略した場合はTrue。detect_labels_resは空で、Rekognitionの結果ではない
+    cats_skipped: bool = False
+
+    # 正規化した検出結果は最初に参照した時に作り、同じ結果オブジェクトを使う間は作り直さない
+    @cached_property
+    def faces(self) -> Detections:
+        """顔検出を省略した結果の場合は、モザイクをかけずに描画しないようFaceDetectionSkippedErrorとする"""
+        if self.faces_skipped:
+            raise FaceDetectionSkippedError("Face detection was skipped because no cat was detected.")
+        return Detections.from_face_details(self.face_details)
+
+    @cached_property
+    def cats(self) -> Detections:
+        return Detections.from_detect_labels_res(self.detect_labels_res)
+
 
 class IRekognitionClientWrapper(ABC):
     @abstractmethod
@@ -19,6 +56,21 @@ class IRekognitionClientWrapper(ABC):
     ) -> DetectLabelsResponseTypeDef:
         pass
 
+    def detect_all(
+        self,
+        image_bytes: bytes,
+        max_labels: int = 10,
+        min_confidence: int = 75,
+    ) -> DetectionResult:
+        """
+        顔検出と猫検出のリクエストを並行して送信し、両方の結果をまとめて返す
+        所要時間は2回のリクエストの合計ではなく、遅い方のリクエストの時間になる
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            faces_future = executor.submit(self.detect_faces, image_bytes)
+            detect_labels_res = self.detect_cats(image_bytes, max_labels, min_confidence)
+            return DetectionResult(faces_future.result(), detect_labels_res)
+
 
 class RekognitionClientWrapper(IRekognitionClientWrapper):
     def __init__(self, rekognition_client: RekognitionClient):
@@ -27,9 +79,10 @@ class RekognitionClientWrapper(IRekognitionClientWrapper):
     def detect_faces(self, image_bytes: bytes) -> list[FaceDetailTypeDef]:
         validate_image_bytes(image_bytes)
 
-        response = self._client.detect_faces(
-            Attributes=["DEFAULT"], Image={"Bytes": image_bytes}
-        )
+        with span("rekognition.detect_faces"):
+            response = self._client.detect_faces(
+                Attributes=["DEFAULT"], Image={"Bytes": image_bytes}
+            )
         return response["FaceDetails"]
 
     def detect_cats(
@@ -40,14 +93,15 @@ class RekognitionClientWrapper(IRekognitionClientWrapper):
     ) -> DetectLabelsResponseTypeDef:
         validate_image_bytes(image_bytes)
 
-        return self._client.detect_labels(
-            Image={"Bytes": image_bytes},
-            MaxLabels=max_labels,
-            MinConfidence=min_confidence,
-            Features=["GENERAL_LABELS"],
-            Settings={
-                "GeneralLabels": {
-                    "LabelInclusionFilters": ["Cat"]  # 物体へのラベル付けは猫に限定する
-                }
-            },
-        )
+        with span("rekognition.detect_cats"):
+            return self._client.detect_labels(
+                Image={"Bytes": image_bytes},
+                MaxLabels=max_labels,
+                MinConfidence=min_confidence,
+                Features=["GENERAL_LABELS"],
+                Settings={
+                    "GeneralLabels": {
+                        "LabelInclusionFilters": ["Cat"]  # 物体へのラベル付けは猫に限定する
+                    }
+                },
+            )
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Hashable
+
+from PIL import Image
+
+from lib.boundary_draw.drawer import DrawResult
+from lib.cache import LRUCache
+from lib.output_encoder import EncodedImage
+from lib.rekognition.detections import (
+    CatDetectionsLike,
+    FaceDetectionsLike,
+    as_cat_detections,
+    as_face_detections,
+)
+
+
+def face_details_key(face_details: FaceDetectionsLike) -> bytes:
+    """顔検出結果のうち、モザイク処理に影響するBoundingBoxだけをキャッシュキーにする"""
+    faces = as_face_detections(face_details)
+    return faces.boxes[faces.has_box].tobytes()
+
+
+def detect_labels_key(detect_labels_res: CatDetectionsLike) -> bytes:
+    """猫検出結果のうち、枠線の描画に影響する値（BoundingBoxと信頼度）だけをキャッシュキーにする"""
+    return as_cat_detections(detect_labels_res).key
+
+
+def image_nbytes(image: Image.Image) -> int:
+    """画像メモリのサイズの見積もり（PILは1バンドの画像以外は1画素4バイトで保持する）"""
+    return image.width * image.height * (1 if image.mode in ("1", "L", "P") else 4)
+
+
+def draw_result_nbytes(rendered: DrawResult) -> int:
+    """描画結果のメモリのサイズの見積もり。Figureは表示する画像の配列と、描画済みのキャンバスの合計"""
+    if isinstance(rendered, Image.Image):
+        return image_nbytes(rendered)
+    figure, axes = rendered
+    width, height = figure.canvas.get_width_height()
+    return width * height * 4 + sum(image.get_array().nbytes for image in axes.get_images())
+
+
+def close_draw_result(rendered: DrawResult):
+    """破棄した描画結果のFigureを閉じ、pyplotのFigureの管理から外す"""
+    if not isinstance(rendered, Image.Image):
+        import matplotlib.pyplot as plt
+
+        plt.close(rendered[0])
+
+
+class RenderCache:
+    """
+    画像処理結果のキャッシュ
+    - base_images: モザイク適用済みの画像。キーは (画像ハッシュ, 顔のBoundingBox, mosaic_size)
+    - rendered: 枠線まで描画した結果。キーは ベース画像のキー + 猫の検出結果 + ハイライト状態 + 色
+    - encoded: 描画結果をOutputEncoderでエンコードした結果（サムネイルと全体）。
+      キーは 描画結果のキー + エンコードの設定 + 種類。再実行のたびにエンコードし直さない
+    いずれも件数とメモリのサイズの上限付きのLRUで破棄する（24MPの画像1枚で約100MBのため、件数だけでは抑えられない）
+    破棄したmatplotlibのFigureは閉じる
+    """
+
+    def __init__(
+        self,
+        max_base_images: int = 8,
+        max_rendered: int = 32,
+        max_base_image_bytes: int = 256 * 1024 * 1024,
+        max_rendered_bytes: int = 512 * 1024 * 1024,
+        max_encoded: int = 64,
+        max_encoded_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.base_images: LRUCache[Hashable, Image.Image] = LRUCache(
+            max_base_images, max_bytes=max_base_image_bytes, size_of=image_nbytes
+        )
+        self.rendered: LRUCache[Hashable, DrawResult] = LRUCache(
+            max_rendered, max_bytes=max_rendered_bytes, size_of=draw_result_nbytes, on_evict=close_draw_result
+        )
+        self.encoded: LRUCache[Hashable, EncodedImage] = LRUCache(
+            max_encoded, max_bytes=max_encoded_bytes, size_of=lambda encoded: encoded.nbytes
+        )
@@ -0,0 +1,33 @@
+import math
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    値のリストからq（0〜100）パーセンタイルを線形補間で計算して返す
+    空のリストの場合は0.0を返す
+    """
+    if not 0 <= q <= 100:
+        raise ValueError("q must be between 0 and 100.")
+    if len(values) == 0:
+        return 0.0
+
+    sorted_values = sorted(values)
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize_durations(durations: list[float]) -> dict[str, float]:
+    """処理時間（秒）のリストから件数・平均・p50・p95・最大値を集計する"""
+    if len(durations) == 0:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(durations),
+        "mean": sum(durations) / len(durations),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "max": max(durations),
+    }
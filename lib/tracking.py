@@ -0,0 +1,107 @@
+"""
+キーフレーム間の検出結果の補間（IoUによるBoundingBoxの対応付け）
+
+動画の全フレームでRekognitionを呼ぶ代わりに、キーフレームだけで検出し、その間のフレームの枠は
+前後のキーフレームで対応付けた枠を線形補間して求める
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from lib.rekognition.detections import Detections
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    (N, 4)と(M, 4)の(Left, Top, Width, Height)の配列から、全ての組み合わせのIoUを(N, M)の配列で返す
+    NaNを含む枠（BoundingBoxの無いインスタンス）のIoUは0
+    """
+    a = np.nan_to_num(boxes_a, nan=0.0)[:, None, :]
+    b = np.nan_to_num(boxes_b, nan=0.0)[None, :, :]
+    inter_width = np.clip(
+        np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None
+    )
+    inter_height = np.clip(
+        np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None
+    )
+    intersection = inter_width * inter_height
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, intersection / union, 0.0)
+
+
+def match_scores(scores: np.ndarray, min_score: float) -> list[tuple[int, int]]:
+    """(N, M)の類似度が大きい組から貪欲に1対1で対応付け、類似度がmin_score以上の組(行, 列)を返す"""
+    pairs = []
+    used_rows: set[int] = set()
+    used_columns: set[int] = set()
+    for flat_index in np.argsort(-scores, axis=None, kind="stable").tolist():
+        row, column = divmod(flat_index, scores.shape[1])
+        if scores[row, column] < min_score:
+            break
+        if row in used_rows or column in used_columns:
+            continue
+        used_rows.add(row)
+        used_columns.add(column)
+        pairs.append((row, column))
+    return sorted(pairs)
+
+
+def match_boxes(boxes_a: np.ndarray, boxes_b: np.ndarray, min_iou: float = 0.3) -> list[tuple[int, int]]:
+    """IoUが大きい組から貪欲に1対1で対応付け、IoUがmin_iou以上の組(aの添字, bの添字)を返す"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return []
+    return match_scores(iou_matrix(boxes_a, boxes_b), min_iou)
+
+
+def _expand(boxes: np.ndarray, margin: float) -> np.ndarray:
+    """枠を中心はそのままに、幅・高さのmargin倍ずつ上下左右に広げる"""
+    if margin == 0 or len(boxes) == 0:
+        return boxes
+    expanded = boxes.copy()
+    expanded[:, 0] -= boxes[:, 2] * margin
+    expanded[:, 1] -= boxes[:, 3] * margin
+    expanded[:, 2] += boxes[:, 2] * margin * 2
+    expanded[:, 3] += boxes[:, 3] * margin * 2
+    return expanded
+
+
+def interpolate_detections(
+    start: Detections,
+    end: Detections,
+    t: float,
+    min_iou: float = 0.3,
+    keep_unmatched: bool = True,
+    margin: float = 0.0,
+    name_prefix: str = "Cat",
+) -> Detections:
+    """
+    キーフレームstart（t=0）とend（t=1）の間の、位置tのフレームの検出結果を返す
+    - 対応付けられた枠は、位置と大きさを線形補間する
+    - 対応付けられなかった枠は、keep_unmatched=Trueなら区間全体で残す（顔のモザイクの漏れを防ぐ）。
+      Falseなら近い方のキーフレームの枠だけを残す
+    - marginを指定すると、補間した枠を広げて動きによるずれを吸収する
+    """
+    if t <= 0:
+        return start
+    if t >= 1:
+        return end
+
+    pairs = match_boxes(start.boxes, end.boxes, min_iou)
+    matched_start = {index_a for index_a, _ in pairs}
+    matched_end = {index_b for _, index_b in pairs}
+
+    boxes = [start.boxes[index_a] * (1 - t) + end.boxes[index_b] * t for index_a, index_b in pairs]
+    confidences = [
+        start.confidences[index_a] * (1 - t) + end.confidences[index_b] * t for index_a, index_b in pairs
+    ]
+    if keep_unmatched or t < 0.5:
+        unmatched_start = [index for index in range(len(start)) if index not in matched_start]
+        boxes.extend(start.boxes[index] for index in unmatched_start)
+        confidences.extend(start.confidences[index] for index in unmatched_start)
+    if keep_unmatched or t >= 0.5:
+        unmatched_end = [index for index in range(len(end)) if index not in matched_end]
+        boxes.extend(end.boxes[index] for index in unmatched_end)
+        confidences.extend(end.confidences[index] for index in unmatched_end)
+
+    return Detections(_expand(np.array(boxes).reshape(-1, 4), margin), confidences, name_prefix)
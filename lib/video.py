@@ -0,0 +1,366 @@
+"""
+動画・アニメーション画像（GIF / アニメーションWebP / APNG）の処理
+
+全フレームでRekognitionを呼ぶと遅く料金もかかるため、keyframe_interval毎のキーフレームだけで検出し、
+間のフレームの顔・猫の枠はIoUで対応付けて補間する（lib.tracking）
+フレームは1枚ずつ読み込み・書き出し、メモリに保持するのはキーフレーム間のフレームだけにする
+
+    with open("out.gif", "wb") as fp:
+        report = processor.process(AnimatedImageFrameSource(image_bytes), GIFFrameSink(fp))
+    print(report.frames_per_second)
+
+動画ファイル（mp4など）は、ffmpegがインストールされている場合にFFmpegFrameSource / FFmpegFrameSinkで扱える
+"""
+from __future__ import annotations
+
+import collections
+import io
+import json
+import shutil
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+from PIL import GifImagePlugin, Image, ImageSequence
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import IFaceMosaicDrawer
+from lib.instrumentation import span
+from lib.rekognition.detections import Detections
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+from lib.tracking import interpolate_detections
+
+# フレームに表示時間の情報が無い場合の表示時間（ミリ秒）
+DEFAULT_FRAME_DURATION_MS = 100
+
+# アプリで処理するアニメーション画像のフレーム数の上限と、処理結果（GIF）のサイズの上限
+ANIMATION_MAX_FRAMES = 300
+ANIMATION_MAX_OUTPUT_BYTES = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class VideoFrame:
+    index: int
+    image: Image.Image
+    duration_ms: int = DEFAULT_FRAME_DURATION_MS
+
+
+def is_animated_image(image_bytes: bytes) -> bool:
+    """複数のフレームを持つ画像（アニメーションGIFなど）かどうかを、デコードせずに判定する"""
+    try:
+        return getattr(Image.open(io.BytesIO(image_bytes)), "n_frames", 1) > 1
+    except Exception:
+        return False
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+class IFrameSource(ABC):
+    """フレームを先頭から順に1枚ずつ返す入力"""
+
+    @property
+    @abstractmethod
+    def size(self) -> tuple[int, int]:
+        pass
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[VideoFrame]:
+        pass
+
+
+class IFrameSink(ABC):
+    """処理済みのフレームを1枚ずつ受け取る出力"""
+
+    @abstractmethod
+    def write(self, frame: VideoFrame):
+        pass
+
+    def close(self):
+        pass
+
+
+class AnimatedImageFrameSource(IFrameSource):
+    """PillowでデコードできるアニメーションGIF / アニメーションWebP / APNGのフレームを1枚ずつ返す"""
+
+    def __init__(self, image_bytes: bytes):
+        self._image_bytes = image_bytes
+        self._image = Image.open(io.BytesIO(image_bytes))
+        self._size = self._image.size
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    @property
+    def frame_count(self) -> int:
+        """フレーム数（フレームのヘッダーを読むだけで、画素はデコードしない）"""
+        return getattr(self._image, "n_frames", 1)
+
+    def __iter__(self) -> Iterator[VideoFrame]:
+        image = Image.open(io.BytesIO(self._image_bytes))
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            duration_ms = frame.info.get("duration") or DEFAULT_FRAME_DURATION_MS
+            # 次のフレームへ進むと内容が変わるため、RGBに変換したコピーを渡す
+            yield VideoFrame(index, frame.convert("RGB"), int(duration_ms))
+
+
+class GIFFrameSink(IFrameSink):
+    """
+    フレームを1枚ずつアニメーションGIFとしてfpへ書き出す
+    PillowのGIFの保存（save_all）は全フレームをメモリに保持するため使わず、フレーム毎に減色して書き出す
+    各フレームは独自のパレット（ローカルカラーテーブル）を持つ
+    減色には高速なオクツリー法を使う（既定のメディアンカット法はフレーム毎の処理時間の大半を占めるため）
+    """
+
+    def __init__(self, fp: BinaryIO, loop: int = 0):
+        self._fp = fp
+        self._loop = loop
+        self._header_written = False
+
+    def write(self, frame: VideoFrame):
+        paletted = frame.image.convert("RGB").quantize(
+            256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE
+        )
+        if not self._header_written:
+            header, _ = GifImagePlugin.getheader(
+                paletted, info={"loop": self._loop, "duration": frame.duration_ms}
+            )
+            for chunk in header:
+                self._fp.write(chunk)
+            self._header_written = True
+        for chunk in GifImagePlugin.getdata(paletted, duration=frame.duration_ms, include_color_table=True):
+            self._fp.write(chunk)
+
+    def close(self):
+        if self._header_written:
+            self._fp.write(b";")  # トレーラー
+
+
+class FFmpegFrameSource(IFrameSource):
+    """ffmpegで動画をデコードし、RGBの生データをパイプで1フレームずつ受け取る（ffmpeg / ffprobeが必要）"""
+
+    def __init__(self, path: str, ffmpeg: str = "ffmpeg", ffprobe: str = "ffprobe"):
+        self._path = path
+        self._ffmpeg = ffmpeg
+        probe = subprocess.run(
+            [
+                ffprobe, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "stream=width,height,avg_frame_rate", "-of", "json", path,
+            ],
+            check=True, capture_output=True,
+        )
+        stream = json.loads(probe.stdout)["streams"][0]
+        self._size = (int(stream["width"]), int(stream["height"]))
+        numerator, _, denominator = stream.get("avg_frame_rate", "0/1").partition("/")
+        fps = float(numerator) / float(denominator) if float(denominator or 0) > 0 else 0.0
+        self.fps = fps if fps > 0 else 1000 / DEFAULT_FRAME_DURATION_MS
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    def __iter__(self) -> Iterator[VideoFrame]:
+        width, height = self._size
+        frame_bytes = width * height * 3
+        duration_ms = round(1000 / self.fps)
+        process = subprocess.Popen(
+            [self._ffmpeg, "-v", "error", "-i", self._path, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+            stdout=subprocess.PIPE,
+        )
+        assert process.stdout is not None
+        try:
+            index = 0
+            while True:
+                data = process.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                yield VideoFrame(index, Image.frombytes("RGB", (width, height), data), duration_ms)
+                index += 1
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+
+
+class FFmpegFrameSink(IFrameSink):
+    """RGBの生データをパイプでffmpegへ渡し、動画ファイル（H.264など）にエンコードする（ffmpegが必要）"""
+
+    def __init__(self, path: str, size: tuple[int, int], fps: float, ffmpeg: str = "ffmpeg"):
+        width, height = size
+        self._process = subprocess.Popen(
+            [
+                ffmpeg, "-v", "error", "-y",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+                # yuv420pは幅・高さが偶数である必要があるため、奇数の場合は1px切り詰める
+                "-vf", "crop=trunc(iw/2)*2:trunc(ih/2)*2", "-pix_fmt", "yuv420p", path,
+            ],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, frame: VideoFrame):
+        assert self._process.stdin is not None
+        self._process.stdin.write(frame.image.convert("RGB").tobytes())
+
+    def close(self):
+        assert self._process.stdin is not None
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self._process.returncode}.")
+
+
+@dataclass(frozen=True)
+class VideoReport:
+    """動画1本分の処理結果"""
+    frames: int
+    keyframes: int
+    elapsed_seconds: float
+    detect_seconds: float
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+
+class _Keyframe:
+    __slots__ = ("index", "future")
+
+    def __init__(self, index: int, future: Future):
+        self.index = index
+        self.future = future
+
+
+class VideoProcessor:
+    """
+    動画・アニメーション画像のフレーム毎に顔モザイクと猫の枠線を適用する
+    - keyframe_interval毎のキーフレーム（と最後のフレーム）だけをRekognitionで検出する
+    - 間のフレームは、前後のキーフレームの枠をIoUで対応付けて線形補間する
+      顔は、対応付けられなかった枠も区間全体に残し、face_marginだけ広げてモザイクの漏れを防ぐ
+    - キーフレームの検出はexecutorで先読みし、デコード・描画と並行して行う
+    - 保持するフレームは、前後のキーフレームの間の分（最大でおおよそkeyframe_interval * 2枚）だけ
+    """
+
+    def __init__(
+        self,
+        rekognition_client: IRekognitionClientWrapper,
+        mosaic_drawer: IFaceMosaicDrawer,
+        bounding_box_drawer: Optional[PILBoundingBoxDrawer] = None,
+        keyframe_interval: int = 10,
+        mosaic_size: int = 5,
+        min_iou: float = 0.3,
+        face_margin: float = 0.1,
+        quality: int = 90,
+        executor: Optional[Executor] = None,
+    ):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1.")
+        self._rekognition_client = rekognition_client
+        self._mosaic_drawer = mosaic_drawer
+        self._bounding_box_drawer = bounding_box_drawer
+        self._keyframe_interval = keyframe_interval
+        self._mosaic_size = mosaic_size
+        self._min_iou = min_iou
+        self._face_margin = face_margin
+        self._quality = quality
+        self._executor = executor
+
+    def _detect(self, image: Image.Image) -> tuple[Detections, Detections, float]:
+        """キーフレームをJPEGにエンコードして検出し、(顔, 猫, 所要秒数)を返す"""
+        start = time.perf_counter()
+        with span("video.detect"):
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=self._quality)
+            detection = self._rekognition_client.detect_all(buffer.getvalue())
+            if detection.faces_skipped:
+                # 猫のいないフレームでも顔にはモザイクをかけるため、省略された顔検出をやり直す
+                faces = Detections.from_face_details(self._rekognition_client.detect_faces(buffer.getvalue()))
+            else:
+                faces = detection.faces
+            result = faces, detection.cats
+        return (*result, time.perf_counter() - start)
+
+    def _render(self, frame: VideoFrame, faces: Detections, cats: Detections) -> VideoFrame:
+        with span("video.render"):
+            image = self._mosaic_drawer.apply_mosaic(frame.image, faces, self._mosaic_size)
+            if self._bounding_box_drawer is not None:
+                image = self._bounding_box_drawer.draw(image, cats, dict.fromkeys(cats.names, False))
+        return VideoFrame(frame.index, image, frame.duration_ms)
+
+    def _detections_at(
+        self, frame_index: int, previous: _Keyframe, following: Optional[_Keyframe]
+    ) -> tuple[Detections, Detections]:
+        previous_faces, previous_cats, _ = previous.future.result()
+        if following is None or following.index == previous.index:
+            return previous_faces, previous_cats
+        following_faces, following_cats, _ = following.future.result()
+        t = (frame_index - previous.index) / (following.index - previous.index)
+        faces = interpolate_detections(
+            previous_faces, following_faces, t, self._min_iou,
+            keep_unmatched=True, margin=self._face_margin if 0 < t < 1 else 0.0, name_prefix="Face",
+        )
+        cats = interpolate_detections(previous_cats, following_cats, t, self._min_iou, keep_unmatched=False)
+        return faces, cats
+
+    def process(self, source: IFrameSource, sink: IFrameSink) -> VideoReport:
+        """sourceの全フレームを処理してsinkへ書き出す。sinkは最後に閉じる"""
+        executor = self._executor if self._executor is not None else ThreadPoolExecutor(max_workers=2)
+        buffer: collections.deque[VideoFrame] = collections.deque()
+        keyframes: collections.deque[_Keyframe] = collections.deque()
+        detect_seconds = 0.0
+        keyframe_count = 0
+        frame_count = 0
+        finished = False
+
+        def drain(block: bool):
+            """描画に必要な前後のキーフレームの検出が済んだフレームを、先頭から順に書き出す"""
+            nonlocal detect_seconds
+            while buffer:
+                frame = buffer[0]
+                while len(keyframes) >= 2 and keyframes[1].index <= frame.index:
+                    detect_seconds += keyframes.popleft().future.result()[2]
+                previous = keyframes[0]
+                following = keyframes[1] if len(keyframes) >= 2 else None
+                if following is None and not finished and frame.index != previous.index:
+                    return
+                if not block and not (
+                    previous.future.done() and (following is None or following.future.done())
+                ):
+                    return
+                sink.write(self._render(frame, *self._detections_at(frame.index, previous, following)))
+                buffer.popleft()
+
+        start = time.perf_counter()
+        try:
+            last_frame: Optional[VideoFrame] = None
+            for frame in source:
+                frame_count += 1
+                last_frame = frame
+                buffer.append(frame)
+                if frame.index % self._keyframe_interval == 0:
+                    keyframes.append(_Keyframe(frame.index, executor.submit(self._detect, frame.image)))
+                    keyframe_count += 1
+                # 先読みは1区間分までにし、保持するフレーム数を抑える
+                drain(block=len(buffer) > self._keyframe_interval)
+
+            # 最後のフレームもキーフレームとして検出し、末尾の区間も補間できるようにする
+            if last_frame is not None and last_frame.index % self._keyframe_interval != 0:
+                keyframes.append(_Keyframe(last_frame.index, executor.submit(self._detect, last_frame.image)))
+                keyframe_count += 1
+            finished = True
+            drain(block=True)
+            detect_seconds += sum(keyframe.future.result()[2] for keyframe in keyframes)
+        finally:
+            sink.close()
+            if self._executor is None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return VideoReport(
+            frames=frame_count,
+            keyframes=keyframe_count,
+            elapsed_seconds=time.perf_counter() - start,
+            detect_seconds=detect_seconds,
+        )
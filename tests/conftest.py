@@ -1,6 +1,7 @@
 import pytest
 from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer
 from lib.boundary_draw.drawer import BoundingBoxDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
 
 
 @pytest.fixture
@@ -11,3 +12,19 @@ def mosaic_drawer():
 @pytest.fixture
 def box_drawer():
     return BoundingBoxDrawer()
+
+
+@pytest.fixture
+def pil_box_drawer():
+    return PILBoundingBoxDrawer()
+
+
+@pytest.fixture
+def metrics_sink():
+    """共有のinstrumentationにインメモリのシンクを登録し、テスト後に外す"""
+    from lib.instrumentation import InMemoryMetricsSink, instrumentation
+
+    sink = InMemoryMetricsSink()
+    instrumentation.add_sink(sink)
+    yield sink
+    instrumentation.remove_sink(sink)
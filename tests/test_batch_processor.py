@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+
+from PIL import Image
+import pytest
+
+from lib.batch_processor import BatchImageProcessor, list_input_images, load_completed_paths
+from lib.boundary_draw.drawer import IBoundaryDrawer
+from lib.cache import LRUCache
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.router import LOCAL_CATS_FIRST, RoutingRekognitionClientWrapper
+from lib.rekognition.stub import StubRekognitionClientWrapper
+
+
+def dummy_labels_response_one_cat():
+    return {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Instances": [
+                    {
+                        "BoundingBox": {"Left": 0.44, "Top": 0.71, "Width": 0.30, "Height": 0.28},
+                        "Confidence": 94.49180603027344
+                    },
+                ]
+            }
+        ]
+    }
+
+
+def dummy_face_details():
+    return [{"BoundingBox": {"Width": 0.13, "Height": 0.25, "Left": 0.25, "Top": 0.14}}]
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    shutil.copy("tests/images/image_processor/input_two_faces_one_cat.jpg", input_dir / "a.jpg")
+    shutil.copy("tests/images/image_processor/input_no_face_no_cat.jpg", input_dir / "b.jpg")
+    (input_dir / "notes.txt").write_text("not an image")
+    return input_dir
+
+
+@pytest.fixture
+def batch_processor(tmp_path, mosaic_drawer, box_drawer):
+    return BatchImageProcessor(
+        StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response_one_cat()),
+        mosaic_drawer,
+        box_drawer,
+        str(tmp_path / "output"),
+        workers=2,
+    )
+
+
+def test_list_input_images_from_directory_glob_and_manifest(input_dir):
+    expected = [str(input_dir / "a.jpg"), str(input_dir / "b.jpg")]
+    assert list_input_images(str(input_dir)) == expected
+    assert list_input_images(str(input_dir / "*.jpg")) == expected
+
+    manifest = input_dir / "manifest.jsonl"
+    manifest.write_text('{"path": "b.jpg"}\n\n{"path": "a.jpg"}\n')
+    assert list_input_images(str(manifest)) == expected[::-1]
+
+
+def test_batch_processor_writes_outputs_and_results(tmp_path, input_dir, batch_processor):
+    results_path = str(tmp_path / "results.jsonl")
+    report = batch_processor.run(list_input_images(str(input_dir)), results_path).to_dict()
+
+    assert report["processed"] == 2
+    assert report["succeeded"] == 2
+    assert report["images_per_second"] > 0
+    assert report["stages"]["detect"]["count"] == 2
+
+    with open(results_path) as results_file:
+        records = [json.loads(line) for line in results_file]
+    assert {record["status"] for record in records} == {"ok"}
+    assert {record["cat_count"] for record in records} == {1}
+    for record in records:
+        assert (tmp_path / "output" / (record["path"].split("/")[-1] + ".png")).exists()
+
+
+def test_batch_processor_keeps_same_name_different_extension_apart(tmp_path, input_dir, batch_processor):
+    Image.open(input_dir / "a.jpg").save(input_dir / "a.png")
+    report = batch_processor.run(
+        [str(input_dir / "a.jpg"), str(input_dir / "a.png")], str(tmp_path / "results.jsonl")
+    )
+
+    output_paths = {result.output_path for result in report.results}
+    assert len(output_paths) == 2
+    assert all(os.path.exists(output_path) for output_path in output_paths)
+
+
+def test_batch_processor_resumes_from_results(tmp_path, input_dir, batch_processor):
+    results_path = str(tmp_path / "results.jsonl")
+    paths = list_input_images(str(input_dir))
+    batch_processor.run(paths[:1], results_path)
+
+    report = batch_processor.run(paths, results_path, resume=True).to_dict()
+
+    assert report["processed"] == 1
+    assert report["skipped"] == 1
+    assert load_completed_paths(results_path) == set(paths)
+
+
+def test_batch_processor_records_errors(tmp_path, batch_processor):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"")
+    report = batch_processor.run([str(broken)], str(tmp_path / "results.jsonl"))
+
+    assert report.results[0].status == "error"
+    assert "ValueError" in report.results[0].error
+
+
+def test_batch_processor_rejects_images_without_local_cat(tmp_path, input_dir, mosaic_drawer, box_drawer):
+    # ローカルの検出器（スタブ）は猫を返さないため、Rekognitionを呼ばずに全てrejectedになる
+    remote = StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response_one_cat())
+    router = RoutingRekognitionClientWrapper(remote, LOCAL_CATS_FIRST, local_detector=StubRekognitionClientWrapper())
+    cache = LRUCache()
+    processor = BatchImageProcessor(
+        CachedRekognitionClientWrapper(router, cache), mosaic_drawer, box_drawer, str(tmp_path / "output"), workers=2
+    )
+    results_path = str(tmp_path / "results.jsonl")
+    paths = list_input_images(str(input_dir))
+
+    report = processor.run(paths, results_path).to_dict()
+
+    assert (report["succeeded"], report["rejected"], report["failed"]) == (0, 2, 0)
+    assert not (tmp_path / "output").exists()
+    assert (router.stats.face_calls, router.stats.cat_calls) == (0, 0)
+    # ローカルの判定だけの結果はキャッシュしない
+    assert len(cache) == 0
+    # rejectedの画像は再開時にスキップする
+    assert load_completed_paths(results_path) == set(paths)
+
+
+def test_batch_processor_with_pil_drawer_saves_full_resolution_image(tmp_path, input_dir, mosaic_drawer, pil_box_drawer):
+    processor = BatchImageProcessor(
+        StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response_one_cat()),
+        mosaic_drawer,
+        pil_box_drawer,
+        str(tmp_path / "output"),
+    )
+    report = processor.run([str(input_dir / "a.jpg")], str(tmp_path / "results.jsonl"))
+
+    output_image = Image.open(report.results[0].output_path)
+    assert output_image.size == Image.open(input_dir / "a.jpg").size
+
+
+class CopyImageDrawer(IBoundaryDrawer):
+    """PILBoundingBoxDrawerを継承しない、画像を返す描画器"""
+
+    def draw(self, target_image, detect_labels_res, highlight_states, default_color="gray", highlight_color="red"):
+        return target_image.copy()
+
+
+def test_batch_processor_saves_image_from_any_drawer_returning_image(tmp_path, input_dir, mosaic_drawer):
+    processor = BatchImageProcessor(
+        StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response_one_cat()),
+        mosaic_drawer,
+        CopyImageDrawer(),
+        str(tmp_path / "output"),
+    )
+    report = processor.run([str(input_dir / "a.jpg")], str(tmp_path / "results.jsonl"))
+
+    assert report.results[0].status == "ok"
+    assert Image.open(report.results[0].output_path).size == Image.open(input_dir / "a.jpg").size
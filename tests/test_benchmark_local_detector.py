@@ -0,0 +1,60 @@
+import numpy as np
+
+from benchmarks.local_detector import Comparison, compare, coverage_matrix
+from lib.rekognition.results_store import DetectionResultsStore
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.rekognition.utils import compute_image_hash
+from lib.rekognition.wrapper import DetectionResult
+
+
+def box(left: float, top: float, width: float, height: float) -> dict:
+    return {"BoundingBox": {"Left": left, "Top": top, "Width": width, "Height": height}}
+
+
+def cats(*instances: dict) -> dict:
+    return {"Labels": [{"Name": "Cat", "Instances": list(instances)}]} if instances else {"Labels": []}
+
+
+def test_coverage_matrix():
+    local = np.array([[0.2, 0.2, 0.1, 0.1], [0.5, 0.5, 0.2, 0.2]])
+    reference = np.array([[0.0, 0.0, 0.5, 0.5]])
+
+    np.testing.assert_allclose(coverage_matrix(local, reference), [[1.0], [0.0]])
+
+
+def test_comparison_counts_matches_and_prefilter_misses():
+    comparison = Comparison()
+    # 顔1件は一致、1件は誤検出。猫の顔の枠は猫全体の枠に含まれるので一致
+    comparison.add(
+        DetectionResult([box(0.1, 0.1, 0.2, 0.2), box(0.7, 0.7, 0.1, 0.1)], cats(box(0.3, 0.3, 0.1, 0.1))),
+        DetectionResult([box(0.11, 0.1, 0.2, 0.2)], cats(box(0.2, 0.2, 0.5, 0.5))),
+        face_min_iou=0.4,
+        cat_min_coverage=0.6,
+    )
+    # ローカルでは猫が見つからない（プレフィルタでは見逃しになる）
+    comparison.add(DetectionResult([], cats()), DetectionResult([], cats(box(0.1, 0.1, 0.5, 0.5))), 0.4, 0.6)
+
+    report = comparison.to_dict()
+
+    assert report["faces"] == {"local": 2, "reference": 1, "matched": 1, "precision": 0.5, "recall": 1.0}
+    assert report["cats"] == {"local": 1, "reference": 2, "matched": 1, "precision": 1.0, "recall": 0.5}
+    assert report["prefilter"] == {"skip_rate": 0.5, "missed_cat_rate": 0.5}
+
+
+def test_compare_with_stored_reference(tmp_path):
+    paths = []
+    for index in range(2):
+        path = tmp_path / f"image{index}.jpg"
+        path.write_bytes(f"image{index}".encode())
+        paths.append(str(path))
+    store = DetectionResultsStore(str(tmp_path / "results.sqlite3"))
+    store.save(compute_image_hash(b"image0"), DetectionResult([box(0.1, 0.1, 0.2, 0.2)], cats()))
+    local = StubRekognitionClientWrapper([box(0.1, 0.1, 0.2, 0.2)])
+
+    report = compare(paths, local, reference_store=store)
+
+    assert report["images"] == 1
+    assert report["skipped"] == 1
+    assert report["faces"]["recall"] == 1.0
+    assert "local_latency_ms" in report
+    assert "reference_latency_ms" not in report
@@ -0,0 +1,44 @@
+from benchmarks.pipeline import STAGES, compare_results, run_case
+
+
+def _results(p50_by_stage: dict[str, float]) -> dict:
+    return {
+        "cases": [{
+            "megapixels": 1,
+            "faces": 10,
+            "cats": 5,
+            "stages": {stage: {"p50": p50} for stage, p50 in p50_by_stage.items()},
+        }]
+    }
+
+
+def test_run_case():
+    case = run_case(0.1, faces=3, cats=2, repeat=1)
+
+    assert (case["faces"], case["cats"]) == (3, 2)
+    assert set(case["stages"]) == set(STAGES)
+    for summary in case["stages"].values():
+        assert summary["count"] == 1
+        assert summary["p50"] >= 0
+        assert summary["peak_rss_delta_bytes"] >= 0
+
+
+def test_compare_results():
+    baseline = _results({"mosaic": 0.100, "draw": 0.100, "decode": 0.0001})
+    current = _results({"mosaic": 0.150, "draw": 0.105, "decode": 0.0002})
+
+    comparisons = {c["stage"]: c for c in compare_results(baseline, current, threshold=0.1)}
+
+    assert comparisons["mosaic"]["regression"] is True
+    assert abs(comparisons["mosaic"]["change"] - 0.5) < 1e-9
+    assert comparisons["draw"]["regression"] is False
+    # 変化率は大きいが差が1ms未満のため回帰とみなさない
+    assert comparisons["decode"]["regression"] is False
+
+
+def test_compare_results_skips_unknown_cases():
+    baseline = _results({"mosaic": 0.1})
+    current = _results({"mosaic": 0.1})
+    current["cases"][0]["faces"] = 99
+
+    assert compare_results(baseline, current) == []
@@ -0,0 +1,111 @@
+import itertools
+
+from PIL import Image
+
+from lib.boundary_draw.layered_drawer import LayeredBoundingBoxDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from tests.utils.image import images_are_equal
+
+
+def dummy_labels_response_three_cats():
+    # Cat-1とCat-2の枠は重なっている
+    return {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Instances": [
+                    {
+                        "BoundingBox": {"Left": 0.48, "Top": 0.14, "Width": 0.51, "Height": 0.85},
+                        "Confidence": 94.3099365234375
+                    },
+                    {
+                        "BoundingBox": {"Left": 0.40, "Top": 0.33, "Width": 0.32, "Height": 0.66},
+                        "Confidence": 88.44355010986328
+                    },
+                    {
+                        "BoundingBox": {"Left": 0.02, "Top": 0.01, "Width": 0.2, "Height": 0.2},
+                    },
+                ]
+            }
+        ]
+    }
+
+
+class CountingLayeredDrawer(LayeredBoundingBoxDrawer):
+    def __init__(self):
+        super().__init__()
+        self.compose_calls = 0
+        self.recomposite_calls = 0
+
+    def _compose(self, *args):
+        self.compose_calls += 1
+        return super()._compose(*args)
+
+    def _recomposite(self, *args):
+        self.recomposite_calls += 1
+        return super()._recomposite(*args)
+
+
+def test_layered_drawer_matches_full_redraw_for_every_highlight_transition():
+    base_image = Image.open("tests/images/bounding_box_draw/input_two_cats.jpg")
+    base_image.load()
+    labels_response = dummy_labels_response_three_cats()
+    layered_drawer = LayeredBoundingBoxDrawer()
+    full_drawer = PILBoundingBoxDrawer()
+
+    names = ["Cat-1", "Cat-2", "Cat-3"]
+    for flags in itertools.product([False, True], repeat=len(names)):
+        highlight_states = dict(zip(names, flags))
+        expected = full_drawer.draw(base_image, labels_response, highlight_states)
+        output = layered_drawer.draw(base_image, labels_response, highlight_states)
+        assert images_are_equal(output, expected), highlight_states
+
+
+def test_layered_drawer_recomposites_only_changed_instances():
+    base_image = Image.new("RGB", (400, 300), "white")
+    labels_response = dummy_labels_response_three_cats()
+    drawer = CountingLayeredDrawer()
+
+    drawer.draw(base_image, labels_response, {"Cat-1": False, "Cat-2": False, "Cat-3": False})
+    drawer.draw(base_image, labels_response, {"Cat-1": False, "Cat-2": False, "Cat-3": True})
+    drawer.draw(base_image, labels_response, {"Cat-1": False, "Cat-2": False, "Cat-3": True})
+
+    assert drawer.compose_calls == 1
+    assert drawer.recomposite_calls == 1
+
+
+def test_layered_drawer_returns_independent_images():
+    base_image = Image.new("RGB", (400, 300), "white")
+    labels_response = dummy_labels_response_three_cats()
+    drawer = LayeredBoundingBoxDrawer()
+
+    off = drawer.draw(base_image, labels_response, {"Cat-3": False})
+    drawer.draw(base_image, labels_response, {"Cat-3": True})
+
+    assert images_are_equal(off, PILBoundingBoxDrawer().draw(base_image, labels_response, {"Cat-3": False}))
+    assert base_image.getpixel((10, 5)) == (255, 255, 255)
+
+
+def test_layered_drawer_recomposes_for_new_base_image():
+    labels_response = dummy_labels_response_three_cats()
+    drawer = CountingLayeredDrawer()
+
+    drawer.draw(Image.new("RGB", (400, 300), "white"), labels_response, {})
+    drawer.draw(Image.new("RGB", (400, 300), "black"), labels_response, {})
+
+    assert drawer.compose_calls == 2
+
+
+def test_layered_drawer_bounds_layers_by_bytes():
+    labels_response = dummy_labels_response_three_cats()
+    # 400x300の画像1枚の合成状態は、ベース画像と合成した画像で約940KB
+    drawer = LayeredBoundingBoxDrawer(max_layer_bytes=1024 * 1024)
+    first = Image.new("RGB", (400, 300), "white")
+    second = Image.new("RGB", (400, 300), "black")
+
+    drawer.draw(first, labels_response, {})
+    drawer.draw(second, labels_response, {})
+
+    assert len(drawer._layers) == 1
+    assert drawer._layers.get(id(first)) is None
+    assert drawer._layers.total_bytes <= 1024 * 1024
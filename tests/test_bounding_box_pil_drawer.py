@@ -0,0 +1,74 @@
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer, compute_instance_overlays
+from lib.image_processor import ImageProcessor
+from tests.utils.image import images_are_equal
+
+
+def dummy_labels_response_two_cats():
+    return {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Instances": [
+                    {
+                        "BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4},
+                        "Confidence": 94.3099365234375
+                    },
+                    {
+                        "BoundingBox": {"Left": 0.5, "Top": 0.0, "Width": 0.4, "Height": 0.5},
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def dummy_labels_response_no_cat():
+    return {"Labels": []}
+
+
+def test_compute_instance_overlays():
+    overlays = compute_instance_overlays(dummy_labels_response_two_cats(), (200, 100))
+
+    assert [overlay.instance_name for overlay in overlays] == ["Cat-1", "Cat-2"]
+    assert [overlay.label for overlay in overlays] == ["Cat-1(94.31%)", "Cat-2(no confidence)"]
+    assert overlays[0].boxes == [(20, 20, 80, 60)]
+    assert overlays[1].boxes == [(100, 0, 180, 50)]
+
+
+def test_pil_drawer_draws_boxes_with_highlight_color():
+    drawer = PILBoundingBoxDrawer(line_width=2)
+    input_image = Image.new("RGB", (200, 100), "white")
+
+    output_image = drawer.draw(
+        input_image, dummy_labels_response_two_cats(), {"Cat-1": True, "Cat-2": False}
+    )
+
+    assert output_image.size == input_image.size
+    assert output_image.getpixel((50, 60)) == (255, 0, 0)
+    assert output_image.getpixel((140, 50)) == (128, 128, 128)
+    assert output_image.getpixel((50, 40)) == (255, 255, 255)
+    # 入力画像は変更しない
+    assert input_image.getpixel((50, 60)) == (255, 255, 255)
+
+
+def test_pil_drawer_no_cat_returns_same_image(pil_box_drawer):
+    input_image = Image.open("tests/images/bounding_box_draw/input_no_cat.jpg")
+
+    output_image = pil_box_drawer.draw(input_image, dummy_labels_response_no_cat(), {})
+
+    assert output_image is not input_image
+    assert images_are_equal(output_image, input_image)
+
+
+def test_image_processor_with_pil_drawer_returns_image(mosaic_drawer, pil_box_drawer):
+    processor = ImageProcessor(mosaic_drawer, pil_box_drawer)
+    input_image = Image.open("tests/images/image_processor/input_no_face_two_cats.jpg")
+
+    output_image = processor.process_image(
+        input_image, [], dummy_labels_response_two_cats(), {"Cat-1": False, "Cat-2": False}
+    )
+
+    assert isinstance(output_image, Image.Image)
+    assert output_image.size == input_image.size
@@ -0,0 +1,110 @@
+import pytest
+
+from lib.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_cache_returns_stored_value():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_expires_entries_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 10
+    assert cache.get("a") == 1
+    clock.now = 10.1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_raises_on_invalid_max_entries():
+    with pytest.raises(ValueError):
+        LRUCache(max_entries=0)
+
+
+def test_lru_cache_evicts_by_total_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=10, size_of=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    assert cache.total_bytes == 8
+
+    cache.put("c", "xxxx")
+    assert cache.get("a") is None
+    assert cache.keys() == ["b", "c"]
+    assert cache.total_bytes == 8
+
+
+def test_lru_cache_keeps_newest_entry_larger_than_max_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=10, size_of=len)
+    cache.put("a", "xx")
+    cache.put("b", "x" * 20)
+
+    assert cache.keys() == ["b"]
+    assert cache.total_bytes == 20
+
+
+def test_lru_cache_replacing_entry_updates_total_bytes():
+    cache = LRUCache(max_entries=10, max_bytes=100, size_of=len)
+    cache.put("a", "xxxx")
+    cache.put("a", "xx")
+
+    assert cache.total_bytes == 2
+
+
+def test_lru_cache_pop():
+    cache = LRUCache(max_entries=10, max_bytes=100, size_of=len)
+    cache.put("a", "xxxx")
+
+    assert cache.pop("a") == "xxxx"
+    assert cache.pop("a") is None
+    assert cache.total_bytes == 0
+    assert len(cache) == 0
+
+
+def test_lru_cache_calls_on_evict_for_discarded_values():
+    now = [0.0]
+    evicted = []
+    cache = LRUCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0], on_evict=evicted.append)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.put("c", "C")
+    assert evicted == ["A"]
+
+    cache.put("b", "B2")
+    assert evicted == ["A", "B"]
+
+    now[0] = 11
+    assert cache.get("c") is None
+    assert evicted == ["A", "B", "C"]
+
+    # popで取り出した値は呼び出し元が扱うため、on_evictは呼ばない
+    assert cache.pop("b") == "B2"
+    cache.put("d", "D")
+    cache.clear()
+    assert evicted == ["A", "B", "C", "D"]
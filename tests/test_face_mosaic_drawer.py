@@ -1,5 +1,12 @@
 from PIL import Image
+import numpy as np
 
+from lib.face_mosaic_drawer import (
+    NumpyEllipseFaceMosaicDrawer,
+    ellipse_mask,
+    face_boxes_in_pixels,
+    pixelate_ellipse_in_place,
+)
 from tests.utils.image import images_are_equal, load_expected_output_image
 
 
@@ -52,3 +59,83 @@ def test_ellipse_face_mosaic_drawer_two_faces(mosaic_drawer):
         "tests/images/face_mosaic_draw/expected_output_two_faces.png"
     )
     assert images_are_equal(output_image, expected_image)
+
+
+def test_numpy_face_mosaic_drawer_no_face():
+    input_image = Image.open(
+        "tests/images/face_mosaic_draw/input_no_face.jpg"
+    )
+    output_image = NumpyEllipseFaceMosaicDrawer().apply_mosaic(
+        input_image, dummy_face_details_no_face(), mosaic_size=5
+    )
+    assert output_image is input_image
+
+
+def neighbouring_block_range(region: np.ndarray, mosaic_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """各画素について、自身と上下左右斜めのブロック（mosaic_size離れた画素）の値の最小値・最大値を返す"""
+    height, width = region.shape[:2]
+    padded = np.pad(region, ((mosaic_size, mosaic_size), (mosaic_size, mosaic_size), (0, 0)), mode="edge")
+    shifted = [
+        padded[mosaic_size + dy:mosaic_size + dy + height, mosaic_size + dx:mosaic_size + dx + width]
+        for dy in (-mosaic_size, 0, mosaic_size)
+        for dx in (-mosaic_size, 0, mosaic_size)
+    ]
+    return np.min(shifted, axis=0), np.max(shifted, axis=0)
+
+
+def test_numpy_face_mosaic_drawer_two_faces_is_close_to_ellipse_drawer():
+    mosaic_size = 5
+    input_image = Image.open(
+        "tests/images/face_mosaic_draw/input_two_faces.jpg"
+    )
+    output_image = NumpyEllipseFaceMosaicDrawer().apply_mosaic(
+        input_image, dummy_face_details(), mosaic_size=mosaic_size
+    )
+    expected_image = load_expected_output_image(
+        "tests/images/face_mosaic_draw/expected_output_two_faces.png"
+    )
+
+    output = np.asarray(output_image, dtype=np.int16)
+    expected = np.asarray(expected_image, dtype=np.int16)
+    original = np.asarray(input_image.convert("RGB"), dtype=np.int16)
+    assert output.shape == expected.shape
+
+    outside = np.ones(output.shape[:2], dtype=bool)
+    for left, top, right, bottom in face_boxes_in_pixels(dummy_face_details(), input_image.size):
+        outside[top:bottom, left:right] = False
+        inside_ellipse = ellipse_mask(right - left, bottom - top)
+        region = output[top:bottom, left:right]
+        expected_region = expected[top:bottom, left:right]
+
+        # 楕円の外側（顔の領域内）は元の画像のまま
+        assert np.array_equal(region[~inside_ellipse], expected_region[~inside_ellipse])
+
+        # 楕円の内側は、元の画像のmosaic_size四方のブロック平均（ブロックの途中で切れる端は残りの画素の平均）
+        block_means = np.array(input_image.convert("RGB").crop((left, top, right, bottom)))
+        pixelate_ellipse_in_place(block_means, mosaic_size)
+        assert np.array_equal(region[inside_ellipse], block_means[inside_ellipse])
+
+        # EllipseFaceMosaicDrawerはbicubicで縮小・拡大するため、各画素の値は周囲のブロックの値の間を補間したものになる
+        # 縮小のフィルタの違いとbicubicのオーバーシュート分（16階調）を許容して、画素毎に比較する
+        lower, upper = neighbouring_block_range(region, mosaic_size)
+        tolerance = 16
+        assert np.all((expected_region >= lower - tolerance)[inside_ellipse])
+        assert np.all((expected_region <= upper + tolerance)[inside_ellipse])
+
+    # 顔の領域の外側は変更しない
+    assert np.array_equal(output[outside], original[outside])
+    assert not np.array_equal(output, original)
+
+
+def test_pixelate_ellipse_in_place_uses_block_means_inside_ellipse():
+    rng = np.random.default_rng(0)
+    region = rng.integers(0, 256, size=(23, 17, 3), dtype=np.uint8)
+    original = region.copy()
+
+    pixelate_ellipse_in_place(region, mosaic_size=5)
+
+    mask = ellipse_mask(17, 23)
+    assert np.array_equal(region[~mask], original[~mask])
+    # 楕円の中心を含むブロックは、元のブロックの平均値で塗られる
+    block = original[10:15, 5:10].reshape(-1, 3)
+    assert np.array_equal(region[12, 7], np.round(block.mean(axis=0)).astype(np.uint8))
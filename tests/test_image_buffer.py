@@ -0,0 +1,187 @@
+import io
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from benchmarks.synthetic import synthetic_face_details, synthetic_jpeg_bytes, synthetic_labels_response
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer, NumpyEllipseFaceMosaicDrawer
+from lib.image_buffer import ImageBuffer, encode_image_buffer, open_image_buffer
+from lib.image_processor import ImageProcessor
+from lib.large_image import open_preview, render_image_bytes
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def noise_image(size=(120, 80), mode="RGB") -> Image.Image:
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).convert(mode)
+
+
+def test_pixels_and_image_share_memory():
+    buffer = ImageBuffer.allocate((40, 30))
+    buffer.pixels[:] = 0
+
+    ImageDraw.Draw(buffer.image).rectangle((0, 0, 9, 9), fill="red")
+    buffer.rgb[20:, 30:] = (0, 0, 255)
+
+    assert buffer.rgb[5, 5].tolist() == [255, 0, 0]
+    assert buffer.image.getpixel((35, 25)) == (0, 0, 255)
+    assert buffer.image.mode == "RGB"
+    assert buffer.size == (40, 30)
+
+
+def test_rejects_unsupported_arrays():
+    with pytest.raises(ValueError):
+        ImageBuffer(np.zeros((30, 40, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("format,mode", [("JPEG", "RGB"), ("PNG", "RGB"), ("PNG", "RGBA"), ("PNG", "L"), ("PNG", "P")])
+def test_open_image_buffer_matches_pil_decode(format, mode):
+    image_bytes = encode(noise_image(mode=mode), format)
+
+    buffer = open_image_buffer(image_bytes)
+
+    expected = np.asarray(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+    assert np.array_equal(buffer.rgb, expected)
+
+
+def test_open_image_buffer_downscales_like_open_preview():
+    image_bytes = synthetic_jpeg_bytes(1)
+
+    buffer = open_image_buffer(image_bytes, max_dimension=300)
+
+    expected = open_preview(image_bytes, max_dimension=300)
+    assert buffer.size == expected.size
+    assert np.array_equal(buffer.rgb, np.asarray(expected.convert("RGB")))
+
+
+def test_open_image_buffer_reads_shared_memory_without_holding_it():
+    image_bytes = encode(noise_image(), "PNG")
+    shm = shared_memory.SharedMemory(create=True, size=len(image_bytes))
+    try:
+        shm.buf[:len(image_bytes)] = image_bytes
+        with shm.buf[:len(image_bytes)] as view:
+            buffer = open_image_buffer(view)
+        # デコード後に共有メモリのビューが残っていると、closeがBufferErrorになる
+        shm.close()
+    finally:
+        shm.unlink()
+
+    assert np.array_equal(buffer.rgb, np.asarray(noise_image()))
+
+
+@pytest.mark.parametrize("format", ["JPEG", "PNG", "WEBP"])
+def test_encode_image_buffer(format):
+    buffer = open_image_buffer(encode(noise_image(), "PNG"))
+    output = io.BytesIO()
+
+    encode_image_buffer(buffer, output, format=format)
+
+    decoded = Image.open(io.BytesIO(output.getvalue()))
+    assert (decoded.format, decoded.mode, decoded.size) == (format, "RGB", (120, 80))
+
+
+@pytest.mark.parametrize("mosaic_drawer", [NumpyEllipseFaceMosaicDrawer(), EllipseFaceMosaicDrawer()])
+def test_render_image_bytes_matches_image_processor(mosaic_drawer):
+    image_bytes = synthetic_jpeg_bytes(0.5)
+    face_details = synthetic_face_details(5)
+    detect_labels_res = synthetic_labels_response(3)
+    highlight_states = {"Cat-2": True}
+    output = io.BytesIO()
+
+    size = render_image_bytes(
+        image_bytes,
+        face_details,
+        detect_labels_res,
+        highlight_states,
+        output,
+        mosaic_drawer=mosaic_drawer,
+        format="PNG",
+        max_dimension=400,
+    )
+
+    expected = ImageProcessor(mosaic_drawer, PILBoundingBoxDrawer()).process_image_bytes(
+        image_bytes, face_details, detect_labels_res, highlight_states, max_dimension=400
+    )
+    assert size == expected.size
+    assert np.array_equal(np.asarray(Image.open(output)), np.asarray(expected.convert("RGB")))
+
+
+def spy_decoding(monkeypatch) -> tuple[list[Image.Image], list[ImageBuffer]]:
+    """Image.load()で読み込んだ画像と、確保したImageBufferを記録する"""
+    loaded: list[Image.Image] = []
+    allocated: list[ImageBuffer] = []
+    load = Image.Image.load
+    allocate = ImageBuffer.allocate.__func__
+
+    def spy_load(self):
+        loaded.append(self)
+        return load(self)
+
+    def spy_allocate(cls, size):
+        allocated.append(allocate(cls, size))
+        return allocated[-1]
+
+    monkeypatch.setattr(Image.Image, "load", spy_load)
+    monkeypatch.setattr(ImageBuffer, "allocate", classmethod(spy_allocate))
+    return loaded, allocated
+
+
+def test_render_image_bytes_decodes_into_one_buffer_without_copy(monkeypatch, tmp_path):
+    image_bytes = synthetic_jpeg_bytes(2)
+    loaded, allocated = spy_decoding(monkeypatch)
+
+    with open(tmp_path / "output.jpg", "wb") as output:
+        render_image_bytes(image_bytes, synthetic_face_details(20), synthetic_labels_response(5), {}, output)
+
+    # デコーダーは確保した1枚のバッファへ直接書き込み、モザイクと枠線も同じメモリを書き換える
+    # （PILのメモリ確保はtracemallocで追跡できないため、メモリ使用量ではなくデコード先を確認する）
+    assert len(allocated) == 1
+    assert allocated[0].zero_copy
+    assert any(image.im is allocated[0].image.im for image in loaded if image.format == "JPEG")
+
+
+def test_falls_back_to_rgbx_without_pillow_internals(monkeypatch):
+    monkeypatch.setattr("lib.image_buffer._map_buffer", None)
+    image_bytes = encode(noise_image(), "PNG")
+
+    buffer = open_image_buffer(image_bytes)
+    output = io.BytesIO()
+    encode_image_buffer(buffer, output, format="PNG")
+
+    assert not buffer.zero_copy
+    assert buffer.image.mode == "RGBX"
+    assert np.array_equal(buffer.rgb, np.asarray(noise_image()))
+    # フォールバックでも配列と画像はメモリを共有する
+    ImageDraw.Draw(buffer.image).rectangle((0, 0, 9, 9), fill="red")
+    assert buffer.rgb[5, 5].tolist() == [255, 0, 0]
+    assert np.array_equal(np.asarray(Image.open(output)), np.asarray(noise_image()))
+
+
+def test_render_image_bytes_without_pillow_internals_matches(monkeypatch):
+    image_bytes = synthetic_jpeg_bytes(0.5)
+    args = (synthetic_face_details(5), synthetic_labels_response(3), {"Cat-2": True})
+    expected = io.BytesIO()
+    render_image_bytes(image_bytes, *args, expected, format="PNG")
+
+    monkeypatch.setattr("lib.image_buffer._map_buffer", None)
+    actual = io.BytesIO()
+    render_image_bytes(image_bytes, *args, actual, format="PNG")
+
+    assert np.array_equal(np.asarray(Image.open(actual)), np.asarray(Image.open(expected)))
+
+
+def test_open_image_buffer_copies_when_decode_target_cannot_be_set(monkeypatch):
+    monkeypatch.setattr("lib.image_buffer._set_decode_target", lambda image, buffer: False)
+    image_bytes = encode(noise_image(), "PNG")
+
+    buffer = open_image_buffer(image_bytes)
+
+    assert np.array_equal(buffer.rgb, np.asarray(noise_image()))
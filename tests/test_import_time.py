@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.import_time import measure_import
+
+# 起動時（最初の検出・matplotlibでの描画の前）には読み込まないモジュール
+DEFERRED_MODULES = ("matplotlib", "boto3", "botocore", "mypy_boto3_rekognition")
+
+
+@pytest.fixture(scope="module")
+def app_import_timings():
+    # streamlit run で起動した場合と同様に、streamlitは読み込み済みの状態で計測する
+    return measure_import("app.nekognition_app", preload=["streamlit"])
+
+
+def test_app_import_defers_heavy_modules(app_import_timings):
+    imported = {timing.name.split(".")[0] for timing in app_import_timings}
+
+    assert imported.isdisjoint(DEFERRED_MODULES)
+
+
+def test_measure_import_reports_target_last(app_import_timings):
+    target = app_import_timings[-1]
+
+    assert target.name == "app.nekognition_app"
+    assert target.cumulative_us >= max(timing.cumulative_us for timing in app_import_timings[:-1])
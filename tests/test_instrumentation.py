@@ -0,0 +1,181 @@
+import logging
+import time
+import urllib.error
+import urllib.request
+
+from PIL import Image
+import pytest
+
+import lib.instrumentation as instrumentation_module
+from lib.image_processor import ImageProcessor
+from lib.instrumentation import (
+    InMemoryMetricsSink,
+    Instrumentation,
+    LoggingMetricsSink,
+    PrometheusMetricsSink,
+    SpanRecord,
+    configure_from_env,
+)
+
+
+def test_span_is_noop_without_sinks():
+    instrumentation = Instrumentation()
+
+    assert instrumentation.enabled is False
+    assert instrumentation.span("a") is instrumentation.span("b")
+
+
+def test_span_records_duration_and_attributes():
+    instrumentation = Instrumentation()
+    sink = InMemoryMetricsSink()
+    instrumentation.add_sink(sink)
+
+    with instrumentation.span("stage", drawer="PIL"):
+        pass
+
+    assert len(sink.records) == 1
+    record = sink.records[0]
+    assert record.name == "stage"
+    assert record.duration_seconds >= 0
+    assert record.attributes == {"drawer": "PIL"}
+
+
+def test_span_records_error():
+    instrumentation = Instrumentation()
+    sink = InMemoryMetricsSink()
+    instrumentation.add_sink(sink)
+
+    with pytest.raises(ValueError):
+        with instrumentation.span("stage"):
+            raise ValueError()
+
+    assert sink.records[0].attributes == {"error": "ValueError"}
+
+
+def test_remove_sink():
+    instrumentation = Instrumentation()
+    sink = InMemoryMetricsSink()
+    instrumentation.add_sink(sink)
+    instrumentation.remove_sink(sink)
+
+    with instrumentation.span("stage"):
+        pass
+
+    assert instrumentation.enabled is False
+    assert sink.records == []
+
+
+def test_logging_sink(caplog):
+    sink = LoggingMetricsSink()
+
+    with caplog.at_level(logging.INFO, logger="nekognition.metrics"):
+        sink.record(SpanRecord("image_processor.draw", 0.0125, {"drawer": "PIL"}))
+
+    assert "span=image_processor.draw duration_ms=12.500 drawer=PIL" in caplog.text
+
+
+def test_prometheus_sink_render():
+    sink = PrometheusMetricsSink(buckets=(0.1, 1.0))
+    sink.record(SpanRecord("decode", 0.05))
+    sink.record(SpanRecord("decode", 0.5))
+    sink.record(SpanRecord("decode", 5.0))
+
+    text = sink.render()
+
+    assert "# TYPE nekognition_span_duration_seconds histogram" in text
+    assert 'nekognition_span_duration_seconds_bucket{span="decode",le="0.1"} 1' in text
+    assert 'nekognition_span_duration_seconds_bucket{span="decode",le="1"} 2' in text
+    assert 'nekognition_span_duration_seconds_bucket{span="decode",le="+Inf"} 3' in text
+    assert 'nekognition_span_duration_seconds_sum{span="decode"} 5.55' in text
+    assert 'nekognition_span_duration_seconds_count{span="decode"} 3' in text
+
+
+def test_prometheus_sink_escapes_label_values():
+    sink = PrometheusMetricsSink()
+    sink.record(SpanRecord("draw", 0.01, {"drawer": 'a"b'}))
+
+    assert 'drawer="a\\"b"' in sink.render()
+
+
+def test_prometheus_sink_textfile_flush(tmp_path):
+    path = tmp_path / "nekognition.prom"
+    # 書き出しのスレッドが動かないよう、間隔を長くして手動で書き出す
+    sink = PrometheusMetricsSink(textfile_path=str(path), flush_interval_seconds=3600)
+    try:
+        # 記録したスレッドではファイルを書かない
+        sink.record(SpanRecord("decode", 0.01))
+        assert not path.exists()
+
+        sink.flush()
+        assert 'count{span="decode"} 1' in path.read_text()
+
+        # 記録が無ければ書き出さない
+        path.unlink()
+        sink.flush()
+        assert not path.exists()
+
+        sink.record(SpanRecord("decode", 0.01))
+    finally:
+        # 停止時に残りを書き出す
+        sink.close()
+    assert 'count{span="decode"} 2' in path.read_text()
+
+
+def test_prometheus_sink_textfile_background_flusher(tmp_path):
+    path = tmp_path / "nekognition.prom"
+    sink = PrometheusMetricsSink(textfile_path=str(path), flush_interval_seconds=0.01)
+    try:
+        sink.record(SpanRecord("decode", 0.01))
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 'count{span="decode"} 1' in path.read_text()
+    finally:
+        sink.close()
+
+
+def test_prometheus_sink_http_server():
+    sink = PrometheusMetricsSink()
+    sink.record(SpanRecord("decode", 0.01))
+    server = sink.start_http_server(0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert 'count{span="decode"} 1' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/")
+    finally:
+        sink.close()
+
+
+def test_configure_from_env_registers_sinks_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation_module, "_configured_from_env", False)
+    monkeypatch.setattr(instrumentation_module, "instrumentation", Instrumentation())
+    environ = {
+        "NEKOGNITION_METRICS_LOG": "1",
+        "NEKOGNITION_METRICS_PROMETHEUS_FILE": str(tmp_path / "metrics.prom"),
+    }
+
+    assert configure_from_env(environ) is True
+    assert configure_from_env(environ) is True
+    sinks = instrumentation_module.instrumentation._sinks
+    assert [type(sink) for sink in sinks] == [LoggingMetricsSink, PrometheusMetricsSink]
+
+
+def test_configure_from_env_without_settings(monkeypatch):
+    monkeypatch.setattr(instrumentation_module, "_configured_from_env", False)
+    monkeypatch.setattr(instrumentation_module, "instrumentation", Instrumentation())
+
+    assert configure_from_env({}) is False
+
+
+def test_image_processor_spans(metrics_sink, mosaic_drawer, pil_box_drawer):
+    processor = ImageProcessor(mosaic_drawer, pil_box_drawer)
+    image = Image.new("RGB", (64, 48))
+
+    processor.process_image(image, [], {"Labels": []}, {})
+
+    names = [record.name for record in metrics_sink.records]
+    assert names == ["image_processor.mosaic", "image_processor.draw", "image_processor.process_image"]
+    assert metrics_sink.records[0].attributes == {"drawer": "EllipseFaceMosaicDrawer"}
+    assert metrics_sink.records[1].attributes == {"drawer": "PILBoundingBoxDrawer"}
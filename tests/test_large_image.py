@@ -0,0 +1,78 @@
+import io
+
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.large_image import get_image_size, open_preview, write_full_resolution
+from tests.utils.image import images_are_equal
+
+
+def dummy_labels_response_one_cat():
+    return {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Instances": [
+                    {
+                        "BoundingBox": {"Left": 0.44, "Top": 0.71, "Width": 0.30, "Height": 0.28},
+                        "Confidence": 94.49180603027344
+                    },
+                ]
+            }
+        ]
+    }
+
+
+def dummy_two_faces_details():
+    return [
+        {"BoundingBox": {"Width": 0.13, "Height": 0.25, "Left": 0.25, "Top": 0.14}},
+        {"BoundingBox": {"Width": 0.11, "Height": 0.20, "Left": 0.51, "Top": 0.23}},
+    ]
+
+
+def read_input_image_bytes() -> bytes:
+    with open("tests/images/image_processor/input_two_faces_one_cat.jpg", "rb") as f:
+        return f.read()
+
+
+def test_get_image_size():
+    assert get_image_size(read_input_image_bytes()) == Image.open(
+        "tests/images/image_processor/input_two_faces_one_cat.jpg"
+    ).size
+
+
+def test_open_preview_decodes_at_reduced_resolution():
+    image_bytes = read_input_image_bytes()
+    width, height = get_image_size(image_bytes)
+
+    preview = open_preview(image_bytes, max_dimension=max(width, height) // 4)
+
+    assert max(preview.size) == max(width, height) // 4
+    assert abs(preview.size[0] / preview.size[1] - width / height) < 0.01
+
+
+def test_open_preview_returns_small_image_as_is():
+    image_bytes = read_input_image_bytes()
+    assert open_preview(image_bytes, max_dimension=10000).size == get_image_size(image_bytes)
+
+
+def test_write_full_resolution_matches_image_processor_output():
+    image_bytes = read_input_image_bytes()
+    highlight_states = {"Cat-1": True}
+    expected = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer()).process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), highlight_states
+    )
+
+    output = io.BytesIO()
+    write_full_resolution(
+        image_bytes,
+        dummy_two_faces_details(),
+        dummy_labels_response_one_cat(),
+        highlight_states,
+        output,
+        format="PNG",
+    )
+
+    assert images_are_equal(Image.open(io.BytesIO(output.getvalue())), expected)
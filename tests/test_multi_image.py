@@ -0,0 +1,186 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, Mock
+
+from PIL import Image
+import pytest
+
+from app.nekognition_app import NekognitionApp
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.multi_image import ImageItem, MultiImageProcessor
+from lib.rekognition.stub import StubRekognitionClientWrapper
+
+
+def jpeg_bytes(size=(320, 240), color=(200, 120, 40)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def labels_response_two_cats():
+    box = {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.3}
+    return {
+        "Labels": [{
+            "Name": "Cat",
+            "Instances": [
+                {"BoundingBox": box, "Confidence": 99.1},
+                {"BoundingBox": box, "Confidence": 87.5},
+            ],
+        }]
+    }
+
+
+class SlowForFirstImageClient(StubRekognitionClientWrapper):
+    """1枚目の画像の検出だけ遅くするスタブ"""
+
+    def __init__(self, slow_bytes: bytes, delay_seconds: float, **kwargs):
+        super().__init__(**kwargs)
+        self._slow_bytes = slow_bytes
+        self._delay_seconds = delay_seconds
+
+    def detect_faces(self, image_bytes: bytes):
+        if image_bytes == self._slow_bytes:
+            time.sleep(self._delay_seconds)
+        return super().detect_faces(image_bytes)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def make_processor(client, executor, **kwargs) -> MultiImageProcessor:
+    return MultiImageProcessor(
+        client, NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer(), executor, **kwargs
+    )
+
+
+def test_process_one_returns_preview_and_labels(executor):
+    client = StubRekognitionClientWrapper(
+        face_details=[{"BoundingBox": {"Left": 0.5, "Top": 0.5, "Width": 0.2, "Height": 0.2}}],
+        detect_labels_res=labels_response_two_cats(),
+    )
+    processor = make_processor(client, executor)
+
+    result = processor.process_one(ImageItem("key", "cat.jpg", jpeg_bytes()))
+
+    assert result.error is None
+    assert result.face_count == 1
+    assert result.cat_labels == ["Cat-1 (99.10%)", "Cat-2 (87.50%)"]
+    assert Image.open(io.BytesIO(result.preview_jpeg)).size == (320, 240)
+
+
+def test_process_one_downscales_preview(executor):
+    processor = make_processor(StubRekognitionClientWrapper(), executor, preview_max_dimension=100)
+
+    result = processor.process_one(ImageItem("key", "cat.jpg", jpeg_bytes((400, 200))))
+
+    assert Image.open(io.BytesIO(result.preview_jpeg)).size == (100, 50)
+
+
+def test_process_one_reports_errors(executor):
+    processor = make_processor(StubRekognitionClientWrapper(), executor)
+
+    result = processor.process_one(ImageItem("key", "empty.jpg", b""))
+
+    assert result.preview_jpeg is None
+    assert result.error is not None
+
+
+def test_process_many_yields_in_completion_order(executor):
+    slow_image = jpeg_bytes(color=(1, 2, 3))
+    client = SlowForFirstImageClient(slow_image, delay_seconds=0.5)
+    processor = make_processor(client, executor)
+    items = [ImageItem("slow", "slow.jpg", slow_image)] + [
+        ImageItem(f"fast-{index}", f"fast-{index}.jpg", jpeg_bytes()) for index in range(3)
+    ]
+
+    keys = [result.key for result in processor.process_many(items)]
+
+    # 遅い画像の完了を待たずに、先に終わった画像の結果が返る
+    assert keys[-1] == "slow"
+    assert sorted(keys[:-1]) == ["fast-0", "fast-1", "fast-2"]
+
+
+def test_process_many_bounds_in_flight_items(executor):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    class CountingClient(StubRekognitionClientWrapper):
+        def detect_faces(self, image_bytes: bytes):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+            return []
+
+    processor = make_processor(CountingClient(), executor, max_in_flight=2)
+    items = [ImageItem(str(index), f"{index}.jpg", jpeg_bytes()) for index in range(6)]
+
+    assert len(list(processor.process_many(items))) == 6
+    assert max_running <= 2
+
+
+def test_nekognition_app_multi_image_mode(monkeypatch, executor):
+    mock_st = MagicMock()
+    mock_st.session_state = {}
+    monkeypatch.setattr("app.nekognition_app.st", mock_st)
+    app = NekognitionApp(
+        rekognition_client=StubRekognitionClientWrapper(detect_labels_res=labels_response_two_cats()),
+        multi_image_executor=executor,
+    )
+    uploaded_files = []
+    for index, color in enumerate([(10, 10, 10), (20, 20, 20), (10, 10, 10)]):
+        uploaded_file = Mock()
+        uploaded_file.getvalue.return_value = jpeg_bytes(color=color)
+        uploaded_file.name = f"{index}.jpg"
+        uploaded_files.append(uploaded_file)
+
+    app._run_multi_image(uploaded_files)
+
+    # 同じ内容の画像は1回だけ処理・表示する
+    store = mock_st.session_state["multi_image_results"]
+    assert len(store) == 2
+    assert mock_st.image.call_count == 2
+
+    # 再実行時は保持している結果を表示し、アップロードから外された画像の結果は破棄する
+    app._run_multi_image(uploaded_files[:1])
+    assert len(store) == 1
+    assert mock_st.image.call_count == 3
+
+
+def test_nekognition_app_shares_multi_image_processor_across_reruns(monkeypatch):
+    from app import nekognition_app
+
+    mock_st = MagicMock()
+    mock_st.session_state = {}
+    monkeypatch.setattr("app.nekognition_app.st", mock_st)
+    client = StubRekognitionClientWrapper(detect_labels_res=labels_response_two_cats())
+    created = []
+    original = nekognition_app._shared_multi_image_processor.__wrapped__
+
+    def counting(*args):
+        created.append(args)
+        return original(*args)
+
+    shared = nekognition_app.functools.lru_cache(maxsize=8)(counting)
+    monkeypatch.setattr(nekognition_app, "_shared_multi_image_processor", shared)
+    uploaded_file = Mock()
+    uploaded_file.getvalue.return_value = jpeg_bytes()
+    uploaded_file.name = "0.jpg"
+
+    # 再実行のたびにNekognitionAppは作り直されるが、処理器とワーカープールは共有する
+    for _ in range(2):
+        mock_st.session_state.pop("multi_image_results", None)
+        NekognitionApp(rekognition_client=client)._run_multi_image([uploaded_file])
+
+    assert len(created) == 1
+    assert created[0][2] is nekognition_app._shared_multi_image_executor()
@@ -1,10 +1,17 @@
+import io
+import os
 import pytest
 from types import SimpleNamespace
-from unittest.mock import Mock
+from unittest.mock import MagicMock, Mock
+
+from PIL import Image
 
 from app.nekognition_app import NekognitionApp
+from lib.output_encoder import OutputEncoder
+from lib.rekognition.detections import Detections
+from lib.rekognition.stub import StubRekognitionClientWrapper
 from lib.rekognition.utils import validate_image_bytes
-from lib.rekognition.wrapper import IRekognitionClientWrapper
+from lib.rekognition.wrapper import DetectionResult, IRekognitionClientWrapper
 
 
 class MockRekognitionClientWrapper(IRekognitionClientWrapper):
@@ -81,8 +88,7 @@ def test_nekognition_app_update_session_state(
 
     assert mock_st.session_state["image_bytes"] == b"dummy_image_bytes"
     assert mock_st.session_state["uploaded_filename"] == "dummy.png"
-    assert mock_st.session_state["detect_face_res"] == ["face"]
-    assert mock_st.session_state["detect_cats_res"] == {"Labels": ["cat"]}
+    assert mock_st.session_state["detection_result"] == DetectionResult(["face"], {"Labels": ["cat"]})
 
 
 def test_nekognition_app_update_session_state_min_bytes_uploaded_file(
@@ -95,8 +101,7 @@ def test_nekognition_app_update_session_state_min_bytes_uploaded_file(
 
     assert mock_st.session_state["image_bytes"] == b"a"
     assert mock_st.session_state["uploaded_filename"] == "dummy.png"
-    assert mock_st.session_state["detect_face_res"] == ["face"]
-    assert mock_st.session_state["detect_cats_res"] == {"Labels": ["cat"]}
+    assert mock_st.session_state["detection_result"] == DetectionResult(["face"], {"Labels": ["cat"]})
 
 
 def test_nekognition_app_update_session_state_max_bytes_uploaded_file(
@@ -109,8 +114,7 @@ def test_nekognition_app_update_session_state_max_bytes_uploaded_file(
 
     assert mock_st.session_state["image_bytes"] == b"a" * 5242880
     assert mock_st.session_state["uploaded_filename"] == "dummy.png"
-    assert mock_st.session_state["detect_face_res"] == ["face"]
-    assert mock_st.session_state["detect_cats_res"] == {"Labels": ["cat"]}
+    assert mock_st.session_state["detection_result"] == DetectionResult(["face"], {"Labels": ["cat"]})
 
 
 def test_nekognition_app_update_session_state_raises_value_error_on_smaller_than_min_bytes_uploaded_file(
@@ -131,3 +135,124 @@ def test_nekognition_app_update_session_state_raises_value_error_on_larger_than_
         rekognition_mocked_app._update_session_state_with_detection(
             dummy_uploaded_file_larger_than_max_bytes
         )
+
+
+def test_nekognition_app_shares_image_processor_between_reruns():
+    # Streamlitの再実行のたびにNekognitionAppが作り直されても、デフォルトの描画器とImageProcessorは共有される
+    first = NekognitionApp(rekognition_client=MockRekognitionClientWrapper())
+    second = NekognitionApp(rekognition_client=MockRekognitionClientWrapper())
+
+    assert first._image_processor is second._image_processor
+
+
+def test_nekognition_app_shows_thumbnail_then_encoded_image(monkeypatch):
+    mock_st = MagicMock()
+    monkeypatch.setattr("app.nekognition_app.st", mock_st)
+    app = NekognitionApp(
+        rekognition_client=MockRekognitionClientWrapper(),
+        output_encoder=OutputEncoder(format="WEBP", thumbnail_dimension=32),
+    )
+
+    image = Image.new("RGB", (128, 64), "white")
+    encoder = app._output_encoder
+
+    app._show_processed_image(lambda: encoder.encode_thumbnail(image), lambda: encoder.encode(image))
+
+    # サムネイルを表示した場所を、全体の画像で置き換える
+    slot = mock_st.empty.return_value
+    thumbnail, full = [Image.open(io.BytesIO(call.args[0])) for call in slot.image.call_args_list]
+    assert thumbnail.size == (32, 16)
+    assert full.size == (128, 64)
+    assert full.format == "WEBP"
+    assert "WEBP 128x64" in mock_st.caption.call_args.args[0]
+
+
+def test_nekognition_app_full_resolution_export_survives_download_rerun(monkeypatch):
+    mock_st = MagicMock()
+    mock_st.session_state = {"image_hash": "hash"}
+    monkeypatch.setattr("app.nekognition_app.st", mock_st)
+    app = NekognitionApp(rekognition_client=MockRekognitionClientWrapper())
+    with open("tests/images/image_processor/input_two_faces_one_cat.jpg", "rb") as f:
+        image_bytes = f.read()
+
+    def show(highlight_states):
+        app._show_full_resolution_export(image_bytes, Detections.from_face_details([]), Detections.from_detect_labels_res({"Labels": []}), highlight_states, 5)
+
+    mock_st.button.return_value = True
+    show({"Cat-1": False})
+    path = mock_st.session_state["full_resolution_export"]["path"]
+    assert Image.open(path).format == "JPEG"
+    assert mock_st.download_button.call_count == 1
+
+    # ダウンロードのクリック後の再実行（書き出しボタンは押されていない）でも、同じファイルのボタンを表示する
+    mock_st.button.return_value = False
+    show({"Cat-1": False})
+    assert mock_st.download_button.call_count == 2
+    assert mock_st.session_state["full_resolution_export"]["path"] == path
+
+    # ハイライト状態が変わったら前の書き出し結果を破棄する
+    show({"Cat-1": True})
+    assert mock_st.download_button.call_count == 2
+    assert "full_resolution_export" not in mock_st.session_state
+    assert not os.path.exists(path)
+
+
+def animated_gif_bytes(frames: int, size=(64, 48)) -> bytes:
+    images = [Image.new("RGB", size, (index * 20 % 256, 80, 160)) for index in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], duration=50, loop=0)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def animation_st(monkeypatch) -> MagicMock:
+    mock_st = MagicMock()
+    mock_st.session_state = {}
+    monkeypatch.setattr("app.nekognition_app.st", mock_st)
+    return mock_st
+
+
+def test_nekognition_app_animation_keeps_result_across_reruns(animation_st):
+    app = NekognitionApp(rekognition_client=StubRekognitionClientWrapper())
+    image_bytes = animated_gif_bytes(3)
+
+    app._run_animation(image_bytes)
+    app._run_animation(image_bytes)
+
+    gif_bytes = animation_st.session_state["animation_result"][1]
+    assert Image.open(io.BytesIO(gif_bytes)).n_frames == 3
+    assert animation_st.image.call_count == 2
+    animation_st.error.assert_not_called()
+
+
+def test_nekognition_app_animation_rejects_too_many_frames(animation_st):
+    client = MagicMock()
+    app = NekognitionApp(rekognition_client=client, animation_max_frames=2)
+
+    app._run_animation(animated_gif_bytes(3))
+
+    # 処理する前に上限を確認し、検出しない
+    animation_st.error.assert_called_once()
+    client.detect_all.assert_not_called()
+    assert "animation_result" not in animation_st.session_state
+
+
+def test_nekognition_app_animation_rejects_oversized_input(animation_st):
+    client = MagicMock()
+    app = NekognitionApp(rekognition_client=client)
+
+    app._run_animation(b"a" * 5242881)
+
+    animation_st.error.assert_called_once()
+    client.detect_all.assert_not_called()
+
+
+def test_nekognition_app_animation_does_not_store_oversized_result(animation_st):
+    app = NekognitionApp(rekognition_client=StubRekognitionClientWrapper(), animation_max_output_bytes=100)
+    animation_st.session_state["animation_result"] = ("previous", b"previous", None)
+
+    app._run_animation(animated_gif_bytes(3))
+
+    animation_st.error.assert_called_once()
+    animation_st.image.assert_not_called()
+    assert "animation_result" not in animation_st.session_state
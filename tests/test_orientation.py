@@ -0,0 +1,97 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from lib.image_buffer import open_image_buffer
+from lib.image_processor import ImageProcessor
+from lib.large_image import get_image_size, open_preview
+from lib.orientation import ORIENTATION_TAG, apply_orientation, exif_orientation, oriented_size
+from lib.perceptual_hash import fingerprint_image_bytes
+from lib.rekognition.preprocess import preprocess_image_bytes
+
+
+def raw_image(size=(120, 80)) -> Image.Image:
+    """向きを判別できるよう、左上だけ赤い画像"""
+    image = Image.new("RGB", size, "white")
+    image.paste((255, 0, 0), (0, 0, size[0] // 4, size[1] // 4))
+    return image
+
+
+def encode_with_orientation(image: Image.Image, orientation: int, format: str = "JPEG") -> bytes:
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, exif=exif.tobytes(), quality=95)
+    return buffer.getvalue()
+
+
+def upright(image_bytes: bytes) -> np.ndarray:
+    return np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("RGB"), dtype=np.int16)
+
+
+def assert_close(image: Image.Image, expected: np.ndarray):
+    """JPEGの再エンコードによる差は許容し、向き（赤い角の位置）が一致することを確認する"""
+    actual = np.asarray(image.convert("RGB"), dtype=np.int16)
+    assert actual.shape == expected.shape
+    assert np.abs(actual - expected).mean() < 4
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_apply_orientation_matches_exif_transpose(orientation):
+    image_bytes = encode_with_orientation(raw_image(), orientation, format="PNG")
+    image = Image.open(io.BytesIO(image_bytes))
+
+    assert exif_orientation(image) == orientation
+    rotated = apply_orientation(image.convert("RGB"), orientation)
+    assert rotated.size == oriented_size(image, orientation)
+    assert np.array_equal(np.asarray(rotated), upright(image_bytes))
+
+
+def test_exif_orientation_without_exif_is_one():
+    buffer = io.BytesIO()
+    raw_image().save(buffer, format="PNG")
+    image = Image.open(buffer)
+
+    assert exif_orientation(image) == 1
+
+
+def test_rotated_photo_is_upright_for_rekognition_and_display():
+    # Orientation=6（時計回りに90度回転して表示する）の小さなJPEG
+    image_bytes = encode_with_orientation(raw_image(), 6)
+    expected = upright(image_bytes)
+
+    preprocessed = preprocess_image_bytes(image_bytes)
+    sent = Image.open(io.BytesIO(preprocessed))
+    # 小さな画像でも回転して再エンコードし、回転情報の無い正立した画像を送る
+    assert preprocessed != image_bytes
+    assert exif_orientation(sent) == 1
+    assert sent.size == (80, 120)
+    assert_close(sent, expected)
+
+    assert get_image_size(image_bytes) == (80, 120)
+    assert_close(open_preview(image_bytes), expected)
+    assert_close(open_image_buffer(image_bytes).image, expected)
+    assert_close(ImageProcessor._decode(image_bytes, None), expected)
+    assert fingerprint_image_bytes(image_bytes).size == (80, 120)
+
+
+def test_rotated_photo_is_upright_when_downscaled():
+    image_bytes = encode_with_orientation(raw_image((1200, 800)), 8)
+    expected = np.asarray(
+        Image.fromarray(upright(image_bytes).astype(np.uint8)).resize((40, 60), Image.Resampling.LANCZOS),
+        dtype=np.int16,
+    )
+
+    sent = Image.open(io.BytesIO(preprocess_image_bytes(image_bytes, max_dimension=60)))
+    assert sent.size == (40, 60)
+    assert_close(sent, expected)
+    assert_close(open_preview(image_bytes, max_dimension=60), expected)
+    assert_close(open_image_buffer(image_bytes, max_dimension=60).image, expected)
+
+
+def test_unrotated_jpeg_is_still_passed_through():
+    image_bytes = encode_with_orientation(raw_image(), 1)
+
+    assert preprocess_image_bytes(image_bytes) == image_bytes
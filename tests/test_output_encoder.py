@@ -0,0 +1,155 @@
+import io
+from unittest.mock import MagicMock
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from PIL import Image
+
+from lib.output_encoder import OutputEncoder, output_encoder_from_env, to_image
+
+
+def noise_image(size=(640, 480)) -> Image.Image:
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8))
+
+
+def open_encoded(data: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+@pytest.mark.parametrize("format", ["JPEG", "WEBP"])
+def test_encode_format(format):
+    encoded = OutputEncoder(format=format).encode(noise_image())
+
+    image = open_encoded(encoded.data)
+    assert image.format == format
+    assert image.size == (640, 480) == encoded.size
+    assert encoded.nbytes == len(encoded.data)
+    assert encoded.mime_type == f"image/{format.lower()}"
+    assert encoded.encode_seconds >= 0
+
+
+def test_encode_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        OutputEncoder(format="PNG")
+
+
+def test_encode_progressive_jpeg():
+    progressive = open_encoded(OutputEncoder(progressive=True).encode(noise_image()).data)
+    baseline = open_encoded(OutputEncoder(progressive=False).encode(noise_image()).data)
+
+    assert progressive.info.get("progressive") == 1
+    assert "progressive" not in baseline.info
+
+
+def test_encode_converts_rgba_image():
+    encoded = OutputEncoder().encode(noise_image().convert("RGBA"))
+
+    assert open_encoded(encoded.data).mode == "RGB"
+
+
+def test_encode_max_dimension_keeps_aspect_ratio():
+    encoded = OutputEncoder(max_dimension=200).encode(noise_image((640, 480)))
+
+    assert encoded.size == (200, 150)
+    assert open_encoded(encoded.data).size == (200, 150)
+
+
+def test_encode_max_dimension_does_not_upscale():
+    encoded = OutputEncoder(max_dimension=2000).encode(noise_image((640, 480)))
+
+    assert encoded.size == (640, 480)
+
+
+def test_encode_lowers_quality_to_fit_max_bytes():
+    image = noise_image()
+    unlimited = OutputEncoder(quality=95).encode(image)
+    limited = OutputEncoder(quality=95, max_bytes=unlimited.nbytes // 2, min_quality=20).encode(image)
+
+    assert limited.quality < 95
+    assert limited.nbytes < unlimited.nbytes
+
+
+def test_encode_stops_at_min_quality():
+    encoded = OutputEncoder(quality=90, max_bytes=1, min_quality=70).encode(noise_image())
+
+    # 上限に収まらない場合も、min_qualityより下げずにエンコードした結果を返す
+    assert encoded.quality == 70
+    assert encoded.nbytes > 1
+
+
+def test_encode_figure_without_png():
+    fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
+    ax.imshow(np.asarray(noise_image((40, 30))))
+    fig.savefig = MagicMock(side_effect=AssertionError("savefig must not be called"))
+    try:
+        encoded = OutputEncoder().encode((fig, ax))
+    finally:
+        plt.close(fig)
+
+    assert encoded.size == (400, 300)
+    assert open_encoded(encoded.data).format == "JPEG"
+
+
+def test_to_image_figure_is_rgb():
+    fig, ax = plt.subplots(figsize=(2, 1), dpi=50)
+    try:
+        image = to_image((fig, ax))
+    finally:
+        plt.close(fig)
+
+    assert image.mode == "RGB"
+    assert image.size == (100, 50)
+
+
+def test_encode_thumbnail():
+    encoder = OutputEncoder(format="WEBP", thumbnail_dimension=160)
+    image = noise_image((640, 480))
+    thumbnail = encoder.encode_thumbnail(image)
+    full = encoder.encode(image)
+
+    assert thumbnail.size == (160, 120)
+    assert thumbnail.format == "WEBP"
+    assert thumbnail.nbytes < full.nbytes
+
+
+def test_encode_thumbnail_respects_max_dimension():
+    thumbnail = OutputEncoder(max_dimension=100, thumbnail_dimension=320).encode_thumbnail(noise_image())
+
+    assert max(thumbnail.size) == 100
+
+
+def test_output_encoder_from_env():
+    encoder = output_encoder_from_env(
+        {
+            "NEKOGNITION_OUTPUT_FORMAT": "webp",
+            "NEKOGNITION_OUTPUT_QUALITY": "70",
+            "NEKOGNITION_OUTPUT_MAX_DIMENSION": "320",
+        }
+    )
+    encoded = encoder.encode(noise_image())
+
+    assert encoder.format == "WEBP"
+    assert encoded.quality == 70
+    assert encoded.size == (320, 240)
+
+
+def test_output_encoder_from_env_defaults():
+    encoder = output_encoder_from_env({})
+
+    encoded = encoder.encode(noise_image())
+
+    assert encoder.format == "JPEG"
+    assert encoded.quality == 85
+    assert "progressive" not in open_encoded(encoded.data).info
+
+
+def test_output_encoder_from_env_progressive():
+    encoder = output_encoder_from_env({"NEKOGNITION_OUTPUT_PROGRESSIVE": "1"})
+
+    assert open_encoded(encoder.encode(noise_image()).data).info.get("progressive") == 1
+    # エンコード結果のキャッシュ（RenderCache.encoded）はプログレッシブかどうかを区別する
+    assert encoder.settings != output_encoder_from_env({"NEKOGNITION_OUTPUT_PROGRESSIVE": "0"}).settings
@@ -0,0 +1,48 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.parallel import map_completed
+
+
+def test_map_completed_yields_in_completion_order():
+    def work(delay: float) -> float:
+        time.sleep(delay)
+        return delay
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(map_completed(executor, work, [0.2, 0.0], max_in_flight=2))
+
+    assert results == [0.0, 0.2]
+
+
+def test_map_completed_reads_items_lazily_and_limits_in_flight():
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    submitted = []
+
+    def items():
+        for index in range(6):
+            submitted.append(index)
+            yield index
+
+    def work(index: int) -> int:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return index
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = map_completed(executor, work, items(), max_in_flight=2)
+        first = next(results)
+        # 最初の結果を返した時点では、上限の2件までしか投入していない
+        assert len(submitted) == 2
+        rest = list(results)
+
+    assert sorted([first, *rest]) == list(range(6))
+    assert max_running <= 2
@@ -0,0 +1,103 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from lib.perceptual_hash import MultiIndexHashTable, fingerprint_image_bytes, hamming_distance
+
+INPUT_IMAGES = [
+    "tests/images/bounding_box_draw/input_one_cat.jpg",
+    "tests/images/bounding_box_draw/input_two_cats.jpg",
+    "tests/images/image_processor/input_two_faces_one_cat.jpg",
+]
+
+
+def encode(image: Image.Image, format: str = "JPEG", **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("path", INPUT_IMAGES)
+def test_fingerprint_is_stable_across_resize_and_recompression(path):
+    image = Image.open(path).convert("RGB")
+    original = fingerprint_image_bytes(encode(image, quality=90))
+
+    for variant in (
+        encode(image, quality=40),
+        encode(image.resize((image.width // 3, image.height // 3)), quality=60),
+        encode(image, "PNG"),
+    ):
+        fingerprint = fingerprint_image_bytes(variant)
+        assert hamming_distance(original.hash_value, fingerprint.hash_value) <= 4
+        assert original.thumbnail_difference(fingerprint) < 1.5
+        assert fingerprint.aspect_ratio == pytest.approx(original.aspect_ratio, rel=0.01)
+
+
+def test_fingerprint_separates_different_and_shifted_images():
+    fingerprints = [fingerprint_image_bytes(open(path, "rb").read()) for path in INPUT_IMAGES]
+    for index, a in enumerate(fingerprints):
+        for b in fingerprints[index + 1:]:
+            assert hamming_distance(a.hash_value, b.hash_value) > 10
+
+    # 連写のように少しずれた画像は、dHashが近くても縮小画像の差で区別できる
+    image = Image.open(INPUT_IMAGES[1]).convert("RGB")
+    width, height = image.size
+    shifted = image.crop((width // 50, height // 50, width, height)).resize(image.size)
+    assert fingerprints[1].thumbnail_difference(fingerprint_image_bytes(encode(shifted))) > 1.5
+
+
+def test_multi_index_hash_table_matches_linear_scan():
+    rng = random.Random(0)
+    index = MultiIndexHashTable(max_distance=4)
+    hashes = []
+    for _ in range(2000):
+        # 一部は既存のハッシュ値から数ビットだけ変えた値にする
+        if hashes and rng.random() < 0.3:
+            value = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, 6)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        assert index.add(value) == len(hashes)
+        hashes.append(value)
+
+    for query in rng.sample(hashes, 200):
+        expected = sorted(
+            (hamming_distance(query, value), entry_id)
+            for entry_id, value in enumerate(hashes)
+            if hamming_distance(query, value) <= 3
+        )
+        assert [(distance, entry_id) for entry_id, distance in index.search(query, 3)] == expected
+
+    assert len(index) == 2000
+    assert index.nbytes > 0
+
+
+def test_multi_index_hash_table_rejects_larger_distance():
+    index = MultiIndexHashTable(max_distance=2)
+    assert index.search(0) == []
+    with pytest.raises(ValueError):
+        index.search(0, max_distance=3)
+    with pytest.raises(ValueError):
+        MultiIndexHashTable(max_distance=64)
+    index.add(0b1011)
+    assert index.search(0b0011) == [(0, 1)]
+    assert index.search(0b0100) == []
+
+
+def test_multi_index_hash_table_remove_and_reuse_ids():
+    index = MultiIndexHashTable(max_distance=2)
+    first = index.add(0b1011)
+    second = index.add(0b1111)
+    nbytes = index.nbytes
+
+    index.remove(first)
+    assert len(index) == 1
+    assert index.search(0b1011) == [(second, 1)]
+
+    # 削除したIDを再利用し、配列を大きくしない
+    assert index.add(1 << 40) == first
+    assert index.search(1 << 40) == [(first, 0)]
+    assert index.nbytes == nbytes
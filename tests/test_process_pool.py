@@ -0,0 +1,153 @@
+import io
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lib.boundary_draw.drawer import BoundingBoxDrawer
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.output_encoder import OutputEncoder
+from lib import process_pool
+from lib.process_pool import ProcessPoolImageProcessor, RenderPoolStats, process_pool_from_env
+
+FACES = [{"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.4}}]
+CATS = {
+    "Labels": [
+        {
+            "Name": "Cat",
+            "Instances": [
+                {"BoundingBox": {"Left": 0.5, "Top": 0.2, "Width": 0.4, "Height": 0.6}, "Confidence": 90.0}
+            ],
+        }
+    ]
+}
+
+
+def png_bytes(size=(160, 120)) -> bytes:
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def pool():
+    # ワーカーの起動に時間がかかるため、モジュール内のテストで共有する
+    pool = ProcessPoolImageProcessor(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def shared_memory_names(monkeypatch):
+    """呼び出し元で作成した共有メモリの名前を記録する"""
+    names = []
+
+    class RecordingSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if kwargs.get("create"):
+                names.append(self.name)
+
+    monkeypatch.setattr(process_pool.shared_memory, "SharedMemory", RecordingSharedMemory)
+    return names
+
+
+def test_matches_in_process_rendering(pool):
+    image_bytes = png_bytes()
+    highlight_states = {"Cat-1": True}
+
+    rendered = pool.process_image_bytes(image_bytes, FACES, CATS, highlight_states)
+
+    expected = ImageProcessor(NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer()).process_image_bytes(
+        image_bytes, FACES, CATS, highlight_states
+    )
+    # 同じ設定のOutputEncoderでエンコードした結果と一致する
+    assert rendered.data == OutputEncoder().encode(expected).data
+    assert rendered.format == "JPEG"
+    assert rendered.size == (160, 120)
+    assert rendered.worker_seconds > 0
+
+
+def test_max_dimension_is_applied_in_worker(pool):
+    rendered = pool.process_image_bytes(png_bytes((400, 200)), FACES, CATS, {}, max_dimension=100)
+
+    assert rendered.size == (100, 50)
+
+
+def test_concurrent_submissions_release_shared_memory(shared_memory_names):
+    pool = ProcessPoolImageProcessor(max_workers=2)
+    futures = [pool.submit(png_bytes(), FACES, CATS, {}) for _ in range(4)]
+    results = [future.result() for future in futures]
+
+    assert all(Image.open(io.BytesIO(result.data)).format == "JPEG" for result in results)
+    assert len(shared_memory_names) == 4
+    for name in shared_memory_names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+    assert (pool.stats.submitted, pool.stats.completed, pool.stats.failed, pool.stats.in_flight) == (4, 4, 0, 0)
+    assert pool.stats.busy_seconds > 0
+    assert 0 < pool.stats.utilization() <= 1
+    pool.shutdown()
+
+
+def test_worker_error_is_raised_and_shared_memory_released(pool, shared_memory_names):
+    with pytest.raises(Exception):
+        pool.process_image_bytes(b"not an image", FACES, CATS, {})
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shared_memory_names[0])
+    # 失敗した処理の後もプールは使える
+    assert pool.process_image_bytes(png_bytes(), [], {"Labels": []}, {}).size == (160, 120)
+
+
+def test_matplotlib_drawer_is_rendered_and_encoded_in_worker():
+    pool = ProcessPoolImageProcessor(
+        max_workers=1, bounding_box_drawer_factory=BoundingBoxDrawer, output_encoder=OutputEncoder(format="WEBP")
+    )
+    try:
+        # matplotlibの描画器は全ての猫のハイライト状態を必要とする
+        rendered = pool.process_image_bytes(png_bytes(), FACES, CATS, {"Cat-1": False})
+    finally:
+        pool.shutdown()
+
+    assert Image.open(io.BytesIO(rendered.data)).format == "WEBP"
+
+
+def test_stats_utilization():
+    stats = RenderPoolStats(workers=2, busy_seconds=3.0, started_at=10.0)
+
+    assert stats.utilization(now=13.0) == pytest.approx(0.5)
+    assert stats.utilization(now=10.0) == 0.0
+
+
+def test_output_encoder_settings_and_thumbnail_are_applied_in_worker():
+    encoder = OutputEncoder(format="WEBP", max_dimension=100, thumbnail_dimension=40)
+    pool = ProcessPoolImageProcessor(max_workers=1, output_encoder=encoder)
+    try:
+        thumbnail_future = pool.submit(png_bytes(), FACES, CATS, {}, thumbnail=True)
+        full = pool.process_image_bytes(png_bytes(), FACES, CATS, {})
+        thumbnail = thumbnail_future.result()
+    finally:
+        pool.shutdown()
+
+    assert (full.format, full.size) == ("WEBP", (100, 75))
+    assert Image.open(io.BytesIO(full.data)).format == "WEBP"
+    assert thumbnail.size == (40, 30)
+    assert Image.open(io.BytesIO(thumbnail.data)).size == (40, 30)
+    assert full.describe().startswith("WEBP 100x75 ")
+
+
+def test_process_pool_from_env():
+    assert process_pool_from_env({}) is None
+
+    pool = process_pool_from_env({"NEKOGNITION_RENDER_PROCESSES": "3", "NEKOGNITION_OUTPUT_FORMAT": "webp"})
+    try:
+        assert pool.stats.workers == 3
+        # 1画像モードの表示と同じエンコードの設定を使う
+        assert pool._output_encoder.format == "WEBP"
+    finally:
+        pool.shutdown()
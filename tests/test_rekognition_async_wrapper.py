@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+from lib.rekognition.async_wrapper import AsyncRekognitionClientWrapper, RekognitionBackpressureError
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.rekognition.wrapper import DetectionResult
+
+
+def dummy_face_details():
+    return [{"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.2, "Height": 0.2}}]
+
+
+def dummy_labels_response():
+    return {"Labels": [{"Name": "Cat", "Instances": []}]}
+
+
+class ConcurrencyCountingStub(StubRekognitionClientWrapper):
+    """同時に実行中の呼び出し数の最大値を記録するスタブ"""
+
+    def __init__(self, latency_seconds: float):
+        super().__init__(detect_faces_latency_seconds=latency_seconds)
+        self._lock = threading.Lock()
+        self._running = 0
+        self.max_running = 0
+        self.calls = 0
+
+    def detect_faces(self, image_bytes: bytes):
+        with self._lock:
+            self._running += 1
+            self.calls += 1
+            self.max_running = max(self.max_running, self._running)
+        try:
+            return super().detect_faces(image_bytes)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+def test_async_wrapper_detect_all_returns_combined_result():
+    async def run():
+        stub = StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response())
+        async with AsyncRekognitionClientWrapper(stub) as client:
+            return await client.detect_all(b"image")
+
+    result = asyncio.run(run())
+    assert result == DetectionResult(dummy_face_details(), dummy_labels_response())
+
+
+def test_async_wrapper_limits_concurrency():
+    stub = ConcurrencyCountingStub(latency_seconds=0.05)
+
+    async def run():
+        async with AsyncRekognitionClientWrapper(stub, max_concurrency=2) as client:
+            await asyncio.gather(*(client.detect_faces(b"image") for _ in range(6)))
+
+    # 処理時間には依存せず、同時に実行された呼び出し数が上限を超えないことを確認する
+    asyncio.run(run())
+    assert stub.calls == 6
+    assert 1 <= stub.max_running <= 2
+
+
+def test_async_wrapper_rejects_requests_over_max_waiting():
+    async def run():
+        stub = StubRekognitionClientWrapper(detect_faces_latency_seconds=0.1)
+        async with AsyncRekognitionClientWrapper(stub, max_concurrency=1, max_waiting=1) as client:
+            return await asyncio.gather(
+                *(client.detect_faces(b"image") for _ in range(3)),
+                return_exceptions=True,
+            )
+
+    results = asyncio.run(run())
+    assert [isinstance(result, RekognitionBackpressureError) for result in results] == [False, False, True]
+
+
+def test_async_wrapper_propagates_errors():
+    async def run():
+        async with AsyncRekognitionClientWrapper(StubRekognitionClientWrapper()) as client:
+            await client.detect_cats(b"")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
@@ -0,0 +1,116 @@
+import pytest
+
+from lib.cache import LRUCache
+from lib.rekognition.cache import CachedRekognitionClientWrapper, SQLiteDetectionCacheStore
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+
+class CountingRekognitionClientWrapper(IRekognitionClientWrapper):
+    def __init__(self):
+        self.detect_faces_calls = 0
+        self.detect_cats_calls = 0
+
+    def detect_faces(self, image_bytes: bytes):
+        self.detect_faces_calls += 1
+        return [{"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.2, "Height": 0.2}}]
+
+    def detect_cats(
+        self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75
+    ):
+        self.detect_cats_calls += 1
+        return {"Labels": [{"Name": "Cat", "Instances": []}]}
+
+
+@pytest.fixture
+def counting_client() -> CountingRekognitionClientWrapper:
+    return CountingRekognitionClientWrapper()
+
+
+def test_cached_wrapper_calls_client_once_per_image(counting_client):
+    cached = CachedRekognitionClientWrapper(counting_client, LRUCache())
+
+    first = cached.detect_faces(b"image")
+    second = cached.detect_faces(b"image")
+    cached.detect_cats(b"image")
+    cached.detect_cats(b"image")
+
+    assert first == second
+    assert counting_client.detect_faces_calls == 1
+    assert counting_client.detect_cats_calls == 1
+
+
+def test_cached_wrapper_distinguishes_images_and_parameters(counting_client):
+    cached = CachedRekognitionClientWrapper(counting_client, LRUCache())
+
+    cached.detect_faces(b"image1")
+    cached.detect_faces(b"image2")
+    cached.detect_cats(b"image1")
+    cached.detect_cats(b"image1", max_labels=5)
+    cached.detect_cats(b"image1", min_confidence=90)
+
+    assert counting_client.detect_faces_calls == 2
+    assert counting_client.detect_cats_calls == 3
+
+
+def test_cached_wrapper_does_not_cache_errors(counting_client):
+    class FailingOnceClient(CountingRekognitionClientWrapper):
+        def detect_faces(self, image_bytes: bytes):
+            if self.detect_faces_calls == 0:
+                self.detect_faces_calls += 1
+                raise RuntimeError("temporary error")
+            return super().detect_faces(image_bytes)
+
+    client = FailingOnceClient()
+    cached = CachedRekognitionClientWrapper(client, LRUCache())
+    with pytest.raises(RuntimeError):
+        cached.detect_faces(b"image")
+    assert len(cached.detect_faces(b"image")) == 1
+    assert client.detect_faces_calls == 2
+
+
+def test_cached_wrapper_uses_disk_store_across_instances(tmp_path, counting_client):
+    db_path = str(tmp_path / "cache.sqlite3")
+    first = CachedRekognitionClientWrapper(
+        counting_client, LRUCache(), SQLiteDetectionCacheStore(db_path)
+    )
+    expected = first.detect_cats(b"image")
+
+    second = CachedRekognitionClientWrapper(
+        counting_client, LRUCache(), SQLiteDetectionCacheStore(db_path)
+    )
+    assert second.detect_cats(b"image") == expected
+    assert counting_client.detect_cats_calls == 1
+
+
+def test_sqlite_store_expires_entries_after_ttl(tmp_path):
+    now = [0.0]
+    store = SQLiteDetectionCacheStore(
+        str(tmp_path / "cache.sqlite3"), ttl_seconds=10, clock=lambda: now[0]
+    )
+    store.put("key", {"Labels": []})
+    assert store.get("key") == {"Labels": []}
+    now[0] = 11
+    assert store.get("key") is None
+
+
+def test_cached_wrapper_detect_all_delegates_to_detect_all_once(counting_client):
+    class DetectAllCountingClient(CountingRekognitionClientWrapper):
+        def __init__(self):
+            super().__init__()
+            self.detect_all_calls = 0
+
+        def detect_all(self, image_bytes, max_labels=10, min_confidence=75):
+            self.detect_all_calls += 1
+            return super().detect_all(image_bytes, max_labels, min_confidence)
+
+    client = DetectAllCountingClient()
+    cached = CachedRekognitionClientWrapper(client, LRUCache())
+
+    first = cached.detect_all(b"image")
+    second = cached.detect_all(b"image")
+    cached.detect_faces(b"image")
+
+    assert first == second
+    assert client.detect_all_calls == 1
+    assert client.detect_faces_calls == 1
+    assert client.detect_cats_calls == 1
@@ -0,0 +1,108 @@
+import random
+
+import numpy as np
+import pytest
+
+from lib.boundary_draw.pil_drawer import compute_instance_overlays
+from lib.face_mosaic_drawer import face_boxes_in_pixels
+from lib.render_cache import detect_labels_key, face_details_key
+from lib.rekognition.detections import Detections, as_cat_detections, as_face_detections
+from lib.rekognition.wrapper import DetectionResult
+
+
+def labels_response(instances: list[dict]) -> dict:
+    return {"Labels": [{"Name": "Dog", "Instances": []}, {"Name": "Cat", "Instances": instances}]}
+
+
+def random_box(rng: random.Random) -> dict:
+    width, height = rng.uniform(0.01, 0.5), rng.uniform(0.01, 0.5)
+    return {"Left": rng.uniform(-0.1, 1 - width), "Top": rng.uniform(-0.1, 1 - height), "Width": width, "Height": height}
+
+
+def test_from_detect_labels_res():
+    instances = [
+        {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 97.123},
+        {"Confidence": 80.0},
+        {"BoundingBox": {"Left": 0.5, "Top": 0.5, "Width": 0.1, "Height": 0.1}},
+    ]
+
+    cats = Detections.from_detect_labels_res(labels_response(instances))
+
+    assert len(cats) == 3
+    assert cats.boxes.shape == (3, 4)
+    assert cats.boxes[0].tolist() == [0.1, 0.2, 0.3, 0.4]
+    assert cats.has_box.tolist() == [True, False, True]
+    assert np.isnan(cats.confidences[2])
+    assert cats.names == ("Cat-1", "Cat-2", "Cat-3")
+    assert cats.confidence_texts == ("97.12%", "80.00%", "no confidence")
+    assert cats.labels == ("Cat-1(97.12%)", "Cat-2(80.00%)", "Cat-3(no confidence)")
+
+
+def test_no_cats_and_read_only_arrays():
+    cats = Detections.from_detect_labels_res({"Labels": []})
+
+    assert len(cats) == 0
+    assert cats.boxes.shape == (0, 4)
+    with pytest.raises(ValueError):
+        Detections.from_face_details([{"BoundingBox": random_box(random.Random(0))}]).boxes[0, 0] = 1.0
+
+
+def test_detection_result_normalizes_once():
+    result = DetectionResult([{"BoundingBox": random_box(random.Random(0))}], labels_response([{"Confidence": 90.0}]))
+
+    assert result.faces is result.faces
+    assert result.cats is result.cats
+    assert as_cat_detections(result.cats) is result.cats
+    assert as_face_detections(result.faces) is result.faces
+    assert result.cats.names == ("Cat-1",)
+
+
+def test_pixel_boxes_match_raw_responses():
+    rng = random.Random(1)
+    for image_size in ((640, 480), (4000, 3000), (33, 17)):
+        instances = [{"BoundingBox": random_box(rng), "Confidence": rng.uniform(50, 100)} for _ in range(50)]
+        face_details = [{"BoundingBox": random_box(rng)} for _ in range(50)]
+
+        # 変換前のレスポンスを渡した場合と、正規化した結果を渡した場合で同じ座標になる
+        raw_overlays = compute_instance_overlays(labels_response(instances), image_size)
+        overlays = compute_instance_overlays(Detections.from_detect_labels_res(labels_response(instances)), image_size)
+        assert [(o.instance_name, o.label, o.boxes) for o in overlays] == [
+            (o.instance_name, o.label, o.boxes) for o in raw_overlays
+        ]
+
+        # 1件ずつ計算した場合と同じ座標になる
+        width, height = image_size
+        expected = []
+        for instance in instances:
+            box = instance["BoundingBox"]
+            expected.append([(
+                round(box["Left"] * width),
+                round(box["Top"] * height),
+                round((box["Left"] + box["Width"]) * width),
+                round((box["Top"] + box["Height"]) * height),
+            )])
+        assert [overlay.boxes for overlay in overlays] == expected
+
+        expected_faces = []
+        for face in face_details:
+            box = face["BoundingBox"]
+            left, top = int(box["Left"] * width), int(box["Top"] * height)
+            right, bottom = int(left + box["Width"] * width), int(top + box["Height"] * height)
+            left, top, right, bottom = max(0, left), max(0, top), min(width, right), min(height, bottom)
+            if left < right and top < bottom:
+                expected_faces.append((left, top, right, bottom))
+        assert face_boxes_in_pixels(Detections.from_face_details(face_details), image_size) == expected_faces
+
+
+def test_cache_keys_depend_on_boxes_and_confidence():
+    instances = [{"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 97.0}]
+    changed = [{"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 96.0}]
+
+    assert detect_labels_key(labels_response(instances)) == detect_labels_key(
+        Detections.from_detect_labels_res(labels_response(instances))
+    )
+    assert detect_labels_key(labels_response(instances)) != detect_labels_key(labels_response(changed))
+    # 顔のキーはBoundingBoxを持つ顔だけで決まる
+    assert face_details_key([{"BoundingBox": instances[0]["BoundingBox"]}, {}]) == face_details_key(
+        [{"BoundingBox": instances[0]["BoundingBox"], "Confidence": 99.0}]
+    )
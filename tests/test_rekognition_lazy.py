@@ -0,0 +1,43 @@
+import threading
+
+from lib.rekognition.lazy import LazyRekognitionClientWrapper
+from lib.rekognition.stub import StubRekognitionClientWrapper
+
+
+def test_client_is_created_on_first_call():
+    created = []
+
+    def factory():
+        created.append(True)
+        return StubRekognitionClientWrapper(detect_labels_res={"Labels": []})
+
+    client = LazyRekognitionClientWrapper(factory)
+    assert created == []
+
+    assert client.detect_faces(b"image") == []
+    assert client.detect_cats(b"image") == {"Labels": []}
+    assert client.detect_all(b"image").face_details == []
+    assert len(created) == 1
+
+
+def test_client_is_created_once_across_threads():
+    created = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        created.append(True)
+        return StubRekognitionClientWrapper()
+
+    client = LazyRekognitionClientWrapper(factory)
+
+    def call():
+        barrier.wait()
+        client.detect_faces(b"image")
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
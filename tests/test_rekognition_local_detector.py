@@ -0,0 +1,43 @@
+import importlib.util
+
+import pytest
+
+from lib.rekognition.detections import Detections
+from lib.rekognition.local_detector import OpenCVRekognitionClientWrapper
+
+requires_cv2 = pytest.mark.skipif(importlib.util.find_spec("cv2") is None, reason="OpenCV is not installed")
+
+IMAGE_PATH = "tests/images/image_processor/input_two_faces_one_cat.jpg"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("cv2") is not None, reason="OpenCV is installed")
+def test_opencv_detector_requires_cv2():
+    with pytest.raises(ImportError, match="opencv-python-headless<5"):
+        OpenCVRekognitionClientWrapper()
+
+
+@requires_cv2
+def test_opencv_detector_returns_rekognition_shaped_responses():
+    detector = OpenCVRekognitionClientWrapper()
+    with open(IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
+
+    result = detector.detect_all(image_bytes)
+
+    assert result.face_details == detector.detect_faces(image_bytes)
+    assert result.detect_labels_res == detector.detect_cats(image_bytes)
+    for detections in (result.faces, result.cats):
+        assert isinstance(detections, Detections)
+        assert detections.has_box.all()
+        assert ((detections.boxes >= 0) & (detections.boxes <= 1)).all()
+    labels = result.detect_labels_res["Labels"]
+    assert labels == [] or labels[0]["Name"] == "Cat"
+
+
+@requires_cv2
+def test_opencv_detector_rejects_missing_cascade(tmp_path):
+    detector = OpenCVRekognitionClientWrapper(face_cascade=str(tmp_path / "missing.xml"))
+    with open(IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
+    with pytest.raises(ValueError):
+        detector.detect_faces(image_bytes)
@@ -0,0 +1,135 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+
+from lib.cache import LRUCache
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.local_server import (
+    FixtureResponse,
+    LatencyDistribution,
+    LocalRekognitionServer,
+    RekognitionFixtures,
+)
+from lib.rekognition.resilience import (
+    RekognitionUnavailableError,
+    ResilientRekognitionClientWrapper,
+    create_rekognition_client,
+)
+from lib.rekognition.wrapper import RekognitionClientWrapper
+
+FACE = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 99.5}
+CAT = {
+    "Name": "Cat",
+    "Confidence": 97.0,
+    "Instances": [{"BoundingBox": {"Left": 0.5, "Top": 0.5, "Width": 0.2, "Height": 0.2}, "Confidence": 97.0}],
+}
+
+
+@pytest.fixture(autouse=True)
+def dummy_credentials(monkeypatch):
+    # スタンドインサーバーは署名を検証しないが、boto3は署名のために認証情報を必要とする
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "local")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "local")
+
+
+def boto3_wrapper(server: LocalRekognitionServer) -> RekognitionClientWrapper:
+    return RekognitionClientWrapper(
+        create_rekognition_client("ap-northeast-1", endpoint_url=server.endpoint_url)
+    )
+
+
+def test_latency_distribution_parse_and_sample():
+    rng = random.Random(0)
+
+    assert LatencyDistribution.parse("fixed:0.05").sample(rng) == 0.05
+    assert all(0.02 <= LatencyDistribution.parse("uniform:0.02,0.1").sample(rng) <= 0.1 for _ in range(100))
+    lognormal = LatencyDistribution.parse("lognormal:0.1,0.5")
+    samples = sorted(lognormal.sample(rng) for _ in range(2001))
+    assert samples[1000] == pytest.approx(0.1, rel=0.1)
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("normal:0.1")
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("uniform:0.1")
+
+
+def test_fixtures_from_dict():
+    fixtures = RekognitionFixtures.from_dict({
+        "abc": {"FaceDetails": [FACE]},
+        "default": {"Labels": [CAT]},
+    })
+
+    assert fixtures.get("abc") == FixtureResponse([FACE], [])
+    assert fixtures.get("unknown") == FixtureResponse([], [CAT])
+
+
+def test_boto3_client_receives_fixture_responses():
+    fixtures = RekognitionFixtures()
+    fixtures.add(b"cat image", [FACE], [CAT])
+
+    with LocalRekognitionServer(fixtures) as server:
+        client = boto3_wrapper(server)
+        result = client.detect_all(b"cat image")
+        unknown = client.detect_all(b"other image")
+        filtered = client.detect_cats(b"cat image", min_confidence=98)
+
+    assert result.face_details == [FACE]
+    assert result.detect_labels_res["Labels"] == [CAT]
+    assert unknown.face_details == []
+    assert unknown.detect_labels_res["Labels"] == []
+    assert filtered["Labels"] == []
+    assert server.stats.requests_by_operation == {"DetectFaces": 2, "DetectLabels": 3}
+
+
+def test_server_rejects_invalid_requests():
+    with LocalRekognitionServer() as server:
+        client = create_rekognition_client("ap-northeast-1", endpoint_url=server.endpoint_url)
+        with pytest.raises(ClientError) as error:
+            client.compare_faces(SourceImage={"Bytes": b"a"}, TargetImage={"Bytes": b"b"})
+
+    assert error.value.response["Error"]["Code"] == "UnknownOperationException"
+
+
+def test_injected_throttling_is_retried_by_resilient_wrapper():
+    with LocalRekognitionServer(throttle_rate=0.5, seed=3) as server:
+        client = ResilientRekognitionClientWrapper(boto3_wrapper(server), sleep=lambda seconds: None)
+        for _ in range(20):
+            client.detect_faces(b"image")
+
+    stats = server.stats
+    assert stats.throttled > 0
+    assert client.stats.retries == stats.throttled
+    assert client.stats.attempts == stats.requests
+
+
+def test_injected_errors_exhaust_retries():
+    with LocalRekognitionServer(error_rate=1.0) as server:
+        client = ResilientRekognitionClientWrapper(boto3_wrapper(server), max_attempts=3, sleep=lambda seconds: None)
+        with pytest.raises(RekognitionUnavailableError):
+            client.detect_cats(b"image")
+
+    assert server.stats.errors == 3
+
+
+def test_concurrent_requests_overlap_and_cache_serves_repeats():
+    images = [f"image-{index}".encode() for index in range(8)]
+    fixtures = RekognitionFixtures()
+    for image in images:
+        fixtures.add(image, [FACE])
+
+    with LocalRekognitionServer(fixtures, latency=LatencyDistribution("fixed", (0.2,))) as server:
+        client = CachedRekognitionClientWrapper(boto3_wrapper(server), LRUCache(max_entries=16))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            first = list(executor.map(client.detect_all, images))
+        elapsed = time.perf_counter() - start
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            repeated = list(executor.map(client.detect_all, images * 3))
+
+    assert all(result.face_details == [FACE] for result in first + repeated)
+    # 16リクエスト×0.2秒を直列に処理すると3.2秒かかる
+    assert elapsed < 1.5
+    # 2回目以降はキャッシュから返され、サーバーへは送信されない
+    assert server.stats.requests_by_operation == {"DetectFaces": 8, "DetectLabels": 8}
@@ -0,0 +1,92 @@
+import io
+
+import pytest
+from PIL import Image
+
+from lib.rekognition.near_duplicate import NearDuplicateRekognitionClientWrapper
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+FACE = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 99.0}
+
+
+class CountingRekognitionClientWrapper(IRekognitionClientWrapper):
+    def __init__(self):
+        self.calls = 0
+
+    def detect_faces(self, image_bytes: bytes):
+        self.calls += 1
+        return [FACE]
+
+    def detect_cats(self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75):
+        self.calls += 1
+        return {"Labels": [{"Name": "Cat", "Instances": []}]}
+
+
+@pytest.fixture
+def image() -> Image.Image:
+    return Image.open("tests/images/image_processor/input_two_faces_one_cat.jpg").convert("RGB")
+
+
+def encode(image: Image.Image, quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_reuses_results_for_resized_and_recompressed_image(image):
+    client = CountingRekognitionClientWrapper()
+    wrapper = NearDuplicateRekognitionClientWrapper(client)
+
+    first = wrapper.detect_all(encode(image))
+    resized = wrapper.detect_all(encode(image.resize((image.width // 2, image.height // 2)), quality=50))
+
+    assert client.calls == 2  # 最初の画像の顔・猫の検出だけ
+    assert resized is first
+    # BoundingBoxは比率のため、縮小した画像にもそのまま対応する
+    assert resized.faces.boxes.tolist() == [[0.1, 0.2, 0.3, 0.4]]
+    assert (wrapper.hits, wrapper.misses) == (1, 1)
+    assert wrapper.detect_faces(encode(image, quality=70)) == [FACE]
+    assert client.calls == 2
+
+
+def test_does_not_reuse_results_for_different_images(image):
+    client = CountingRekognitionClientWrapper()
+    wrapper = NearDuplicateRekognitionClientWrapper(client)
+    width, height = image.size
+
+    wrapper.detect_all(encode(image))
+    # 別の画像、切り抜き（縦横比が異なる）、連写のように少しずれた画像、異なるパラメータ
+    wrapper.detect_all(open("tests/images/bounding_box_draw/input_two_cats.jpg", "rb").read())
+    wrapper.detect_all(encode(image.crop((0, 0, width // 2, height))))
+    wrapper.detect_all(encode(image.crop((width // 50, height // 50, width, height)).resize(image.size)))
+    wrapper.detect_all(encode(image), min_confidence=90)
+
+    assert client.calls == 10
+    assert wrapper.hits == 0
+
+
+def test_skips_undecodable_and_flat_images():
+    client = CountingRekognitionClientWrapper()
+    wrapper = NearDuplicateRekognitionClientWrapper(client)
+    flat = encode(Image.new("RGB", (64, 48), "gray"))
+
+    wrapper.detect_all(flat)
+    wrapper.detect_all(flat)
+    wrapper.detect_all(b"not an image")
+
+    assert client.calls == 6
+
+
+def test_removes_evicted_results_from_index(image):
+    client = CountingRekognitionClientWrapper()
+    wrapper = NearDuplicateRekognitionClientWrapper(client, max_results=1)
+    width, height = image.size
+
+    wrapper.detect_all(encode(image))
+    wrapper.detect_all(encode(image.crop((0, 0, width // 2, height))))
+
+    # 件数上限で破棄した結果のハッシュ値はインデックスにも残さない
+    assert len(wrapper._index) == 1
+    assert wrapper.detect_all(encode(image, quality=70)) is not None
+    assert wrapper.hits == 0
+    assert len(wrapper._index) == 1
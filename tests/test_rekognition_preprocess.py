@@ -0,0 +1,81 @@
+import io
+
+from PIL import Image
+import numpy as np
+import pytest
+
+from lib.rekognition.preprocess import (
+    PreprocessingRekognitionClientWrapper,
+    preprocess_image_bytes,
+)
+from lib.rekognition.utils import MAX_IMAGE_BYTES
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+
+
+class RecordingRekognitionClientWrapper(IRekognitionClientWrapper):
+    def __init__(self):
+        self.sent_image_bytes: list[bytes] = []
+
+    def detect_faces(self, image_bytes: bytes):
+        self.sent_image_bytes.append(image_bytes)
+        return []
+
+    def detect_cats(
+        self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75
+    ):
+        self.sent_image_bytes.append(image_bytes)
+        return {"Labels": []}
+
+
+def encode_image(size: tuple[int, int], format: str, **params) -> bytes:
+    width, height = size
+    pixels = np.random.default_rng(0).integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def test_preprocess_keeps_small_image_as_is():
+    with open("tests/images/image_processor/input_two_faces_one_cat.jpg", "rb") as f:
+        image_bytes = f.read()
+
+    assert preprocess_image_bytes(image_bytes, max_dimension=1920) is image_bytes
+
+
+def test_preprocess_downscales_large_image_keeping_aspect_ratio():
+    image_bytes = encode_image((4000, 3000), "JPEG")
+
+    preprocessed = preprocess_image_bytes(image_bytes, max_dimension=1000)
+
+    sent_image = Image.open(io.BytesIO(preprocessed))
+    assert sent_image.format == "JPEG"
+    assert sent_image.size == (1000, 750)
+
+
+def test_preprocess_reduces_image_over_max_bytes():
+    # ランダムな画素のPNGは圧縮が効かず上限を超える
+    image_bytes = encode_image((1600, 1200), "PNG")
+    assert len(image_bytes) > MAX_IMAGE_BYTES
+
+    preprocessed = preprocess_image_bytes(image_bytes, max_dimension=1920)
+
+    assert len(preprocessed) <= MAX_IMAGE_BYTES
+    assert Image.open(io.BytesIO(preprocessed)).size == (1600, 1200)
+
+
+def test_preprocessing_wrapper_sends_downscaled_image_once_for_detect_all():
+    client = RecordingRekognitionClientWrapper()
+    wrapper = PreprocessingRekognitionClientWrapper(client, max_dimension=500)
+    image_bytes = encode_image((2000, 1000), "JPEG")
+
+    wrapper.detect_all(image_bytes)
+
+    assert len(client.sent_image_bytes) == 2
+    assert client.sent_image_bytes[0] is client.sent_image_bytes[1]
+    assert Image.open(io.BytesIO(client.sent_image_bytes[0])).size == (500, 250)
+
+
+def test_preprocessing_wrapper_raises_on_empty_bytes():
+    wrapper = PreprocessingRekognitionClientWrapper(RecordingRekognitionClientWrapper())
+    with pytest.raises(ValueError):
+        wrapper.detect_faces(b"")
@@ -0,0 +1,302 @@
+import threading
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from lib.rekognition.resilience import (
+    CircuitBreaker,
+    RekognitionCircuitOpenError,
+    RekognitionUnavailableError,
+    ResilientRekognitionClientWrapper,
+    TokenBucket,
+    create_rekognition_client,
+    is_retryable_error,
+)
+from lib.rekognition.wrapper import RekognitionClientWrapper
+
+
+def client_error(code: str, operation: str = "DetectFaces") -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ThrottlingRekognitionClient:
+    """指定した回数だけエラーを送出してから成功する、boto3のRekognitionクライアントの代わり"""
+
+    def __init__(self, errors: list[Exception]):
+        self._errors = list(errors)
+        self.calls = 0
+
+    def _maybe_raise(self):
+        self.calls += 1
+        if self._errors:
+            raise self._errors.pop(0)
+
+    def detect_faces(self, **kwargs):
+        self._maybe_raise()
+        return {"FaceDetails": [{"BoundingBox": {"Left": 0, "Top": 0, "Width": 1, "Height": 1}}]}
+
+    def detect_labels(self, **kwargs):
+        self._maybe_raise()
+        return {"Labels": []}
+
+
+def resilient_client(fake_client, clock: FakeClock, **kwargs) -> ResilientRekognitionClientWrapper:
+    return ResilientRekognitionClientWrapper(
+        RekognitionClientWrapper(fake_client),
+        sleep=clock.sleep,
+        random_fraction=lambda: 1.0,
+        **kwargs,
+    )
+
+
+def test_retries_throttling_with_exponential_backoff():
+    clock = FakeClock()
+    fake = ThrottlingRekognitionClient([
+        client_error("ThrottlingException"),
+        client_error("ProvisionedThroughputExceededException"),
+    ])
+    client = resilient_client(fake, clock, base_delay_seconds=0.1)
+
+    face_details = client.detect_faces(b"image")
+
+    assert len(face_details) == 1
+    assert fake.calls == 3
+    assert clock.slept == pytest.approx([0.1, 0.2])
+    stats = client.stats
+    assert (stats.calls, stats.attempts, stats.retries, stats.failures) == (1, 3, 2, 0)
+    assert stats.backoff_wait_seconds == pytest.approx(0.3)
+    assert stats.wait_seconds == pytest.approx(0.3)
+
+
+def test_backoff_is_jittered_and_capped():
+    client = ResilientRekognitionClientWrapper(
+        RekognitionClientWrapper(ThrottlingRekognitionClient([])),
+        base_delay_seconds=1.0,
+        max_delay_seconds=4.0,
+        random_fraction=lambda: 0.5,
+    )
+
+    assert client.backoff_seconds(0) == pytest.approx(0.5)
+    assert client.backoff_seconds(1) == pytest.approx(1.0)
+    assert client.backoff_seconds(10) == pytest.approx(2.0)
+
+
+def test_raises_unavailable_after_max_attempts():
+    clock = FakeClock()
+    fake = ThrottlingRekognitionClient([client_error("ThrottlingException")] * 5)
+    client = resilient_client(fake, clock, max_attempts=3)
+
+    with pytest.raises(RekognitionUnavailableError) as exc_info:
+        client.detect_cats(b"image")
+
+    assert isinstance(exc_info.value.__cause__, ClientError)
+    assert fake.calls == 3
+    assert client.stats.failures == 1
+
+
+def test_does_not_retry_non_retryable_errors():
+    clock = FakeClock()
+    fake = ThrottlingRekognitionClient([client_error("InvalidParameterException")])
+    client = resilient_client(fake, clock)
+
+    with pytest.raises(ClientError):
+        client.detect_faces(b"image")
+
+    assert fake.calls == 1
+    assert clock.slept == []
+
+
+def test_does_not_retry_invalid_image_bytes():
+    clock = FakeClock()
+    fake = ThrottlingRekognitionClient([])
+    client = resilient_client(fake, clock)
+
+    with pytest.raises(ValueError):
+        client.detect_faces(b"")
+
+    assert fake.calls == 0
+
+
+def test_is_retryable_error():
+    assert is_retryable_error(client_error("ThrottlingException"))
+    assert is_retryable_error(EndpointConnectionError(endpoint_url="https://example.com"))
+    assert not is_retryable_error(client_error("ImageTooLargeException"))
+    assert not is_retryable_error(ValueError())
+
+
+def test_token_bucket_waits_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_second=2, capacity=2, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    # 待っている間に補充されたトークンは予約済みのため、次の呼び出しはさらに0.5秒待つ
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_second=1, capacity=1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    clock.now += 10
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_token_bucket_is_shared_between_threads():
+    bucket = TokenBucket(rate_per_second=1000, capacity=1, clock=lambda: 0.0, sleep=lambda seconds: None)
+    waits: list[float] = []
+    lock = threading.Lock()
+
+    def acquire():
+        waited = bucket.acquire()
+        with lock:
+            waits.append(waited)
+
+    threads = [threading.Thread(target=acquire) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 同じトークンを複数のスレッドが取得しないため、待ち時間は0, 1ms, 2ms, ...と積み上がる
+    assert sorted(waits) == pytest.approx([index / 1000 for index in range(20)])
+
+
+def test_token_bucket_rejects_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate_per_second=0)
+
+
+def test_rate_limit_wait_is_reported():
+    clock = FakeClock()
+    client = resilient_client(
+        ThrottlingRekognitionClient([]),
+        clock,
+        rate_limiter=TokenBucket(rate_per_second=1, capacity=1, clock=clock, sleep=clock.sleep),
+    )
+
+    client.detect_faces(b"image")
+    client.detect_faces(b"image")
+
+    assert client.stats.rate_limit_wait_seconds == pytest.approx(1.0)
+    assert client.stats.backoff_wait_seconds == 0
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=30, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request() is False
+
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    # 半開状態では試行中の1回以外は通さない
+    assert breaker.allow_request() is False
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_reopens_when_half_open_trial_fails():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=30, clock=clock)
+
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request() is True
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_circuit_fails_fast():
+    clock = FakeClock()
+    fake = ThrottlingRekognitionClient([client_error("ThrottlingException")] * 10)
+    client = resilient_client(
+        fake,
+        clock,
+        max_attempts=3,
+        circuit_breaker=CircuitBreaker(failure_threshold=3, clock=clock),
+    )
+
+    with pytest.raises(RekognitionUnavailableError):
+        client.detect_faces(b"image")
+    with pytest.raises(RekognitionCircuitOpenError):
+        client.detect_faces(b"image")
+
+    assert fake.calls == 3
+
+
+def test_create_rekognition_client_config():
+    client = create_rekognition_client("ap-northeast-1", max_pool_connections=50)
+
+    assert client.meta.config.max_pool_connections == 50
+    assert client.meta.config.retries["total_max_attempts"] == 1
+
+
+def test_non_retryable_errors_do_not_reset_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+    fake = ThrottlingRekognitionClient(
+        [client_error("ThrottlingException"), client_error("AccessDeniedException"), client_error("ThrottlingException")]
+    )
+    client = resilient_client(fake, clock, max_attempts=1, circuit_breaker=breaker)
+
+    with pytest.raises(RekognitionUnavailableError):
+        client.detect_faces(b"image")
+    # 入力の不備などの再試行しないエラーは、障害中の連続失敗の回数を0に戻さない
+    with pytest.raises(ClientError):
+        client.detect_faces(b"image")
+    with pytest.raises(RekognitionUnavailableError):
+        client.detect_faces(b"image")
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_non_retryable_error_in_half_open_trial_does_not_close_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=30, clock=clock)
+    fake = ThrottlingRekognitionClient([client_error("InvalidImageFormatException")])
+    client = resilient_client(fake, clock, max_attempts=1, circuit_breaker=breaker)
+    breaker.record_failure()
+    clock.now += 30
+
+    with pytest.raises(ClientError):
+        client.detect_faces(b"image")
+
+    # 試行の権利だけを返し、閉じずに次の呼び出しを改めて試行にする
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+
+
+def test_release_trial_keeps_closed_breaker_state():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+
+    breaker.record_failure()
+    breaker.release_trial()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
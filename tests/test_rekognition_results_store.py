@@ -0,0 +1,155 @@
+import sqlite3
+
+import pytest
+
+from lib.rekognition.results_store import DetectionResultsStore, PersistentRekognitionClientWrapper
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.rekognition.utils import compute_image_hash
+from lib.rekognition.wrapper import DetectionResult
+
+
+def cats_response(confidences: list[float]) -> dict:
+    box = {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}
+    if len(confidences) == 0:
+        return {"Labels": []}
+    return {
+        "Labels": [{
+            "Name": "Cat",
+            "Instances": [{"BoundingBox": box, "Confidence": confidence} for confidence in confidences],
+        }]
+    }
+
+
+def faces(count: int) -> list[dict]:
+    return [
+        {"BoundingBox": {"Left": 0.5, "Top": 0.5, "Width": 0.1, "Height": 0.1}, "Confidence": 99.0}
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DetectionResultsStore(str(tmp_path / "results.sqlite3"))
+    yield store
+    store.close()
+
+
+class CountingStub(StubRekognitionClientWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detect_all_calls = 0
+
+    def detect_all(self, image_bytes, max_labels=10, min_confidence=75):
+        self.detect_all_calls += 1
+        return super().detect_all(image_bytes, max_labels, min_confidence)
+
+
+def test_save_and_get(store):
+    result = DetectionResult(faces(2), cats_response([95.5, 80.0]))
+    store.save("hash", result)
+
+    assert store.get("hash") == result
+    assert store.get("other") is None
+    # 猫検出のパラメータが異なる結果は別物として扱う
+    assert store.get("hash", max_labels=5) is None
+
+
+def test_save_replaces_existing_result(store):
+    store.save("hash", DetectionResult(faces(1), cats_response([95.0, 96.0, 97.0])), detected_at=1)
+    store.save("hash", DetectionResult(faces(0), cats_response([95.0])), detected_at=2)
+
+    assert store.get("hash") == DetectionResult([], cats_response([95.0]))
+    summaries = store.find_images()
+    assert len(summaries) == 1
+    assert (summaries[0].cat_count, summaries[0].face_count) == (1, 0)
+    assert store.find_images(min_cats=1, min_cat_confidence=0)[0].matched_cat_count == 1
+
+
+def test_persists_across_connections(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    result = DetectionResult(faces(1), cats_response([90.0]))
+    first = DetectionResultsStore(path)
+    first.save("hash", result)
+    first.close()
+
+    second = DetectionResultsStore(path)
+    assert second.get("hash") == result
+    second.close()
+
+
+def test_find_images_by_cat_count_and_confidence(store):
+    store.save("three-confident", DetectionResult([], cats_response([95.0, 92.0, 91.0])), detected_at=1)
+    store.save("three-mixed", DetectionResult([], cats_response([95.0, 92.0, 70.0])), detected_at=2)
+    store.save("one", DetectionResult(faces(1), cats_response([99.0])), detected_at=3)
+    store.save("none", DetectionResult(faces(2), cats_response([])), detected_at=4)
+
+    confident = store.find_images(min_cats=3, min_cat_confidence=90)
+    assert [summary.image_hash for summary in confident] == ["three-confident"]
+    assert confident[0].matched_cat_count == 3
+
+    assert [summary.image_hash for summary in store.find_images(min_cats=3)] == ["three-mixed", "three-confident"]
+    assert [summary.image_hash for summary in store.find_images(min_cat_confidence=98)] == ["one"]
+    assert [summary.image_hash for summary in store.find_images(min_faces=1)] == ["none", "one"]
+
+
+def test_find_images_since_and_limit(store):
+    for index in range(5):
+        store.save(f"hash-{index}", DetectionResult([], cats_response([90.0])), detected_at=index)
+
+    assert [summary.image_hash for summary in store.find_images(since=3)] == ["hash-4", "hash-3"]
+    assert [summary.image_hash for summary in store.find_images(limit=2)] == ["hash-4", "hash-3"]
+
+
+def test_queries_use_indexes(store):
+    store.save("hash", DetectionResult([], cats_response([90.0])))
+    conn = store._connection()
+
+    def plan(query: str, params: tuple) -> str:
+        return " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params))
+
+    assert "images_cat_count" in plan("SELECT * FROM images WHERE cat_count >= ?", (3,))
+    assert "images_detected_at" in plan("SELECT * FROM images WHERE detected_at >= ?", (0,))
+    assert "INDEX" in plan("SELECT * FROM images WHERE image_hash = ?", ("hash",))
+
+
+def test_persistent_wrapper_reuses_stored_results(store):
+    client = CountingStub(faces(1), cats_response([90.0]))
+    wrapper = PersistentRekognitionClientWrapper(client, store)
+
+    first = wrapper.detect_all(b"image")
+    second = PersistentRekognitionClientWrapper(CountingStub(), store).detect_all(b"image")
+
+    assert first == second == DetectionResult(faces(1), cats_response([90.0]))
+    assert client.detect_all_calls == 1
+    assert store.get(compute_image_hash(b"image")) == first
+
+
+def test_persistent_wrapper_single_detection_does_not_store(store):
+    wrapper = PersistentRekognitionClientWrapper(StubRekognitionClientWrapper(faces(1)), store)
+
+    assert wrapper.detect_faces(b"image") == faces(1)
+    assert wrapper.detect_cats(b"image") == {"Labels": []}
+    assert store.get(compute_image_hash(b"image")) is None
+
+    wrapper.detect_all(b"image")
+    assert PersistentRekognitionClientWrapper(CountingStub(), store).detect_faces(b"image") == faces(1)
+
+
+def test_adds_faces_skipped_column_to_existing_file(tmp_path):
+    db_path = str(tmp_path / "results.sqlite3")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE images (image_hash TEXT NOT NULL, max_labels INTEGER NOT NULL, min_confidence INTEGER NOT NULL,"
+        " detected_at REAL NOT NULL, face_count INTEGER NOT NULL, cat_count INTEGER NOT NULL,"
+        " face_details TEXT NOT NULL, detect_labels_res TEXT NOT NULL,"
+        " PRIMARY KEY (image_hash, max_labels, min_confidence))"
+    )
+    conn.execute("INSERT INTO images VALUES ('hash', 10, 75, 1, 0, 0, '[]', '{\"Labels\": []}')")
+    conn.commit()
+    conn.close()
+
+    store = DetectionResultsStore(db_path)
+    assert store.get("hash") == DetectionResult([], {"Labels": []})
+    store.save("skipped", DetectionResult([], {"Labels": []}, faces_skipped=True))
+    assert store.get("skipped").faces_skipped
+    store.close()
@@ -0,0 +1,211 @@
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lib.cache import LRUCache
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.multi_image import ImageItem, MultiImageProcessor
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.rekognition.cache import CachedRekognitionClientWrapper
+from lib.rekognition.results_store import DetectionResultsStore, PersistentRekognitionClientWrapper
+from lib.rekognition.router import (
+    CATS_FIRST,
+    LOCAL_CATS_FIRST,
+    PARALLEL,
+    RoutingRekognitionClientWrapper,
+)
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.rekognition.utils import compute_image_hash
+from lib.video import VideoFrame, VideoProcessor
+
+FACE = {"BoundingBox": {"Left": 0.25, "Top": 0.25, "Width": 0.5, "Height": 0.5}, "Confidence": 99.0}
+CATS = {"Labels": [{"Name": "Cat", "Instances": [{"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.3}, "Confidence": 90.0}]}]}
+# ラベルはあるがインスタンスが無い場合は、アプリと同じく猫なしとして扱う
+NO_CATS = {"Labels": [{"Name": "Cat", "Instances": []}]}
+
+
+class CountingStub(StubRekognitionClientWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls: list[str] = []
+
+    def detect_faces(self, image_bytes):
+        self.calls.append("faces")
+        return super().detect_faces(image_bytes)
+
+    def detect_cats(self, image_bytes, max_labels=10, min_confidence=75):
+        self.calls.append("cats")
+        return super().detect_cats(image_bytes, max_labels, min_confidence)
+
+
+def jpeg_bytes(size=(64, 48)) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(
+        buffer, format="JPEG"
+    )
+    return buffer.getvalue()
+
+
+def test_cats_first_skips_face_call_without_cats():
+    client = CountingStub([FACE], NO_CATS)
+    router = RoutingRekognitionClientWrapper(client, CATS_FIRST)
+
+    result = router.detect_all(b"image")
+
+    assert client.calls == ["cats"]
+    assert result.faces_skipped
+    assert result.face_details == []
+    assert len(result.cats) == 0
+    # 顔検出を省略した結果は、モザイクをかけずに描画できないよう顔の検出結果を返さない
+    with pytest.raises(Exception, match="skipped"):
+        result.faces
+    assert (router.stats.images, router.stats.rejected, router.stats.calls_per_image) == (1, 1, 1.0)
+
+
+def test_cats_first_calls_faces_when_cats_found():
+    client = CountingStub([FACE], CATS)
+    router = RoutingRekognitionClientWrapper(client, CATS_FIRST)
+
+    result = router.detect_all(b"image")
+
+    assert client.calls == ["cats", "faces"]
+    assert not result.faces_skipped
+    assert len(result.faces) == 1
+    assert router.stats.calls_per_image == 2.0
+
+
+def test_parallel_always_calls_both():
+    client = CountingStub([FACE], NO_CATS)
+    router = RoutingRekognitionClientWrapper(client, PARALLEL)
+
+    result = router.detect_all(b"image")
+
+    assert sorted(client.calls) == ["cats", "faces"]
+    assert len(result.faces) == 1
+    assert router.stats.rejected == 0
+
+
+def test_local_cats_first_uses_local_detector_as_gate():
+    client = CountingStub([FACE], CATS)
+    router = RoutingRekognitionClientWrapper(client, LOCAL_CATS_FIRST, local_detector=StubRekognitionClientWrapper())
+
+    assert router.detect_all(b"image").faces_skipped
+    assert client.calls == []
+
+    router = RoutingRekognitionClientWrapper(
+        client, LOCAL_CATS_FIRST, local_detector=StubRekognitionClientWrapper(detect_labels_res=CATS)
+    )
+    result = router.detect_all(b"image")
+    assert sorted(client.calls) == ["cats", "faces"]
+    assert result.cats.confidences.tolist() == [90.0]
+    assert (router.stats.local_calls, router.stats.calls_per_image) == (1, 2.0)
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        RoutingRekognitionClientWrapper(StubRekognitionClientWrapper(), "faces-first")
+
+
+def test_skipped_results_store_cats_but_not_faces(tmp_path):
+    client = CountingStub([FACE], NO_CATS)
+    store = DetectionResultsStore(str(tmp_path / "results.sqlite3"))
+    router = RoutingRekognitionClientWrapper(client, CATS_FIRST)
+    cached = CachedRekognitionClientWrapper(PersistentRekognitionClientWrapper(router, store), LRUCache())
+
+    assert cached.detect_all(b"image").faces_skipped
+    # 猫検出の結果はフラグつきで保存し、キャッシュからも返す
+    stored = store.get(compute_image_hash(b"image"))
+    assert (stored.detect_labels_res, stored.faces_skipped) == (NO_CATS, True)
+    assert [summary.faces_skipped for summary in store.find_images()] == [True]
+    assert cached.detect_cats(b"image") == NO_CATS
+    assert client.calls == ["cats"]
+
+    # 別のプロセスでも、保存済みの結果からRekognitionを呼ばずに顔検出を省略する
+    other = CachedRekognitionClientWrapper(PersistentRekognitionClientWrapper(router, store), LRUCache())
+    assert other.detect_all(b"image").faces_skipped
+    assert client.calls == ["cats"]
+
+    # 省略した顔検出の結果（空のリスト）がキャッシュ・保存から返されることはない
+    assert cached.detect_faces(b"image") == [FACE]
+    assert other.detect_faces(b"image") == [FACE]
+
+
+def test_cached_cats_without_cat_skip_missing_faces():
+    client = CountingStub([FACE], NO_CATS)
+    cached = CachedRekognitionClientWrapper(RoutingRekognitionClientWrapper(client, CATS_FIRST), LRUCache())
+
+    cached.detect_cats(b"image")
+    # 顔の結果が無くても、猫のいない画像の顔検出は呼ばない
+    assert cached.detect_all(b"image").faces_skipped
+    assert "faces" not in client.calls
+
+
+def test_cached_cats_without_cat_are_not_detected_again():
+    client = CountingStub([FACE], NO_CATS)
+    cached = CachedRekognitionClientWrapper(RoutingRekognitionClientWrapper(client, CATS_FIRST), LRUCache())
+
+    # 猫のいない画像を繰り返しアップロードしても、Rekognitionの猫検出は1回だけ
+    assert cached.detect_all(b"image").faces_skipped
+    assert cached.detect_all(b"image").faces_skipped
+    assert client.calls == ["cats"]
+
+
+def test_locally_skipped_cats_are_not_cached_or_stored(tmp_path):
+    client = CountingStub([FACE], CATS)
+    store = DetectionResultsStore(str(tmp_path / "results.sqlite3"))
+    router = RoutingRekognitionClientWrapper(client, LOCAL_CATS_FIRST, local_detector=StubRekognitionClientWrapper())
+    cached = CachedRekognitionClientWrapper(PersistentRekognitionClientWrapper(router, store), LRUCache())
+
+    result = cached.detect_all(b"image")
+
+    # ローカルの検出器の判定だけの結果は、Rekognitionの結果として残さない
+    assert result.faces_skipped and result.cats_skipped
+    assert store.get(compute_image_hash(b"image")) is None
+    assert cached.detect_cats(b"image") == CATS
+    with pytest.raises(ValueError):
+        store.save("hash", result)
+
+
+def test_multi_image_rejects_images_without_cats():
+    client = RoutingRekognitionClientWrapper(StubRekognitionClientWrapper([FACE], NO_CATS), CATS_FIRST)
+    processor = MultiImageProcessor(client, NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer(), executor=None)
+
+    result = processor.process_one(ImageItem("key", "no_cat.jpg", jpeg_bytes()))
+
+    assert result.rejected
+    assert result.error is None
+    assert result.preview_jpeg is None
+
+
+def test_video_mosaics_faces_in_frames_without_cats():
+    class Source:
+        size = (64, 48)
+
+        def __iter__(self):
+            image = Image.open(io.BytesIO(jpeg_bytes())).convert("RGB")
+            yield VideoFrame(0, image, 100)
+
+    class Sink:
+        def __init__(self):
+            self.frames = []
+
+        def write(self, frame):
+            self.frames.append(frame)
+
+        def close(self):
+            pass
+
+    client = CountingStub([FACE], NO_CATS)
+    sink = Sink()
+    VideoProcessor(RoutingRekognitionClientWrapper(client, CATS_FIRST), NumpyEllipseFaceMosaicDrawer()).process(
+        Source(), sink
+    )
+
+    assert "faces" in client.calls
+    original = np.asarray(Image.open(io.BytesIO(jpeg_bytes())).convert("RGB"), dtype=float)
+    rendered = np.asarray(sink.frames[0].image, dtype=float)
+    # 顔の範囲（画像の中央）はモザイクで平滑化されている
+    assert rendered[20:28, 28:36].std() < original[20:28, 28:36].std()
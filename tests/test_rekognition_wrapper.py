@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from lib.rekognition.stub import StubRekognitionClientWrapper
+from lib.rekognition.wrapper import DetectionResult, RekognitionClientWrapper
+
+
+def dummy_face_details():
+    return [{"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.2, "Height": 0.2}}]
+
+
+def dummy_labels_response():
+    return {"Labels": [{"Name": "Cat", "Instances": []}]}
+
+
+def test_detect_all_returns_combined_result():
+    client = StubRekognitionClientWrapper(dummy_face_details(), dummy_labels_response())
+
+    result = client.detect_all(b"image")
+
+    assert result == DetectionResult(dummy_face_details(), dummy_labels_response())
+
+
+class ConcurrencyCountingStub(StubRekognitionClientWrapper):
+    """同時に実行中の呼び出し数の最大値を記録するスタブ"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        # 顔検出と猫検出の両方が実行中になるまで待つ（直列に呼び出した場合はタイムアウトする）
+        self._barrier = threading.Barrier(2, timeout=5)
+        self._running = 0
+        self.max_running = 0
+
+    def _enter(self):
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+        try:
+            self._barrier.wait()
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def detect_faces(self, image_bytes: bytes):
+        self._enter()
+        return super().detect_faces(image_bytes)
+
+    def detect_cats(self, image_bytes: bytes, max_labels: int = 10, min_confidence: int = 75):
+        self._enter()
+        return super().detect_cats(image_bytes, max_labels, min_confidence)
+
+
+def test_detect_all_sends_requests_concurrently():
+    client = ConcurrencyCountingStub()
+
+    client.detect_all(b"image")
+
+    # 処理時間には依存せず、顔検出と猫検出が同時に実行されたことを確認する
+    assert client.max_running == 2
+
+
+def test_detect_all_propagates_errors():
+    client = StubRekognitionClientWrapper()
+    with pytest.raises(ValueError):
+        client.detect_all(b"")
+
+
+def test_rekognition_client_wrapper_spans(metrics_sink):
+    class FakeRekognitionClient:
+        def detect_faces(self, **kwargs):
+            return {"FaceDetails": dummy_face_details()}
+
+        def detect_labels(self, **kwargs):
+            return dummy_labels_response()
+
+    client = RekognitionClientWrapper(FakeRekognitionClient())
+
+    client.detect_faces(b"image")
+    client.detect_cats(b"image")
+
+    assert len(metrics_sink.durations("rekognition.detect_faces")) == 1
+    assert len(metrics_sink.durations("rekognition.detect_cats")) == 1
@@ -0,0 +1,172 @@
+import io
+
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import EllipseFaceMosaicDrawer
+from lib.image_processor import ImageProcessor
+from lib.output_encoder import OutputEncoder
+from lib.render_cache import RenderCache
+from tests.utils.image import images_are_equal
+
+
+class CountingMosaicDrawer(EllipseFaceMosaicDrawer):
+    def __init__(self):
+        self.calls = 0
+
+    def apply_mosaic(self, image, face_details, mosaic_size):
+        self.calls += 1
+        return super().apply_mosaic(image, face_details, mosaic_size)
+
+
+class CountingBoxDrawer(PILBoundingBoxDrawer):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def draw(self, target_image, detect_labels_res, highlight_states={}, default_color="gray", highlight_color="red"):
+        self.calls += 1
+        return super().draw(target_image, detect_labels_res, highlight_states, default_color, highlight_color)
+
+
+def dummy_labels_response_one_cat():
+    return {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Instances": [
+                    {
+                        "BoundingBox": {"Left": 0.44, "Top": 0.71, "Width": 0.30, "Height": 0.28},
+                        "Confidence": 94.49180603027344
+                    },
+                ]
+            }
+        ]
+    }
+
+
+def dummy_two_faces_details():
+    return [
+        {"BoundingBox": {"Width": 0.13, "Height": 0.25, "Left": 0.25, "Top": 0.14}},
+        {"BoundingBox": {"Width": 0.11, "Height": 0.20, "Left": 0.51, "Top": 0.23}},
+    ]
+
+
+def read_input_image_bytes() -> bytes:
+    with open("tests/images/image_processor/input_two_faces_one_cat.jpg", "rb") as f:
+        return f.read()
+
+
+def test_process_image_bytes_reuses_mosaiced_image_on_highlight_change():
+    mosaic_drawer = CountingMosaicDrawer()
+    box_drawer = CountingBoxDrawer()
+    processor = ImageProcessor(mosaic_drawer, box_drawer, RenderCache())
+    image_bytes = read_input_image_bytes()
+
+    off = processor.process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {"Cat-1": False}
+    )
+    on = processor.process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {"Cat-1": True}
+    )
+    off_again = processor.process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {"Cat-1": False}
+    )
+
+    assert mosaic_drawer.calls == 1
+    assert box_drawer.calls == 2
+    assert off_again is off
+    assert not images_are_equal(off, on)
+
+
+def test_process_image_bytes_recomputes_mosaic_when_mosaic_size_changes():
+    mosaic_drawer = CountingMosaicDrawer()
+    processor = ImageProcessor(mosaic_drawer, CountingBoxDrawer(), RenderCache())
+    image_bytes = read_input_image_bytes()
+
+    processor.process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {}, mosaic_size=5
+    )
+    processor.process_image_bytes(
+        image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {}, mosaic_size=10
+    )
+
+    assert mosaic_drawer.calls == 2
+
+
+def test_process_image_bytes_matches_process_image():
+    image_bytes = read_input_image_bytes()
+    cached_processor = ImageProcessor(EllipseFaceMosaicDrawer(), PILBoundingBoxDrawer(), RenderCache())
+    processor = ImageProcessor(EllipseFaceMosaicDrawer(), PILBoundingBoxDrawer())
+
+    expected = processor.process_image(
+        Image.open("tests/images/image_processor/input_two_faces_one_cat.jpg"),
+        dummy_two_faces_details(),
+        dummy_labels_response_one_cat(),
+        {"Cat-1": True},
+    )
+    for processor_under_test in (processor, cached_processor):
+        output = processor_under_test.process_image_bytes(
+            image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat(), {"Cat-1": True}
+        )
+        assert images_are_equal(output, expected)
+
+
+def test_render_cache_evicts_by_image_bytes():
+    cache = RenderCache(max_base_image_bytes=2 * 100 * 100 * 4)
+    for index in range(3):
+        cache.base_images.put(index, Image.new("RGB", (100, 100)))
+
+    assert cache.base_images.keys() == [1, 2]
+    assert cache.base_images.total_bytes == 2 * 100 * 100 * 4
+
+
+def test_render_cache_closes_evicted_figures(box_drawer):
+    import matplotlib.pyplot as plt
+
+    cache = RenderCache(max_rendered=1)
+    image = Image.new("RGB", (40, 30))
+    first = box_drawer.draw(image, {"Labels": []}, {})
+    second = box_drawer.draw(image, {"Labels": []}, {})
+    cache.rendered.put("first", first)
+    cache.rendered.put("second", second)
+
+    assert not plt.fignum_exists(first[0].number)
+    assert plt.fignum_exists(second[0].number)
+    assert cache.rendered.total_bytes > 40 * 30 * 3
+    plt.close(second[0])
+
+
+class CountingOutputEncoder(OutputEncoder):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def _encode(self, *args, **kwargs):
+        self.calls += 1
+        return super()._encode(*args, **kwargs)
+
+
+def test_encode_image_bytes_reuses_encoded_bytes_on_rerun():
+    box_drawer = CountingBoxDrawer()
+    processor = ImageProcessor(CountingMosaicDrawer(), box_drawer, RenderCache())
+    encoder = CountingOutputEncoder(thumbnail_dimension=64)
+    image_bytes = read_input_image_bytes()
+    args = (image_bytes, dummy_two_faces_details(), dummy_labels_response_one_cat())
+
+    def show(highlight_states):
+        thumbnail = processor.encode_image_bytes(*args, highlight_states, encoder, thumbnail=True)
+        return thumbnail, processor.encode_image_bytes(*args, highlight_states, encoder)
+
+    thumbnail, full = show({"Cat-1": False})
+    show({"Cat-1": True})
+    # チェックボックスを戻した再実行では、描画もエンコードもやり直さない
+    assert show({"Cat-1": False}) == (thumbnail, full)
+    assert (box_drawer.calls, encoder.calls) == (2, 4)
+    assert max(thumbnail.size) == 64
+    assert full.size == Image.open(io.BytesIO(image_bytes)).size
+
+    # エンコードの設定が異なる場合はエンコードし直す
+    webp = processor.encode_image_bytes(*args, {"Cat-1": False}, OutputEncoder(format="WEBP"))
+    assert webp.format == "WEBP"
+    assert box_drawer.calls == 2
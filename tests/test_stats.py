@@ -0,0 +1,27 @@
+import pytest
+
+from lib.stats import percentile, summarize_durations
+
+
+def test_percentile_interpolates_between_values():
+    values = [4.0, 1.0, 3.0, 2.0]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 2.5
+    assert percentile(values, 100) == 4.0
+
+
+def test_percentile_of_empty_values_is_zero():
+    assert percentile([], 95) == 0.0
+
+
+def test_percentile_raises_on_invalid_q():
+    with pytest.raises(ValueError):
+        percentile([1.0], 101)
+
+
+def test_summarize_durations():
+    summary = summarize_durations([1.0, 2.0, 3.0])
+    assert summary["count"] == 3
+    assert summary["mean"] == 2.0
+    assert summary["p50"] == 2.0
+    assert summary["max"] == 3.0
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from lib.rekognition.detections import Detections
+from lib.tracking import interpolate_detections, iou_matrix, match_boxes
+
+
+def detections(boxes: list[tuple[float, float, float, float]]) -> Detections:
+    return Detections(boxes, [90.0] * len(boxes))
+
+
+def test_iou_matrix():
+    a = np.array([[0.0, 0.0, 0.5, 0.5], [0.5, 0.5, 0.2, 0.2]])
+    b = np.array([[0.0, 0.0, 0.5, 0.5], [0.25, 0.0, 0.5, 0.5], [np.nan] * 4])
+
+    ious = iou_matrix(a, b)
+
+    assert ious.shape == (2, 3)
+    assert ious[0, 0] == pytest.approx(1.0)
+    assert ious[0, 1] == pytest.approx(0.125 / 0.375)
+    assert ious[1, 0] == 0.0
+    assert ious[0, 2] == 0.0
+
+
+def test_match_boxes_is_greedy_and_one_to_one():
+    a = np.array([[0.0, 0.0, 0.2, 0.2], [0.5, 0.5, 0.2, 0.2], [0.9, 0.9, 0.05, 0.05]])
+    b = np.array([[0.52, 0.5, 0.2, 0.2], [0.01, 0.0, 0.2, 0.2]])
+
+    assert match_boxes(a, b) == [(0, 1), (1, 0)]
+    assert match_boxes(a, b, min_iou=0.99) == []
+    assert match_boxes(a, np.empty((0, 4))) == []
+
+
+def test_interpolate_matched_boxes_linearly():
+    start = detections([(0.1, 0.1, 0.2, 0.2)])
+    end = detections([(0.2, 0.1, 0.2, 0.4)])
+
+    middle = interpolate_detections(start, end, 0.5, min_iou=0.1)
+
+    np.testing.assert_allclose(middle.boxes, [[0.15, 0.1, 0.2, 0.3]])
+    assert interpolate_detections(start, end, 0.0) is start
+    assert interpolate_detections(start, end, 1.0) is end
+
+
+def test_interpolate_unmatched_boxes():
+    start = detections([(0.1, 0.1, 0.1, 0.1)])
+    end = detections([(0.8, 0.8, 0.1, 0.1)])
+
+    # 顔のモザイクでは、対応付けられなかった枠を区間全体に残す
+    assert len(interpolate_detections(start, end, 0.3, keep_unmatched=True)) == 2
+    # 猫の枠では、近い方のキーフレームの枠だけを残す
+    assert interpolate_detections(start, end, 0.3, keep_unmatched=False).boxes.tolist() == [[0.1, 0.1, 0.1, 0.1]]
+    assert interpolate_detections(start, end, 0.7, keep_unmatched=False).boxes.tolist() == [[0.8, 0.8, 0.1, 0.1]]
+
+
+def test_interpolate_with_margin():
+    start = detections([(0.4, 0.4, 0.2, 0.2)])
+
+    expanded = interpolate_detections(start, start, 0.5, margin=0.1, name_prefix="Face")
+
+    np.testing.assert_allclose(expanded.boxes, [[0.38, 0.38, 0.24, 0.24]])
+    assert expanded.names == ("Face-1",)
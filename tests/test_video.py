@@ -0,0 +1,162 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lib.boundary_draw.pil_drawer import PILBoundingBoxDrawer
+from lib.face_mosaic_drawer import NumpyEllipseFaceMosaicDrawer
+from lib.rekognition.wrapper import IRekognitionClientWrapper
+from lib.video import (
+    AnimatedImageFrameSource,
+    FFmpegFrameSink,
+    FFmpegFrameSource,
+    GIFFrameSink,
+    IFrameSink,
+    IFrameSource,
+    VideoFrame,
+    VideoProcessor,
+    ffmpeg_available,
+    is_animated_image,
+)
+
+SIZE = (120, 80)
+
+
+def frame_image(index: int) -> Image.Image:
+    """右上の10x10の領域にフレーム番号を埋め込んだ、市松模様の画像"""
+    checker = (np.indices((SIZE[1], SIZE[0])).sum(axis=0) % 2 * 255).astype(np.uint8)
+    pixels = np.stack([checker] * 3, axis=-1)
+    pixels[:10, -10:] = (index * 20, 0, 0)
+    return Image.fromarray(pixels)
+
+
+def frame_index_of(image: Image.Image) -> int:
+    return round(image.convert("RGB").getpixel((SIZE[0] - 5, 5))[0] / 20)
+
+
+def face_box(index: int) -> dict:
+    """フレーム番号に比例して右へ動く顔"""
+    return {"Left": 0.1 + 0.05 * index, "Top": 0.25, "Width": 0.25, "Height": 0.5}
+
+
+class FrameAwareClient(IRekognitionClientWrapper):
+    """受け取ったフレームの番号を記録し、その位置の顔を返すクライアント"""
+
+    def __init__(self):
+        self.detected: list[int] = []
+
+    def _index(self, image_bytes: bytes) -> int:
+        return frame_index_of(Image.open(io.BytesIO(image_bytes)))
+
+    def detect_faces(self, image_bytes):
+        index = self._index(image_bytes)
+        self.detected.append(index)
+        return [{"BoundingBox": face_box(index)}]
+
+    def detect_cats(self, image_bytes, max_labels=10, min_confidence=75):
+        return {"Labels": []}
+
+
+class ListSource(IFrameSource):
+    def __init__(self, frames: int, sink: "ListSink"):
+        self._frames = frames
+        self._sink = sink
+        self.max_buffered = 0
+
+    @property
+    def size(self):
+        return SIZE
+
+    def __iter__(self):
+        for index in range(self._frames):
+            self.max_buffered = max(self.max_buffered, index - len(self._sink.frames))
+            yield VideoFrame(index, frame_image(index), 40)
+
+
+class ListSink(IFrameSink):
+    def __init__(self):
+        self.frames: list[VideoFrame] = []
+        self.closed = False
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        self.closed = True
+
+
+def local_variance(image: Image.Image, x: int, y: int) -> float:
+    return float(np.asarray(image.convert("L"), dtype=float)[y - 1:y + 2, x - 1:x + 2].var())
+
+
+def test_processor_detects_keyframes_only_and_mosaics_every_frame():
+    client = FrameAwareClient()
+    sink = ListSink()
+    source = ListSource(10, sink)
+
+    report = VideoProcessor(client, NumpyEllipseFaceMosaicDrawer(), keyframe_interval=4, face_margin=0).process(source, sink)
+
+    # 0, 4, 8 と最後のフレームだけを検出する
+    assert sorted(client.detected) == [0, 4, 8, 9]
+    assert (report.frames, report.keyframes) == (10, 4)
+    assert report.frames_per_second > 0
+    assert sink.closed
+    assert [frame.index for frame in sink.frames] == list(range(10))
+    assert all(frame.duration_ms == 40 for frame in sink.frames)
+    # 保持するフレームはキーフレーム間の分まで
+    assert source.max_buffered <= 4 * 2
+
+    # キーフレーム以外（補間した位置）にもモザイクがかかっている
+    for frame in sink.frames:
+        box = face_box(frame.index)
+        center_x = round((box["Left"] + box["Width"] / 2) * SIZE[0])
+        center_y = round((box["Top"] + box["Height"] / 2) * SIZE[1])
+        assert local_variance(frame.image, center_x, center_y) < local_variance(frame_image(0), center_x, center_y)
+
+
+def test_processor_propagates_detection_errors_and_closes_sink():
+    class FailingClient(FrameAwareClient):
+        def detect_faces(self, image_bytes):
+            raise RuntimeError("boom")
+
+    sink = ListSink()
+    with pytest.raises(RuntimeError):
+        VideoProcessor(FailingClient(), NumpyEllipseFaceMosaicDrawer()).process(ListSource(3, sink), sink)
+    assert sink.closed
+
+
+def test_gif_round_trip():
+    frames = [frame_image(index) for index in range(5)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=70, loop=0)
+    assert is_animated_image(buffer.getvalue())
+    assert not is_animated_image(b"not an image")
+
+    output = io.BytesIO()
+    client = FrameAwareClient()
+    report = VideoProcessor(client, NumpyEllipseFaceMosaicDrawer(), PILBoundingBoxDrawer(), keyframe_interval=2).process(
+        AnimatedImageFrameSource(buffer.getvalue()), GIFFrameSink(output)
+    )
+
+    result = Image.open(io.BytesIO(output.getvalue()))
+    assert report.frames == result.n_frames == 5
+    assert result.size == SIZE
+    assert result.info["loop"] == 0
+    assert result.info["duration"] == 70
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg is not installed")
+def test_ffmpeg_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "clip.mp4")
+    sink = FFmpegFrameSink(path, SIZE, fps=10)
+    for index in range(6):
+        sink.write(VideoFrame(index, frame_image(index)))
+    sink.close()
+
+    source = FFmpegFrameSource(path)
+    frames = list(source)
+    assert source.size == SIZE
+    assert len(frames) == 6
+    assert source.fps == pytest.approx(10)